@@ -0,0 +1,282 @@
+"""
+Alertas de stock bajo según umbrales de reposición por ingrediente.
+
+Cada ingrediente puede tener un stock mínimo (punto de reposición) y un
+stock crítico. Su nivel es "critico" si el stock es menor o igual al
+crítico, "bajo" si es menor o igual al mínimo y "normal" en otro caso.
+
+El motor no recorre los ingredientes periódicamente: se suscribe al bus
+de eventos y, cada vez que se confirma un cambio de ingredientes
+(descuento de stock de un pedido, carga de CSV, actualizar_stock, cambio
+de umbrales), anota los IDs del evento y los evalúa después, en su propio
+hilo, con una consulta por lote. La escritura que publicó el evento no
+espera esa evaluación ni su commit; los IDs que llegan mientras el hilo
+trabaja se juntan en una sola evaluación.
+Sólo escribe cuando un ingrediente cambia de nivel: marca como resuelta
+su alerta activa y abre otra si el nuevo nivel no es normal, así cada
+ingrediente tiene a lo sumo una alerta activa (índice único parcial).
+
+Las alertas quedan en la tabla AlertasStock y se publican en el bus como
+entidad "alertas" (desde el hilo del motor; la interfaz muestra un
+contador). Si se define PROYECTO_ALERTAS_WEBHOOK las alertas nuevas además
+se envían desde el mismo hilo: por POST JSON si es una URL http(s), o como una línea JSON por
+alerta agregada a ese archivo (reemplazo local del webhook).
+
+Uso:
+    motor_alertas.instalar()      # evalúa una vez y luego sólo los cambios
+    python alertas.py [--evaluar]
+"""
+import argparse
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import urllib.request
+from datetime import datetime
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from sqlalchemy import and_, case, func, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, en_lotes
+from eventos import EventoCambio, bus_eventos, registrar_cambio
+from models import AlertaStock, Ingrediente
+
+logger = logging.getLogger(__name__)
+
+NIVELES = ("normal", "bajo", "critico")
+# Segundos de espera de un POST al webhook
+TIEMPO_WEBHOOK = 5
+
+
+class FilaAlerta(NamedTuple):
+    id: int
+    ingrediente_id: int
+    ingrediente: str
+    nivel: str
+    stock: float
+    umbral: float
+    unidad: str
+    fecha: datetime
+
+
+def nivel_stock(stock: float, stock_minimo: Optional[float],
+                stock_critico: Optional[float]) -> Tuple[str, Optional[float]]:
+    """Nivel del stock y el umbral que alcanzó (None si es normal)"""
+    if stock_critico is not None and stock <= stock_critico:
+        return "critico", stock_critico
+    if stock_minimo is not None and stock <= stock_minimo:
+        return "bajo", stock_minimo
+    return "normal", None
+
+
+def enviar_webhook(destino: str, alertas: List[Dict]) -> None:
+    """POST JSON a una URL http(s); cualquier otro destino es un archivo de líneas JSON"""
+    if destino.startswith(("http://", "https://")):
+        cuerpo = json.dumps({"alertas": alertas}, ensure_ascii=False).encode("utf-8")
+        solicitud = urllib.request.Request(destino, data=cuerpo, headers={"Content-Type": "application/json"})
+        urllib.request.urlopen(solicitud, timeout=TIEMPO_WEBHOOK).close()
+        return
+    with open(destino, "a", encoding="utf-8") as archivo:
+        for alerta in alertas:
+            archivo.write(json.dumps(alerta, ensure_ascii=False) + "\n")
+
+
+class MotorAlertas:
+    def __init__(self, sesiones=SessionLocal, webhook: str = None):
+        self.sesiones = sesiones
+        self.webhook = webhook if webhook is not None else os.environ.get("PROYECTO_ALERTAS_WEBHOOK")
+        self.evaluaciones = 0
+        self.generadas = 0
+        self._instalado = False
+        self._lock = threading.Lock()
+        self._cola: Optional[queue.Queue] = None
+        # Ingredientes por evaluar (None = todos) y si ya hay una evaluación en la cola
+        self._pendientes: Optional[Set[int]] = set()
+        self._evaluacion_encolada = False
+
+    @staticmethod
+    def evaluar(db: Session, ingrediente_ids: Iterable[int] = None) -> List[FilaAlerta]:
+        """
+        Compara el stock de los ingredientes indicados (o de todos los que
+        tienen umbrales o una alerta activa si es None) con sus umbrales y
+        registra los cambios de nivel. No hace commit.
+        Retorna las alertas abiertas.
+        """
+        consulta = (
+            select(Ingrediente.id, Ingrediente.nombre, Ingrediente.stock, Ingrediente.unidad,
+                   Ingrediente.stock_minimo, Ingrediente.stock_critico, AlertaStock.id, AlertaStock.nivel)
+            .outerjoin(AlertaStock, and_(AlertaStock.ingrediente_id == Ingrediente.id,
+                                         AlertaStock.resuelta.is_(None)))
+        )
+        if ingrediente_ids is None:
+            sentencias = [consulta.where(or_(Ingrediente.stock_minimo.isnot(None),
+                                             Ingrediente.stock_critico.isnot(None),
+                                             AlertaStock.id.isnot(None)))]
+        else:
+            sentencias = [consulta.where(Ingrediente.id.in_(lote))
+                          for lote in en_lotes(sorted(set(ingrediente_ids)))]
+
+        ahora = datetime.now()
+        resueltas, nuevas = [], []
+        for sentencia in sentencias:
+            for ingrediente_id, nombre, stock, unidad, minimo, critico, alerta_id, actual in db.execute(sentencia):
+                nivel, umbral = nivel_stock(stock or 0.0, minimo, critico)
+                if nivel == (actual or "normal"):
+                    continue
+                if alerta_id is not None:
+                    resueltas.append(alerta_id)
+                if nivel != "normal":
+                    alerta = AlertaStock(ingrediente_id=ingrediente_id, nivel=nivel, stock=stock or 0.0,
+                                         umbral=umbral, fecha=ahora)
+                    nuevas.append((alerta, nombre, unidad))
+
+        for lote in en_lotes(resueltas):
+            # La alerta anterior se cierra antes de abrir la nueva (índice único parcial)
+            db.execute(update(AlertaStock).where(AlertaStock.id.in_(lote)).values(resuelta=ahora)
+                       .execution_options(synchronize_session=False))
+            registrar_cambio(db, "alertas", "actualizar", lote)
+        if nuevas:
+            db.add_all(alerta for alerta, _, _ in nuevas)
+            db.flush()
+        return [FilaAlerta(a.id, a.ingrediente_id, nombre, a.nivel, a.stock, a.umbral, unidad, a.fecha)
+                for a, nombre, unidad in nuevas]
+
+    @staticmethod
+    def activas(db: Session) -> List[FilaAlerta]:
+        """Alertas activas, las críticas primero y luego las más antiguas"""
+        consulta = (
+            select(AlertaStock.id, AlertaStock.ingrediente_id, Ingrediente.nombre, AlertaStock.nivel,
+                   AlertaStock.stock, AlertaStock.umbral, Ingrediente.unidad, AlertaStock.fecha)
+            .join(Ingrediente, Ingrediente.id == AlertaStock.ingrediente_id)
+            .where(AlertaStock.resuelta.is_(None))
+            .order_by(case((AlertaStock.nivel == "critico", 0), else_=1), AlertaStock.fecha)
+        )
+        return list(map(FilaAlerta._make, db.execute(consulta)))
+
+    @staticmethod
+    def contar_activas(db: Session) -> Dict[str, int]:
+        """Cantidad de alertas activas por nivel, ej: {"bajo": 3, "critico": 1}"""
+        conteo = dict(db.execute(
+            select(AlertaStock.nivel, func.count(AlertaStock.id))
+            .where(AlertaStock.resuelta.is_(None)).group_by(AlertaStock.nivel)
+        ).all())
+        return {nivel: conteo.get(nivel, 0) for nivel in NIVELES[1:]}
+
+    def procesar(self, ingrediente_ids: Iterable[int] = None) -> List[FilaAlerta]:
+        """Evalúa los ingredientes en una transacción propia y envía las alertas nuevas al webhook"""
+        if ingrediente_ids is not None:
+            ingrediente_ids = list(ingrediente_ids)
+        db = self.sesiones()
+        try:
+            try:
+                alertas = self.evaluar(db, ingrediente_ids)
+                db.commit()
+            except IntegrityError:
+                # Otra terminal abrió la misma alerta entre la lectura y la escritura
+                db.rollback()
+                alertas = self.evaluar(db, ingrediente_ids)
+                db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        self.evaluaciones += 1
+        self.generadas += len(alertas)
+        if alertas and self.webhook:
+            self._encolar(alertas)
+        return alertas
+
+    # Bus de eventos
+
+    def instalar(self) -> None:
+        """Evalúa una vez todos los ingredientes con umbrales y luego sólo los que cambian"""
+        if self._instalado:
+            return
+        self._instalado = True
+        bus_eventos.suscribir(self.al_cambiar_ingredientes, "ingredientes")
+        self.procesar()
+
+    def al_cambiar_ingredientes(self, evento: EventoCambio) -> None:
+        """Suscriptor del bus (dentro del commit del escritor): sólo anota los IDs"""
+        if evento.operacion == "eliminar":
+            return  # Sus alertas las elimina la base (ON DELETE CASCADE)
+        with self._lock:
+            if evento.ids is None or self._pendientes is None:
+                self._pendientes = None
+            else:
+                self._pendientes.update(evento.ids)
+            if self._evaluacion_encolada:
+                return
+            self._evaluacion_encolada = True
+        self._poner(("evaluar", None))
+
+    def esperar(self) -> None:
+        """Bloquea hasta que el hilo del motor termine las evaluaciones y envíos pendientes"""
+        if self._cola is not None:
+            self._cola.join()
+
+    # Hilo del motor: evaluaciones pendientes y webhook
+
+    def _poner(self, tarea: Tuple[str, Optional[List[Dict]]]) -> None:
+        with self._lock:
+            if self._cola is None:
+                self._cola = queue.Queue()
+                threading.Thread(target=self._trabajar, name="motor-alertas", daemon=True).start()
+        self._cola.put(tarea)
+
+    def _encolar(self, alertas: List[FilaAlerta]) -> None:
+        self._poner(("webhook", [dict(a._asdict(), fecha=a.fecha.isoformat(timespec="seconds")) for a in alertas]))
+
+    def _trabajar(self) -> None:
+        while True:
+            tarea, alertas = self._cola.get()
+            try:
+                if tarea == "webhook":
+                    enviar_webhook(self.webhook, alertas)
+                else:
+                    with self._lock:
+                        ids, self._pendientes = self._pendientes, set()
+                        self._evaluacion_encolada = False
+                    if ids is None or ids:
+                        self.procesar(ids)
+            except Exception:
+                if tarea == "webhook":
+                    logger.exception("No se pudieron enviar %d alertas a %s", len(alertas), self.webhook)
+                else:
+                    logger.exception("Error al evaluar alertas de stock")
+            finally:
+                self._cola.task_done()
+
+
+# Instancia compartida por la aplicación (se activa con instalar())
+motor_alertas = MotorAlertas()
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Alertas de stock bajo")
+    parser.add_argument("--evaluar", action="store_true", help="Evalúa todos los ingredientes antes de listar")
+    args = parser.parse_args(argv)
+
+    from database import actualizar_esquema
+    actualizar_esquema()
+    if args.evaluar:
+        print(f"Alertas nuevas: {len(motor_alertas.procesar())}")
+    db = SessionLocal()
+    try:
+        alertas = MotorAlertas.activas(db)
+    finally:
+        db.close()
+    for alerta in alertas:
+        print(f"{alerta.nivel:<8} {alerta.ingrediente:<30} {alerta.stock:>10.2f} {alerta.unidad:<10} "
+              f"umbral {alerta.umbral:.2f}  desde {alerta.fecha:%Y-%m-%d %H:%M}")
+    print(f"{len(alertas)} alertas activas")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
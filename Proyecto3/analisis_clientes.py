@@ -0,0 +1,108 @@
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from models import Cliente
+from crud.filas import FilaCliente, columnas
+from datetime import datetime
+from typing import Dict, List
+
+# Segmentos RFM según los puntajes de recencia (R) y frecuencia (F), de 1 a 5
+SEGMENTOS_RFM = [
+    ("Campeones", lambda r, f: r >= 4 and f >= 4),
+    ("Leales", lambda r, f: r >= 3 and f >= 4),
+    ("Potenciales", lambda r, f: r >= 4 and f >= 2),
+    ("Nuevos", lambda r, f: r >= 4),
+    ("Necesitan atención", lambda r, f: r == 3),
+    ("En riesgo", lambda r, f: r <= 2 and f >= 3),
+    ("Perdidos", lambda r, f: True),
+]
+
+class AnalisisClientes:
+    """
+    Segmentación RFM y ranking de clientes.
+    Se calcula sobre los contadores desnormalizados de Cliente (total de
+    pedidos, gasto acumulado y fecha del último pedido), por lo que el costo
+    depende de la cantidad de clientes y no de la cantidad de pedidos.
+    """
+
+    @staticmethod
+    def _puntajes(valores: List[float], invertir: bool = False) -> List[int]:
+        """
+        Puntaje de 1 a 5 por quintil de rango (5 = mejor). Los valores
+        iguales toman el rango del primero de su grupo: mismo puntaje.
+        """
+        n = len(valores)
+        orden = sorted(range(n), key=lambda i: valores[i], reverse=invertir)
+        puntajes = [0] * n
+        inicio_empate = 0
+        for rango, i in enumerate(orden):
+            if rango and valores[i] != valores[orden[rango - 1]]:
+                inicio_empate = rango
+            puntajes[i] = 1 + inicio_empate * 5 // n
+        return puntajes
+
+    @staticmethod
+    def segmento(r: int, f: int) -> str:
+        for nombre, condicion in SEGMENTOS_RFM:
+            if condicion(r, f):
+                return nombre
+        return SEGMENTOS_RFM[-1][0]
+
+    @staticmethod
+    def calcular_rfm(db: Session, fecha_referencia: datetime = None) -> List[Dict]:
+        """
+        Calcula recencia (días desde el último pedido), frecuencia y monto de
+        cada cliente con pedidos, sus puntajes R, F y M y su segmento.
+        Retorna la lista ordenada por puntaje total descendente.
+        """
+        try:
+            fecha_referencia = fecha_referencia or datetime.now()
+            filas = db.query(
+                Cliente.id, Cliente.rut, Cliente.nombre,
+                Cliente.ultimo_pedido, Cliente.total_pedidos, Cliente.total_gastado
+            ).filter(Cliente.total_pedidos > 0, Cliente.ultimo_pedido.isnot(None)).all()
+            if not filas:
+                return []
+
+            recencias = [max(0, (fecha_referencia - f.ultimo_pedido).days) for f in filas]
+            puntajes_r = AnalisisClientes._puntajes(recencias, invertir=True)
+            puntajes_f = AnalisisClientes._puntajes([f.total_pedidos for f in filas])
+            puntajes_m = AnalisisClientes._puntajes([f.total_gastado for f in filas])
+
+            resultado = []
+            for fila, recencia, r, f, m in zip(filas, recencias, puntajes_r, puntajes_f, puntajes_m):
+                resultado.append({
+                    "cliente_id": fila.id,
+                    "rut": fila.rut,
+                    "nombre": fila.nombre,
+                    "recencia_dias": recencia,
+                    "frecuencia": fila.total_pedidos,
+                    "monto": round(fila.total_gastado, 2),
+                    "r": r, "f": f, "m": m,
+                    "segmento": AnalisisClientes.segmento(r, f),
+                })
+            resultado.sort(key=lambda x: (x["r"] + x["f"] + x["m"], x["monto"]), reverse=True)
+            return resultado
+        except Exception as e:
+            raise Exception(f"Error al calcular segmentación RFM: {str(e)}")
+
+    @staticmethod
+    def resumen_segmentos(rfm: List[Dict]) -> Dict[str, Dict]:
+        """Cantidad de clientes y monto total por segmento"""
+        resumen = {nombre: {"clientes": 0, "monto": 0.0} for nombre, _ in SEGMENTOS_RFM}
+        for fila in rfm:
+            resumen[fila["segmento"]]["clientes"] += 1
+            resumen[fila["segmento"]]["monto"] += fila["monto"]
+        return resumen
+
+    @staticmethod
+    def obtener_top_clientes(db: Session, limite: int = 10, criterio: str = "gastado") -> List[FilaCliente]:
+        """Los `limite` clientes con mayor gasto acumulado (criterio='gastado') o más pedidos ('pedidos')"""
+        try:
+            columna = Cliente.total_pedidos if criterio == "pedidos" else Cliente.total_gastado
+            consulta = (select(*columnas(Cliente, FilaCliente))
+                        .where(Cliente.total_pedidos > 0)
+                        .order_by(columna.desc(), Cliente.id)
+                        .limit(limite))
+            return list(map(FilaCliente._make, db.execute(consulta)))
+        except Exception as e:
+            raise Exception(f"Error al obtener top clientes: {str(e)}")
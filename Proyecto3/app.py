@@ -1,20 +1,54 @@
 import customtkinter as ctk
 from tkinter import messagebox, ttk, filedialog
 import json
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from database import get_session, engine, Base
+import io
+import os
+import threading
+from datetime import datetime
+from PIL import Image
+from database import get_session, engine, actualizar_esquema
 from crud.cliente_crud import ClienteCRUD
 from crud.ingrediente_crud import IngredienteCRUD
 from crud.menu_crud import MenuCRUD
-from crud.pedido_crud import PedidoCRUD
+from crud.pedido_crud import PedidoCRUD, ESTADOS_PEDIDO
+from crud.version_crud import VersionCRUD
+from crud.concurrencia import metricas_conflictos
+from eventos import bus_eventos
+from fuente_reportes import fuente_reportes, get_session_reportes
 from graficos import GraficosEstadisticos
+from analisis_clientes import AnalisisClientes
+from busqueda import BusquedaTexto
+from cache_graficos import CacheGraficos
+from federacion import Federacion, TIPOS_FEDERADOS
+from respaldo import Respaldo, iniciar_respaldo_periodico
+from alertas import MotorAlertas, motor_alertas
+from metricas import metricas_en_vivo
+from instrumentacion import instrumentacion
+from perfilado import perfilador
+
+# Espera tras la última tecla antes de buscar (ms) y máximo de resultados
+RETARDO_BUSQUEDA = 250
+LIMITE_BUSQUEDA = 100
+# Intervalo de refresco del panel de métricas en vivo (ms)
+REFRESCO_METRICAS = 1000
+# Intervalo de revisión de cambios en las alertas de stock (ms)
+REVISION_ALERTAS = 500
+# Niveles de la mini gráfica de pedidos por minuto
+BARRAS_SERIE = " ▁▂▃▄▅▆▇█"
 
 # Configuración de la ventana principal
 ctk.set_appearance_mode("System")
 ctk.set_default_color_theme("blue")
 
 # Crear las tablas en la base de datos
-Base.metadata.create_all(bind=engine)
+actualizar_esquema()
+
+# Conteo de sentencias SQL por operación (pestaña Diagnóstico)
+instrumentacion.instalar(engine)
+instrumentacion.estricto = os.environ.get("PROYECTO_LAZY_ESTRICTO") == "1"
+for clase_crud in (ClienteCRUD, IngredienteCRUD, MenuCRUD, PedidoCRUD, VersionCRUD):
+    instrumentacion.instrumentar_clase(clase_crud)
+
 class App(ctk.CTk):
     def __init__(self):
         super().__init__()
@@ -22,6 +56,42 @@ class App(ctk.CTk):
         self.title("Sistema de Gestión - Restaurante")
         self.geometry("900x700")
 
+        # Caché de gráficos renderizados (memoria + disco)
+        self.cache_graficos = CacheGraficos()
+        # Sucursales registradas para los gráficos de toda la cadena
+        self.federacion = Federacion()
+        # Copia de la base para las estadísticas, renovada en segundo plano
+        fuente_reportes.iniciar_refresco_periodico()
+        # Respaldo en línea periódico opcional (PROYECTO_RESPALDO_MINUTOS, ver respaldo.py)
+        if os.environ.get("PROYECTO_RESPALDO_MINUTOS"):
+            iniciar_respaldo_periodico(
+                Respaldo.desde_configuracion(os.environ.get("PROYECTO_RESPALDO_DIR", "respaldos")),
+                float(os.environ["PROYECTO_RESPALDO_MINUTOS"]),
+                comprimir=True, conservar=int(os.environ.get("PROYECTO_RESPALDO_CONSERVAR", "14")),
+                espejo=os.environ.get("PROYECTO_RESPALDO_ESPEJO"),
+            )
+
+        # Búsquedas pendientes de los buscadores (id de after() por buscador)
+        self._busquedas_pendientes = {}
+        self._segmentos_clientes = {}
+
+        # Cambios publicados por el bus de eventos que aún no se muestran (por entidad)
+        self._cambios_pendientes = {}
+        self._refresco_programado = None
+
+        # Atajo oculto para activar/desactivar el perfilado
+        self.bind_all("<Control-P>", self.alternar_perfilado)
+
+        # Barra superior: métricas en vivo (ver metricas.py) y contador de alertas de stock (ver alertas.py)
+        frame_estado = ctk.CTkFrame(self, fg_color="transparent")
+        frame_estado.pack(pady=(10, 0), padx=20, fill="x")
+        self.label_metricas = ctk.CTkLabel(frame_estado, text="", anchor="w", justify="left")
+        self.label_metricas.pack(side="left", fill="x", expand=True)
+        # Lo marca el hilo del motor de alertas; la interfaz lo revisa en su propio hilo
+        self._alertas_cambiaron = threading.Event()
+        self.boton_alertas = ctk.CTkButton(frame_estado, text="", command=self.mostrar_alertas, width=220)
+        self.boton_alertas.pack(side="right")
+
         # Crear el Tabview (pestañas)
         self.tabview = ctk.CTkTabview(self)
         self.tabview.pack(pady=20, padx=20, fill="both", expand=True)
@@ -41,6 +111,20 @@ class App(ctk.CTk):
         
         self.tab_graficos = self.tabview.add("Gráficos")
         self.crear_formulario_graficos(self.tab_graficos)
+
+        self.tab_diagnostico = self.tabview.add("Diagnóstico")
+        self.crear_formulario_diagnostico(self.tab_diagnostico)
+
+        # Cada escritura confirmada refresca sólo las filas afectadas de su Treeview
+        bus_eventos.suscribir(self.al_cambiar_datos, "clientes", "ingredientes", "menus", "pedidos")
+        # Las alertas se evalúan sólo para los ingredientes de cada cambio confirmado
+        bus_eventos.suscribir(self.al_cambiar_alertas, "alertas")
+        motor_alertas.instalar()
+        self.actualizar_insignia_alertas()
+        self.revisar_alertas()
+        # Las métricas en vivo se reconstruyen una vez y luego sólo suman los pedidos confirmados
+        metricas_en_vivo.instalar()
+        self.actualizar_panel_metricas()
 # Clientes
     def crear_formulario_cliente(self, parent):
         frame_superior = ctk.CTkFrame(parent)
@@ -63,34 +147,75 @@ class App(ctk.CTk):
         ctk.CTkButton(frame_superior, text="Eliminar", command=self.eliminar_cliente).grid(row=1, column=2, pady=10, padx=5)
         ctk.CTkButton(frame_superior, text="Refrescar", command=self.cargar_clientes).grid(row=1, column=3, pady=10, padx=5)
 
+        ctk.CTkLabel(frame_superior, text="Buscar").grid(row=1, column=4, pady=10, padx=10)
+        self.entry_buscar_cliente = ctk.CTkEntry(frame_superior, width=200, placeholder_text="Nombre, RUT o correo")
+        self.entry_buscar_cliente.grid(row=1, column=5, pady=10, padx=10)
+        self.entry_buscar_cliente.bind(
+            "<KeyRelease>", lambda event: self.programar_busqueda("clientes", self.buscar_clientes)
+        )
+
         frame_inferior = ctk.CTkFrame(parent)
         frame_inferior.pack(pady=10, padx=10, fill="both", expand=True)
 
-        self.treeview_clientes = ttk.Treeview(frame_inferior, columns=("ID", "RUT", "Nombre", "Correo"), show="headings")
+        self.treeview_clientes = ttk.Treeview(
+            frame_inferior,
+            columns=("ID", "RUT", "Nombre", "Correo", "Pedidos", "Gastado", "Último Pedido", "Segmento"),
+            show="headings"
+        )
         self.treeview_clientes.heading("ID", text="ID")
         self.treeview_clientes.heading("RUT", text="RUT")
         self.treeview_clientes.heading("Nombre", text="Nombre")
         self.treeview_clientes.heading("Correo", text="Correo")
+        self.treeview_clientes.heading("Pedidos", text="Pedidos")
+        self.treeview_clientes.heading("Gastado", text="Gastado")
+        self.treeview_clientes.heading("Último Pedido", text="Último Pedido")
+        self.treeview_clientes.heading("Segmento", text="Segmento")
         self.treeview_clientes.column("ID", width=50)
         self.treeview_clientes.column("Correo", width=200)
+        self.treeview_clientes.column("Pedidos", width=70)
+        self.treeview_clientes.column("Gastado", width=100)
         self.treeview_clientes.pack(pady=10, padx=10, fill="both", expand=True)
 
         self.cargar_clientes()
 
-        self.cargar_clientes()
-
     def cargar_clientes(self):
         db = next(get_session())
         self.treeview_clientes.delete(*self.treeview_clientes.get_children())
         try:
-            clientes = ClienteCRUD.obtener_todos_clientes(db)
-            for cliente in clientes:
-                self.treeview_clientes.insert("", "end", values=(cliente.id, cliente.rut, cliente.nombre, cliente.correo or ""))
+            clientes = ClienteCRUD.listar_clientes(db)
+            self._segmentos_clientes = {fila["cliente_id"]: fila["segmento"] for fila in AnalisisClientes.calcular_rfm(db)}
+            self.mostrar_clientes(clientes)
         except Exception as e:
             messagebox.showerror("Error", f"Error al cargar clientes: {e}")
         finally:
             db.close()
 
+    def _fila_cliente(self, cliente):
+        return (
+            cliente.id, cliente.rut, cliente.nombre, cliente.correo or "",
+            cliente.total_pedidos, f"${cliente.total_gastado:,.0f}",
+            cliente.ultimo_pedido.strftime("%Y-%m-%d") if cliente.ultimo_pedido else "",
+            self._segmentos_clientes.get(cliente.id, "")
+        )
+
+    def mostrar_clientes(self, clientes):
+        for cliente in clientes:
+            self.treeview_clientes.insert("", "end", iid=str(cliente.id), values=self._fila_cliente(cliente))
+
+    def buscar_clientes(self):
+        texto = self.entry_buscar_cliente.get().strip()
+        if not texto:
+            self.cargar_clientes()
+            return
+        db = next(get_session())
+        self.treeview_clientes.delete(*self.treeview_clientes.get_children())
+        try:
+            self.mostrar_clientes(BusquedaTexto.buscar_clientes(db, texto, LIMITE_BUSQUEDA))
+        except Exception as e:
+            messagebox.showerror("Error", str(e))
+        finally:
+            db.close()
+
     def crear_cliente(self):
         rut = self.entry_rut.get().strip()
         nombre = self.entry_nombre_cliente.get().strip()
@@ -100,7 +225,6 @@ class App(ctk.CTk):
             try:
                 ClienteCRUD.crear_cliente(db, rut, nombre, correo if correo else None)
                 messagebox.showinfo("Éxito", "Cliente creado correctamente.")
-                self.cargar_clientes()
                 self.entry_rut.delete(0, 'end')
                 self.entry_nombre_cliente.delete(0, 'end')
                 self.entry_correo_cliente.delete(0, 'end')
@@ -130,7 +254,6 @@ class App(ctk.CTk):
                 correo if correo else None
             )
             messagebox.showinfo("Éxito", "Cliente actualizado.")
-            self.cargar_clientes()
         except Exception as e:
             messagebox.showerror("Error", str(e))
         finally:
@@ -141,12 +264,16 @@ class App(ctk.CTk):
         if not selected:
             messagebox.showwarning("Selección", "Seleccione un cliente.")
             return
-        cliente_id = self.treeview_clientes.item(selected)["values"][0]
+        ids = [self.treeview_clientes.item(fila)["values"][0] for fila in selected]
         db = next(get_session())
         try:
-            ClienteCRUD.eliminar_cliente(db, cliente_id)
-            messagebox.showinfo("Éxito", "Cliente eliminado.")
-            self.cargar_clientes()
+            if len(ids) == 1:
+                ClienteCRUD.eliminar_cliente(db, ids[0])
+                messagebox.showinfo("Éxito", "Cliente eliminado.")
+            else:
+                # Varias filas seleccionadas: una sola eliminación masiva
+                eliminados = ClienteCRUD.eliminar_clientes(db, ids)
+                messagebox.showinfo("Éxito", f"{eliminados} clientes eliminados.")
         except Exception as e:
             messagebox.showerror("Error", str(e))
         finally:
@@ -174,15 +301,32 @@ class App(ctk.CTk):
         ctk.CTkButton(frame_superior, text="Refrescar", command=self.cargar_ingredientes).grid(row=1, column=3, pady=10, padx=5)
         ctk.CTkButton(frame_superior, text="Cargar CSV", command=self.cargar_csv_ingredientes).grid(row=1, column=4, pady=10, padx=5)
 
+        # Umbrales de reposición: vacíos = sin alerta
+        ctk.CTkLabel(frame_superior, text="Mínimo").grid(row=2, column=0, pady=10, padx=10)
+        self.entry_stock_minimo = ctk.CTkEntry(frame_superior, width=100)
+        self.entry_stock_minimo.grid(row=2, column=1, pady=10, padx=10)
+
+        ctk.CTkLabel(frame_superior, text="Crítico").grid(row=2, column=2, pady=10, padx=10)
+        self.entry_stock_critico = ctk.CTkEntry(frame_superior, width=100)
+        self.entry_stock_critico.grid(row=2, column=3, pady=10, padx=10)
+
+        ctk.CTkButton(frame_superior, text="Fijar Umbrales", command=self.fijar_umbrales_ingrediente).grid(row=2, column=4, pady=10, padx=5)
+
         frame_inferior = ctk.CTkFrame(parent)
         frame_inferior.pack(pady=10, padx=10, fill="both", expand=True)
 
-        self.treeview_ingredientes = ttk.Treeview(frame_inferior, columns=("ID", "Nombre", "Stock", "Unidad"), show="headings")
+        self.treeview_ingredientes = ttk.Treeview(
+            frame_inferior, columns=("ID", "Nombre", "Stock", "Unidad", "Mínimo", "Crítico"), show="headings"
+        )
         self.treeview_ingredientes.heading("ID", text="ID")
         self.treeview_ingredientes.heading("Nombre", text="Nombre")
         self.treeview_ingredientes.heading("Stock", text="Stock")
         self.treeview_ingredientes.heading("Unidad", text="Unidad")
+        self.treeview_ingredientes.heading("Mínimo", text="Mínimo")
+        self.treeview_ingredientes.heading("Crítico", text="Crítico")
         self.treeview_ingredientes.column("ID", width=50)
+        self.treeview_ingredientes.column("Mínimo", width=80)
+        self.treeview_ingredientes.column("Crítico", width=80)
         self.treeview_ingredientes.pack(pady=10, padx=10, fill="both", expand=True)
 
         self.cargar_ingredientes()
@@ -191,14 +335,25 @@ class App(ctk.CTk):
         db = next(get_session())
         self.treeview_ingredientes.delete(*self.treeview_ingredientes.get_children())
         try:
-            ingredientes = IngredienteCRUD.obtener_todos_ingredientes(db)
+            ingredientes = IngredienteCRUD.listar_ingredientes(db)
             for ing in ingredientes:
-                self.treeview_ingredientes.insert("", "end", values=(ing.id, ing.nombre, ing.stock, ing.unidad))
+                self.treeview_ingredientes.insert("", "end", iid=str(ing.id), values=self._fila_ingrediente(ing))
         except Exception as e:
             messagebox.showerror("Error", f"Error al cargar ingredientes: {e}")
         finally:
             db.close()
 
+    @staticmethod
+    def _fila_ingrediente(ing):
+        return (ing.id, ing.nombre, ing.stock, ing.unidad,
+                "" if ing.stock_minimo is None else ing.stock_minimo,
+                "" if ing.stock_critico is None else ing.stock_critico)
+
+    def _umbrales_ingresados(self):
+        minimo = self.entry_stock_minimo.get().strip()
+        critico = self.entry_stock_critico.get().strip()
+        return float(minimo) if minimo else None, float(critico) if critico else None
+
     def crear_ingrediente(self):
         nombre = self.entry_nombre_ingrediente.get().strip()
         stock = self.entry_stock.get().strip()
@@ -206,9 +361,8 @@ class App(ctk.CTk):
         if nombre and stock and unidad:
             db = next(get_session())
             try:
-                IngredienteCRUD.crear_ingrediente(db, nombre, float(stock), unidad)
+                IngredienteCRUD.crear_ingrediente(db, nombre, float(stock), unidad, *self._umbrales_ingresados())
                 messagebox.showinfo("Éxito", "Ingrediente creado.")
-                self.cargar_ingredientes()
                 self.entry_nombre_ingrediente.delete(0, 'end')
                 self.entry_stock.delete(0, 'end')
                 self.entry_unidad.delete(0, 'end')
@@ -238,7 +392,21 @@ class App(ctk.CTk):
                 unidad if unidad else None
             )
             messagebox.showinfo("Éxito", "Ingrediente actualizado.")
-            self.cargar_ingredientes()
+        except Exception as e:
+            messagebox.showerror("Error", str(e))
+        finally:
+            db.close()
+
+    def fijar_umbrales_ingrediente(self):
+        selected = self.treeview_ingredientes.selection()
+        if not selected:
+            messagebox.showwarning("Selección", "Seleccione un ingrediente.")
+            return
+        ing_id = self.treeview_ingredientes.item(selected)["values"][0]
+        db = next(get_session())
+        try:
+            IngredienteCRUD.fijar_umbrales(db, ing_id, *self._umbrales_ingresados())
+            messagebox.showinfo("Éxito", "Umbrales actualizados.")
         except Exception as e:
             messagebox.showerror("Error", str(e))
         finally:
@@ -254,12 +422,78 @@ class App(ctk.CTk):
         try:
             IngredienteCRUD.eliminar_ingrediente(db, ing_id)
             messagebox.showinfo("Éxito", "Ingrediente eliminado.")
-            self.cargar_ingredientes()
         except Exception as e:
             messagebox.showerror("Error", str(e))
         finally:
             db.close()
 
+    # Alertas de stock
+    def al_cambiar_alertas(self, evento):
+        """Suscriptor del bus, llamado desde el hilo del motor: sólo marca el cambio (Tk no es seguro entre hilos)"""
+        self._alertas_cambiaron.set()
+
+    def revisar_alertas(self):
+        """Un solo recuento por intervalo si el motor publicó cambios, y se reprograma"""
+        if self._alertas_cambiaron.is_set():
+            self._alertas_cambiaron.clear()
+            self.actualizar_insignia_alertas()
+        self.after(REVISION_ALERTAS, self.revisar_alertas)
+
+    def actualizar_insignia_alertas(self):
+        db = next(get_session())
+        try:
+            conteo = MotorAlertas.contar_activas(db)
+        except Exception:
+            return
+        finally:
+            db.close()
+        total = sum(conteo.values())
+        if not total:
+            self.boton_alertas.configure(text="Sin alertas de stock", fg_color="gray")
+        else:
+            self.boton_alertas.configure(
+                text=f"⚠ {total} alertas de stock ({conteo['critico']} críticas)",
+                fg_color="#c0392b" if conteo["critico"] else "#d68910",
+            )
+
+    def mostrar_alertas(self):
+        db = next(get_session())
+        try:
+            alertas = MotorAlertas.activas(db)
+        except Exception as e:
+            messagebox.showerror("Error", f"Error al obtener alertas: {e}")
+            return
+        finally:
+            db.close()
+        if not alertas:
+            messagebox.showinfo("Alertas de stock", "No hay ingredientes bajo su umbral.")
+            return
+        mensaje = "\n".join(
+            f"{'CRÍTICO' if a.nivel == 'critico' else 'Bajo'}: {a.ingrediente} {a.stock:g} {a.unidad} "
+            f"(umbral {a.umbral:g}, desde {a.fecha:%d/%m %H:%M})"
+            for a in alertas[:20]
+        )
+        if len(alertas) > 20:
+            mensaje += f"\n... y {len(alertas) - 20} más"
+        self.tabview.set("Ingredientes")
+        messagebox.showwarning("Alertas de stock", mensaje)
+
+    # Métricas en vivo
+    def actualizar_panel_metricas(self):
+        """Lee las ventanas en memoria (sin consultar la base) y se reprograma"""
+        metricas = metricas_en_vivo.instantanea()
+        serie = metricas["pedidos_por_minuto_hora"]
+        maximo = max(serie) or 1
+        grafica = "".join(BARRAS_SERIE[round(n * (len(BARRAS_SERIE) - 1) / maximo)] for n in serie)
+        self.label_metricas.configure(
+            text=f"{metricas['pedidos_por_minuto']} pedidos/min · "
+                 f"última hora: {metricas['pedidos_ultima_hora']} pedidos, "
+                 f"${metricas['ingresos_ultima_hora']:,.0f} · "
+                 f"ticket ${metricas['ticket_promedio']:,.0f}\n"
+                 f"pedidos por minuto (60 min): {grafica}"
+        )
+        self.after(REFRESCO_METRICAS, self.actualizar_panel_metricas)
+
     # Menús
     def crear_formulario_menu(self, parent):
         frame_superior = ctk.CTkFrame(parent)
@@ -289,6 +523,24 @@ class App(ctk.CTk):
         ctk.CTkButton(frame_superior, text="Eliminar", command=self.eliminar_menu).grid(row=3, column=1, pady=10, padx=5)
         ctk.CTkButton(frame_superior, text="Refrescar", command=self.cargar_menus).grid(row=3, column=2, pady=10, padx=5)
 
+        ctk.CTkLabel(frame_superior, text="Buscar").grid(row=4, column=0, pady=5, padx=5)
+        self.entry_buscar_menu = ctk.CTkEntry(frame_superior, width=200, placeholder_text="Nombre, descripción o categoría")
+        self.entry_buscar_menu.grid(row=4, column=1, pady=5, padx=5)
+        self.entry_buscar_menu.bind(
+            "<KeyRelease>", lambda event: self.programar_busqueda("menus", self.buscar_menus)
+        )
+
+        # Cambios masivos: sobre los menús seleccionados o, si no hay selección, sobre la categoría ingresada
+        ctk.CTkLabel(frame_superior, text="Ajuste %").grid(row=5, column=0, pady=5, padx=5)
+        self.entry_ajuste_precio = ctk.CTkEntry(frame_superior, width=100, placeholder_text="Ej: 10 o -5")
+        self.entry_ajuste_precio.grid(row=5, column=1, pady=5, padx=5)
+        ctk.CTkButton(frame_superior, text="Ajustar Precios", command=self.ajustar_precios_menus).grid(row=5, column=2, pady=10, padx=5)
+        ctk.CTkButton(frame_superior, text="Mover a Categoría", command=self.reasignar_categoria_menus).grid(row=5, column=3, pady=10, padx=5)
+        ctk.CTkButton(frame_superior, text="Habilitar Categoría",
+                      command=lambda: self.cambiar_disponibilidad_categoria(True)).grid(row=6, column=2, pady=10, padx=5)
+        ctk.CTkButton(frame_superior, text="Deshabilitar Categoría",
+                      command=lambda: self.cambiar_disponibilidad_categoria(False)).grid(row=6, column=3, pady=10, padx=5)
+
         frame_inferior = ctk.CTkFrame(parent)
         frame_inferior.pack(pady=10, padx=10, fill="both", expand=True)
 
@@ -307,15 +559,36 @@ class App(ctk.CTk):
         db = next(get_session())
         self.treeview_menus.delete(*self.treeview_menus.get_children())
         try:
-            menus = MenuCRUD.obtener_todos_menus(db)
-            for menu in menus:
-                disp = "Sí" if menu.disponible else "No"
-                self.treeview_menus.insert("", "end", values=(menu.id, menu.nombre, menu.precio, menu.categoria, disp))
+            menus = MenuCRUD.listar_menus(db)
+            self.mostrar_menus(menus)
         except Exception as e:
             messagebox.showerror("Error", f"Error al cargar menús: {e}")
         finally:
             db.close()
 
+    @staticmethod
+    def _fila_menu(menu):
+        disp = "Sí" if menu.disponible else "No"
+        return (menu.id, menu.nombre, menu.precio, menu.categoria, disp)
+
+    def mostrar_menus(self, menus):
+        for menu in menus:
+            self.treeview_menus.insert("", "end", iid=str(menu.id), values=self._fila_menu(menu))
+
+    def buscar_menus(self):
+        texto = self.entry_buscar_menu.get().strip()
+        if not texto:
+            self.cargar_menus()
+            return
+        db = next(get_session())
+        self.treeview_menus.delete(*self.treeview_menus.get_children())
+        try:
+            self.mostrar_menus(BusquedaTexto.buscar_menus(db, texto, LIMITE_BUSQUEDA))
+        except Exception as e:
+            messagebox.showerror("Error", str(e))
+        finally:
+            db.close()
+
     def crear_menu(self):
         nombre = self.entry_nombre_menu.get().strip()
         precio = self.entry_precio.get().strip()
@@ -332,7 +605,6 @@ class App(ctk.CTk):
                 
                 MenuCRUD.crear_menu(db, nombre, descripcion, float(precio), categoria, True, receta)
                 messagebox.showinfo("Éxito", "Menú creado.")
-                self.cargar_menus()
                 self.entry_nombre_menu.delete(0, 'end')
                 self.entry_precio.delete(0, 'end')
                 self.entry_categoria.delete(0, 'end')
@@ -352,12 +624,71 @@ class App(ctk.CTk):
         if not selected:
             messagebox.showwarning("Selección", "Seleccione un menú.")
             return
-        menu_id = self.treeview_menus.item(selected)["values"][0]
+        ids = [self.treeview_menus.item(fila)["values"][0] for fila in selected]
         db = next(get_session())
         try:
-            MenuCRUD.eliminar_menu(db, menu_id)
-            messagebox.showinfo("Éxito", "Menú eliminado.")
-            self.cargar_menus()
+            if len(ids) == 1:
+                MenuCRUD.eliminar_menu(db, ids[0])
+                messagebox.showinfo("Éxito", "Menú eliminado.")
+            else:
+                # Varias filas seleccionadas: una sola eliminación masiva
+                eliminados = MenuCRUD.eliminar_menus(db, ids)
+                messagebox.showinfo("Éxito", f"{eliminados} menús eliminados.")
+        except Exception as e:
+            messagebox.showerror("Error", str(e))
+        finally:
+            db.close()
+
+    def _menus_seleccionados(self):
+        return [self.treeview_menus.item(fila)["values"][0] for fila in self.treeview_menus.selection()]
+
+    def ajustar_precios_menus(self):
+        ids = self._menus_seleccionados()
+        categoria = self.entry_categoria.get().strip()
+        if not ids and not categoria:
+            messagebox.showwarning("Selección", "Seleccione menús o ingrese una categoría.")
+            return
+        try:
+            porcentaje = float(self.entry_ajuste_precio.get().strip())
+        except ValueError:
+            messagebox.showwarning("Campos Vacíos", "Ingrese el porcentaje de ajuste.")
+            return
+        db = next(get_session())
+        try:
+            if ids:
+                modificados = MenuCRUD.ajustar_precios(db, porcentaje=porcentaje, menu_ids=ids)
+            else:
+                modificados = MenuCRUD.ajustar_precios(db, porcentaje=porcentaje, categoria=categoria)
+            messagebox.showinfo("Éxito", f"Precio ajustado en {modificados} menús.")
+        except Exception as e:
+            messagebox.showerror("Error", str(e))
+        finally:
+            db.close()
+
+    def reasignar_categoria_menus(self):
+        ids = self._menus_seleccionados()
+        if not ids:
+            messagebox.showwarning("Selección", "Seleccione los menús a mover.")
+            return
+        db = next(get_session())
+        try:
+            modificados = MenuCRUD.reasignar_categoria(db, self.entry_categoria.get(), menu_ids=ids)
+            messagebox.showinfo("Éxito", f"{modificados} menús movidos de categoría.")
+        except Exception as e:
+            messagebox.showerror("Error", str(e))
+        finally:
+            db.close()
+
+    def cambiar_disponibilidad_categoria(self, disponible):
+        categoria = self.entry_categoria.get().strip()
+        if not categoria:
+            messagebox.showwarning("Campos Vacíos", "Ingrese la categoría.")
+            return
+        db = next(get_session())
+        try:
+            modificados = MenuCRUD.cambiar_disponibilidad_categoria(db, categoria, disponible)
+            estado = "habilitados" if disponible else "deshabilitados"
+            messagebox.showinfo("Éxito", f"{modificados} menús {estado}.")
         except Exception as e:
             messagebox.showerror("Error", str(e))
         finally:
@@ -381,14 +712,43 @@ class App(ctk.CTk):
         ctk.CTkButton(frame_superior, text="Crear Pedido", command=self.crear_pedido).grid(row=2, column=0, pady=10, padx=5)
         ctk.CTkButton(frame_superior, text="Eliminar", command=self.eliminar_pedido).grid(row=2, column=1, pady=10, padx=5)
         ctk.CTkButton(frame_superior, text="Refrescar", command=self.cargar_pedidos).grid(row=2, column=2, pady=10, padx=5)
+        self.combo_estado_pedido = ctk.CTkComboBox(frame_superior, values=list(ESTADOS_PEDIDO), width=150)
+        self.combo_estado_pedido.grid(row=2, column=3, pady=10, padx=5)
+        self.combo_estado_pedido.set(ESTADOS_PEDIDO[-1])
+        ctk.CTkButton(frame_superior, text="Cambiar Estado", command=self.cambiar_estado_pedido).grid(row=2, column=4, pady=10, padx=5)
+
+        # Buscadores: doble clic en un resultado completa el Cliente ID o agrega el menú a los items
+        ctk.CTkLabel(frame_superior, text="Buscar Cliente").grid(row=3, column=0, pady=5, padx=5)
+        self.entry_buscar_cliente_pedido = ctk.CTkEntry(frame_superior, width=150)
+        self.entry_buscar_cliente_pedido.grid(row=3, column=1, pady=5, padx=5)
+        self.entry_buscar_cliente_pedido.bind(
+            "<KeyRelease>", lambda event: self.programar_busqueda("pedido_cliente", self.buscar_cliente_pedido)
+        )
+        ctk.CTkLabel(frame_superior, text="Buscar Menú").grid(row=3, column=2, pady=5, padx=5)
+        self.entry_buscar_menu_pedido = ctk.CTkEntry(frame_superior, width=300)
+        self.entry_buscar_menu_pedido.grid(row=3, column=3, pady=5, padx=5)
+        self.entry_buscar_menu_pedido.bind(
+            "<KeyRelease>", lambda event: self.programar_busqueda("pedido_menu", self.buscar_menu_pedido)
+        )
+
+        self.treeview_busqueda_pedido = ttk.Treeview(
+            frame_superior, columns=("Tipo", "ID", "Nombre", "Detalle"), show="headings", height=4
+        )
+        for columna in ("Tipo", "ID", "Nombre", "Detalle"):
+            self.treeview_busqueda_pedido.heading(columna, text=columna)
+        self.treeview_busqueda_pedido.column("Tipo", width=70)
+        self.treeview_busqueda_pedido.column("ID", width=50)
+        self.treeview_busqueda_pedido.grid(row=4, column=0, columnspan=5, pady=5, padx=5, sticky="ew")
+        self.treeview_busqueda_pedido.bind("<Double-1>", self.seleccionar_resultado_pedido)
 
         frame_inferior = ctk.CTkFrame(parent)
         frame_inferior.pack(pady=10, padx=10, fill="both", expand=True)
 
-        self.treeview_pedidos = ttk.Treeview(frame_inferior, columns=("ID", "Cliente", "Fecha", "Total", "Items"), show="headings")
+        self.treeview_pedidos = ttk.Treeview(frame_inferior, columns=("ID", "Cliente", "Fecha", "Estado", "Total", "Items"), show="headings")
         self.treeview_pedidos.heading("ID", text="ID")
         self.treeview_pedidos.heading("Cliente", text="Cliente")
         self.treeview_pedidos.heading("Fecha", text="Fecha")
+        self.treeview_pedidos.heading("Estado", text="Estado")
         self.treeview_pedidos.heading("Total", text="Total")
         self.treeview_pedidos.heading("Items", text="Items")
         self.treeview_pedidos.column("ID", width=50)
@@ -400,21 +760,26 @@ class App(ctk.CTk):
         db = next(get_session())
         self.treeview_pedidos.delete(*self.treeview_pedidos.get_children())
         try:
-            pedidos = PedidoCRUD.obtener_todos_pedidos(db)
+            pedidos = PedidoCRUD.listar_pedidos(db)
             for pedido in pedidos:
-                items_text = f"{len(pedido.items)} items"
-                self.treeview_pedidos.insert("", "end", values=(
-                    pedido.id, 
-                    pedido.cliente.nombre, 
-                    pedido.fecha.strftime("%Y-%m-%d %H:%M"), 
-                    f"${pedido.total}",
-                    items_text
-                ))
+                self.treeview_pedidos.insert("", "end", iid=str(pedido.id), values=self._fila_pedido(pedido))
         except Exception as e:
             messagebox.showerror("Error", f"Error al cargar pedidos: {e}")
         finally:
             db.close()
 
+    @staticmethod
+    def _fila_pedido(pedido):
+        items_text = f"{pedido.cantidad_items} items"
+        return (
+            pedido.id, 
+            pedido.cliente_nombre, 
+            pedido.fecha.strftime("%Y-%m-%d %H:%M"), 
+            pedido.estado,
+            f"${pedido.total}",
+            items_text
+        )
+
     def crear_pedido(self):
         cliente_id = self.entry_cliente_id.get().strip()
         items_str = self.entry_items.get().strip()
@@ -425,7 +790,6 @@ class App(ctk.CTk):
                 items = json.loads(items_str)
                 PedidoCRUD.crear_pedido(db, int(cliente_id), items)
                 messagebox.showinfo("Éxito", "Pedido creado.")
-                self.cargar_pedidos()
                 self.entry_cliente_id.delete(0, 'end')
                 self.entry_items.delete(0, 'end')
             except json.JSONDecodeError:
@@ -437,7 +801,70 @@ class App(ctk.CTk):
         else:
             messagebox.showwarning("Campos Vacíos", "Complete los campos.")
 
-    def eliminar_pedido(self):
+    def buscar_cliente_pedido(self):
+        texto = self.entry_buscar_cliente_pedido.get().strip()
+        self.treeview_busqueda_pedido.delete(*self.treeview_busqueda_pedido.get_children())
+        if not texto:
+            return
+        db = next(get_session())
+        try:
+            for cliente in BusquedaTexto.buscar_clientes(db, texto, LIMITE_BUSQUEDA):
+                self.treeview_busqueda_pedido.insert("", "end", values=("Cliente", cliente.id, cliente.nombre, cliente.rut))
+        except Exception as e:
+            messagebox.showerror("Error", str(e))
+        finally:
+            db.close()
+
+    def buscar_menu_pedido(self):
+        texto = self.entry_buscar_menu_pedido.get().strip()
+        self.treeview_busqueda_pedido.delete(*self.treeview_busqueda_pedido.get_children())
+        if not texto:
+            return
+        db = next(get_session())
+        try:
+            for menu in BusquedaTexto.buscar_menus(db, texto, LIMITE_BUSQUEDA, solo_disponibles=True):
+                self.treeview_busqueda_pedido.insert("", "end", values=("Menú", menu.id, menu.nombre, f"${menu.precio}"))
+        except Exception as e:
+            messagebox.showerror("Error", str(e))
+        finally:
+            db.close()
+
+    def seleccionar_resultado_pedido(self, event=None):
+        selected = self.treeview_busqueda_pedido.selection()
+        if not selected:
+            return
+        tipo, id_resultado = self.treeview_busqueda_pedido.item(selected[0])["values"][:2]
+        if tipo == "Cliente":
+            self.entry_cliente_id.delete(0, 'end')
+            self.entry_cliente_id.insert(0, str(id_resultado))
+            return
+        # Menú: se agrega a los items del pedido (o suma uno si ya estaba)
+        try:
+            items = json.loads(self.entry_items.get().strip() or "[]")
+        except json.JSONDecodeError:
+            messagebox.showerror("Error", "Formato de items inválido.")
+            return
+        for item in items:
+            if item.get("menu_id") == id_resultado:
+                item["cantidad"] = item.get("cantidad", 1) + 1
+                break
+        else:
+            items.append({"menu_id": id_resultado, "cantidad": 1})
+        self.entry_items.delete(0, 'end')
+        self.entry_items.insert(0, json.dumps(items))
+
+    def programar_busqueda(self, clave, funcion):
+        """Ejecuta la búsqueda RETARDO_BUSQUEDA ms después de la última tecla (debounce)"""
+        pendiente = self._busquedas_pendientes.pop(clave, None)
+        if pendiente is not None:
+            self.after_cancel(pendiente)
+        self._busquedas_pendientes[clave] = self.after(RETARDO_BUSQUEDA, lambda: self._ejecutar_busqueda(clave, funcion))
+
+    def _ejecutar_busqueda(self, clave, funcion):
+        self._busquedas_pendientes.pop(clave, None)
+        funcion()
+
+    def cambiar_estado_pedido(self):
         selected = self.treeview_pedidos.selection()
         if not selected:
             messagebox.showwarning("Selección", "Seleccione un pedido.")
@@ -445,9 +872,27 @@ class App(ctk.CTk):
         pedido_id = self.treeview_pedidos.item(selected)["values"][0]
         db = next(get_session())
         try:
-            PedidoCRUD.eliminar_pedido(db, pedido_id)
-            messagebox.showinfo("Éxito", "Pedido eliminado.")
-            self.cargar_pedidos()
+            PedidoCRUD.cambiar_estado(db, pedido_id, self.combo_estado_pedido.get())
+        except Exception as e:
+            messagebox.showerror("Error", str(e))
+        finally:
+            db.close()
+
+    def eliminar_pedido(self):
+        selected = self.treeview_pedidos.selection()
+        if not selected:
+            messagebox.showwarning("Selección", "Seleccione un pedido.")
+            return
+        ids = [self.treeview_pedidos.item(fila)["values"][0] for fila in selected]
+        db = next(get_session())
+        try:
+            if len(ids) == 1:
+                PedidoCRUD.eliminar_pedido(db, ids[0])
+                messagebox.showinfo("Éxito", "Pedido eliminado.")
+            else:
+                # Varias filas seleccionadas: una sola eliminación masiva
+                eliminados = PedidoCRUD.eliminar_pedidos(db, ids)
+                messagebox.showinfo("Éxito", f"{eliminados} pedidos eliminados.")
         except Exception as e:
             messagebox.showerror("Error", str(e))
         finally:
@@ -482,7 +927,6 @@ class App(ctk.CTk):
                     mensaje += f"... y {len(resultados['mensajes']) - 10} más"
             
             messagebox.showinfo("Carga CSV", mensaje)
-            self.cargar_ingredientes()
             
         except Exception as e:
             messagebox.showerror("Error", str(e))
@@ -500,7 +944,7 @@ class App(ctk.CTk):
         
         self.combo_graficos = ctk.CTkComboBox(
             frame_controles,
-            values=["Ventas por Fecha", "Menús Más Vendidos", "Uso de Ingredientes"],
+            values=GraficosEstadisticos.TIPOS_GRAFICO,
             width=200
         )
         self.combo_graficos.set("Ventas por Fecha")
@@ -510,7 +954,7 @@ class App(ctk.CTk):
         ctk.CTkLabel(frame_controles, text="Periodo:").grid(row=0, column=2, pady=10, padx=10)
         self.combo_periodo = ctk.CTkComboBox(
             frame_controles,
-            values=["diario", "semanal", "mensual", "anual"],
+            values=GraficosEstadisticos.PERIODOS,
             width=120
         )
         self.combo_periodo.set("diario")
@@ -522,6 +966,34 @@ class App(ctk.CTk):
             command=self.generar_grafico
         ).grid(row=0, column=4, pady=10, padx=10)
         
+        # Filtros (sólo para el mapa de calor)
+        ctk.CTkLabel(frame_controles, text="Desde (AAAA-MM-DD):").grid(row=1, column=0, pady=5, padx=10)
+        self.entry_grafico_desde = ctk.CTkEntry(frame_controles, width=120)
+        self.entry_grafico_desde.grid(row=1, column=1, pady=5, padx=10)
+        ctk.CTkLabel(frame_controles, text="Hasta:").grid(row=1, column=2, pady=5, padx=10)
+        self.entry_grafico_hasta = ctk.CTkEntry(frame_controles, width=120)
+        self.entry_grafico_hasta.grid(row=1, column=3, pady=5, padx=10)
+        ctk.CTkLabel(frame_controles, text="Categoría:").grid(row=2, column=0, pady=5, padx=10)
+        self.entry_grafico_categoria = ctk.CTkEntry(frame_controles, width=120)
+        self.entry_grafico_categoria.grid(row=2, column=1, pady=5, padx=10)
+        self.label_fecha_datos = ctk.CTkLabel(frame_controles, text="")
+        self.label_fecha_datos.grid(row=2, column=2, columnspan=2, pady=5, padx=10)
+        
+        # Alcance: esta sucursal o la cadena completa (sucursales registradas)
+        self.combo_alcance = ctk.CTkComboBox(
+            frame_controles,
+            values=["Esta sucursal", "Cadena"],
+            width=140,
+            command=self.cambiar_alcance_graficos
+        )
+        self.combo_alcance.set("Esta sucursal")
+        self.combo_alcance.grid(row=1, column=4, pady=5, padx=10)
+        ctk.CTkButton(
+            frame_controles,
+            text="Agregar Sucursal",
+            command=self.agregar_sucursal
+        ).grid(row=2, column=4, pady=5, padx=10)
+        
         # Frame para el gráfico
         self.frame_grafico = ctk.CTkFrame(parent)
         self.frame_grafico.pack(pady=10, padx=10, fill="both", expand=True)
@@ -534,53 +1006,299 @@ class App(ctk.CTk):
         )
         self.label_info_grafico.pack(pady=50)
     
+    def cambiar_alcance_graficos(self, alcance):
+        """Con la cadena sólo se ofrecen los gráficos que se pueden combinar entre sucursales"""
+        tipos = list(TIPOS_FEDERADOS) if alcance == "Cadena" else GraficosEstadisticos.TIPOS_GRAFICO
+        self.combo_graficos.configure(values=tipos)
+        if self.combo_graficos.get() not in tipos:
+            self.combo_graficos.set(tipos[0])
+    
+    def agregar_sucursal(self):
+        """Registra la base de datos de otra sucursal para los gráficos de la cadena"""
+        ruta = filedialog.askopenfilename(
+            title="Base de datos de la sucursal",
+            filetypes=[("Base de datos SQLite", "*.db"), ("Todos los archivos", "*.*")]
+        )
+        if not ruta:
+            return
+        nombre = ctk.CTkInputDialog(text="Nombre de la sucursal:", title="Agregar Sucursal").get_input()
+        if nombre is None:
+            return
+        try:
+            self.federacion.agregar(nombre, ruta)
+            nombres = ", ".join(s["nombre"] for s in self.federacion.sucursales)
+            messagebox.showinfo("Éxito", f"Sucursal agregada. Sucursales: {nombres}")
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+    
     def generar_grafico(self):
-        """Genera el gráfico seleccionado"""
+        """Genera el gráfico seleccionado, reutilizando la imagen en caché si los datos no cambiaron"""
         # Limpiar frame de gráfico
         for widget in self.frame_grafico.winfo_children():
             widget.destroy()
         
         tipo_grafico = self.combo_graficos.get()
-        db = next(get_session())
+        periodo = self.combo_periodo.get() if GraficosEstadisticos.usa_periodo(tipo_grafico) else None
+        if self.combo_alcance.get() == "Cadena":
+            self.generar_grafico_cadena(tipo_grafico, periodo)
+            return
+        filtros = None
+        if GraficosEstadisticos.usa_filtros(tipo_grafico):
+            try:
+                desde = self.entry_grafico_desde.get().strip()
+                hasta = self.entry_grafico_hasta.get().strip()
+                filtros = {
+                    "fecha_inicio": datetime.strptime(desde, "%Y-%m-%d").date() if desde else None,
+                    "fecha_fin": datetime.strptime(hasta, "%Y-%m-%d").date() if hasta else None,
+                    "categoria": self.entry_grafico_categoria.get().strip() or None,
+                }
+            except ValueError:
+                messagebox.showerror("Error", "Formato de fecha inválido. Use AAAA-MM-DD")
+                return
+        # Las estadísticas leen la fuente de reportes: no compiten con la toma de pedidos
+        db = next(get_session_reportes())
         
         try:
-            fig = None
-            error = None
-            
-            if tipo_grafico == "Ventas por Fecha":
-                periodo = self.combo_periodo.get()
-                fig, error = GraficosEstadisticos.graficar_ventas_por_fecha(db, periodo)
-            elif tipo_grafico == "Menús Más Vendidos":
-                fig, error = GraficosEstadisticos.graficar_distribucion_menus(db)
-            elif tipo_grafico == "Uso de Ingredientes":
-                fig, error = GraficosEstadisticos.graficar_uso_ingredientes(db)
-            
-            if error:
-                # Mostrar mensaje de error
-                label_error = ctk.CTkLabel(
-                    self.frame_grafico,
-                    text=error,
-                    font=("Arial", 12),
-                    text_color="red"
-                )
-                label_error.pack(pady=50)
-            elif fig:
-                # Mostrar gráfico
-                canvas = FigureCanvasTkAgg(fig, master=self.frame_grafico)
-                canvas.draw()
-                canvas.get_tk_widget().pack(fill="both", expand=True)
-            else:
-                label_error = ctk.CTkLabel(
-                    self.frame_grafico,
-                    text="No se pudo generar el gráfico",
-                    font=("Arial", 12)
+            clave = CacheGraficos.crear_clave(tipo_grafico, periodo, "png", VersionCRUD.obtener(db), filtros)
+            datos, error = self.cache_graficos.obtener_o_generar(
+                clave,
+                lambda: GraficosEstadisticos.renderizar_grafico(db, tipo_grafico, periodo or "diario", "png", filtros)
+            )
+            if fuente_reportes.fecha_datos is not None:
+                self.label_fecha_datos.configure(
+                    text=f"Datos al {fuente_reportes.fecha_datos.strftime('%H:%M:%S')}"
                 )
-                label_error.pack(pady=50)
-                
+            
+            self._mostrar_grafico(datos, error)
         except Exception as e:
             messagebox.showerror("Error", f"Error al generar gráfico: {str(e)}")
         finally:
             db.close()
+    
+    def generar_grafico_cadena(self, tipo_grafico, periodo):
+        """Gráfico combinado de todas las sucursales registradas (consultadas en paralelo)"""
+        if not self.federacion.sucursales:
+            messagebox.showerror("Error", "No hay sucursales registradas. Use 'Agregar Sucursal'")
+            return
+        try:
+            clave = CacheGraficos.crear_clave("Cadena: " + tipo_grafico, periodo, "png", self.federacion.version())
+            datos, error = self.cache_graficos.obtener_o_generar(
+                clave, lambda: self.federacion.renderizar_grafico(tipo_grafico, periodo or "diario", "png")
+            )
+            self.label_fecha_datos.configure(text=f"{len(self.federacion.sucursales)} sucursales")
+            self._mostrar_grafico(datos, error)
+        except Exception as e:
+            messagebox.showerror("Error", f"Error al generar gráfico: {str(e)}")
+    
+    def _mostrar_grafico(self, datos, error):
+        if error:
+            # Mostrar mensaje de error
+            label_error = ctk.CTkLabel(
+                self.frame_grafico,
+                text=error,
+                font=("Arial", 12),
+                text_color="red"
+            )
+            label_error.pack(pady=50)
+        elif datos:
+            # Mostrar la imagen del gráfico
+            imagen = Image.open(io.BytesIO(datos))
+            self.imagen_grafico = ctk.CTkImage(light_image=imagen, dark_image=imagen, size=imagen.size)
+            ctk.CTkLabel(self.frame_grafico, image=self.imagen_grafico, text="").pack(fill="both", expand=True)
+        else:
+            label_error = ctk.CTkLabel(
+                self.frame_grafico,
+                text="No se pudo generar el gráfico",
+                font=("Arial", 12)
+            )
+            label_error.pack(pady=50)
+
+    # Refresco por eventos de cambio
+    def _vistas(self):
+        """Entidad -> (Treeview, obtener por IDs, formato de fila, recarga completa, buscador activo)"""
+        return {
+            "clientes": (self.treeview_clientes, ClienteCRUD.listar_clientes, self._fila_cliente,
+                         self.buscar_clientes, self.entry_buscar_cliente),
+            "ingredientes": (self.treeview_ingredientes, IngredienteCRUD.listar_ingredientes,
+                             self._fila_ingrediente, self.cargar_ingredientes, None),
+            "menus": (self.treeview_menus, MenuCRUD.listar_menus, self._fila_menu,
+                      self.buscar_menus, self.entry_buscar_menu),
+            "pedidos": (self.treeview_pedidos, PedidoCRUD.listar_pedidos, self._fila_pedido,
+                        self.cargar_pedidos, None),
+        }
+
+    def al_cambiar_datos(self, evento):
+        """
+        Suscriptor del bus de eventos: acumula los cambios y los muestra una
+        sola vez cuando la interfaz queda libre (varias escrituras seguidas
+        producen un único refresco por Treeview).
+        """
+        cambio = self._cambios_pendientes.setdefault(evento.entidad, {"todo": False, "eliminar": set(), "actualizar": set()})
+        if evento.ids is None:
+            cambio["todo"] = True
+        elif evento.operacion == "eliminar":
+            cambio["eliminar"].update(evento.ids)
+        else:
+            cambio["actualizar"].update(evento.ids)
+        if self._refresco_programado is None:
+            self._refresco_programado = self.after_idle(self.aplicar_cambios)
+
+    def aplicar_cambios(self):
+        self._refresco_programado = None
+        cambios, self._cambios_pendientes = self._cambios_pendientes, {}
+        vistas = self._vistas()
+        for entidad, cambio in cambios.items():
+            treeview, obtener, fila, recargar, buscador = vistas[entidad]
+            # Con IDs desconocidos, o con una búsqueda activa (las filas nuevas
+            # podrían no coincidir con ella), se recarga la lista completa
+            if cambio["todo"] or (buscador is not None and buscador.get().strip()):
+                recargar()
+                continue
+            for id_eliminado in cambio["eliminar"]:
+                if treeview.exists(str(id_eliminado)):
+                    treeview.delete(str(id_eliminado))
+            ids = cambio["actualizar"] - cambio["eliminar"]
+            if not ids:
+                continue
+            db = next(get_session())
+            try:
+                for objeto in obtener(db, ids):
+                    if treeview.exists(str(objeto.id)):
+                        treeview.item(str(objeto.id), values=fila(objeto))
+                    else:
+                        treeview.insert("", "end", iid=str(objeto.id), values=fila(objeto))
+            except Exception as e:
+                messagebox.showerror("Error", f"Error al refrescar {entidad}: {e}")
+            finally:
+                db.close()
+
+    # Diagnóstico
+    def crear_formulario_diagnostico(self, parent):
+        """Muestra las sentencias SQL ejecutadas por cada acción y método CRUD"""
+        frame_superior = ctk.CTkFrame(parent)
+        frame_superior.pack(pady=10, padx=10, fill="x")
+
+        ctk.CTkButton(frame_superior, text="Refrescar", command=self.cargar_diagnostico).grid(row=0, column=0, pady=10, padx=5)
+        ctk.CTkButton(frame_superior, text="Reiniciar", command=self.reiniciar_diagnostico).grid(row=0, column=1, pady=10, padx=5)
+        ctk.CTkButton(frame_superior, text="Exportar JSON", command=self.exportar_diagnostico).grid(row=0, column=2, pady=10, padx=5)
+        self.check_estricto = ctk.CTkCheckBox(frame_superior, text="Modo estricto (lazy load = error)", command=self.cambiar_modo_estricto)
+        self.check_estricto.grid(row=0, column=3, pady=10, padx=10)
+        if instrumentacion.estricto:
+            self.check_estricto.select()
+
+        frame_inferior = ctk.CTkFrame(parent)
+        frame_inferior.pack(pady=10, padx=10, fill="both", expand=True)
+
+        columnas = ("Operación", "Llamadas", "Sentencias", "Prom.", "Máx.", "SQL (ms)", "Total (ms)", "N+1")
+        self.treeview_diagnostico = ttk.Treeview(frame_inferior, columns=columnas, show="headings")
+        for columna in columnas:
+            self.treeview_diagnostico.heading(columna, text=columna)
+            self.treeview_diagnostico.column(columna, width=70, anchor="e")
+        self.treeview_diagnostico.column("Operación", width=240, anchor="w")
+        self.treeview_diagnostico.bind("<<TreeviewSelect>>", self.mostrar_n_mas_1)
+        self.treeview_diagnostico.pack(pady=10, padx=10, fill="both", expand=True)
+
+        self.label_n_mas_1 = ctk.CTkLabel(frame_inferior, text="", justify="left", anchor="w", wraplength=800)
+        self.label_n_mas_1.pack(pady=5, padx=10, fill="x")
+
+        self.label_conflictos = ctk.CTkLabel(frame_inferior, text="", justify="left", anchor="w", wraplength=800)
+        self.label_conflictos.pack(pady=5, padx=10, fill="x")
+
+        self.label_fuente_reportes = ctk.CTkLabel(frame_inferior, text="", justify="left", anchor="w", wraplength=800)
+        self.label_fuente_reportes.pack(pady=5, padx=10, fill="x")
+
+    def cargar_diagnostico(self):
+        self.treeview_diagnostico.delete(*self.treeview_diagnostico.get_children())
+        self.diagnostico = {fila["operacion"]: fila for fila in instrumentacion.resumen()}
+        for fila in self.diagnostico.values():
+            self.treeview_diagnostico.insert("", "end", values=(
+                fila["operacion"],
+                fila["llamadas"],
+                fila["sentencias"],
+                f"{fila['promedio_sentencias']:.1f}",
+                fila["max_sentencias"],
+                f"{fila['tiempo_sql'] * 1000:.1f}",
+                f"{fila['tiempo_total'] * 1000:.1f}",
+                fila["llamadas_n_mas_1"] or ""
+            ))
+
+        conflictos = metricas_conflictos.resumen()
+        if conflictos:
+            texto = "Conflictos de concurrencia (versión modificada por otra terminal):\n"
+            for fila in conflictos[:5]:
+                texto += (f"• {fila['operacion']}: {fila['conflictos']} conflictos en {fila['llamadas']} llamadas, "
+                          f"{fila['resueltas']} resueltas al reintentar, {fila['agotadas']} fallidas\n")
+        else:
+            texto = "Sin conflictos de concurrencia."
+        self.label_conflictos.configure(text=texto)
+
+        texto = f"Datos de estadísticas: modo {fuente_reportes.modo}"
+        if fuente_reportes.fecha_datos is not None:
+            texto += f", copia del {fuente_reportes.fecha_datos.strftime('%H:%M:%S')} ({fuente_reportes.refrescos} refrescos)"
+        if fuente_reportes.ultimo_error is not None:
+            fecha, error = fuente_reportes.ultimo_error
+            texto += (f"\nError al refrescar la copia a las {fecha.strftime('%H:%M:%S')} "
+                      f"({fuente_reportes.errores_refresco} en total), se siguen mostrando datos anteriores: {error}")
+        self.label_fuente_reportes.configure(text=texto)
+
+    def mostrar_n_mas_1(self, event=None):
+        selected = self.treeview_diagnostico.selection()
+        if not selected:
+            return
+        fila = self.diagnostico.get(self.treeview_diagnostico.item(selected)["values"][0])
+        if not fila or not fila["n_mas_1"]:
+            self.label_n_mas_1.configure(text="Sin sentencias repetidas.")
+            return
+        texto = "Posibles N+1 (sentencia repetida en una misma llamada):\n"
+        for repetida in fila["n_mas_1"][:5]:
+            texto += f"• {repetida['repeticiones']}x {repetida['sentencia'][:200]}\n"
+        self.label_n_mas_1.configure(text=texto)
+
+    def reiniciar_diagnostico(self):
+        instrumentacion.reiniciar()
+        metricas_conflictos.reiniciar()
+        self.cargar_diagnostico()
+
+    def exportar_diagnostico(self):
+        archivo = filedialog.asksaveasfilename(
+            title="Exportar diagnóstico",
+            defaultextension=".json",
+            filetypes=[("JSON files", "*.json")]
+        )
+        if not archivo:
+            return
+        try:
+            instrumentacion.exportar_json(archivo)
+            messagebox.showinfo("Éxito", f"Diagnóstico exportado a {archivo}")
+        except Exception as e:
+            messagebox.showerror("Error", str(e))
+
+    def cambiar_modo_estricto(self):
+        instrumentacion.estricto = bool(self.check_estricto.get())
+
+    def alternar_perfilado(self, event=None):
+        if perfilador.alternar():
+            messagebox.showinfo("Perfilado", f"Perfilado activado. Los perfiles se guardan en '{perfilador.directorio}'.")
+        else:
+            messagebox.showinfo("Perfilado", "Perfilado desactivado.")
+
+
+# Acciones de la interfaz que se registran en el diagnóstico
+ACCIONES_APP = (
+    "cargar_clientes", "buscar_clientes", "crear_cliente", "actualizar_cliente", "eliminar_cliente",
+    "cargar_ingredientes", "crear_ingrediente", "actualizar_ingrediente", "eliminar_ingrediente",
+    "fijar_umbrales_ingrediente", "actualizar_insignia_alertas", "mostrar_alertas",
+    "cargar_csv_ingredientes", "cargar_menus", "buscar_menus", "crear_menu", "eliminar_menu",
+    "ajustar_precios_menus", "reasignar_categoria_menus", "cambiar_disponibilidad_categoria",
+    "cargar_pedidos", "buscar_cliente_pedido", "buscar_menu_pedido", "crear_pedido",
+    "cambiar_estado_pedido", "eliminar_pedido", "generar_grafico", "generar_grafico_cadena", "aplicar_cambios",
+)
+instrumentacion.instrumentar_clase(App, ACCIONES_APP)
+
+# Perfilado opcional (PROYECTO_PERFIL=1 o Ctrl+Shift+P)
+perfilador.perfilar_clase(App, ACCIONES_APP)
+for clase_crud in (ClienteCRUD, IngredienteCRUD, MenuCRUD, PedidoCRUD, VersionCRUD):
+    perfilador.perfilar_clase(clase_crud)
 
 if __name__ == "__main__":
     app = App()
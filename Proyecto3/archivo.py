@@ -0,0 +1,169 @@
+"""
+Archivo de pedidos antiguos.
+
+Los pedidos completados con más de N días se mueven por lotes desde la base
+principal a un archivo SQLite aparte (adjunto en cada conexión como el
+esquema "archivo", ver database.adjuntar_archivo). Así las tablas Pedidos e
+ItemPedidos de la base principal, que atienden la toma de pedidos, se
+mantienen pequeñas. Los items archivados guardan el precio unitario del menú
+para que los totales no dependan de cambios de precio posteriores, y el
+historial de estados se mueve con el pedido (lo usa
+TiemposPreparacion.reconstruir).
+
+Las estadísticas leen de fuente_ventas(), que une pedidos activos y
+archivados; los contadores por cliente se recalculan sobre ambas bases.
+
+Uso (por ejemplo desde cron):
+    python archivo.py --db proyecto.db --dias 180 --lote 2000 --vacuum
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from sqlalchemy import func, insert, select, union_all
+from sqlalchemy.orm import Session
+
+ESTADO_ARCHIVABLE = "Completado"
+
+
+def fuente_ventas(incluir_archivo: bool = True):
+    """
+    Subconsulta con una fila por item vendido, de pedidos activos y archivados:
+    (pedido_id, fecha, cliente_id, menu_id, cantidad, subtotal).
+    Cada rama usa sus propios índices; SQLite aplica los filtros externos
+    sobre fecha o menú dentro de cada rama de la unión.
+    """
+    from models import Pedido, ItemPedido, Menu, PedidoArchivado, ItemPedidoArchivado
+
+    activos = (
+        select(
+            Pedido.id.label("pedido_id"), Pedido.fecha, Pedido.cliente_id,
+            ItemPedido.menu_id, ItemPedido.cantidad,
+            (ItemPedido.cantidad * Menu.precio).label("subtotal"),
+        )
+        .join(ItemPedido, ItemPedido.pedido_id == Pedido.id)
+        .join(Menu, Menu.id == ItemPedido.menu_id)
+    )
+    if not incluir_archivo:
+        return activos.subquery("ventas")
+    archivados = (
+        select(
+            PedidoArchivado.id, PedidoArchivado.fecha, PedidoArchivado.cliente_id,
+            ItemPedidoArchivado.menu_id, ItemPedidoArchivado.cantidad,
+            ItemPedidoArchivado.cantidad * ItemPedidoArchivado.precio_unitario,
+        )
+        .join(ItemPedidoArchivado, ItemPedidoArchivado.pedido_id == PedidoArchivado.id)
+    )
+    return union_all(activos, archivados).subquery("ventas")
+
+
+def archivar_pedidos(db: Session, dias: int = 180, lote: int = 2000) -> Dict[str, int]:
+    """
+    Mueve al archivo los pedidos completados con fecha anterior a hoy - dias,
+    en transacciones de a `lote` pedidos. Retorna la cantidad de pedidos e
+    items archivados.
+    """
+    from models import (Pedido, ItemPedido, Menu, HistorialEstadoPedido, PedidoArchivado,
+                        ItemPedidoArchivado, HistorialEstadoPedidoArchivado)
+    from crud.cliente_crud import ClienteCRUD
+    from crud.version_crud import VersionCRUD
+    from eventos import registrar_cambio
+
+    # Los IDs archivados no se reutilizan: Pedidos, ItemPedidos y
+    # HistorialEstadosPedido usan AUTOINCREMENT y actualizar_esquema hace que
+    # sus secuencias continúen después del mayor ID archivado
+    corte = datetime.now() - timedelta(days=dias)
+
+    total = {"pedidos": 0, "items": 0}
+    try:
+        while True:
+            ids: List[int] = [i for (i,) in (
+                db.query(Pedido.id)
+                .filter(Pedido.estado == ESTADO_ARCHIVABLE, Pedido.fecha < corte)
+                .order_by(Pedido.id)
+                .limit(lote)
+                .all()
+            )]
+            if not ids:
+                break
+
+            db.execute(insert(PedidoArchivado).from_select(
+                ["id", "fecha", "estado", "cliente_id", "archivado"],
+                select(Pedido.id, Pedido.fecha, Pedido.estado, Pedido.cliente_id, func.datetime("now", "localtime"))
+                .where(Pedido.id.in_(ids))
+            ))
+            items = db.execute(insert(ItemPedidoArchivado).from_select(
+                ["id", "cantidad", "pedido_id", "menu_id", "precio_unitario"],
+                select(ItemPedido.id, ItemPedido.cantidad, ItemPedido.pedido_id, ItemPedido.menu_id, Menu.precio)
+                .join(Menu, Menu.id == ItemPedido.menu_id)
+                .where(ItemPedido.pedido_id.in_(ids))
+            )).rowcount
+            # Antes de borrar el pedido: la base borraría su historial (ON DELETE CASCADE)
+            db.execute(insert(HistorialEstadoPedidoArchivado).from_select(
+                ["id", "estado_anterior", "estado", "fecha", "pedido_id"],
+                select(HistorialEstadoPedido.id, HistorialEstadoPedido.estado_anterior, HistorialEstadoPedido.estado,
+                       HistorialEstadoPedido.fecha, HistorialEstadoPedido.pedido_id)
+                .where(HistorialEstadoPedido.pedido_id.in_(ids))
+            ))
+            db.query(ItemPedido).filter(ItemPedido.pedido_id.in_(ids)).delete(synchronize_session=False)
+            db.query(Pedido).filter(Pedido.id.in_(ids)).delete(synchronize_session=False)
+            registrar_cambio(db, "pedidos", "eliminar", ids)
+
+            # El gasto acumulado queda fijado al precio archivado
+            clientes = [i for (i,) in db.query(PedidoArchivado.cliente_id)
+                        .filter(PedidoArchivado.id.in_(ids)).distinct().all()]
+            ClienteCRUD.recalcular_estadisticas(db, clientes)
+            VersionCRUD.incrementar(db, "pedidos")
+            # Un commit abarca ambos archivos: el lote se mueve completo o no se mueve
+            db.commit()
+
+            total["pedidos"] += len(ids)
+            total["items"] += items
+        return total
+    except Exception as e:
+        db.rollback()
+        raise Exception(f"Error al archivar pedidos: {str(e)}")
+
+
+def compactar(motor) -> None:
+    """VACUUM de la base principal para devolver al sistema el espacio liberado"""
+    with motor.connect().execution_options(isolation_level="AUTOCOMMIT") as conexion:
+        conexion.exec_driver_sql("VACUUM main")
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Mueve los pedidos completados antiguos al archivo")
+    parser.add_argument("--db", default=None, help="Ruta del archivo SQLite (default: PROYECTO_DATABASE_URL o ./proyecto.db)")
+    parser.add_argument("--archivo", default=None, help="Ruta del archivo de pedidos (default: <db>_archivo.db)")
+    parser.add_argument("--dias", type=int, default=180, help="Antigüedad mínima en días (default: 180)")
+    parser.add_argument("--lote", type=int, default=2000, help="Pedidos por transacción (default: 2000)")
+    parser.add_argument("--vacuum", action="store_true", help="Compactar la base principal al terminar")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        os.environ["PROYECTO_DATABASE_URL"] = f"sqlite:///{os.path.abspath(args.db)}"
+    if args.archivo:
+        os.environ["PROYECTO_ARCHIVO"] = os.path.abspath(args.archivo)
+    from database import SessionLocal, engine, actualizar_esquema, ruta_archivo
+    import models  # noqa: F401  (registra los modelos en Base)
+    actualizar_esquema()
+
+    db = SessionLocal()
+    try:
+        inicio = time.perf_counter()
+        total = archivar_pedidos(db, args.dias, args.lote)
+        print(f"{total['pedidos']} pedidos y {total['items']} items archivados en {ruta_archivo()} "
+              f"({time.perf_counter() - inicio:.2f}s)")
+    finally:
+        db.close()
+
+    if args.vacuum:
+        compactar(engine)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
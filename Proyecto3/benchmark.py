@@ -0,0 +1,456 @@
+"""
+Benchmark de las rutas críticas: métodos CRUD, costo por llamada de las
+búsquedas puntuales, carga de CSV, agregaciones de GraficosEstadisticos
+(en SQL y sobre el almacén columnar) y cargadores de los Treeview de la
+aplicación.
+
+Genera (o reutiliza) una base de datos sintética con GeneradorDatos y
+escribe los resultados en JSON para comparar entre versiones.
+
+Uso:
+    python benchmark.py --pedidos 100000 --salida bench.json
+    python benchmark.py --db datos.db --salida nuevo.json --comparar bench.json
+"""
+import argparse
+import csv
+import inspect
+import itertools
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+# Búsquedas por repetición en los casos del grupo Consultas
+LLAMADAS_CONSULTA = 1000
+
+
+def medir(nombre: str, grupo: str, funcion: Callable, repeticiones: int,
+          preparar: Callable = None) -> Dict:
+    """
+    Ejecuta funcion(db, *args) `repeticiones` veces con una sesión nueva cada vez.
+    preparar(db) retorna los argumentos y no se incluye en el tiempo medido.
+    """
+    from database import SessionLocal
+
+    tiempos, error = [], None
+    for _ in range(repeticiones):
+        db = SessionLocal()
+        try:
+            args = preparar(db) if preparar else ()
+            db.expunge_all()  # Sin objetos precargados en el identity map
+            inicio = time.perf_counter()
+            funcion(db, *args)
+            tiempos.append(time.perf_counter() - inicio)
+        except Exception as e:
+            error = str(e)
+            break
+        finally:
+            db.close()
+
+    resultado = {"nombre": nombre, "grupo": grupo, "repeticiones": len(tiempos), "error": error}
+    if tiempos:
+        resultado.update({
+            "min": round(min(tiempos), 6),
+            "mediana": round(statistics.median(tiempos), 6),
+            "media": round(statistics.mean(tiempos), 6),
+            "max": round(max(tiempos), 6),
+        })
+    return resultado
+
+
+class _TreeviewNulo:
+    """Reemplazo mínimo de ttk.Treeview para medir los cargadores sin display"""
+
+    def __init__(self):
+        self.filas = 0
+
+    def get_children(self, *args):
+        return ()
+
+    def delete(self, *args):
+        pass
+
+    def insert(self, *args, **kwargs):
+        self.filas += 1
+
+
+def casos_crud(db) -> List[tuple]:
+    """Arma los casos (grupo, nombre, funcion, preparar) para cada método de los *CRUD"""
+    from models import Cliente, Menu, Pedido, ItemPedido, Ingrediente
+    from crud.cliente_crud import ClienteCRUD
+    from crud.ingrediente_crud import IngredienteCRUD
+    from crud.menu_crud import MenuCRUD
+    from crud.pedido_crud import PedidoCRUD
+    from crud.version_crud import VersionCRUD
+    from alertas import MotorAlertas
+    from metricas import MetricasEnVivo
+
+    contador = itertools.count(1)
+    cliente = db.query(Cliente).order_by(Cliente.id.desc()).first()
+    ingrediente = db.query(Ingrediente).order_by(Ingrediente.id).first()
+    menu = db.query(Menu).filter(Menu.disponible == 1).order_by(Menu.id).first()
+    otro_menu = db.query(Menu).filter(Menu.disponible == 1, Menu.id != menu.id).order_by(Menu.id).first()
+    pedido = db.query(Pedido).order_by(Pedido.id.desc()).first()
+    item = db.query(ItemPedido).filter(ItemPedido.pedido_id == pedido.id).first()
+    cliente_id, cliente_rut, categoria = cliente.id, cliente.rut, menu.categoria
+    ingrediente_id, ingrediente_nombre = ingrediente.id, ingrediente.nombre
+    menu_id, otro_menu_id, pedido_id, item_id = menu.id, otro_menu.id, pedido.id, item.id
+    receta = {ingrediente_nombre: 0.01}
+    metricas = MetricasEnVivo()
+
+    def nuevo_cliente(db):
+        return (ClienteCRUD.crear_cliente(db, f"bench-{next(contador)}", "Cliente Benchmark").id,)
+
+    def nuevo_pedido(db):
+        return (PedidoCRUD.crear_pedido(db, cliente_id, [{"menu_id": menu_id, "cantidad": 1}]).id,)
+
+    def nuevo_item(db):
+        nuevo = PedidoCRUD.crear_pedido(db, cliente_id, [{"menu_id": menu_id, "cantidad": 1}])
+        return (nuevo.items[0].id,)
+
+    return [
+        ("ClienteCRUD", "validar_correo", lambda db: ClienteCRUD.validar_correo("ana.perez@gmail.com"), None),
+        ("ClienteCRUD", "crear_cliente",
+         lambda db: ClienteCRUD.crear_cliente(db, f"bench-c-{next(contador)}", "Cliente Benchmark",
+                                              f"bench{next(contador)}@empresa.cl"), None),
+        ("ClienteCRUD", "obtener_cliente_por_id", lambda db: ClienteCRUD.obtener_cliente_por_id(db, cliente_id), None),
+        ("ClienteCRUD", "obtener_cliente_por_rut", lambda db: ClienteCRUD.obtener_cliente_por_rut(db, cliente_rut), None),
+        ("ClienteCRUD", "obtener_todos_clientes", ClienteCRUD.obtener_todos_clientes, None),
+        ("ClienteCRUD", "listar_clientes", ClienteCRUD.listar_clientes, None),
+        # Refresco de 50 filas tras un evento de cambio
+        ("ClienteCRUD", "obtener_clientes_por_ids",
+         lambda db: ClienteCRUD.obtener_clientes_por_ids(db, range(cliente_id - 49, cliente_id + 1)), None),
+        ("ClienteCRUD", "actualizar_cliente",
+         lambda db: ClienteCRUD.actualizar_cliente(db, cliente_id, nombre=f"Cliente {next(contador)}"), None),
+        ("ClienteCRUD", "eliminar_cliente", ClienteCRUD.eliminar_cliente, nuevo_cliente),
+        ("ClienteCRUD", "eliminar_clientes", lambda db, *ids: ClienteCRUD.eliminar_clientes(db, ids),
+         lambda db: nuevo_cliente(db) + nuevo_cliente(db)),
+        ("ClienteCRUD", "recalcular_estadisticas",
+         lambda db: (ClienteCRUD.recalcular_estadisticas(db, [cliente_id]), db.commit()), None),
+
+        ("IngredienteCRUD", "crear_ingrediente",
+         lambda db: IngredienteCRUD.crear_ingrediente(db, f"Bench {next(contador)}", 100.0, "kg"), None),
+        ("IngredienteCRUD", "obtener_ingrediente_por_id",
+         lambda db: IngredienteCRUD.obtener_ingrediente_por_id(db, ingrediente_id), None),
+        ("IngredienteCRUD", "obtener_ingrediente_por_nombre",
+         lambda db: IngredienteCRUD.obtener_ingrediente_por_nombre(db, ingrediente_nombre), None),
+        ("IngredienteCRUD", "obtener_todos_ingredientes", IngredienteCRUD.obtener_todos_ingredientes, None),
+        ("IngredienteCRUD", "listar_ingredientes", IngredienteCRUD.listar_ingredientes, None),
+        ("IngredienteCRUD", "obtener_ingredientes_por_ids",
+         lambda db: IngredienteCRUD.obtener_ingredientes_por_ids(db, range(ingrediente_id, ingrediente_id + 50)), None),
+        ("IngredienteCRUD", "actualizar_ingrediente",
+         lambda db: IngredienteCRUD.actualizar_ingrediente(db, ingrediente_id, unidad="kg"), None),
+        ("IngredienteCRUD", "actualizar_stock", lambda db: IngredienteCRUD.actualizar_stock(db, ingrediente_id, 1.0), None),
+        ("IngredienteCRUD", "eliminar_ingrediente", IngredienteCRUD.eliminar_ingrediente,
+         lambda db: (IngredienteCRUD.crear_ingrediente(db, f"Bench {next(contador)}", 1.0, "kg").id,)),
+        ("IngredienteCRUD", "verificar_stock_disponible",
+         lambda db: IngredienteCRUD.verificar_stock_disponible(db, ingrediente_id, 1.0), None),
+        ("IngredienteCRUD", "validar_umbrales", lambda db: IngredienteCRUD.validar_umbrales(10.0, 2.0), None),
+        ("IngredienteCRUD", "fijar_umbrales",
+         lambda db: IngredienteCRUD.fijar_umbrales(db, ingrediente_id, None, None), None),
+        # Evaluación de alertas tras un cambio de stock de 50 ingredientes
+        ("MotorAlertas", "evaluar",
+         lambda db: (MotorAlertas.evaluar(db, range(ingrediente_id, ingrediente_id + 50)), db.commit()), None),
+        # Reconstrucción al iniciar (una consulta) y lectura del panel en vivo (sin consultas)
+        ("MetricasEnVivo", "rehidratar", metricas.rehidratar, None),
+        ("MetricasEnVivo", "instantanea", lambda db: metricas.instantanea(), None),
+
+        ("MenuCRUD", "crear_menu",
+         lambda db: MenuCRUD.crear_menu(db, f"Menú {next(contador)}", "Benchmark", 5000.0, categoria, True, receta), None),
+        ("MenuCRUD", "obtener_menu_por_id", lambda db: MenuCRUD.obtener_menu_por_id(db, menu_id), None),
+        ("MenuCRUD", "obtener_todos_menus", MenuCRUD.obtener_todos_menus, None),
+        ("MenuCRUD", "listar_menus", MenuCRUD.listar_menus, None),
+        ("MenuCRUD", "obtener_menus_por_ids", lambda db: MenuCRUD.obtener_menus_por_ids(db, range(menu_id, menu_id + 50)), None),
+        ("MenuCRUD", "obtener_menus_disponibles", MenuCRUD.obtener_menus_disponibles, None),
+        ("MenuCRUD", "obtener_menus_por_categoria", lambda db: MenuCRUD.obtener_menus_por_categoria(db, categoria), None),
+        ("MenuCRUD", "actualizar_menu", lambda db: MenuCRUD.actualizar_menu(db, otro_menu_id, descripcion="Benchmark"), None),
+        ("MenuCRUD", "cambiar_disponibilidad", lambda db: MenuCRUD.cambiar_disponibilidad(db, otro_menu_id, True), None),
+        ("MenuCRUD", "cambiar_disponibilidad_categoria",
+         lambda db: MenuCRUD.cambiar_disponibilidad_categoria(db, categoria, True), None),
+        ("MenuCRUD", "ajustar_precios", lambda db: MenuCRUD.ajustar_precios(db, porcentaje=0, categoria=categoria), None),
+        ("MenuCRUD", "reasignar_categoria", lambda db: MenuCRUD.reasignar_categoria(db, categoria, categoria), None),
+        ("MenuCRUD", "eliminar_menu", MenuCRUD.eliminar_menu,
+         lambda db: (MenuCRUD.crear_menu(db, f"Menú {next(contador)}", None, 1000.0).id,)),
+        ("MenuCRUD", "eliminar_menus", lambda db, *ids: MenuCRUD.eliminar_menus(db, ids),
+         lambda db: tuple(MenuCRUD.crear_menu(db, f"Menú {next(contador)}", None, 1000.0).id for _ in range(2))),
+
+        ("PedidoCRUD", "crear_pedido",
+         lambda db: PedidoCRUD.crear_pedido(db, cliente_id, [{"menu_id": menu_id, "cantidad": 2},
+                                                             {"menu_id": otro_menu_id, "cantidad": 1}]), None),
+        ("PedidoCRUD", "obtener_pedido_por_id", lambda db: PedidoCRUD.obtener_pedido_por_id(db, pedido_id), None),
+        ("PedidoCRUD", "obtener_todos_pedidos", PedidoCRUD.obtener_todos_pedidos, None),
+        ("PedidoCRUD", "listar_pedidos", PedidoCRUD.listar_pedidos, None),
+        ("PedidoCRUD", "obtener_pedidos_por_ids",
+         lambda db: PedidoCRUD.obtener_pedidos_por_ids(db, range(pedido_id - 49, pedido_id + 1)), None),
+        ("PedidoCRUD", "obtener_pedidos_por_cliente", lambda db: PedidoCRUD.obtener_pedidos_por_cliente(db, cliente_id), None),
+        ("PedidoCRUD", "agregar_item", lambda db: PedidoCRUD.agregar_item(db, pedido_id, menu_id, 1), None),
+        ("PedidoCRUD", "actualizar_cantidad_item", lambda db: PedidoCRUD.actualizar_cantidad_item(db, item_id, 2), None),
+        ("PedidoCRUD", "eliminar_item", PedidoCRUD.eliminar_item, nuevo_item),
+        # Las mismas tres modificaciones de arriba en una sola transacción
+        ("PedidoCRUD", "editar_pedido",
+         lambda db, nuevo_id: PedidoCRUD.editar_pedido(db, nuevo_id, [
+             {"accion": "agregar", "menu_id": otro_menu_id, "cantidad": 1},
+             {"accion": "cambiar", "menu_id": menu_id, "cantidad": 2},
+             {"accion": "quitar", "menu_id": otro_menu_id},
+         ]), nuevo_pedido),
+        ("PedidoCRUD", "eliminar_pedido", PedidoCRUD.eliminar_pedido, nuevo_pedido),
+        ("PedidoCRUD", "eliminar_pedidos", lambda db, *ids: PedidoCRUD.eliminar_pedidos(db, ids),
+         lambda db: nuevo_pedido(db) + nuevo_pedido(db)),
+        ("PedidoCRUD", "cambiar_estado", lambda db: PedidoCRUD.cambiar_estado(db, pedido_id, "Completado"), None),
+        ("PedidoCRUD", "calcular_total", lambda db: PedidoCRUD.calcular_total(db, pedido_id), None),
+
+        ("VersionCRUD", "incrementar", lambda db: (VersionCRUD.incrementar(db, "benchmark"), db.commit()), None),
+        ("VersionCRUD", "obtener", VersionCRUD.obtener, None),
+    ]
+
+
+def casos_consultas(db, llamadas: int = LLAMADAS_CONSULTA) -> List[tuple]:
+    """
+    Costo por llamada de las búsquedas puntuales: la forma anterior con
+    db.query(...).filter(...).first() contra la del CRUD (sentencia armada
+    una vez con bindparam, o db.get). Cada repetición hace `llamadas` búsquedas de claves
+    distintas en la misma sesión; con 1000 llamadas la mediana en ms es el
+    costo por llamada en µs.
+    """
+    from sqlalchemy import select
+    from models import Cliente, Menu, Ingrediente
+    from crud.cliente_crud import ClienteCRUD
+    from crud.ingrediente_crud import IngredienteCRUD
+
+    clientes = db.execute(select(Cliente.id, Cliente.rut).order_by(Cliente.id).limit(llamadas)).all()
+    cliente_ids, ruts = [c.id for c in clientes], [c.rut for c in clientes]
+    nombres = db.scalars(select(Ingrediente.nombre).order_by(Ingrediente.id)).all()
+    nombres = list(itertools.islice(itertools.cycle(nombres), llamadas))
+    # Los items de un pedido repiten pocos menús, como en crear_pedido
+    menu_ids = db.scalars(select(Menu.id).order_by(Menu.id).limit(5)).all()
+    menu_ids = list(itertools.islice(itertools.cycle(menu_ids), llamadas))
+
+    def cada(funcion, claves):
+        return lambda db: [funcion(db, clave) for clave in claves]
+
+    return [
+        ("Consultas", "cliente_por_rut_query",
+         cada(lambda db, rut: db.query(Cliente).filter(Cliente.rut == rut).first(), ruts), None),
+        ("Consultas", "cliente_por_rut_sentencia", cada(ClienteCRUD.obtener_cliente_por_rut, ruts), None),
+        ("Consultas", "ingrediente_por_nombre_query",
+         cada(lambda db, nombre: db.query(Ingrediente).filter(Ingrediente.nombre == nombre).first(), nombres), None),
+        ("Consultas", "ingrediente_por_nombre_sentencia", cada(IngredienteCRUD.obtener_ingrediente_por_nombre, nombres), None),
+        ("Consultas", "cliente_por_id_query",
+         cada(lambda db, i: db.query(Cliente).filter(Cliente.id == i).first(), cliente_ids), None),
+        ("Consultas", "cliente_por_id_get", cada(ClienteCRUD.obtener_cliente_por_id, cliente_ids), None),
+        ("Consultas", "menu_pedido_query",
+         cada(lambda db, i: db.query(Menu).filter(Menu.id == i).first(), menu_ids), None),
+        ("Consultas", "menu_pedido_get", cada(lambda db, i: db.get(Menu, i), menu_ids), None),
+    ]
+
+
+def metodos_sin_medir(casos: List[tuple]) -> List[str]:
+    """Lista los métodos públicos de los *CRUD que no tienen un caso de benchmark"""
+    from crud.cliente_crud import ClienteCRUD
+    from crud.ingrediente_crud import IngredienteCRUD
+    from crud.menu_crud import MenuCRUD
+    from crud.pedido_crud import PedidoCRUD
+    from crud.version_crud import VersionCRUD
+
+    medidos = {(grupo, nombre) for grupo, nombre, _, _ in casos}
+    medidos.add(("IngredienteCRUD", "cargar_desde_csv"))  # Se mide en el grupo CSV
+    faltantes = []
+    for clase in (ClienteCRUD, IngredienteCRUD, MenuCRUD, PedidoCRUD, VersionCRUD):
+        for nombre, _ in inspect.getmembers(clase, inspect.isfunction):
+            if not nombre.startswith("_") and (clase.__name__, nombre) not in medidos:
+                faltantes.append(f"{clase.__name__}.{nombre}")
+    return faltantes
+
+
+def casos_csv(directorio: str, filas: int) -> List[tuple]:
+    from crud.ingrediente_crud import IngredienteCRUD
+
+    ruta = os.path.join(directorio, "ingredientes_benchmark.csv")
+    with open(ruta, "w", newline="", encoding="utf-8") as archivo:
+        escritor = csv.writer(archivo)
+        escritor.writerow(["nombre", "stock", "unidad"])
+        for i in range(filas):
+            escritor.writerow([f"CSV Ingrediente {i}", 100.0 + i, "kg"])
+    return [("CSV", f"cargar_desde_csv_{filas}", lambda db: IngredienteCRUD.cargar_desde_csv(db, ruta), None)]
+
+
+def casos_graficos() -> List[tuple]:
+    from graficos import GraficosEstadisticos
+    from analisis_clientes import AnalisisClientes
+    from busqueda import BusquedaTexto
+    from tiempos_preparacion import TiemposPreparacion
+
+    casos = []
+    for periodo in GraficosEstadisticos.PERIODOS:
+        casos.append(("GraficosEstadisticos", f"obtener_ventas_por_fecha_{periodo}",
+                      lambda db, p=periodo: GraficosEstadisticos.obtener_ventas_por_fecha(db, p), None))
+    casos.append(("GraficosEstadisticos", "obtener_distribucion_menus", GraficosEstadisticos.obtener_distribucion_menus, None))
+    casos.append(("GraficosEstadisticos", "obtener_uso_ingredientes", GraficosEstadisticos.obtener_uso_ingredientes, None))
+    casos.append(("GraficosEstadisticos", "obtener_mapa_calor_horario", GraficosEstadisticos.obtener_mapa_calor_horario, None))
+    # Percentiles fusionando los resúmenes guardados, contra rehacerlos desde el historial
+    casos.append(("TiemposPreparacion", "por_menu", TiemposPreparacion.por_menu, None))
+    casos.append(("TiemposPreparacion", "por_hora", TiemposPreparacion.por_hora, None))
+    casos.append(("TiemposPreparacion", "reconstruir",
+                  lambda db: (TiemposPreparacion.reconstruir(db), db.rollback()), None))
+    casos.append(("AnalisisClientes", "calcular_rfm", AnalisisClientes.calcular_rfm, None))
+    casos.append(("AnalisisClientes", "obtener_top_clientes", AnalisisClientes.obtener_top_clientes, None))
+    casos.append(("BusquedaTexto", "buscar_clientes", lambda db: BusquedaTexto.buscar_clientes(db, "mar go"), None))
+    casos.append(("BusquedaTexto", "buscar_menus", lambda db: BusquedaTexto.buscar_menus(db, "piz"), None))
+    return casos
+
+
+def casos_columnar(directorio: str) -> List[tuple]:
+    """Las mismas agregaciones sobre el almacén columnar (materializado antes de medir)"""
+    from columnar import AlmacenColumnar, AnalisisColumnar
+    from database import SessionLocal
+
+    analisis = AnalisisColumnar(AlmacenColumnar(os.path.join(directorio, "columnar")))
+    db = SessionLocal()
+    try:
+        analisis.almacen.actualizar(db)
+    finally:
+        db.close()
+
+    casos = []
+    for periodo in ("diario", "semanal", "mensual", "anual"):
+        casos.append(("AnalisisColumnar", f"obtener_ventas_por_fecha_{periodo}",
+                      lambda db, p=periodo: analisis.obtener_ventas_por_fecha(db, p), None))
+    for nombre in ("obtener_distribucion_menus", "obtener_uso_ingredientes", "obtener_mapa_calor_horario"):
+        casos.append(("AnalisisColumnar", nombre, getattr(analisis, nombre), None))
+    return casos
+
+
+def casos_interfaz() -> List[tuple]:
+    """Cargadores de los Treeview de App, con un Treeview nulo en lugar del widget"""
+    from types import MethodType, SimpleNamespace
+    try:
+        from app import App
+    except Exception as e:
+        print(f"Cargadores de la interfaz omitidos: {e}")
+        return []
+
+    falso = SimpleNamespace(
+        treeview_clientes=_TreeviewNulo(), treeview_ingredientes=_TreeviewNulo(),
+        treeview_menus=_TreeviewNulo(), treeview_pedidos=_TreeviewNulo(),
+        _segmentos_clientes={},
+    )
+    falso._fila_cliente = MethodType(App._fila_cliente, falso)
+    falso._fila_ingrediente, falso._fila_menu, falso._fila_pedido = App._fila_ingrediente, App._fila_menu, App._fila_pedido
+    falso.mostrar_clientes = MethodType(App.mostrar_clientes, falso)
+    falso.mostrar_menus = MethodType(App.mostrar_menus, falso)
+    return [
+        ("App", nombre, lambda db, n=nombre: getattr(App, n)(falso), None)
+        for nombre in ("cargar_clientes", "cargar_ingredientes", "cargar_menus", "cargar_pedidos")
+    ]
+
+
+def version_codigo() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def comparar(actual: Dict, anterior: Dict, umbral: float) -> int:
+    """Imprime la razón actual/anterior de la mediana. Retorna la cantidad de regresiones"""
+    previos = {r["nombre"]: r for r in anterior["resultados"] if "mediana" in r}
+    regresiones = 0
+    print(f"\n{'caso':<45} {'anterior':>10} {'actual':>10} {'razón':>7}")
+    for r in actual["resultados"]:
+        previo = previos.get(r["nombre"])
+        if not previo or "mediana" not in r or not previo["mediana"]:
+            continue
+        razon = r["mediana"] / previo["mediana"]
+        marca = "  REGRESIÓN" if razon > umbral else ""
+        regresiones += bool(marca)
+        print(f"{r['nombre']:<45} {previo['mediana']:>10.6f} {r['mediana']:>10.6f} {razon:>7.2f}{marca}")
+    return regresiones
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark de CRUD, CSV, estadísticas e interfaz")
+    parser.add_argument("--db", default=None, help="Base existente; si no se indica se genera una temporal")
+    parser.add_argument("--pedidos", type=int, default=10000, help="Escala de la base generada")
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--filas-csv", type=int, default=1000)
+    parser.add_argument("--filtro", default=None, help="Expresión regular sobre el nombre de los casos")
+    parser.add_argument("--salida", default="benchmark.json")
+    parser.add_argument("--comparar", default=None, help="JSON de una ejecución anterior")
+    parser.add_argument("--umbral", type=float, default=1.2, help="Razón sobre la que se marca una regresión")
+    args = parser.parse_args(argv)
+
+    directorio = tempfile.mkdtemp(prefix="benchmark_")
+    ruta_db = os.path.abspath(args.db) if args.db else os.path.join(directorio, "benchmark.db")
+    os.environ["PROYECTO_DATABASE_URL"] = f"sqlite:///{ruta_db}"
+
+    import sqlalchemy
+    from database import SessionLocal, actualizar_esquema
+    import models  # noqa: F401
+    from generador_datos import GeneradorDatos
+    actualizar_esquema()
+
+    db = SessionLocal()
+    try:
+        conteo = None
+        if not args.db:
+            inicio = time.perf_counter()
+            conteo = GeneradorDatos(args.semilla).poblar(db, args.pedidos)
+            print(f"Base generada en {time.perf_counter() - inicio:.2f}s: {conteo}")
+        casos = casos_crud(db)
+        consultas = casos_consultas(db)
+    finally:
+        db.close()
+
+    sin_medir = metodos_sin_medir(casos)
+    casos += consultas + casos_csv(directorio, args.filas_csv) + casos_graficos() + casos_columnar(directorio) + casos_interfaz()
+    if args.filtro:
+        casos = [c for c in casos if re.search(args.filtro, f"{c[0]}.{c[1]}")]
+
+    resultados = []
+    for grupo, nombre, funcion, preparar in casos:
+        resultado = medir(f"{grupo}.{nombre}", grupo, funcion, args.repeticiones, preparar)
+        resultados.append(resultado)
+        if resultado["error"]:
+            print(f"{resultado['nombre']:<50} ERROR {resultado['error']}")
+        else:
+            print(f"{resultado['nombre']:<50} mediana {resultado['mediana'] * 1000:>10.3f} ms")
+
+    salida = {
+        "meta": {
+            "fecha": datetime.now().isoformat(timespec="seconds"),
+            "version_codigo": version_codigo(),
+            "python": platform.python_version(),
+            "sqlalchemy": sqlalchemy.__version__,
+            "plataforma": platform.platform(),
+            "base_de_datos": ruta_db,
+            "generada": conteo,
+            "semilla": args.semilla,
+            "repeticiones": args.repeticiones,
+            "sin_medir": sin_medir,
+        },
+        "resultados": resultados,
+    }
+    with open(args.salida, "w", encoding="utf-8") as archivo:
+        json.dump(salida, archivo, ensure_ascii=False, indent=2)
+    print(f"\nResultados escritos en {args.salida}")
+    if sin_medir:
+        print(f"Métodos sin caso de benchmark: {', '.join(sin_medir)}")
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as archivo:
+            regresiones = comparar(salida, json.load(archivo), args.umbral)
+        return 1 if regresiones else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
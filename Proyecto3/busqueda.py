@@ -0,0 +1,122 @@
+import re
+from sqlalchemy import text, or_
+from sqlalchemy.orm import Session
+from models import Cliente, Menu
+from typing import List
+
+# Índices de texto completo (FTS5 con contenido externo): el índice sólo
+# guarda los términos y lee las filas de la tabla original por rowid.
+# Los triggers lo mantienen sincronizado con cada INSERT, UPDATE y DELETE.
+# El guion es parte de las palabras (el RUT queda como un solo término) y los
+# prefijos de 2 y 3 letras tienen índice propio para la búsqueda al escribir.
+INDICES_FTS = {
+    "ClientesFTS": ("Clientes", ("nombre", "rut", "correo")),
+    "MenusFTS": ("Menus", ("nombre", "descripcion", "categoria")),
+}
+
+class BusquedaTexto:
+    """
+    Búsqueda por prefijo sobre clientes (nombre, RUT, correo) y menús
+    (nombre, descripción, categoría) para los buscadores de la interfaz.
+    Usa FTS5 si la versión de SQLite lo incluye; si no, LIKE sobre las tablas.
+    Los resultados no se ordenan por relevancia: con prefijos cortos hay
+    miles de coincidencias y calcular el rank de todas domina el tiempo.
+    """
+
+    @staticmethod
+    def fts5_disponible(conexion) -> bool:
+        opciones = {fila[0] for fila in conexion.execute(text("PRAGMA compile_options"))}
+        return "ENABLE_FTS5" in opciones
+
+    @staticmethod
+    def crear_indices(conexion) -> None:
+        """Crea las tablas FTS5 y sus triggers si no existen, y las llena la primera vez"""
+        if not BusquedaTexto.fts5_disponible(conexion):
+            return
+        for indice, (tabla, columnas) in INDICES_FTS.items():
+            existe = conexion.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :nombre"),
+                {"nombre": indice}
+            ).first()
+            lista = ", ".join(columnas)
+            nuevos = ", ".join(f"new.{c}" for c in columnas)
+            viejos = ", ".join(f"old.{c}" for c in columnas)
+            conexion.execute(text(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS "{indice}" USING fts5('
+                f"{lista}, content='{tabla}', content_rowid='id', prefix='2 3', "
+                f"tokenize=\"unicode61 remove_diacritics 2 tokenchars '-'\")"
+            ))
+            conexion.execute(text(
+                f'CREATE TRIGGER IF NOT EXISTS "{indice}_ai" AFTER INSERT ON "{tabla}" BEGIN '
+                f'INSERT INTO "{indice}"(rowid, {lista}) VALUES (new.id, {nuevos}); END'
+            ))
+            conexion.execute(text(
+                f'CREATE TRIGGER IF NOT EXISTS "{indice}_ad" AFTER DELETE ON "{tabla}" BEGIN '
+                f'INSERT INTO "{indice}"("{indice}", rowid, {lista}) VALUES (\'delete\', old.id, {viejos}); END'
+            ))
+            # Sólo cuando cambian las columnas indexadas (no con los contadores del cliente)
+            conexion.execute(text(
+                f'CREATE TRIGGER IF NOT EXISTS "{indice}_au" AFTER UPDATE OF {lista} ON "{tabla}" BEGIN '
+                f'INSERT INTO "{indice}"("{indice}", rowid, {lista}) VALUES (\'delete\', old.id, {viejos}); '
+                f'INSERT INTO "{indice}"(rowid, {lista}) VALUES (new.id, {nuevos}); END'
+            ))
+            if not existe:
+                conexion.execute(text(f'INSERT INTO "{indice}"("{indice}") VALUES (\'rebuild\')'))
+
+    @staticmethod
+    def _terminos(texto: str) -> List[str]:
+        return [t for t in re.split(r"[^\w@.\-]+", texto or "") if t.strip("-")]
+
+    @staticmethod
+    def _consulta_fts(texto: str) -> str:
+        """'ana per' -> '"ana"* "per"*' (todos los términos, cada uno por prefijo)"""
+        return " ".join('"' + t.replace('"', '""') + '"*' for t in BusquedaTexto._terminos(texto))
+
+    @staticmethod
+    def _usar_fts(db: Session, indice: str) -> bool:
+        return db.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :nombre"), {"nombre": indice}
+        ).first() is not None
+
+    @staticmethod
+    def buscar_clientes(db: Session, texto: str, limite: int = 50) -> List[Cliente]:
+        """Clientes cuyo nombre, RUT o correo contienen palabras que empiezan con los términos buscados"""
+        try:
+            consulta = BusquedaTexto._consulta_fts(texto)
+            if not consulta:
+                return []
+            if BusquedaTexto._usar_fts(db, "ClientesFTS"):
+                sentencia = text(
+                    'SELECT "Clientes".* FROM "ClientesFTS" JOIN "Clientes" ON "Clientes".id = "ClientesFTS".rowid '
+                    'WHERE "ClientesFTS" MATCH :consulta LIMIT :limite'
+                )
+                return db.query(Cliente).from_statement(sentencia).params(consulta=consulta, limite=limite).all()
+
+            filtros = [or_(Cliente.nombre.ilike(f"%{t}%"), Cliente.rut.ilike(f"%{t}%"), Cliente.correo.ilike(f"%{t}%"))
+                       for t in BusquedaTexto._terminos(texto)]
+            return db.query(Cliente).filter(*filtros).limit(limite).all()
+        except Exception as e:
+            raise Exception(f"Error al buscar clientes: {str(e)}")
+
+    @staticmethod
+    def buscar_menus(db: Session, texto: str, limite: int = 50, solo_disponibles: bool = False) -> List[Menu]:
+        """Menús cuyo nombre, descripción o categoría contienen palabras que empiezan con los términos buscados"""
+        try:
+            consulta = BusquedaTexto._consulta_fts(texto)
+            if not consulta:
+                return []
+            if BusquedaTexto._usar_fts(db, "MenusFTS"):
+                filtro = 'AND "Menus".disponible = 1 ' if solo_disponibles else ""
+                sentencia = text(
+                    'SELECT "Menus".* FROM "MenusFTS" JOIN "Menus" ON "Menus".id = "MenusFTS".rowid '
+                    f'WHERE "MenusFTS" MATCH :consulta {filtro}LIMIT :limite'
+                )
+                return db.query(Menu).from_statement(sentencia).params(consulta=consulta, limite=limite).all()
+
+            filtros = [or_(Menu.nombre.ilike(f"%{t}%"), Menu.descripcion.ilike(f"%{t}%"), Menu.categoria.ilike(f"%{t}%"))
+                       for t in BusquedaTexto._terminos(texto)]
+            if solo_disponibles:
+                filtros.append(Menu.disponible == 1)
+            return db.query(Menu).filter(*filtros).limit(limite).all()
+        except Exception as e:
+            raise Exception(f"Error al buscar menús: {str(e)}")
@@ -0,0 +1,156 @@
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Archivos que escribe la caché: <sha1 de la clave>.<formato> (y su .tmp mientras se escribe)
+_ARCHIVO_CACHE = re.compile(r"^[0-9a-f]{40}\.[a-z0-9]+(\.tmp)?$")
+
+class CacheGraficos:
+    """
+    Caché de gráficos ya renderizados (PNG/SVG).
+    La clave incluye el tipo de gráfico, el periodo, el formato y el sello
+    de versión de los datos, por lo que cualquier escritura en pedidos o
+    menús deja obsoletas las entradas anteriores sin tener que borrarlas.
+    Guarda en memoria (LRU con presupuesto en bytes) y en disco (se
+    eliminan primero los archivos usados hace más tiempo). Sólo se cuentan,
+    recortan o eliminan los archivos escritos por la caché, aunque el
+    directorio tenga otros.
+    """
+
+    def __init__(self, directorio: Optional[str] = "cache_graficos",
+                 max_bytes_memoria: int = 32 * 1024 * 1024,
+                 max_bytes_disco: int = 128 * 1024 * 1024):
+        self.directorio = directorio
+        self.max_bytes_memoria = max_bytes_memoria
+        self.max_bytes_disco = max_bytes_disco
+        self._memoria = OrderedDict()
+        self._bytes_memoria = 0
+        self._bytes_disco = 0
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+
+        if self.directorio:
+            os.makedirs(self.directorio, exist_ok=True)
+            self._bytes_disco = sum(os.path.getsize(ruta) for ruta in self._archivos())
+
+    @staticmethod
+    def crear_clave(tipo: str, periodo: Optional[str], formato: str, version: str,
+                    filtros: Optional[Dict] = None) -> Tuple:
+        filtros = tuple(sorted((k, str(v)) for k, v in (filtros or {}).items() if v))
+        return (tipo, periodo or "", formato, version, filtros)
+
+    def _archivos(self) -> List[str]:
+        """Rutas de los archivos del directorio escritos por la caché"""
+        return [os.path.join(self.directorio, nombre) for nombre in os.listdir(self.directorio)
+                if _ARCHIVO_CACHE.match(nombre)]
+
+    def _ruta(self, clave: Tuple) -> str:
+        nombre = hashlib.sha1(repr(clave).encode("utf-8")).hexdigest()
+        return os.path.join(self.directorio, f"{nombre}.{clave[2]}")
+
+    def _guardar_memoria(self, clave: Tuple, datos: bytes) -> None:
+        if len(datos) > self.max_bytes_memoria:
+            return
+        anterior = self._memoria.pop(clave, None)
+        if anterior is not None:
+            self._bytes_memoria -= len(anterior)
+        self._memoria[clave] = datos
+        self._bytes_memoria += len(datos)
+        while self._bytes_memoria > self.max_bytes_memoria:
+            _, expulsado = self._memoria.popitem(last=False)
+            self._bytes_memoria -= len(expulsado)
+
+    def _recortar_disco(self) -> None:
+        if self._bytes_disco <= self.max_bytes_disco:
+            return
+        archivos = []
+        for ruta in self._archivos():
+            try:
+                estado = os.stat(ruta)
+            except OSError:
+                continue
+            archivos.append((estado.st_mtime, estado.st_size, ruta))
+        # Los de uso más antiguo primero
+        for _, tamano, ruta in sorted(archivos):
+            if self._bytes_disco <= self.max_bytes_disco:
+                break
+            try:
+                os.remove(ruta)
+                self._bytes_disco -= tamano
+            except OSError:
+                continue
+
+    def obtener(self, clave: Tuple) -> Optional[bytes]:
+        """Retorna la imagen guardada para la clave o None si no existe"""
+        with self._lock:
+            datos = self._memoria.get(clave)
+            if datos is not None:
+                self._memoria.move_to_end(clave)
+                self.aciertos += 1
+                return datos
+
+            if self.directorio:
+                ruta = self._ruta(clave)
+                try:
+                    with open(ruta, "rb") as archivo:
+                        datos = archivo.read()
+                    os.utime(ruta)  # Marca el archivo como usado recientemente
+                    self._guardar_memoria(clave, datos)
+                    self.aciertos += 1
+                    return datos
+                except OSError:
+                    pass
+
+            self.fallos += 1
+            return None
+
+    def guardar(self, clave: Tuple, datos: bytes) -> None:
+        """Guarda la imagen en memoria y en disco"""
+        with self._lock:
+            self._guardar_memoria(clave, datos)
+            if not self.directorio or len(datos) > self.max_bytes_disco:
+                return
+            ruta = self._ruta(clave)
+            try:
+                anterior = os.path.getsize(ruta) if os.path.exists(ruta) else 0
+                temporal = f"{ruta}.tmp"
+                with open(temporal, "wb") as archivo:
+                    archivo.write(datos)
+                os.replace(temporal, ruta)
+                self._bytes_disco += len(datos) - anterior
+                self._recortar_disco()
+            except OSError:
+                # Si el disco falla la caché en memoria sigue funcionando
+                pass
+
+    def obtener_o_generar(self, clave: Tuple,
+                          generar: Callable[[], Tuple[Optional[bytes], Optional[str]]]) -> Tuple[Optional[bytes], Optional[str]]:
+        """
+        Retorna (datos, error). Si la clave no está en caché llama a
+        generar(), que debe retornar (datos, error), y guarda el resultado.
+        Los errores no se guardan.
+        """
+        datos = self.obtener(clave)
+        if datos is not None:
+            return datos, None
+        datos, error = generar()
+        if datos is not None and not error:
+            self.guardar(clave, datos)
+        return datos, error
+
+    def limpiar(self) -> None:
+        """Elimina todas las entradas de memoria y disco (sólo los archivos de la caché)"""
+        with self._lock:
+            self._memoria.clear()
+            self._bytes_memoria = 0
+            if self.directorio:
+                for ruta in self._archivos():
+                    try:
+                        os.remove(ruta)
+                    except OSError:
+                        continue
+                self._bytes_disco = 0
@@ -0,0 +1,363 @@
+"""
+Almacén columnar del historial de ventas para estadísticas.
+
+Materializa cada item vendido (de pedidos activos y archivados, igual que
+archivo.fuente_ventas) en un directorio con una columna por archivo:
+arreglos NumPy tipados que se leen como memory maps. Cada fila ocupa 32
+bytes, así que un millón de líneas de pedido son unos 30 MB.
+
+Las filas están ordenadas por pedido_id. actualizar() agrega al final
+sólo los pedidos con ID mayor al último materializado. Si la versión de
+datos (VersionCRUD) cambió, antes compara con una agregación en SQL el
+conteo y las sumas de los pedidos ya materializados: sumas simples, sumas
+de menu_id y pedido_id ponderadas por cantidad (cantidad movida entre
+líneas de igual precio) y la suma de las versiones de los pedidos activos,
+que aumenta con cada escritura del pedido o de sus items. Si difieren (un
+pedido editado, eliminado o archivado, o un cambio de precio en un pedido
+activo), reconstruye el almacén completo.
+
+AnalisisColumnar responde las preguntas de GraficosEstadisticos con los
+mismos resultados, agrupando con NumPy (bincount) en vez de SQL. Sólo los
+menús (pocas filas) se leen de la base.
+
+Uso:
+    python columnar.py --db proyecto.db
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, List
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+# Columna -> tipo NumPy. fecha en segundos (NaT si el pedido no tiene fecha), cliente_id -1 si no tiene
+COLUMNAS = {
+    "pedido_id": np.dtype("int32"),
+    "fecha": np.dtype("datetime64[s]"),
+    "cliente_id": np.dtype("int32"),
+    "menu_id": np.dtype("int32"),
+    "cantidad": np.dtype("int32"),
+    "precio": np.dtype("float64"),
+}
+# Filas leídas de la base por lote al materializar
+LOTE = 100000
+# Diferencia relativa tolerada en la suma de montos al verificar
+TOLERANCIA = 1e-9
+
+
+def directorio_predeterminado(database_url: str = None) -> str:
+    """PROYECTO_COLUMNAR o, junto a la base principal, proyecto.db -> proyecto_columnar/"""
+    if database_url is None:
+        from database import DATABASE_URL as database_url
+    if os.environ.get("PROYECTO_COLUMNAR"):
+        return os.environ["PROYECTO_COLUMNAR"]
+    ruta = database_url.split("///", 1)[1] if "///" in database_url else ""
+    if not ruta or ruta == ":memory:":
+        return "columnar"
+    return f"{os.path.splitext(ruta)[0]}_columnar"
+
+
+def _sumas_sql(db: Session, hasta: int = None) -> Dict:
+    """Conteo y sumas de control de las ventas con pedido_id <= hasta (todas si es None)"""
+    from archivo import fuente_ventas
+    from models import Pedido
+    ventas = fuente_ventas()
+    consulta = select(
+        func.count(),
+        func.coalesce(func.sum(ventas.c.cantidad), 0),
+        func.coalesce(func.sum(ventas.c.subtotal), 0.0),
+        func.coalesce(func.sum(ventas.c.menu_id), 0),
+        func.coalesce(func.sum(ventas.c.cliente_id), 0),
+        func.coalesce(func.sum(func.strftime("%s", ventas.c.fecha)), 0),
+        func.coalesce(func.sum(ventas.c.menu_id * ventas.c.cantidad), 0),
+        func.coalesce(func.sum(ventas.c.pedido_id * ventas.c.cantidad), 0),
+    )
+    versiones = select(func.coalesce(func.sum(Pedido.version), 0))
+    if hasta is not None:
+        consulta = consulta.where(ventas.c.pedido_id <= hasta)
+        versiones = versiones.where(Pedido.id <= hasta)
+    filas, cantidad, monto, menus, clientes, segundos, menus_cantidad, pedidos_cantidad = db.execute(consulta).one()
+    return {"filas": filas, "cantidad": int(cantidad), "monto": float(monto), "menus": int(menus),
+            "clientes": int(clientes), "segundos": int(segundos), "menus_cantidad": int(menus_cantidad),
+            "pedidos_cantidad": int(pedidos_cantidad), "versiones": int(db.scalar(versiones))}
+
+
+class AlmacenColumnar:
+    def __init__(self, directorio: str = None):
+        self.directorio = directorio or directorio_predeterminado()
+        self.meta = self._leer_meta()
+        self._columnas = None
+
+    # Metadatos
+
+    def _ruta(self, nombre: str) -> str:
+        return os.path.join(self.directorio, nombre)
+
+    def _leer_meta(self) -> Dict:
+        try:
+            with open(self._ruta("meta.json"), "r", encoding="utf-8") as archivo:
+                return json.load(archivo)
+        except (OSError, ValueError):
+            return {"filas": 0, "ultimo_pedido_id": 0, "sumas": None, "version": None, "actualizado": None}
+
+    def _guardar_meta(self) -> None:
+        # Se escribe al final: si se interrumpe una carga, las filas agregadas de más se ignoran
+        temporal = self._ruta("meta.json.tmp")
+        with open(temporal, "w", encoding="utf-8") as archivo:
+            json.dump(self.meta, archivo, indent=2)
+        os.replace(temporal, self._ruta("meta.json"))
+
+    @property
+    def filas(self) -> int:
+        return self.meta["filas"]
+
+    def tamano_bytes(self) -> int:
+        return self.filas * sum(tipo.itemsize for tipo in COLUMNAS.values())
+
+    # Carga
+
+    def reconstruir(self, db: Session) -> int:
+        """Materializa todo el historial de nuevo. Retorna la cantidad de filas"""
+        os.makedirs(self.directorio, exist_ok=True)
+        self.meta = {"filas": 0, "ultimo_pedido_id": 0, "sumas": None, "version": None, "actualizado": None}
+        return self._agregar(db)
+
+    def actualizar(self, db: Session) -> int:
+        """
+        Agrega las ventas de los pedidos nuevos, o reconstruye el almacén si
+        cambiaron los pedidos ya materializados. Retorna las filas agregadas.
+        """
+        from crud.version_crud import VersionCRUD
+        if not os.path.exists(self._ruta("meta.json")) or self.meta["sumas"] is None:
+            return self.reconstruir(db)
+        # Sin escrituras en pedidos ni menús desde la última carga no hay nada que leer
+        if self.meta.get("version") == VersionCRUD.obtener(db):
+            return 0
+        sumas = _sumas_sql(db, self.meta["ultimo_pedido_id"])
+        previas = self.meta["sumas"]
+        # Un almacén guardado sin alguna de las sumas se reconstruye
+        iguales = all(sumas[c] == previas.get(c) for c in sumas if c != "monto") and \
+            abs(sumas["monto"] - previas["monto"]) <= TOLERANCIA * max(1.0, abs(previas["monto"]))
+        if not iguales:
+            return self.reconstruir(db)
+        return self._agregar(db)
+
+    def _agregar(self, db: Session) -> int:
+        from archivo import fuente_ventas
+        from crud.version_crud import VersionCRUD
+        version = VersionCRUD.obtener(db)
+        ventas = fuente_ventas()
+        consulta = select(
+            ventas.c.pedido_id,
+            func.strftime("%s", ventas.c.fecha),
+            ventas.c.cliente_id,
+            ventas.c.menu_id,
+            ventas.c.cantidad,
+            ventas.c.subtotal,
+        ).where(ventas.c.pedido_id > self.meta["ultimo_pedido_id"]).order_by(ventas.c.pedido_id)
+
+        # Descarta lo que haya quedado de una carga interrumpida
+        modo = "wb" if self.meta["filas"] == 0 else "r+b"
+        archivos = {}
+        for nombre, tipo in COLUMNAS.items():
+            ruta = self._ruta(f"{nombre}.bin")
+            archivos[nombre] = open(ruta, modo if os.path.exists(ruta) else "wb")
+            archivos[nombre].truncate(self.meta["filas"] * tipo.itemsize)
+            archivos[nombre].seek(0, os.SEEK_END)
+
+        agregadas = 0
+        try:
+            resultado = db.execute(consulta)
+            while True:
+                lote = resultado.fetchmany(LOTE)
+                if not lote:
+                    break
+                pedido, segundos, cliente, menu, cantidad, subtotal = zip(*lote)
+                cantidad = np.array(cantidad, dtype=COLUMNAS["cantidad"])
+                columnas = {
+                    "pedido_id": np.array(pedido, dtype=COLUMNAS["pedido_id"]),
+                    "fecha": np.array([int(s) if s is not None else np.iinfo(np.int64).min for s in segundos],
+                                      dtype=np.int64).view(COLUMNAS["fecha"]),
+                    "cliente_id": np.array([c if c is not None else -1 for c in cliente], dtype=COLUMNAS["cliente_id"]),
+                    "menu_id": np.array(menu, dtype=COLUMNAS["menu_id"]),
+                    "cantidad": cantidad,
+                    # Precio unitario cobrado: el actual del menú o el guardado al archivar
+                    "precio": np.divide(np.array(subtotal, dtype=np.float64), cantidad,
+                                        out=np.zeros(len(lote)), where=cantidad != 0),
+                }
+                for nombre, valores in columnas.items():
+                    archivos[nombre].write(valores.tobytes())
+                agregadas += len(lote)
+                self.meta["ultimo_pedido_id"] = int(columnas["pedido_id"][-1])
+        finally:
+            for archivo in archivos.values():
+                archivo.close()
+
+        self.meta["filas"] += agregadas
+        self.meta["sumas"] = _sumas_sql(db, self.meta["ultimo_pedido_id"])
+        self.meta["version"] = version
+        self.meta["actualizado"] = datetime.now().isoformat(timespec="seconds")
+        self._guardar_meta()
+        self._columnas = None
+        return agregadas
+
+    # Lectura
+
+    def columnas(self) -> Dict[str, np.ndarray]:
+        """Las columnas como memory maps de solo lectura (arreglos vacíos si no hay filas)"""
+        if self._columnas is None:
+            self._columnas = {
+                nombre: np.memmap(self._ruta(f"{nombre}.bin"), dtype=tipo, mode="r", shape=(self.filas,))
+                if self.filas else np.empty(0, dtype=tipo)
+                for nombre, tipo in COLUMNAS.items()
+            }
+        return self._columnas
+
+
+def _clave_periodo(fecha: date, periodo: str) -> str:
+    """Misma clave que GraficosEstadisticos.obtener_ventas_por_fecha"""
+    if periodo == "semanal":
+        return f"{fecha.year}-S{fecha.isocalendar()[1]}"
+    elif periodo == "mensual":
+        return fecha.strftime("%Y-%m")
+    elif periodo == "anual":
+        return str(fecha.year)
+    return fecha.strftime("%Y-%m-%d")
+
+
+class AnalisisColumnar:
+    """
+    Las consultas de GraficosEstadisticos sobre el almacén columnar. Cada
+    consulta actualiza antes el almacén (sólo lee los pedidos nuevos) salvo
+    que se cree con actualizar=False.
+    """
+
+    def __init__(self, almacen: AlmacenColumnar = None, actualizar: bool = True):
+        self.almacen = almacen or AlmacenColumnar()
+        self.actualizar = actualizar
+
+    def _columnas(self, db: Session) -> Dict[str, np.ndarray]:
+        if self.actualizar:
+            self.almacen.actualizar(db)
+        return self.almacen.columnas()
+
+    @staticmethod
+    def _por_menu(columnas: Dict[str, np.ndarray], mascara: np.ndarray = None) -> np.ndarray:
+        """Cantidad vendida por menu_id (índice del arreglo)"""
+        menus, cantidades = columnas["menu_id"], columnas["cantidad"]
+        if mascara is not None:
+            menus, cantidades = menus[mascara], cantidades[mascara]
+        return np.bincount(menus, weights=cantidades) if len(menus) else np.zeros(0)
+
+    def obtener_ventas_por_fecha(self, db: Session, periodo: str = "diario") -> Dict[str, float]:
+        try:
+            columnas = self._columnas(db)
+            fechas = columnas["fecha"]
+            validas = ~np.isnat(fechas)
+            if not validas.any():
+                return {}
+            dias = fechas[validas].astype("datetime64[D]").astype(np.int64)
+            primero = dias.min()
+            subtotales = columnas["precio"][validas] * columnas["cantidad"][validas]
+            totales = np.bincount(dias - primero, weights=subtotales)
+            ventas = {}
+            # Sólo los días con ventas se recorren en Python
+            for desplazamiento in np.flatnonzero(np.bincount(dias - primero)):
+                dia = date(1970, 1, 1) + timedelta(days=int(primero + desplazamiento))
+                clave = _clave_periodo(dia, periodo)
+                ventas[clave] = ventas.get(clave, 0.0) + float(totales[desplazamiento])
+            return dict(sorted(ventas.items()))
+        except Exception as e:
+            raise Exception(f"Error al obtener ventas por fecha: {str(e)}")
+
+    def obtener_distribucion_menus(self, db: Session) -> Dict[str, int]:
+        from models import Menu
+        try:
+            por_menu = self._por_menu(self._columnas(db))
+            distribucion = {}
+            for menu_id, nombre in db.query(Menu.id, Menu.nombre).filter(Menu.nombre.isnot(None)):
+                if menu_id < len(por_menu) and por_menu[menu_id] and nombre:
+                    distribucion[nombre] = distribucion.get(nombre, 0) + int(por_menu[menu_id])
+            return dict(sorted(distribucion.items(), key=lambda x: x[1], reverse=True))
+        except Exception as e:
+            raise Exception(f"Error al obtener distribución de menús: {str(e)}")
+
+    def obtener_uso_ingredientes(self, db: Session) -> Dict[str, float]:
+        from models import Menu
+        try:
+            por_menu = self._por_menu(self._columnas(db))
+            uso = {}
+            for menu_id, receta in db.query(Menu.id, Menu.receta):
+                if not receta or menu_id >= len(por_menu) or not por_menu[menu_id]:
+                    continue
+                for ingrediente, cantidad_por_menu in receta.items():
+                    try:
+                        uso[ingrediente] = uso.get(ingrediente, 0.0) + cantidad_por_menu * int(por_menu[menu_id])
+                    except (ValueError, TypeError):
+                        continue
+            return dict(sorted(uso.items(), key=lambda x: x[1], reverse=True))
+        except Exception as e:
+            raise Exception(f"Error al calcular uso de ingredientes: {str(e)}")
+
+    def obtener_mapa_calor_horario(self, db: Session, fecha_inicio: date = None, fecha_fin: date = None,
+                                   categoria: str = None) -> Dict[str, List[List[float]]]:
+        from models import Menu
+        try:
+            columnas = self._columnas(db)
+            fechas = columnas["fecha"]
+            mascara = ~np.isnat(fechas)
+            if fecha_inicio:
+                mascara &= fechas >= np.datetime64(fecha_inicio, "s")
+            if fecha_fin:
+                # La fecha final es inclusiva
+                mascara &= fechas < np.datetime64(fecha_fin + timedelta(days=1), "s")
+            if categoria:
+                ids = [i for (i,) in db.query(Menu.id).filter(Menu.categoria == categoria)]
+                mascara &= np.isin(columnas["menu_id"], ids)
+
+            segundos = fechas[mascara].astype(np.int64)
+            # 1970-01-01 fue jueves: (días + 3) % 7 da lunes=0
+            celdas = ((segundos // 86400 + 3) % 7) * 24 + (segundos % 86400) // 3600
+            subtotales = columnas["precio"][mascara] * columnas["cantidad"][mascara]
+            # Las filas están ordenadas por pedido: la primera de cada pedido lo cuenta una vez
+            pedidos_id = columnas["pedido_id"][mascara]
+            primeras = np.ones(len(pedidos_id), dtype=bool)
+            primeras[1:] = pedidos_id[1:] != pedidos_id[:-1]
+
+            pedidos = np.bincount(celdas[primeras], minlength=7 * 24).reshape(7, 24)
+            ingresos = np.bincount(celdas, weights=subtotales, minlength=7 * 24).reshape(7, 24)
+            return {"pedidos": pedidos.astype(int).tolist(), "ingresos": ingresos.tolist()}
+        except Exception as e:
+            raise Exception(f"Error al obtener mapa de calor: {str(e)}")
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Actualiza el almacén columnar del historial de ventas")
+    parser.add_argument("--db", default=None, help="Ruta del archivo SQLite (default: PROYECTO_DATABASE_URL o ./proyecto.db)")
+    parser.add_argument("--directorio", default=None, help="Directorio del almacén (default: junto a la base)")
+    parser.add_argument("--reconstruir", action="store_true", help="Materializa todo de nuevo")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        os.environ["PROYECTO_DATABASE_URL"] = f"sqlite:///{os.path.abspath(args.db)}"
+    from database import SessionLocal
+
+    almacen = AlmacenColumnar(args.directorio)
+    db = SessionLocal()
+    try:
+        inicio = time.perf_counter()
+        filas = almacen.reconstruir(db) if args.reconstruir else almacen.actualizar(db)
+    finally:
+        db.close()
+    print(f"{filas} filas agregadas en {time.perf_counter() - inicio:.3f}s; "
+          f"{almacen.filas} filas, {almacen.tamano_bytes() / 2 ** 20:.1f} MB en {almacen.directorio}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,20 @@
 from sqlalchemy.orm import Session 
+from sqlalchemy import bindparam, delete, func, select, update
 from sqlalchemy.exc import SQLAlchemyError
-from models import Cliente
-from typing import Optional, List
+from models import Cliente, Pedido, ItemPedido, Menu, PedidoArchivado, ItemPedidoArchivado
+from crud.version_crud import VersionCRUD
+from crud.filas import FilaCliente, columnas
+from eventos import registrar_cambio
+from database import en_lotes
+from typing import Optional, List, Iterable
 import re
 
+
+# Búsqueda frecuente armada una sola vez: su clave de caché y su SQL compilado
+# se reutilizan y en cada llamada sólo cambia el parámetro
+_CLIENTE_POR_RUT = select(Cliente).where(Cliente.rut == bindparam("rut"))
+
+
 class ClienteCRUD:
     @staticmethod
     def validar_correo(correo: str) -> bool:
@@ -28,14 +39,12 @@ class ClienteCRUD:
                 raise ValueError("Formato de correo electrónico inválido")
             
             # Verificar si el RUT ya existe
-            cliente_existente = db.query(Cliente).filter(Cliente.rut == rut).first()
-            if cliente_existente:
+            if db.execute(_CLIENTE_POR_RUT, {"rut": rut}).scalar_one_or_none():
                 raise ValueError(f"El cliente con RUT '{rut}' ya existe")
             
             # Verificar si el correo ya existe (si se proporciona)
             if correo:
-                correo_existente = db.query(Cliente).filter(Cliente.correo == correo).first()
-                if correo_existente:
+                if db.scalar(select(Cliente.id).where(Cliente.correo == correo).limit(1)):
                     raise ValueError(f"El correo '{correo}' ya está registrado")
             
             nuevo_cliente = Cliente(rut=rut.strip(), nombre=nombre.strip(), correo=correo.strip() if correo else None)
@@ -51,7 +60,7 @@ class ClienteCRUD:
     def obtener_cliente_por_id(db: Session, cliente_id: int) -> Optional[Cliente]:
         """Obtiene un cliente por su ID"""
         try:
-            return db.query(Cliente).filter(Cliente.id == cliente_id).first()
+            return db.get(Cliente, cliente_id)
         except SQLAlchemyError as e:
             raise Exception(f"Error al obtener cliente: {str(e)}")
     
@@ -59,7 +68,7 @@ class ClienteCRUD:
     def obtener_cliente_por_rut(db: Session, rut: str) -> Optional[Cliente]:
         """Obtiene un cliente por su RUT"""
         try:
-            return db.query(Cliente).filter(Cliente.rut == rut).first()
+            return db.execute(_CLIENTE_POR_RUT, {"rut": rut}).scalar_one_or_none()
         except SQLAlchemyError as e:
             raise Exception(f"Error al buscar cliente: {str(e)}")
     
@@ -67,16 +76,40 @@ class ClienteCRUD:
     def obtener_todos_clientes(db: Session) -> List[Cliente]:
         """Obtiene todos los clientes"""
         try:
-            return db.query(Cliente).all()
+            return db.scalars(select(Cliente)).all()
+        except SQLAlchemyError as e:
+            raise Exception(f"Error al obtener clientes: {str(e)}")
+    
+    @staticmethod
+    def obtener_clientes_por_ids(db: Session, cliente_ids: Iterable[int]) -> List[Cliente]:
+        """Obtiene los clientes indicados (los IDs inexistentes se omiten)"""
+        try:
+            return [c for lote in en_lotes(sorted(set(cliente_ids)))
+                    for c in db.scalars(select(Cliente).where(Cliente.id.in_(lote)))]
         except SQLAlchemyError as e:
             raise Exception(f"Error al obtener clientes: {str(e)}")
     
+    @staticmethod
+    def listar_clientes(db: Session, cliente_ids: Iterable[int] = None) -> List[FilaCliente]:
+        """
+        Clientes (todos o los indicados) como filas livianas de solo lectura,
+        para listados y exportaciones: sólo se leen las columnas del listado
+        """
+        try:
+            consulta = select(*columnas(Cliente, FilaCliente)).order_by(Cliente.id)
+            if cliente_ids is None:
+                return list(map(FilaCliente._make, db.execute(consulta)))
+            return [FilaCliente._make(fila) for lote in en_lotes(sorted(set(cliente_ids)))
+                    for fila in db.execute(consulta.where(Cliente.id.in_(lote)))]
+        except SQLAlchemyError as e:
+            raise Exception(f"Error al listar clientes: {str(e)}")
+    
     @staticmethod
     def actualizar_cliente(db: Session, cliente_id: int, rut: str = None, 
                           nombre: str = None, correo: str = None) -> Optional[Cliente]:
         """Actualiza los datos de un cliente"""
         try:
-            cliente = db.query(Cliente).filter(Cliente.id == cliente_id).first()
+            cliente = db.get(Cliente, cliente_id)
             if not cliente:
                 return None
             
@@ -84,10 +117,9 @@ class ClienteCRUD:
                 if not rut.strip():
                     raise ValueError("El RUT no puede estar vacío")
                 # Verificar que el nuevo RUT no esté en uso
-                rut_existente = db.query(Cliente).filter(
-                    Cliente.rut == rut,
-                    Cliente.id != cliente_id
-                ).first()
+                rut_existente = db.scalar(
+                    select(Cliente.id).where(Cliente.rut == rut, Cliente.id != cliente_id).limit(1)
+                )
                 if rut_existente:
                     raise ValueError(f"El RUT '{rut}' ya está en uso")
                 cliente.rut = rut.strip()
@@ -102,10 +134,9 @@ class ClienteCRUD:
                     raise ValueError("Formato de correo electrónico inválido")
                 # Verificar que el correo no esté en uso
                 if correo.strip():
-                    correo_existente = db.query(Cliente).filter(
-                        Cliente.correo == correo,
-                        Cliente.id != cliente_id
-                    ).first()
+                    correo_existente = db.scalar(
+                        select(Cliente.id).where(Cliente.correo == correo, Cliente.id != cliente_id).limit(1)
+                    )
                     if correo_existente:
                         raise ValueError(f"El correo '{correo}' ya está en uso")
                 cliente.correo = correo.strip() if correo.strip() else None
@@ -121,13 +152,114 @@ class ClienteCRUD:
     def eliminar_cliente(db: Session, cliente_id: int) -> bool:
         """Elimina un cliente por su ID"""
         try:
-            cliente = db.query(Cliente).filter(Cliente.id == cliente_id).first()
+            cliente = db.get(Cliente, cliente_id)
             if not cliente:
                 return False
             
             db.delete(cliente)
+            # Sus pedidos los elimina la base (ON DELETE CASCADE); los archivados se eliminan aquí
+            archivados = select(PedidoArchivado.id).where(PedidoArchivado.cliente_id == cliente_id)
+            db.execute(
+                delete(ItemPedidoArchivado).where(ItemPedidoArchivado.pedido_id.in_(archivados))
+                .execution_options(synchronize_session=False)
+            )
+            db.execute(
+                delete(PedidoArchivado).where(PedidoArchivado.cliente_id == cliente_id)
+                .execution_options(synchronize_session=False)
+            )
+            VersionCRUD.incrementar(db, "pedidos")
             db.commit()
             return True
         except SQLAlchemyError as e:
             db.rollback()
             raise Exception(f"Error al eliminar cliente: {str(e)}")
+
+    @staticmethod
+    def eliminar_clientes(db: Session, cliente_ids: Iterable[int]) -> int:
+        """
+        Elimina varios clientes con sentencias DELETE por lotes de IDs, sin
+        cargarlos. Sus pedidos e items los elimina la base (ON DELETE CASCADE).
+        Retorna la cantidad de clientes eliminados.
+        """
+        try:
+            eliminados = 0
+            for lote in en_lotes(sorted(set(cliente_ids))):
+                archivados = select(PedidoArchivado.id).where(PedidoArchivado.cliente_id.in_(lote))
+                db.execute(
+                    delete(ItemPedidoArchivado).where(ItemPedidoArchivado.pedido_id.in_(archivados))
+                    .execution_options(synchronize_session=False)
+                )
+                db.execute(
+                    delete(PedidoArchivado).where(PedidoArchivado.cliente_id.in_(lote))
+                    .execution_options(synchronize_session=False)
+                )
+                eliminados += db.execute(
+                    delete(Cliente).where(Cliente.id.in_(lote)).execution_options(synchronize_session=False)
+                ).rowcount
+                registrar_cambio(db, "clientes", "eliminar", lote)
+            
+            if eliminados:
+                VersionCRUD.incrementar(db, "pedidos")
+            db.commit()
+            return eliminados
+        except SQLAlchemyError as e:
+            db.rollback()
+            raise Exception(f"Error al eliminar clientes: {str(e)}")
+
+    @staticmethod
+    def recalcular_estadisticas(db: Session, cliente_ids: Iterable[int] = None) -> None:
+        """
+        Recalcula desde los pedidos (activos y archivados) los contadores de
+        los clientes indicados (o de todos si cliente_ids es None) con un
+        UPDATE por lote de IDs.
+        No hace commit: se llama dentro de la transacción de la escritura
+        que modifica los pedidos.
+        """
+        if cliente_ids is not None:
+            cliente_ids = {i for i in cliente_ids if i is not None}
+            if not cliente_ids:
+                return
+        db.flush()  # Los cambios pendientes de la sesión deben verse en las subconsultas
+
+        # Cada contador suma la parte de los pedidos activos y la de los archivados
+        def activos(columna):
+            return select(columna).where(Pedido.cliente_id == Cliente.id).scalar_subquery()
+
+        def archivados(columna):
+            return select(columna).where(PedidoArchivado.cliente_id == Cliente.id).scalar_subquery()
+
+        gastado_activos = (
+            select(func.coalesce(func.sum(ItemPedido.cantidad * Menu.precio), 0.0))
+            .select_from(Pedido)
+            .join(ItemPedido, ItemPedido.pedido_id == Pedido.id)
+            .join(Menu, Menu.id == ItemPedido.menu_id)
+            .where(Pedido.cliente_id == Cliente.id)
+            .scalar_subquery()
+        )
+        gastado_archivados = (
+            select(func.coalesce(func.sum(ItemPedidoArchivado.cantidad * ItemPedidoArchivado.precio_unitario), 0.0))
+            .select_from(PedidoArchivado)
+            .join(ItemPedidoArchivado, ItemPedidoArchivado.pedido_id == PedidoArchivado.id)
+            .where(PedidoArchivado.cliente_id == Cliente.id)
+            .scalar_subquery()
+        )
+        primer = [activos(func.min(Pedido.fecha)), archivados(func.min(PedidoArchivado.fecha))]
+        ultimo = [activos(func.max(Pedido.fecha)), archivados(func.max(PedidoArchivado.fecha))]
+        sentencia = update(Cliente).values(
+            total_pedidos=activos(func.count(Pedido.id)) + archivados(func.count(PedidoArchivado.id)),
+            total_gastado=gastado_activos + gastado_archivados,
+            # min()/max() escalares de SQLite retornan NULL si algún argumento es NULL
+            primer_pedido=func.min(func.coalesce(*primer), func.coalesce(*reversed(primer))),
+            ultimo_pedido=func.max(func.coalesce(*ultimo), func.coalesce(*reversed(ultimo))),
+        )
+        sentencia = sentencia.execution_options(synchronize_session=False)
+        if cliente_ids is None:
+            db.execute(sentencia)
+        else:
+            for lote in en_lotes(sorted(cliente_ids)):
+                db.execute(sentencia.where(Cliente.id.in_(lote)))
+        registrar_cambio(db, "clientes", "actualizar", cliente_ids)
+        # Los objetos Cliente ya cargados deben releer los contadores
+        for objeto in db.identity_map.values():
+            if isinstance(objeto, Cliente) and (cliente_ids is None or objeto.id in cliente_ids):
+                db.expire(objeto, ["total_pedidos", "total_gastado", "primer_pedido", "ultimo_pedido"])
@@ -0,0 +1,83 @@
+"""
+Control de concurrencia optimista.
+
+Ingrediente, Menu y Pedido tienen una columna `version` (version_id_col del
+mapper): cada UPDATE del ORM incluye "WHERE version = <leída>" y la
+incrementa, y si otra terminal la cambió entre la lectura y la escritura no
+coincide ninguna fila y SQLAlchemy lanza StaleDataError. con_reintentos()
+repite entonces la operación completa (lectura, cambio y commit) sobre los
+datos nuevos, hasta MAX_INTENTOS veces, sin bloquear a los demás escritores.
+"""
+import random
+import threading
+import time
+from typing import Callable, Dict, List, TypeVar
+
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
+
+MAX_INTENTOS = 8
+# Espera base antes de reintentar, en segundos (se duplica en cada intento)
+ESPERA_BASE = 0.002
+
+T = TypeVar("T")
+
+
+class MetricasConflictos:
+    """Contadores por operación de conflictos de versión y reintentos"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._operaciones: Dict[str, Dict[str, int]] = {}
+
+    def registrar(self, operacion: str, conflictos: int, exito: bool) -> None:
+        with self._lock:
+            fila = self._operaciones.setdefault(
+                operacion, {"llamadas": 0, "conflictos": 0, "resueltas": 0, "agotadas": 0}
+            )
+            fila["llamadas"] += 1
+            fila["conflictos"] += conflictos
+            if conflictos and exito:
+                fila["resueltas"] += 1
+            elif not exito:
+                fila["agotadas"] += 1
+
+    def resumen(self) -> List[Dict]:
+        """Una fila por operación con conflictos, ordenadas de mayor a menor cantidad"""
+        with self._lock:
+            filas = [dict(operacion=nombre, **valores) for nombre, valores in self._operaciones.items()
+                     if valores["conflictos"]]
+        return sorted(filas, key=lambda f: f["conflictos"], reverse=True)
+
+    def reiniciar(self) -> None:
+        with self._lock:
+            self._operaciones.clear()
+
+
+# Instancia compartida por la aplicación
+metricas_conflictos = MetricasConflictos()
+
+
+def con_reintentos(db: Session, operacion: str, funcion: Callable[[], T], intentos: int = MAX_INTENTOS) -> T:
+    """
+    Ejecuta funcion() (que lee, modifica y hace commit) y la repite si otra
+    transacción modificó los mismos registros. Tras `intentos` conflictos
+    lanza StaleDataError.
+    """
+    conflictos = 0
+    while True:
+        try:
+            resultado = funcion()
+        except StaleDataError:
+            db.rollback()
+            conflictos += 1
+            if conflictos >= intentos:
+                metricas_conflictos.registrar(operacion, conflictos, False)
+                raise StaleDataError(
+                    f"Los datos fueron modificados por otra terminal ({conflictos} intentos)"
+                )
+            # Espera exponencial con variación aleatoria para no chocar de nuevo
+            time.sleep(ESPERA_BASE * 2 ** (conflictos - 1) * random.uniform(0.5, 1.5))
+            continue
+        metricas_conflictos.registrar(operacion, conflictos, True)
+        return resultado
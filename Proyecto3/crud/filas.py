@@ -0,0 +1,58 @@
+"""
+Filas livianas de solo lectura para listados, exportaciones y estadísticas.
+
+Los métodos listar_* de los CRUD seleccionan sólo las columnas que se
+muestran y construyen estas tuplas con nombre en vez de objetos del ORM
+(sin estado de instancia, sin identity map y sin carga diferida). Los
+campos se llaman igual que los atributos del modelo, así el mismo código
+sirve para una fila o para un objeto del ORM.
+
+Son inmutables y no están asociadas a una sesión: para modificar un
+registro se usan los métodos del CRUD con su ID.
+"""
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+
+class FilaCliente(NamedTuple):
+    id: int
+    rut: str
+    nombre: str
+    correo: Optional[str]
+    total_pedidos: int
+    total_gastado: float
+    primer_pedido: Optional[datetime]
+    ultimo_pedido: Optional[datetime]
+
+
+class FilaIngrediente(NamedTuple):
+    id: int
+    nombre: str
+    stock: float
+    unidad: str
+    stock_minimo: Optional[float]
+    stock_critico: Optional[float]
+
+
+class FilaMenu(NamedTuple):
+    id: int
+    nombre: str
+    precio: float
+    categoria: Optional[str]
+    disponible: int
+
+
+class FilaPedido(NamedTuple):
+    """Pedido con el nombre del cliente, el total y la cantidad de items ya calculados en SQL"""
+    id: int
+    cliente_id: int
+    cliente_nombre: str
+    fecha: Optional[datetime]
+    estado: str
+    total: float
+    cantidad_items: int
+
+
+def columnas(modelo, tipo_fila) -> list:
+    """Columnas del modelo que corresponden a los campos de la fila, en el mismo orden"""
+    return [getattr(modelo, campo) for campo in tipo_fila._fields]
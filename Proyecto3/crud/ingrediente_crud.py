@@ -1,12 +1,32 @@
 from sqlalchemy.orm import Session
+from sqlalchemy import bindparam, select
 from sqlalchemy.exc import SQLAlchemyError
 from models import Ingrediente
-from typing import List, Optional
+from crud.concurrencia import con_reintentos
+from crud.filas import FilaIngrediente, columnas
+from database import en_lotes
+from typing import Iterable, List, Optional
 import csv
 
+
+# Búsqueda frecuente armada una sola vez: su clave de caché y su SQL compilado
+# se reutilizan y en cada llamada sólo cambia el parámetro
+_INGREDIENTE_POR_NOMBRE = select(Ingrediente).where(Ingrediente.nombre == bindparam("nombre"))
+
+
 class IngredienteCRUD:
     @staticmethod
-    def crear_ingrediente(db: Session, nombre: str, stock: float, unidad: str) -> Ingrediente:
+    def validar_umbrales(stock_minimo: Optional[float], stock_critico: Optional[float]) -> None:
+        """Los umbrales son opcionales, no negativos y el crítico no supera al mínimo"""
+        for nombre, umbral in (("mínimo", stock_minimo), ("crítico", stock_critico)):
+            if umbral is not None and umbral < 0:
+                raise ValueError(f"El stock {nombre} no puede ser negativo")
+        if stock_minimo is not None and stock_critico is not None and stock_critico > stock_minimo:
+            raise ValueError("El stock crítico no puede ser mayor que el stock mínimo")
+
+    @staticmethod
+    def crear_ingrediente(db: Session, nombre: str, stock: float, unidad: str,
+                          stock_minimo: float = None, stock_critico: float = None) -> Ingrediente:
         try:
             # Validar que el nombre no esté vacío
             if not nombre or not nombre.strip():
@@ -19,18 +39,18 @@ class IngredienteCRUD:
             # Validar que la unidad no esté vacía
             if not unidad or not unidad.strip():
                 raise ValueError("La unidad no puede estar vacía")
+            IngredienteCRUD.validar_umbrales(stock_minimo, stock_critico)
             
             # Verificar que el ingrediente no esté duplicado
-            ingrediente_existente = db.query(Ingrediente).filter(
-                Ingrediente.nombre == nombre.strip()
-            ).first()
-            if ingrediente_existente:
+            if db.execute(_INGREDIENTE_POR_NOMBRE, {"nombre": nombre.strip()}).scalar_one_or_none():
                 raise ValueError(f"El ingrediente '{nombre}' ya existe")
             
             ingrediente = Ingrediente(
                 nombre=nombre.strip(),
                 stock=stock,
-                unidad=unidad.strip()
+                unidad=unidad.strip(),
+                stock_minimo=stock_minimo,
+                stock_critico=stock_critico
             )
             db.add(ingrediente)
             db.commit()
@@ -43,29 +63,49 @@ class IngredienteCRUD:
     @staticmethod
     def obtener_ingrediente_por_id(db: Session, ingrediente_id: int) -> Optional[Ingrediente]:
         try:
-            return db.query(Ingrediente).filter(Ingrediente.id == ingrediente_id).first()
+            return db.get(Ingrediente, ingrediente_id)
         except SQLAlchemyError as e:
             raise Exception(f"Error al obtener ingrediente: {str(e)}")
     
     @staticmethod
     def obtener_ingrediente_por_nombre(db: Session, nombre: str) -> Optional[Ingrediente]:
         try:
-            return db.query(Ingrediente).filter(Ingrediente.nombre == nombre).first()
+            return db.execute(_INGREDIENTE_POR_NOMBRE, {"nombre": nombre}).scalar_one_or_none()
         except SQLAlchemyError as e:
             raise Exception(f"Error al buscar ingrediente: {str(e)}")
     
     @staticmethod
     def obtener_todos_ingredientes(db: Session) -> List[Ingrediente]:
         try:
-            return db.query(Ingrediente).all()
+            return db.scalars(select(Ingrediente)).all()
+        except SQLAlchemyError as e:
+            raise Exception(f"Error al obtener ingredientes: {str(e)}")
+    
+    @staticmethod
+    def listar_ingredientes(db: Session, ingrediente_ids: Iterable[int] = None) -> List[FilaIngrediente]:
+        """Ingredientes (todos o los indicados) como filas livianas de solo lectura"""
+        try:
+            consulta = select(*columnas(Ingrediente, FilaIngrediente)).order_by(Ingrediente.id)
+            if ingrediente_ids is None:
+                return list(map(FilaIngrediente._make, db.execute(consulta)))
+            return [FilaIngrediente._make(fila) for lote in en_lotes(sorted(set(ingrediente_ids)))
+                    for fila in db.execute(consulta.where(Ingrediente.id.in_(lote)))]
+        except SQLAlchemyError as e:
+            raise Exception(f"Error al listar ingredientes: {str(e)}")
+    
+    @staticmethod
+    def obtener_ingredientes_por_ids(db: Session, ingrediente_ids: Iterable[int]) -> List[Ingrediente]:
+        try:
+            return [i for lote in en_lotes(sorted(set(ingrediente_ids)))
+                    for i in db.scalars(select(Ingrediente).where(Ingrediente.id.in_(lote)))]
         except SQLAlchemyError as e:
             raise Exception(f"Error al obtener ingredientes: {str(e)}")
     
     @staticmethod
     def actualizar_ingrediente(db: Session, ingrediente_id: int, nombre: str = None, 
                               stock: float = None, unidad: str = None) -> Optional[Ingrediente]:
-        try:
-            ingrediente = db.query(Ingrediente).filter(Ingrediente.id == ingrediente_id).first()
+        def operacion():
+            ingrediente = db.get(Ingrediente, ingrediente_id)
             if not ingrediente:
                 return None
             
@@ -73,10 +113,11 @@ class IngredienteCRUD:
                 if not nombre.strip():
                     raise ValueError("El nombre del ingrediente no puede estar vacío")
                 # Verificar que no exista otro ingrediente con el mismo nombre
-                nombre_existente = db.query(Ingrediente).filter(
-                    Ingrediente.nombre == nombre.strip(),
-                    Ingrediente.id != ingrediente_id
-                ).first()
+                nombre_existente = db.scalar(
+                    select(Ingrediente.id)
+                    .where(Ingrediente.nombre == nombre.strip(), Ingrediente.id != ingrediente_id)
+                    .limit(1)
+                )
                 if nombre_existente:
                     raise ValueError(f"Ya existe un ingrediente con el nombre '{nombre}'")
                 ingrediente.nombre = nombre.strip()
@@ -94,14 +135,17 @@ class IngredienteCRUD:
             db.commit()
             db.refresh(ingrediente)
             return ingrediente
+
+        try:
+            return con_reintentos(db, "IngredienteCRUD.actualizar_ingrediente", operacion)
         except (SQLAlchemyError, ValueError) as e:
             db.rollback()
             raise Exception(f"Error al actualizar ingrediente: {str(e)}")
     
     @staticmethod
     def actualizar_stock(db: Session, ingrediente_id: int, cantidad: float) -> Optional[Ingrediente]:
-        try:
-            ingrediente = db.query(Ingrediente).filter(Ingrediente.id == ingrediente_id).first()
+        def operacion():
+            ingrediente = db.get(Ingrediente, ingrediente_id)
             if not ingrediente:
                 return None
             
@@ -115,14 +159,39 @@ class IngredienteCRUD:
             db.commit()
             db.refresh(ingrediente)
             return ingrediente
+
+        try:
+            return con_reintentos(db, "IngredienteCRUD.actualizar_stock", operacion)
         except SQLAlchemyError as e:
             db.rollback()
             raise Exception(f"Error al actualizar stock: {str(e)}")
     
+    @staticmethod
+    def fijar_umbrales(db: Session, ingrediente_id: int, stock_minimo: Optional[float],
+                       stock_critico: Optional[float]) -> Optional[Ingrediente]:
+        """Fija los umbrales de reposición del ingrediente (None quita el umbral)"""
+        def operacion():
+            IngredienteCRUD.validar_umbrales(stock_minimo, stock_critico)
+            ingrediente = db.get(Ingrediente, ingrediente_id)
+            if not ingrediente:
+                return None
+            
+            ingrediente.stock_minimo = stock_minimo
+            ingrediente.stock_critico = stock_critico
+            db.commit()
+            db.refresh(ingrediente)
+            return ingrediente
+
+        try:
+            return con_reintentos(db, "IngredienteCRUD.fijar_umbrales", operacion)
+        except (SQLAlchemyError, ValueError) as e:
+            db.rollback()
+            raise Exception(f"Error al fijar umbrales: {str(e)}")
+    
     @staticmethod
     def eliminar_ingrediente(db: Session, ingrediente_id: int) -> bool:
         try:
-            ingrediente = db.query(Ingrediente).filter(Ingrediente.id == ingrediente_id).first()
+            ingrediente = db.get(Ingrediente, ingrediente_id)
             if not ingrediente:
                 return False
             
@@ -136,7 +205,7 @@ class IngredienteCRUD:
     @staticmethod
     def verificar_stock_disponible(db: Session, ingrediente_id: int, cantidad_requerida: float) -> bool:
         try:
-            ingrediente = db.query(Ingrediente).filter(Ingrediente.id == ingrediente_id).first()
+            ingrediente = db.get(Ingrediente, ingrediente_id)
             if not ingrediente:
                 return False
             
@@ -148,6 +217,8 @@ class IngredienteCRUD:
     def cargar_desde_csv(db: Session, archivo_csv: str) -> dict:
         """
         Carga ingredientes desde un archivo CSV.
+        Las columnas stock_minimo y stock_critico son opcionales (vacías =
+        sin umbral en los nuevos, sin cambios en los existentes).
         Retorna un diccionario con estadísticas de la carga.
         """
         resultados = {
@@ -186,22 +257,39 @@ class IngredienteCRUD:
                         if not unidad:
                             raise ValueError("Unidad vacía")
                         
+                        umbrales = {}
+                        for columna in ('stock_minimo', 'stock_critico'):
+                            valor = (fila.get(columna) or '').strip()
+                            if valor:
+                                try:
+                                    umbrales[columna] = float(valor)
+                                except ValueError:
+                                    raise ValueError(f"{columna} inválido: '{valor}'")
+                        
                         # Verificar si el ingrediente ya existe
-                        ingrediente_existente = db.query(Ingrediente).filter(
-                            Ingrediente.nombre == nombre
-                        ).first()
+                        ingrediente_existente = db.execute(
+                            _INGREDIENTE_POR_NOMBRE, {"nombre": nombre}
+                        ).scalar_one_or_none()
                         
                         if ingrediente_existente:
                             # Actualizar stock del ingrediente existente
+                            IngredienteCRUD.validar_umbrales(
+                                umbrales.get('stock_minimo', ingrediente_existente.stock_minimo),
+                                umbrales.get('stock_critico', ingrediente_existente.stock_critico)
+                            )
                             ingrediente_existente.stock = stock
                             ingrediente_existente.unidad = unidad
+                            for columna, valor in umbrales.items():
+                                setattr(ingrediente_existente, columna, valor)
                             resultados['mensajes'].append(f"Fila {fila_num}: Actualizado '{nombre}'")
                         else:
                             # Crear nuevo ingrediente
+                            IngredienteCRUD.validar_umbrales(umbrales.get('stock_minimo'), umbrales.get('stock_critico'))
                             nuevo_ingrediente = Ingrediente(
                                 nombre=nombre,
                                 stock=stock,
-                                unidad=unidad
+                                unidad=unidad,
+                                **umbrales
                             )
                             db.add(nuevo_ingrediente)
                             resultados['mensajes'].append(f"Fila {fila_num}: Creado '{nombre}'")
@@ -1,9 +1,56 @@
 from sqlalchemy.orm import Session
+from sqlalchemy import delete, func, select, update
 from sqlalchemy.exc import SQLAlchemyError
-from models import Menu, Ingrediente
-from typing import Optional, List, Dict
+from models import Menu, Pedido, ItemPedido
+from crud.version_crud import VersionCRUD
+from crud.concurrencia import con_reintentos
+from crud.filas import FilaMenu, columnas
+from crud.cliente_crud import ClienteCRUD
+from crud.ingrediente_crud import _INGREDIENTE_POR_NOMBRE
+from eventos import registrar_cambio
+from database import en_lotes
+from typing import Iterable, Optional, List, Dict
 
 class MenuCRUD:
+    @staticmethod
+    def _clientes_del_menu(db: Session, *menu_ids: int) -> List[int]:
+        """IDs de los clientes con algún pedido que incluye alguno de los menús"""
+        return db.scalars(
+            select(Pedido.cliente_id).join(ItemPedido, ItemPedido.pedido_id == Pedido.id)
+            .where(ItemPedido.menu_id.in_(menu_ids)).distinct()
+        ).all()
+
+    @staticmethod
+    def _filtro_menus(categoria: str = None, menu_ids: Iterable[int] = None) -> List[list]:
+        """
+        Condiciones WHERE de una operación masiva: por categoría, por IDs o
+        ambas. Una lista de condiciones por lote de IDs (SQLite limita los
+        parámetros por sentencia); una sola si no se indican IDs.
+        """
+        if categoria is None and menu_ids is None:
+            raise ValueError("Indique una categoría o una lista de menús")
+        filtros = [Menu.categoria == categoria] if categoria is not None else []
+        if menu_ids is None:
+            return [filtros]
+        return [filtros + [Menu.id.in_(lote)] for lote in en_lotes(sorted(set(menu_ids)))]
+
+    @staticmethod
+    def _actualizar_en_bloque(db: Session, lotes: List[list], **valores) -> int:
+        """
+        Un UPDATE por lote sobre los menús filtrados. Incrementa la versión de
+        cada menú para que las ediciones individuales en curso detecten el
+        cambio; los objetos Menu ya cargados releen los campos.
+        """
+        ids = [menu_id for filtros in lotes for menu_id in db.execute(
+            update(Menu).where(*filtros).values(version=Menu.version + 1, **valores)
+            .returning(Menu.id).execution_options(synchronize_session=False)
+        ).scalars()]
+        for objeto in db.identity_map.values():
+            if isinstance(objeto, Menu):
+                db.expire(objeto, list(valores) + ["version"])
+        registrar_cambio(db, "menus", "actualizar", ids)
+        return len(ids)
+
     @staticmethod
     def crear_menu(db: Session, nombre: str, descripcion: str, precio: float, 
                    categoria: str = None, disponible: bool = True, 
@@ -35,9 +82,7 @@ class MenuCRUD:
                         raise ValueError(f"La cantidad del ingrediente '{ingrediente}' debe ser mayor que cero")
                     
                     # Validar que el ingrediente exista en la base de datos
-                    ingrediente_db = db.query(Ingrediente).filter(
-                        Ingrediente.nombre == ingrediente
-                    ).first()
+                    ingrediente_db = db.execute(_INGREDIENTE_POR_NOMBRE, {"nombre": ingrediente}).scalar_one_or_none()
                     if not ingrediente_db:
                         raise ValueError(f"El ingrediente '{ingrediente}' no existe en la base de datos")
                     
@@ -58,6 +103,7 @@ class MenuCRUD:
                 receta=receta
             )
             db.add(nuevo_menu)
+            VersionCRUD.incrementar(db, "menus")
             db.commit()
             db.refresh(nuevo_menu)
             return nuevo_menu
@@ -68,28 +114,48 @@ class MenuCRUD:
     @staticmethod
     def obtener_menu_por_id(db: Session, menu_id: int) -> Optional[Menu]:
         try:
-            return db.query(Menu).filter(Menu.id == menu_id).first()
+            return db.get(Menu, menu_id)
         except SQLAlchemyError as e:
             raise Exception(f"Error al obtener menú: {str(e)}")
     
     @staticmethod
     def obtener_todos_menus(db: Session) -> List[Menu]:
         try:
-            return db.query(Menu).all()
+            return db.scalars(select(Menu)).all()
+        except SQLAlchemyError as e:
+            raise Exception(f"Error al obtener menús: {str(e)}")
+    
+    @staticmethod
+    def listar_menus(db: Session, menu_ids: Iterable[int] = None) -> List[FilaMenu]:
+        """Menús (todos o los indicados) como filas livianas de solo lectura, sin la receta"""
+        try:
+            consulta = select(*columnas(Menu, FilaMenu)).order_by(Menu.id)
+            if menu_ids is None:
+                return list(map(FilaMenu._make, db.execute(consulta)))
+            return [FilaMenu._make(fila) for lote in en_lotes(sorted(set(menu_ids)))
+                    for fila in db.execute(consulta.where(Menu.id.in_(lote)))]
+        except SQLAlchemyError as e:
+            raise Exception(f"Error al listar menús: {str(e)}")
+    
+    @staticmethod
+    def obtener_menus_por_ids(db: Session, menu_ids: Iterable[int]) -> List[Menu]:
+        try:
+            return [m for lote in en_lotes(sorted(set(menu_ids)))
+                    for m in db.scalars(select(Menu).where(Menu.id.in_(lote)))]
         except SQLAlchemyError as e:
             raise Exception(f"Error al obtener menús: {str(e)}")
     
     @staticmethod
     def obtener_menus_disponibles(db: Session) -> List[Menu]:
         try:
-            return db.query(Menu).filter(Menu.disponible == 1).all()
+            return db.scalars(select(Menu).where(Menu.disponible == 1)).all()
         except SQLAlchemyError as e:
             raise Exception(f"Error al obtener menús disponibles: {str(e)}")
     
     @staticmethod
     def obtener_menus_por_categoria(db: Session, categoria: str) -> List[Menu]:
         try:
-            return db.query(Menu).filter(Menu.categoria == categoria).all()
+            return db.scalars(select(Menu).where(Menu.categoria == categoria)).all()
         except SQLAlchemyError as e:
             raise Exception(f"Error al obtener menús por categoría: {str(e)}")
     
@@ -98,8 +164,8 @@ class MenuCRUD:
                        descripcion: str = None, precio: float = None,
                        categoria: str = None, disponible: bool = None,
                        receta: Dict[str, float] = None) -> Optional[Menu]:
-        try:
-            menu = db.query(Menu).filter(Menu.id == menu_id).first()
+        def operacion():
+            menu = db.get(Menu, menu_id)
             if not menu:
                 return None
             
@@ -107,7 +173,12 @@ class MenuCRUD:
                 menu.nombre = nombre
             if descripcion is not None:
                 menu.descripcion = descripcion
+            # Un cambio de precio cambia el gasto acumulado de quienes lo pidieron
+            clientes_afectados = []
             if precio is not None:
+                if precio != menu.precio:
+                    clientes_afectados = MenuCRUD._clientes_del_menu(db, menu_id)
+                    registrar_cambio(db, "pedidos", "actualizar")
                 menu.precio = precio
             if categoria is not None:
                 menu.categoria = categoria
@@ -116,24 +187,33 @@ class MenuCRUD:
             if receta is not None:
                 menu.receta = receta
             
+            ClienteCRUD.recalcular_estadisticas(db, clientes_afectados)
+            VersionCRUD.incrementar(db, "menus")
             db.commit()
             db.refresh(menu)
             return menu
+
+        try:
+            return con_reintentos(db, "MenuCRUD.actualizar_menu", operacion)
         except SQLAlchemyError as e:
             db.rollback()
             raise Exception(f"Error al actualizar menú: {str(e)}")
     
     @staticmethod
     def cambiar_disponibilidad(db: Session, menu_id: int, disponible: bool) -> Optional[Menu]:
-        try:
-            menu = db.query(Menu).filter(Menu.id == menu_id).first()
+        def operacion():
+            menu = db.get(Menu, menu_id)
             if not menu:
                 return None
             
             menu.disponible = 1 if disponible else 0
+            VersionCRUD.incrementar(db, "menus")
             db.commit()
             db.refresh(menu)
             return menu
+
+        try:
+            return con_reintentos(db, "MenuCRUD.cambiar_disponibilidad", operacion)
         except SQLAlchemyError as e:
             db.rollback()
             raise Exception(f"Error al cambiar disponibilidad: {str(e)}")
@@ -141,13 +221,120 @@ class MenuCRUD:
     @staticmethod
     def eliminar_menu(db: Session, menu_id: int) -> bool:
         try:
-            menu = db.query(Menu).filter(Menu.id == menu_id).first()
+            menu = db.get(Menu, menu_id)
             if not menu:
                 return False
             
+            clientes_afectados = MenuCRUD._clientes_del_menu(db, menu_id)
             db.delete(menu)
+            ClienteCRUD.recalcular_estadisticas(db, clientes_afectados)
+            # Los items de pedido del menú los elimina la base (ON DELETE CASCADE)
+            VersionCRUD.incrementar(db, "menus", "pedidos")
             db.commit()
             return True
         except SQLAlchemyError as e:
             db.rollback()
-            raise Exception(f"Error al eliminar menú: {str(e)}")
\ No newline at end of file
+            raise Exception(f"Error al eliminar menú: {str(e)}")
+    
+    @staticmethod
+    def eliminar_menus(db: Session, menu_ids: Iterable[int]) -> int:
+        """
+        Elimina varios menús con sentencias DELETE por lotes de IDs, sin
+        cargarlos. Los items de pedido de esos menús los elimina la base
+        (ON DELETE CASCADE). Retorna la cantidad de menús eliminados.
+        """
+        try:
+            eliminados = 0
+            clientes_afectados = set()
+            for lote in en_lotes(sorted(set(menu_ids))):
+                clientes_afectados.update(MenuCRUD._clientes_del_menu(db, *lote))
+                eliminados += db.execute(
+                    delete(Menu).where(Menu.id.in_(lote)).execution_options(synchronize_session=False)
+                ).rowcount
+                registrar_cambio(db, "menus", "eliminar", lote)
+            
+            if eliminados:
+                ClienteCRUD.recalcular_estadisticas(db, clientes_afectados)
+                VersionCRUD.incrementar(db, "menus", "pedidos")
+            db.commit()
+            return eliminados
+        except SQLAlchemyError as e:
+            db.rollback()
+            raise Exception(f"Error al eliminar menús: {str(e)}")
+
+    @staticmethod
+    def cambiar_disponibilidad_categoria(db: Session, categoria: str, disponible: bool) -> int:
+        """Habilita o deshabilita todos los menús de una categoría. Retorna la cantidad de menús"""
+        try:
+            modificados = MenuCRUD._actualizar_en_bloque(
+                db, MenuCRUD._filtro_menus(categoria), disponible=1 if disponible else 0
+            )
+            if modificados:
+                VersionCRUD.incrementar(db, "menus")
+            db.commit()
+            return modificados
+        except (SQLAlchemyError, ValueError) as e:
+            db.rollback()
+            raise Exception(f"Error al cambiar disponibilidad: {str(e)}")
+
+    @staticmethod
+    def ajustar_precios(db: Session, porcentaje: float = None, monto: float = None,
+                        categoria: str = None, menu_ids: Iterable[int] = None) -> int:
+        """
+        Aplica a los menús de una categoría y/o de una lista de IDs un cambio
+        de precio porcentual (porcentaje=10 sube un 10%) o absoluto
+        (monto=-500 baja 500). Retorna la cantidad de menús modificados.
+        """
+        try:
+            if (porcentaje is None) == (monto is None):
+                raise ValueError("Indique un porcentaje o un monto, no ambos")
+            lotes = MenuCRUD._filtro_menus(categoria, menu_ids)
+            if porcentaje is not None:
+                nuevo_precio = func.round(Menu.precio * (1 + porcentaje / 100.0), 2)
+            else:
+                nuevo_precio = func.round(Menu.precio + monto, 2)
+
+            invalidos = sum(db.scalar(select(func.count(Menu.id)).where(*filtros, nuevo_precio <= 0))
+                            for filtros in lotes)
+            if invalidos:
+                raise ValueError(f"El cambio deja {invalidos} menús con precio menor o igual a cero")
+
+            # El gasto acumulado de quienes pidieron esos menús cambia con el precio
+            clientes_afectados = set()
+            for filtros in lotes:
+                clientes_afectados.update(db.scalars(
+                    select(Pedido.cliente_id).join(ItemPedido, ItemPedido.pedido_id == Pedido.id)
+                    .where(ItemPedido.menu_id.in_(select(Menu.id).where(*filtros))).distinct()
+                ))
+            modificados = MenuCRUD._actualizar_en_bloque(db, lotes, precio=nuevo_precio)
+            if modificados:
+                ClienteCRUD.recalcular_estadisticas(db, clientes_afectados)
+                # Cambian los totales de los pedidos con esos menús
+                registrar_cambio(db, "pedidos", "actualizar")
+                VersionCRUD.incrementar(db, "menus")
+            db.commit()
+            return modificados
+        except (SQLAlchemyError, ValueError) as e:
+            db.rollback()
+            raise Exception(f"Error al ajustar precios: {str(e)}")
+
+    @staticmethod
+    def reasignar_categoria(db: Session, categoria_nueva: str, categoria: str = None,
+                            menu_ids: Iterable[int] = None) -> int:
+        """
+        Mueve a `categoria_nueva` los menús de `categoria` y/o de una lista de
+        IDs (categoria_nueva vacía deja los menús sin categoría). Retorna la
+        cantidad de menús modificados.
+        """
+        try:
+            categoria_nueva = categoria_nueva.strip() if categoria_nueva and categoria_nueva.strip() else None
+            modificados = MenuCRUD._actualizar_en_bloque(
+                db, MenuCRUD._filtro_menus(categoria, menu_ids), categoria=categoria_nueva
+            )
+            if modificados:
+                VersionCRUD.incrementar(db, "menus")
+            db.commit()
+            return modificados
+        except (SQLAlchemyError, ValueError) as e:
+            db.rollback()
+            raise Exception(f"Error al reasignar categoría: {str(e)}")
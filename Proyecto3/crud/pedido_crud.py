@@ -1,9 +1,31 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.orm.attributes import flag_modified
+from sqlalchemy.orm.exc import StaleDataError
+from sqlalchemy import case, delete, func, select, update
 from sqlalchemy.exc import SQLAlchemyError
-from models import Pedido, ItemPedido, Cliente, Menu
-from typing import List, Optional, Dict
+from models import Pedido, ItemPedido, Cliente, Menu, Ingrediente
+from crud.version_crud import VersionCRUD
+from crud.concurrencia import con_reintentos
+from crud.filas import FilaPedido
+from crud.cliente_crud import ClienteCRUD
+from tiempos_preparacion import TiemposPreparacion
+from eventos import registrar_cambio
+from database import en_lotes
+from datetime import date, datetime, timedelta
+from typing import Iterable, List, Optional, Dict, Tuple
+
+ESTADOS_PEDIDO = ("Pendiente", "En preparación", "Completado")
 
 class PedidoCRUD:
+    @staticmethod
+    def _versionar(pedido: Pedido) -> None:
+        """
+        Incluye el pedido en el UPDATE aunque sólo cambien sus items, para
+        que su versión aumente y una edición simultánea del mismo pedido en
+        otra terminal falle (y se reintente) en vez de pisar esta.
+        """
+        flag_modified(pedido, "estado")
+
     @staticmethod
     def crear_pedido(db: Session, cliente_id: int, items: List[Dict]) -> Optional[Pedido]:
         """
@@ -23,8 +45,7 @@ class PedidoCRUD:
                 raise ValueError("Debe seleccionar un cliente válido")
             
             # Verificar que el cliente existe
-            cliente = db.query(Cliente).filter(Cliente.id == cliente_id).first()
-            if not cliente:
+            if not db.get(Cliente, cliente_id):
                 raise ValueError(f"Cliente con ID {cliente_id} no existe")
             
             # Validar que se hayan agregado productos
@@ -49,8 +70,8 @@ class PedidoCRUD:
                 if cantidad <= 0:
                     raise ValueError(f"La cantidad debe ser mayor que cero")
                 
-                # Verificar que el menú existe
-                menu = db.query(Menu).filter(Menu.id == menu_id).first()
+                # Verificar que el menú existe (un menú repetido se toma del identity map sin consultar)
+                menu = db.get(Menu, menu_id)
                 if not menu:
                     raise ValueError(f"Menú con ID {menu_id} no existe")
                 
@@ -66,6 +87,9 @@ class PedidoCRUD:
                 )
                 db.add(item_pedido)
             
+            TiemposPreparacion.registrar_estado(db, nuevo_pedido, None, nuevo_pedido.fecha)
+            ClienteCRUD.recalcular_estadisticas(db, [cliente_id])
+            VersionCRUD.incrementar(db, "pedidos")
             db.commit()
             db.refresh(nuevo_pedido)
             return nuevo_pedido
@@ -78,7 +102,7 @@ class PedidoCRUD:
     def obtener_pedido_por_id(db: Session, pedido_id: int) -> Optional[Pedido]:
         """Obtiene un pedido con todos sus items"""
         try:
-            return db.query(Pedido).filter(Pedido.id == pedido_id).first()
+            return db.get(Pedido, pedido_id)
         except SQLAlchemyError as e:
             raise Exception(f"Error al obtener pedido: {str(e)}")
     
@@ -86,7 +110,46 @@ class PedidoCRUD:
     def obtener_todos_pedidos(db: Session) -> List[Pedido]:
         """Obtiene todos los pedidos"""
         try:
-            return db.query(Pedido).all()
+            return db.scalars(select(Pedido)).all()
+        except SQLAlchemyError as e:
+            raise Exception(f"Error al obtener pedidos: {str(e)}")
+    
+    @staticmethod
+    def listar_pedidos(db: Session, pedido_ids: Iterable[int] = None) -> List[FilaPedido]:
+        """
+        Pedidos (todos o los indicados) como filas livianas de solo lectura,
+        con el nombre del cliente, el total y la cantidad de items calculados
+        en una sola consulta agrupada, sin cargar clientes, items ni menús
+        """
+        try:
+            consulta = (
+                select(
+                    Pedido.id, Pedido.cliente_id, Cliente.nombre, Pedido.fecha, Pedido.estado,
+                    func.coalesce(func.sum(ItemPedido.cantidad * Menu.precio), 0.0),
+                    func.count(ItemPedido.id),
+                )
+                .join(Cliente, Cliente.id == Pedido.cliente_id)
+                .outerjoin(ItemPedido, ItemPedido.pedido_id == Pedido.id)
+                .outerjoin(Menu, Menu.id == ItemPedido.menu_id)
+                .group_by(Pedido.id)
+                .order_by(Pedido.id)
+            )
+            if pedido_ids is None:
+                return list(map(FilaPedido._make, db.execute(consulta)))
+            return [FilaPedido._make(fila) for lote in en_lotes(sorted(set(pedido_ids)))
+                    for fila in db.execute(consulta.where(Pedido.id.in_(lote)))]
+        except SQLAlchemyError as e:
+            raise Exception(f"Error al listar pedidos: {str(e)}")
+    
+    @staticmethod
+    def obtener_pedidos_por_ids(db: Session, pedido_ids: Iterable[int]) -> List[Pedido]:
+        """Obtiene los pedidos indicados con su cliente y sus items (y el menú de cada item) ya cargados"""
+        try:
+            return [p for lote in en_lotes(sorted(set(pedido_ids)))
+                    for p in db.scalars(select(Pedido).options(
+                        selectinload(Pedido.cliente),
+                        selectinload(Pedido.items).selectinload(ItemPedido.menu),
+                    ).where(Pedido.id.in_(lote)))]
         except SQLAlchemyError as e:
             raise Exception(f"Error al obtener pedidos: {str(e)}")
     
@@ -94,35 +157,37 @@ class PedidoCRUD:
     def obtener_pedidos_por_cliente(db: Session, cliente_id: int) -> List[Pedido]:
         """Obtiene todos los pedidos de un cliente"""
         try:
-            return db.query(Pedido).filter(Pedido.cliente_id == cliente_id).all()
+            return db.scalars(select(Pedido).where(Pedido.cliente_id == cliente_id)).all()
         except SQLAlchemyError as e:
             raise Exception(f"Error al obtener pedidos del cliente: {str(e)}")
     
     @staticmethod
     def agregar_item(db: Session, pedido_id: int, menu_id: int, cantidad: int = 1) -> Optional[ItemPedido]:
         """Agrega un item a un pedido existente"""
-        try:
+        def operacion():
             # Verificar que el pedido existe
-            pedido = db.query(Pedido).filter(Pedido.id == pedido_id).first()
+            pedido = db.get(Pedido, pedido_id)
             if not pedido:
                 raise ValueError(f"Pedido con ID {pedido_id} no existe")
             
             # Verificar que el menú existe y está disponible
-            menu = db.query(Menu).filter(Menu.id == menu_id).first()
+            menu = db.get(Menu, menu_id)
             if not menu:
                 raise ValueError(f"Menú con ID {menu_id} no existe")
             if not menu.disponible:
                 raise ValueError(f"El menú '{menu.nombre}' no está disponible")
             
             # Verificar si ya existe este item en el pedido
-            item_existente = db.query(ItemPedido).filter(
-                ItemPedido.pedido_id == pedido_id,
-                ItemPedido.menu_id == menu_id
+            item_existente = db.scalars(
+                select(ItemPedido).where(ItemPedido.pedido_id == pedido_id, ItemPedido.menu_id == menu_id)
             ).first()
             
             if item_existente:
                 # Si existe, aumentar la cantidad
                 item_existente.cantidad += cantidad
+                PedidoCRUD._versionar(pedido)
+                ClienteCRUD.recalcular_estadisticas(db, [pedido.cliente_id])
+                VersionCRUD.incrementar(db, "pedidos")
                 db.commit()
                 db.refresh(item_existente)
                 return item_existente
@@ -134,10 +199,15 @@ class PedidoCRUD:
                     cantidad=cantidad
                 )
                 db.add(nuevo_item)
+                PedidoCRUD._versionar(pedido)
+                ClienteCRUD.recalcular_estadisticas(db, [pedido.cliente_id])
+                VersionCRUD.incrementar(db, "pedidos")
                 db.commit()
                 db.refresh(nuevo_item)
                 return nuevo_item
-                
+
+        try:
+            return con_reintentos(db, "PedidoCRUD.agregar_item", operacion)
         except (SQLAlchemyError, ValueError) as e:
             db.rollback()
             raise Exception(f"Error al agregar item: {str(e)}")
@@ -145,19 +215,25 @@ class PedidoCRUD:
     @staticmethod
     def actualizar_cantidad_item(db: Session, item_id: int, nueva_cantidad: int) -> Optional[ItemPedido]:
         """Actualiza la cantidad de un item específico"""
-        try:
-            item = db.query(ItemPedido).filter(ItemPedido.id == item_id).first()
+        def operacion():
+            item = db.get(ItemPedido, item_id)
             if not item:
                 return None
             
             if nueva_cantidad <= 0:
                 raise ValueError("La cantidad debe ser mayor a 0")
             
+            pedido = db.get(Pedido, item.pedido_id)
             item.cantidad = nueva_cantidad
+            PedidoCRUD._versionar(pedido)
+            ClienteCRUD.recalcular_estadisticas(db, [pedido.cliente_id])
+            VersionCRUD.incrementar(db, "pedidos")
             db.commit()
             db.refresh(item)
             return item
-            
+
+        try:
+            return con_reintentos(db, "PedidoCRUD.actualizar_cantidad_item", operacion)
         except (SQLAlchemyError, ValueError) as e:
             db.rollback()
             raise Exception(f"Error al actualizar cantidad: {str(e)}")
@@ -165,29 +241,93 @@ class PedidoCRUD:
     @staticmethod
     def eliminar_item(db: Session, item_id: int) -> bool:
         """Elimina un item específico de un pedido"""
-        try:
-            item = db.query(ItemPedido).filter(ItemPedido.id == item_id).first()
+        def operacion():
+            item = db.get(ItemPedido, item_id)
             if not item:
                 return False
             
+            pedido = db.get(Pedido, item.pedido_id)
             db.delete(item)
+            PedidoCRUD._versionar(pedido)
+            ClienteCRUD.recalcular_estadisticas(db, [pedido.cliente_id])
+            VersionCRUD.incrementar(db, "pedidos")
             db.commit()
             return True
-            
+
+        try:
+            return con_reintentos(db, "PedidoCRUD.eliminar_item", operacion)
         except SQLAlchemyError as e:
             db.rollback()
             raise Exception(f"Error al eliminar item: {str(e)}")
     
+    @staticmethod
+    def editar_pedido(db: Session, pedido_id: int, operaciones: List[Dict],
+                      descontar_stock: bool = False) -> Optional[Pedido]:
+        """
+        Aplica varias modificaciones a un pedido en una sola transacción.
+        
+        Args:
+            db: Sesión de base de datos
+            pedido_id: ID del pedido
+            operaciones: [{"accion": "agregar", "menu_id": 1, "cantidad": 2},
+                          {"accion": "cambiar", "menu_id": 3, "cantidad": 1},
+                          {"accion": "quitar", "menu_id": 4}, ...]
+            descontar_stock: Descontar (o devolver) los ingredientes de las recetas
+        
+        Returns:
+            Pedido modificado o None si no existe
+        """
+        edicion = EdicionPedido(db, pedido_id)
+        for operacion in operaciones:
+            accion = operacion.get("accion")
+            if accion == "agregar":
+                edicion.agregar(operacion.get("menu_id"), operacion.get("cantidad", 1))
+            elif accion == "cambiar":
+                edicion.cambiar_cantidad(operacion.get("menu_id"), operacion.get("cantidad"))
+            elif accion == "quitar":
+                edicion.quitar(operacion.get("menu_id"))
+            else:
+                raise Exception(f"Error al editar pedido: Acción inválida: {accion}")
+        return edicion.aplicar(descontar_stock)
+    
+    @staticmethod
+    def cambiar_estado(db: Session, pedido_id: int, estado: str) -> Optional[Pedido]:
+        """Cambia el estado de un pedido (Pendiente, En preparación, Completado)"""
+        def operacion():
+            if estado not in ESTADOS_PEDIDO:
+                raise ValueError(f"Estado inválido: {estado}")
+            
+            pedido = db.get(Pedido, pedido_id)
+            if not pedido:
+                return None
+            
+            anterior = pedido.estado
+            if estado != anterior:
+                pedido.estado = estado
+                # Historial de estados y tiempo de preparación al completarse
+                TiemposPreparacion.registrar_estado(db, pedido, anterior)
+            db.commit()
+            db.refresh(pedido)
+            return pedido
+
+        try:
+            return con_reintentos(db, "PedidoCRUD.cambiar_estado", operacion)
+        except (SQLAlchemyError, ValueError) as e:
+            db.rollback()
+            raise Exception(f"Error al cambiar estado: {str(e)}")
+    
     @staticmethod
     def eliminar_pedido(db: Session, pedido_id: int) -> bool:
         """Elimina un pedido completo con todos sus items"""
         try:
-            pedido = db.query(Pedido).filter(Pedido.id == pedido_id).first()
+            pedido = db.get(Pedido, pedido_id)
             if not pedido:
                 return False
             
-            # Los items se eliminan automáticamente por cascade
+            # Los items los elimina la base (ON DELETE CASCADE)
             db.delete(pedido)
+            ClienteCRUD.recalcular_estadisticas(db, [pedido.cliente_id])
+            VersionCRUD.incrementar(db, "pedidos")
             db.commit()
             return True
             
@@ -195,15 +335,212 @@ class PedidoCRUD:
             db.rollback()
             raise Exception(f"Error al eliminar pedido: {str(e)}")
     
+    @staticmethod
+    def eliminar_pedidos(db: Session, pedido_ids: Iterable[int] = None,
+                         desde: date = None, hasta: date = None) -> int:
+        """
+        Elimina varios pedidos por lista de IDs, por rango de fechas
+        (ambas inclusivas) o por ambos a la vez, con sentencias DELETE sin
+        cargar los pedidos. Sus items los elimina la base (ON DELETE CASCADE).
+        Retorna la cantidad de pedidos eliminados.
+        """
+        try:
+            if pedido_ids is None and desde is None and hasta is None:
+                raise ValueError("Debe indicar los IDs de los pedidos o un rango de fechas")
+            
+            condiciones = []
+            if desde:
+                condiciones.append(Pedido.fecha >= datetime.combine(desde, datetime.min.time()))
+            if hasta:
+                condiciones.append(Pedido.fecha < datetime.combine(hasta + timedelta(days=1), datetime.min.time()))
+            lotes = en_lotes(sorted(set(pedido_ids))) if pedido_ids is not None else [None]
+            
+            eliminados = 0
+            clientes = set()
+            for lote in lotes:
+                filtro = condiciones + ([Pedido.id.in_(lote)] if lote is not None else [])
+                clientes.update(db.scalars(select(Pedido.cliente_id).where(*filtro).distinct()))
+                eliminados += db.execute(
+                    delete(Pedido).where(*filtro).execution_options(synchronize_session=False)
+                ).rowcount
+                registrar_cambio(db, "pedidos", "eliminar", lote)
+            
+            if eliminados:
+                ClienteCRUD.recalcular_estadisticas(db, clientes)
+                VersionCRUD.incrementar(db, "pedidos")
+            db.commit()
+            return eliminados
+            
+        except (SQLAlchemyError, ValueError) as e:
+            db.rollback()
+            raise Exception(f"Error al eliminar pedidos: {str(e)}")
+    
     @staticmethod
     def calcular_total(db: Session, pedido_id: int) -> float:
         """Calcula el total de un pedido"""
         try:
-            pedido = db.query(Pedido).filter(Pedido.id == pedido_id).first()
+            pedido = db.get(Pedido, pedido_id)
             if not pedido:
                 return 0.0
             
             return pedido.total  # Usa la propiedad del modelo
             
         except SQLAlchemyError as e:
-            raise Exception(f"Error al calcular total: {str(e)}")
\ No newline at end of file
+            raise Exception(f"Error al calcular total: {str(e)}")
+
+
+class EdicionPedido:
+    """
+    Unidad de trabajo para editar un pedido abierto: acumula operaciones
+    sobre sus líneas (por menú) y las aplica juntas con aplicar().
+    
+        edicion = EdicionPedido(db, pedido_id)
+        edicion.agregar(menu_id, 2).cambiar_cantidad(otro_id, 1).quitar(tercer_id)
+        pedido = edicion.aplicar()
+    
+    Las operaciones se validan todas antes de escribir, las líneas repetidas
+    de un mismo menú quedan fusionadas en una sola, y los contadores del
+    cliente, las versiones y el stock se actualizan una vez con un solo commit.
+    """
+    
+    def __init__(self, db: Session, pedido_id: int):
+        self.db = db
+        self.pedido_id = pedido_id
+        self.operaciones: List[Tuple[str, int, int]] = []
+    
+    def agregar(self, menu_id: int, cantidad: int = 1) -> "EdicionPedido":
+        """Suma `cantidad` unidades del menú (crea la línea si no existe)"""
+        self.operaciones.append(("agregar", menu_id, cantidad))
+        return self
+    
+    def cambiar_cantidad(self, menu_id: int, cantidad: int) -> "EdicionPedido":
+        """Fija la cantidad de la línea del menú"""
+        self.operaciones.append(("cambiar", menu_id, cantidad))
+        return self
+    
+    def quitar(self, menu_id: int) -> "EdicionPedido":
+        """Quita la línea del menú"""
+        self.operaciones.append(("quitar", menu_id, 0))
+        return self
+    
+    def _cantidades_finales(self, actuales: Dict[int, int]) -> Dict[int, int]:
+        """Aplica las operaciones sobre las cantidades actuales por menú (0 = línea eliminada)"""
+        finales = dict(actuales)
+        for accion, menu_id, cantidad in self.operaciones:
+            if not menu_id:
+                raise ValueError("Falta el ID del menú en una de las operaciones")
+            if accion != "quitar" and (cantidad is None or cantidad <= 0):
+                raise ValueError("La cantidad debe ser mayor que cero")
+            if accion != "agregar" and not finales.get(menu_id):
+                raise ValueError(f"El pedido no tiene el menú con ID {menu_id}")
+            if accion == "agregar":
+                finales[menu_id] = finales.get(menu_id, 0) + cantidad
+            else:
+                finales[menu_id] = cantidad
+        return finales
+    
+    def _efecto_stock(self, menus: Dict[int, Menu], diferencias: Dict[int, int]) -> Dict[str, float]:
+        """Consumo neto de cada ingrediente según las recetas (negativo = se devuelve al stock)"""
+        consumo: Dict[str, float] = {}
+        for menu_id, diferencia in diferencias.items():
+            for ingrediente, cantidad in (menus[menu_id].receta or {}).items():
+                consumo[ingrediente] = consumo.get(ingrediente, 0.0) + cantidad * diferencia
+        return {nombre: cantidad for nombre, cantidad in consumo.items() if cantidad}
+    
+    def _descontar_stock(self, consumo: Dict[str, float]) -> None:
+        """Valida y aplica el consumo de todos los ingredientes con un solo UPDATE"""
+        db = self.db
+        stock = dict(db.execute(
+            select(Ingrediente.nombre, Ingrediente.stock).where(Ingrediente.nombre.in_(list(consumo)))
+        ).all())
+        for nombre, cantidad in consumo.items():
+            if nombre not in stock:
+                raise ValueError(f"El ingrediente '{nombre}' no existe en la base de datos")
+            if stock[nombre] < cantidad:
+                raise ValueError(
+                    f"Stock insuficiente para '{nombre}'. "
+                    f"Disponible: {stock[nombre]}, Requerido: {cantidad}"
+                )
+        # Compare-and-swap: si otra terminal consumió stock después de la
+        # validación, alguna fila no cumple la condición y se reintenta
+        requerido = case(consumo, value=Ingrediente.nombre, else_=0.0)
+        ids = db.execute(
+            update(Ingrediente)
+            .where(Ingrediente.nombre.in_(list(consumo)), Ingrediente.stock >= requerido)
+            .values(stock=Ingrediente.stock - requerido, version=Ingrediente.version + 1)
+            .returning(Ingrediente.id)
+            .execution_options(synchronize_session=False)
+        ).scalars().all()
+        if len(ids) != len(consumo):
+            raise StaleDataError("El stock cambió durante la edición del pedido")
+        registrar_cambio(db, "ingredientes", "actualizar", ids)
+        for objeto in db.identity_map.values():
+            if isinstance(objeto, Ingrediente):
+                db.expire(objeto, ["stock"])
+    
+    def aplicar(self, descontar_stock: bool = False) -> Optional[Pedido]:
+        """
+        Valida y aplica las operaciones en una transacción. Con
+        descontar_stock=True descuenta del stock los ingredientes de las
+        unidades agregadas y devuelve los de las quitadas.
+        Retorna el pedido modificado o None si no existe.
+        """
+        db = self.db
+        def operacion():
+            pedido = db.get(Pedido, self.pedido_id)
+            if not pedido:
+                return None
+            
+            lineas: Dict[int, List[ItemPedido]] = {}
+            for item in sorted(pedido.items, key=lambda i: i.id):
+                lineas.setdefault(item.menu_id, []).append(item)
+            actuales = {menu_id: sum(i.cantidad for i in items) for menu_id, items in lineas.items()}
+            finales = self._cantidades_finales(actuales)
+            if not any(finales.values()):
+                raise ValueError("El pedido debe conservar al menos un producto")
+            
+            diferencias = {m: finales[m] - actuales.get(m, 0) for m in finales if finales[m] != actuales.get(m, 0)}
+            menus = {m.id: m for m in db.scalars(select(Menu).where(Menu.id.in_(list(diferencias))))}
+            for menu_id, diferencia in diferencias.items():
+                menu = menus.get(menu_id)
+                if not menu:
+                    raise ValueError(f"Menú con ID {menu_id} no existe")
+                if diferencia > 0 and not menu.disponible:
+                    raise ValueError(f"El menú '{menu.nombre}' no está disponible")
+            
+            # Una línea por menú: se conserva la más antigua y se eliminan las repetidas
+            modificado = False
+            for menu_id, cantidad in finales.items():
+                items = lineas.get(menu_id, [])
+                if len(items) <= 1 and menu_id not in diferencias:
+                    continue
+                modificado = True
+                for item in items[1:] if cantidad else items:
+                    pedido.items.remove(item)
+                if not cantidad:
+                    continue
+                if items:
+                    items[0].cantidad = cantidad
+                else:
+                    pedido.items.append(ItemPedido(menu_id=menu_id, cantidad=cantidad))
+            
+            if not modificado:
+                return pedido
+            
+            PedidoCRUD._versionar(pedido)
+            if descontar_stock:
+                consumo = self._efecto_stock(menus, diferencias)
+                if consumo:
+                    self._descontar_stock(consumo)
+            ClienteCRUD.recalcular_estadisticas(db, [pedido.cliente_id])
+            VersionCRUD.incrementar(db, "pedidos")
+            db.commit()
+            db.refresh(pedido)
+            self.operaciones = []
+            return pedido
+
+        try:
+            return con_reintentos(db, "EdicionPedido.aplicar", operacion)
+        except (SQLAlchemyError, ValueError) as e:
+            db.rollback()
+            raise Exception(f"Error al editar pedido: {str(e)}")
@@ -0,0 +1,41 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import SQLAlchemyError
+from models import VersionDatos
+from typing import Iterable
+
+# Ámbitos cuyos cambios invalidan los gráficos
+AMBITOS_GRAFICOS = ("pedidos", "menus", "tiempos")
+
+class VersionCRUD:
+    @staticmethod
+    def incrementar(db: Session, *ambitos: str) -> None:
+        """
+        Incrementa la versión de los ámbitos indicados.
+        No hace commit: se llama dentro de la transacción de la escritura
+        que modifica los datos, para que ambas se confirmen juntas.
+        """
+        if not ambitos:
+            return
+        # Un solo upsert atómico: crea el ámbito o suma uno a su versión
+        sentencia = sqlite_insert(VersionDatos).values(
+            [{"ambito": ambito, "version": 1} for ambito in ambitos]
+        ).on_conflict_do_update(
+            index_elements=[VersionDatos.ambito],
+            set_={"version": VersionDatos.version + 1}
+        )
+        db.execute(sentencia)
+
+    @staticmethod
+    def obtener(db: Session, ambitos: Iterable[str] = AMBITOS_GRAFICOS) -> str:
+        """Retorna un sello con la versión actual de cada ámbito, ej: 'pedidos=3;menus=1'"""
+        try:
+            ambitos = list(ambitos)
+            versiones = dict(db.execute(
+                select(VersionDatos.ambito, VersionDatos.version)
+                .where(VersionDatos.ambito.in_(ambitos))
+            ).all())
+            return ";".join(f"{ambito}={versiones.get(ambito, 0)}" for ambito in ambitos)
+        except SQLAlchemyError as e:
+            raise Exception(f"Error al obtener versión de datos: {str(e)}")
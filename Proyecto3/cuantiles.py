@@ -0,0 +1,149 @@
+"""
+Resumen de cuantiles en flujo que se puede fusionar.
+
+Estima percentiles (p50, p90, p99...) sin guardar ni ordenar los valores:
+cada valor positivo suma uno a la cubeta ceil(log_gamma(valor)), con
+gamma = (1 + precision) / (1 - precision), y el cuantil se lee recorriendo
+las cubetas en orden. El valor estimado tiene un error relativo de a lo
+sumo `precision` (1% por defecto) respecto de un valor real de la muestra.
+
+Dos resúmenes con la misma precisión se fusionan sumando sus cubetas, y el
+resultado es el mismo que si se hubieran agregado todos los valores a uno
+solo. Así los percentiles de un menú salen de fusionar los de cada hora, o
+los de toda la cadena de fusionar los de cada sucursal.
+
+El tamaño es acotado: con tiempos entre 1 segundo y 1 día y 1% de
+precisión son a lo sumo unas 570 cubetas. Si se supera max_cubetas se
+juntan las cubetas más bajas (se pierde precisión sólo en los cuantiles
+más bajos, no en p90 o p99).
+
+Uso:
+    resumen = ResumenCuantiles()
+    resumen.agregar(segundos)
+    resumen.fusionar(otro)
+    p50, p90, p99 = resumen.cuantiles([0.5, 0.9, 0.99])
+"""
+import math
+from typing import Dict, Iterable, List, Optional
+
+PRECISION = 0.01
+MAX_CUBETAS = 2048
+# Valores menores se cuentan como cero (no tienen logaritmo útil)
+VALOR_MINIMO = 1e-9
+
+
+class ResumenCuantiles:
+    def __init__(self, precision: float = PRECISION, max_cubetas: int = MAX_CUBETAS):
+        if not 0 < precision < 1:
+            raise ValueError(f"Precisión inválida: {precision}")
+        self.precision = precision
+        self.max_cubetas = max_cubetas
+        self.gamma = (1 + precision) / (1 - precision)
+        self._log_gamma = math.log(self.gamma)
+        self.cubetas: Dict[int, int] = {}
+        self.ceros = 0
+        self.cantidad = 0
+        self.suma = 0.0
+        self.minimo: Optional[float] = None
+        self.maximo: Optional[float] = None
+
+    def agregar(self, valor: float, veces: int = 1) -> None:
+        if valor < 0:
+            raise ValueError(f"Sólo se admiten valores no negativos: {valor}")
+        if valor < VALOR_MINIMO:
+            self.ceros += veces
+        else:
+            indice = math.ceil(math.log(valor) / self._log_gamma)
+            self.cubetas[indice] = self.cubetas.get(indice, 0) + veces
+            if len(self.cubetas) > self.max_cubetas:
+                self._juntar()
+        self.cantidad += veces
+        self.suma += valor * veces
+        self.minimo = valor if self.minimo is None else min(self.minimo, valor)
+        self.maximo = valor if self.maximo is None else max(self.maximo, valor)
+
+    def _juntar(self) -> None:
+        """Suma las cubetas más bajas a la más baja que se conserva"""
+        indices = sorted(self.cubetas)
+        sobrantes = indices[:len(indices) - self.max_cubetas]
+        destino = indices[len(sobrantes)]
+        for indice in sobrantes:
+            self.cubetas[destino] += self.cubetas.pop(indice)
+
+    def fusionar(self, otro: "ResumenCuantiles") -> "ResumenCuantiles":
+        """Agrega los valores de otro resumen (misma precisión) a este. Retorna este resumen"""
+        if not math.isclose(otro.precision, self.precision):
+            raise ValueError("Sólo se pueden fusionar resúmenes con la misma precisión")
+        for indice, veces in otro.cubetas.items():
+            self.cubetas[indice] = self.cubetas.get(indice, 0) + veces
+        if len(self.cubetas) > self.max_cubetas:
+            self._juntar()
+        self.ceros += otro.ceros
+        self.cantidad += otro.cantidad
+        self.suma += otro.suma
+        for valor in (otro.minimo, otro.maximo):
+            if valor is not None:
+                self.minimo = valor if self.minimo is None else min(self.minimo, valor)
+                self.maximo = valor if self.maximo is None else max(self.maximo, valor)
+        return self
+
+    def _valor(self, indice: int) -> float:
+        """Punto de la cubeta con error relativo mínimo respecto de sus extremos"""
+        return 2 * self.gamma ** indice / (self.gamma + 1)
+
+    def cuantiles(self, qs: Iterable[float]) -> List[Optional[float]]:
+        """Valores estimados de los cuantiles indicados (entre 0 y 1), en un solo recorrido"""
+        qs = list(qs)
+        if not self.cantidad:
+            return [None] * len(qs)
+        if any(not 0 <= q <= 1 for q in qs):
+            raise ValueError("Los cuantiles deben estar entre 0 y 1")
+        # Posición (desde 0) de cada cuantil en la muestra ordenada
+        pendientes = sorted((q * (self.cantidad - 1), i) for i, q in enumerate(qs))
+        resultado: List[Optional[float]] = [None] * len(qs)
+        acumulado, j = self.ceros, 0
+        while j < len(pendientes) and pendientes[j][0] < acumulado:
+            resultado[pendientes[j][1]] = 0.0
+            j += 1
+        for indice in sorted(self.cubetas):
+            if j == len(pendientes):
+                break
+            acumulado += self.cubetas[indice]
+            valor = min(max(self._valor(indice), self.minimo), self.maximo)
+            while j < len(pendientes) and pendientes[j][0] < acumulado:
+                resultado[pendientes[j][1]] = valor
+                j += 1
+        for _, i in pendientes[j:]:
+            resultado[i] = self.maximo
+        return resultado
+
+    def cuantil(self, q: float) -> Optional[float]:
+        return self.cuantiles([q])[0]
+
+    @property
+    def promedio(self) -> Optional[float]:
+        return self.suma / self.cantidad if self.cantidad else None
+
+    # Serialización (columna JSON)
+
+    def a_dict(self) -> Dict:
+        return {
+            "precision": self.precision, "ceros": self.ceros, "cantidad": self.cantidad,
+            "suma": self.suma, "minimo": self.minimo, "maximo": self.maximo,
+            # JSON sólo admite claves de texto
+            "cubetas": {str(indice): veces for indice, veces in self.cubetas.items()},
+        }
+
+    @classmethod
+    def desde_dict(cls, datos: Optional[Dict], max_cubetas: int = MAX_CUBETAS) -> "ResumenCuantiles":
+        """Resumen guardado con a_dict(); vacío si datos es None"""
+        if not datos:
+            return cls(max_cubetas=max_cubetas)
+        resumen = cls(datos["precision"], max_cubetas)
+        resumen.cubetas = {int(indice): veces for indice, veces in datos["cubetas"].items()}
+        resumen.ceros = datos["ceros"]
+        resumen.cantidad = datos["cantidad"]
+        resumen.suma = datos["suma"]
+        resumen.minimo = datos["minimo"]
+        resumen.maximo = datos["maximo"]
+        return resumen
@@ -1,13 +1,47 @@
-from sqlalchemy import create_engine
+import os
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.schema import CreateTable
 from sqlalchemy.orm import sessionmaker, declarative_base
 
-# SQLite local
-DATABASE_URL = 'sqlite:///./proyecto.db'
+# SQLite local (se puede cambiar con la variable de entorno PROYECTO_DATABASE_URL)
+DATABASE_URL = os.environ.get("PROYECTO_DATABASE_URL", 'sqlite:///./proyecto.db')
+
+
+
+def ruta_archivo(database_url: str = DATABASE_URL) -> str:
+    """
+    Archivo SQLite donde se guardan los pedidos archivados (PROYECTO_ARCHIVO,
+    o por defecto junto a la base principal: proyecto.db -> proyecto_archivo.db)
+    """
+    if os.environ.get("PROYECTO_ARCHIVO"):
+        return os.environ["PROYECTO_ARCHIVO"]
+    ruta = database_url.split("///", 1)[1] if "///" in database_url else ""
+    if not ruta or ruta == ":memory:":
+        return ":memory:"
+    base, extension = os.path.splitext(ruta)
+    return f"{base}_archivo{extension or '.db'}"
+
+
+def adjuntar_archivo(motor, ruta: str) -> None:
+    """Adjunta el archivo de pedidos como esquema "archivo" en cada conexión nueva del engine"""
+    @event.listens_for(motor, "connect")
+    def _adjuntar(conexion, _):
+        conexion.execute("ATTACH DATABASE ? AS archivo", (ruta,))
+
+
+def activar_claves_foraneas(motor) -> None:
+    """SQLite no aplica las claves foráneas (ni ON DELETE CASCADE) salvo que se active en cada conexión"""
+    @event.listens_for(motor, "connect")
+    def _activar(conexion, _):
+        conexion.execute("PRAGMA foreign_keys=ON")
+
 
 # Creacion del engine
 engine = create_engine(
     DATABASE_URL, connect_args={"check_same_thread": False}
 )
+activar_claves_foraneas(engine)
+adjuntar_archivo(engine, ruta_archivo())
 
 # Sesiones
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -16,9 +50,165 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
 
+def en_lotes(valores, tamano: int = 500):
+    """Divide una lista de IDs en lotes: SQLite limita los parámetros por sentencia"""
+    valores = list(valores)
+    for inicio in range(0, len(valores), tamano):
+        yield valores[inicio:inicio + tamano]
+
+
 def get_session():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+def _claves_foraneas(tabla) -> set:
+    return {
+        (tuple(fk.parent.name for fk in restriccion.elements), restriccion.referred_table.name,
+         (restriccion.ondelete or "").upper())
+        for restriccion in tabla.foreign_key_constraints
+    }
+
+
+def _reconstruir_tablas(bind, tablas) -> None:
+    """
+    SQLite no permite modificar las claves foráneas de una tabla existente:
+    se crea la tabla nueva, se copian las filas, se elimina la anterior y se
+    renombra la nueva (procedimiento recomendado por SQLite), todo en una
+    transacción y con las claves foráneas desactivadas.
+    """
+    with bind.connect().execution_options(isolation_level="AUTOCOMMIT") as conexion:
+        conexion.exec_driver_sql("PRAGMA foreign_keys=OFF")
+        conexion.exec_driver_sql("BEGIN")
+        try:
+            for tabla in tablas:
+                temporal = f"{tabla.name}__nueva"
+                ddl = str(CreateTable(tabla).compile(dialect=bind.dialect)).replace(
+                    bind.dialect.identifier_preparer.format_table(tabla), f'"{temporal}"', 1
+                )
+                columnas = ", ".join(f'"{c.name}"' for c in tabla.columns)
+                conexion.exec_driver_sql(ddl)
+                conexion.exec_driver_sql(
+                    f'INSERT INTO "{temporal}" ({columnas}) SELECT {columnas} FROM "{tabla.name}"'
+                )
+                conexion.exec_driver_sql(f'DROP TABLE "{tabla.name}"')
+                conexion.exec_driver_sql(f'ALTER TABLE "{temporal}" RENAME TO "{tabla.name}"')
+            errores = conexion.exec_driver_sql("PRAGMA foreign_key_check").fetchall()
+            if errores:
+                raise ValueError(f"Filas con claves foráneas inválidas: {errores[:5]}")
+            conexion.exec_driver_sql("COMMIT")
+        except Exception:
+            conexion.exec_driver_sql("ROLLBACK")
+            raise
+        finally:
+            conexion.exec_driver_sql("PRAGMA foreign_keys=ON")
+
+
+def _sin_autoincrement(conexion, tabla) -> bool:
+    """La tabla del modelo usa AUTOINCREMENT pero la de la base no (creada antes)"""
+    if not tabla.dialect_options["sqlite"]["autoincrement"]:
+        return False
+    sql = conexion.execute(
+        text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :nombre"), {"nombre": tabla.name}
+    ).scalar()
+    return sql is not None and "AUTOINCREMENT" not in sql.upper()
+
+
+def _ajustar_secuencias(conexion) -> None:
+    """
+    Las tablas con AUTOINCREMENT cuyas filas se archivan (misma tabla en el
+    esquema "archivo") continúan después del mayor ID archivado, aunque
+    esas filas ya no estén en la base principal
+    """
+    archivadas = {t.name: t for t in Base.metadata.sorted_tables if t.schema == "archivo"}
+    for tabla in Base.metadata.sorted_tables:
+        if tabla.schema or tabla.name not in archivadas or not tabla.dialect_options["sqlite"]["autoincrement"]:
+            continue
+        maximo = conexion.execute(text(f'SELECT max(id) FROM archivo."{tabla.name}"')).scalar()
+        if maximo is None:
+            continue
+        actual = conexion.execute(
+            text("SELECT seq FROM sqlite_sequence WHERE name = :nombre"), {"nombre": tabla.name}
+        ).scalar()
+        if actual is None:
+            conexion.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES (:nombre, :seq)"),
+                             {"nombre": tabla.name, "seq": maximo})
+        elif actual < maximo:
+            conexion.execute(text("UPDATE sqlite_sequence SET seq = :seq WHERE name = :nombre"),
+                             {"nombre": tabla.name, "seq": maximo})
+
+
+def _completar_columnas_nuevas(bind, agregadas) -> None:
+    """Calcula una vez los valores de las columnas derivadas recién agregadas a una base existente"""
+    if any(c.startswith("Clientes.total_") for c in agregadas):
+        # Base existente sin contadores por cliente
+        from crud.cliente_crud import ClienteCRUD
+        db = SessionLocal(bind=bind)
+        try:
+            ClienteCRUD.recalcular_estadisticas(db)
+            db.commit()
+        finally:
+            db.close()
+
+
+def actualizar_esquema(bind=None):
+    """
+    Crea las tablas que falten y agrega a las tablas existentes las columnas
+    e índices nuevos de los modelos, que create_all no agrega, calculando
+    las columnas derivadas (contadores por cliente). Las tablas
+    cuyas claves foráneas cambiaron (por ejemplo ON DELETE CASCADE) o que
+    ahora usan AUTOINCREMENT se reconstruyen, y sus secuencias continúan
+    después de los IDs archivados. También crea los índices de búsqueda de
+    texto completo.
+    Los modelos deben estar importados antes de llamarla.
+    Retorna las columnas agregadas, ej: ["Clientes.total_pedidos"]
+    """
+    bind = bind or engine
+    agregadas = []
+    Base.metadata.create_all(bind=bind)
+    inspector = inspect(bind)
+    compilador = bind.dialect.ddl_compiler(bind.dialect, None)
+    with bind.begin() as conexion:
+        for tabla in Base.metadata.sorted_tables:
+            existentes = {c["name"] for c in inspector.get_columns(tabla.name, schema=tabla.schema)}
+            for columna in tabla.columns:
+                if columna.name in existentes:
+                    continue
+                tipo = columna.type.compile(dialect=bind.dialect)
+                default = compilador.get_column_default_string(columna)
+                nombre = f'"{tabla.schema}"."{tabla.name}"' if tabla.schema else f'"{tabla.name}"'
+                sentencia = f'ALTER TABLE {nombre} ADD COLUMN "{columna.name}" {tipo}'
+                if default is not None:
+                    sentencia += f" DEFAULT {default}"
+                conexion.execute(text(sentencia))
+                agregadas.append(f"{tabla.fullname}.{columna.name}")
+
+    if bind.dialect.name == "sqlite":
+        reconstruir = []
+        with bind.connect() as conexion:
+            for tabla in Base.metadata.sorted_tables:
+                existentes = {
+                    (tuple(fk["constrained_columns"]), fk["referred_table"], (fk["options"].get("ondelete") or "").upper())
+                    for fk in inspector.get_foreign_keys(tabla.name, schema=tabla.schema)
+                }
+                if existentes != _claves_foraneas(tabla) or (not tabla.schema and _sin_autoincrement(conexion, tabla)):
+                    reconstruir.append(tabla)
+        if reconstruir:
+            _reconstruir_tablas(bind, reconstruir)
+        with bind.begin() as conexion:
+            _ajustar_secuencias(conexion)
+
+    with bind.begin() as conexion:
+        for tabla in Base.metadata.sorted_tables:
+            for indice in tabla.indexes:
+                indice.create(bind=conexion, checkfirst=True)
+
+        # Índices de texto completo y sus triggers (no son parte de los modelos)
+        from busqueda import BusquedaTexto
+        BusquedaTexto.crear_indices(conexion)
+
+    _completar_columnas_nuevas(bind, agregadas)
+    return agregadas
@@ -0,0 +1,177 @@
+"""
+Bus de eventos de cambio (publicación/suscripción dentro del proceso).
+
+Cada transacción acumula en su sesión los cambios que hace, y sólo al
+confirmarse (after_commit) se publican como EventoCambio: una entidad
+("clientes", "ingredientes", "menus", "pedidos", "alertas"), una operación
+("crear", "actualizar", "eliminar") y los IDs afectados. Si la transacción
+se deshace no se publica nada.
+
+Los cambios del ORM (objetos nuevos, modificados o eliminados en un flush)
+se registran solos. Las sentencias masivas (UPDATE/DELETE sin cargar los
+objetos) los registran con registrar_cambio(). ids=None significa "IDs
+desconocidos": el suscriptor debe recargar la entidad completa.
+
+Los cambios de una misma transacción se fusionan en un evento por entidad
+y operación, así una eliminación masiva de mil pedidos es un solo evento.
+
+Uso:
+    bus_eventos.suscribir(funcion, "pedidos", "clientes")
+    registrar_cambio(db, "menus", "actualizar", ids)   # en operaciones masivas
+"""
+import logging
+import threading
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+OPERACIONES = ("crear", "actualizar", "eliminar")
+
+# Clase del modelo -> (entidad, atributo con el ID de la entidad). Un cambio
+# en un item es una actualización de su pedido.
+ENTIDADES_MODELO = {
+    "Cliente": ("clientes", "id"),
+    "Ingrediente": ("ingredientes", "id"),
+    "Menu": ("menus", "id"),
+    "Pedido": ("pedidos", "id"),
+    "ItemPedido": ("pedidos", "pedido_id"),
+    "AlertaStock": ("alertas", "id"),
+}
+
+# Efectos de ON DELETE CASCADE que el ORM no ve (passive_deletes)
+CASCADAS = {
+    "clientes": ("pedidos", "eliminar"),
+    "menus": ("pedidos", "actualizar"),
+    "ingredientes": ("alertas", "eliminar"),
+}
+
+
+class EventoCambio:
+    """Cambio confirmado sobre una entidad. ids=None: IDs desconocidos (recargar todo)"""
+    __slots__ = ("entidad", "operacion", "ids")
+
+    def __init__(self, entidad: str, operacion: str, ids: Optional[FrozenSet[int]]):
+        self.entidad = entidad
+        self.operacion = operacion
+        self.ids = ids
+
+    def __repr__(self) -> str:
+        ids = "todos" if self.ids is None else sorted(self.ids)
+        return f"EventoCambio({self.entidad}, {self.operacion}, {ids})"
+
+
+def _pendientes(db: Session) -> Dict[Tuple[str, str], Optional[set]]:
+    return db.info.setdefault("eventos_pendientes", {})
+
+
+def registrar_cambio(db: Session, entidad: str, operacion: str, ids: Iterable[int] = None) -> None:
+    """
+    Anota un cambio en la transacción actual de la sesión; se publica si la
+    transacción se confirma. Para las sentencias masivas que el ORM no ve.
+    """
+    if operacion not in OPERACIONES:
+        raise ValueError(f"Operación inválida: {operacion}")
+    pendientes = _pendientes(db)
+    clave = (entidad, operacion)
+    if ids is None:
+        pendientes[clave] = None
+    elif clave not in pendientes:
+        pendientes[clave] = {i for i in ids if i is not None}
+    elif pendientes[clave] is not None:
+        pendientes[clave].update(i for i in ids if i is not None)
+    if operacion == "eliminar" and entidad in CASCADAS:
+        pendientes[CASCADAS[entidad]] = None
+
+
+def _fusionar(pendientes: Dict[Tuple[str, str], Optional[set]]) -> List[EventoCambio]:
+    """Un evento por entidad y operación; lo creado o actualizado y luego eliminado sólo cuenta como eliminado"""
+    eventos = []
+    for (entidad, operacion), ids in pendientes.items():
+        if ids is not None:
+            eliminados = pendientes.get((entidad, "eliminar"))
+            if operacion != "eliminar" and eliminados:
+                ids = ids - eliminados
+            if operacion == "actualizar" and pendientes.get((entidad, "crear")):
+                ids = ids - pendientes[(entidad, "crear")]
+            if not ids:
+                continue
+            ids = frozenset(ids)
+        eventos.append(EventoCambio(entidad, operacion, ids))
+    return eventos
+
+
+class BusEventos:
+    def __init__(self):
+        self._suscriptores: List[Tuple[Callable[[EventoCambio], None], FrozenSet[str]]] = []
+        self._lock = threading.Lock()
+        self._instalado = False
+        self.publicados = 0
+
+    def suscribir(self, funcion: Callable[[EventoCambio], None], *entidades: str) -> Callable:
+        """Llama a funcion(evento) por cada evento de las entidades indicadas (todas si no se indican)"""
+        with self._lock:
+            self._suscriptores.append((funcion, frozenset(entidades)))
+        return funcion
+
+    def cancelar(self, funcion: Callable) -> None:
+        with self._lock:
+            self._suscriptores = [s for s in self._suscriptores if s[0] is not funcion]
+
+    def publicar(self, eventos: Iterable[EventoCambio]) -> None:
+        """
+        Entrega los eventos a los suscriptores en el hilo que confirmó la
+        transacción. Un error en un suscriptor no afecta a los demás ni a
+        la transacción, que ya está confirmada.
+        """
+        with self._lock:
+            suscriptores = list(self._suscriptores)
+        for evento in eventos:
+            self.publicados += 1
+            for funcion, entidades in suscriptores:
+                if entidades and evento.entidad not in entidades:
+                    continue
+                try:
+                    funcion(evento)
+                except Exception:
+                    logger.exception("Error en el suscriptor %r del evento %r", funcion, evento)
+
+    # Eventos de la sesión
+
+    def instalar(self) -> None:
+        """Registra los eventos en todas las sesiones (una sola vez)"""
+        if self._instalado:
+            return
+        self._instalado = True
+        event.listen(Session, "after_flush", self._despues_de_flush)
+        event.listen(Session, "after_commit", self._despues_de_commit)
+        event.listen(Session, "after_rollback", self._despues_de_rollback)
+
+    def _despues_de_flush(self, db: Session, contexto) -> None:
+        # En after_flush new/dirty/deleted aún tienen el estado previo y los nuevos ya tienen ID
+        for objetos, operacion in ((db.new, "crear"), (db.dirty, "actualizar"), (db.deleted, "eliminar")):
+            for objeto in objetos:
+                entidad = ENTIDADES_MODELO.get(type(objeto).__name__)
+                if entidad is None:
+                    continue
+                nombre, atributo = entidad
+                if atributo != "id":
+                    # Item: su pedido se actualiza (salvo que el pedido se elimine en este mismo flush)
+                    registrar_cambio(db, nombre, "actualizar", [getattr(objeto, atributo)])
+                elif operacion != "actualizar" or db.is_modified(objeto, include_collections=False):
+                    registrar_cambio(db, nombre, operacion, [objeto.id])
+
+    def _despues_de_commit(self, db: Session) -> None:
+        pendientes = db.info.pop("eventos_pendientes", None)
+        if pendientes:
+            self.publicar(_fusionar(pendientes))
+
+    def _despues_de_rollback(self, db: Session) -> None:
+        db.info.pop("eventos_pendientes", None)
+
+
+# Instancia compartida por la aplicación; escucha todas las sesiones desde que se importa
+bus_eventos = BusEventos()
+bus_eventos.instalar()
@@ -0,0 +1,325 @@
+"""
+Federación de sucursales: estadísticas de toda la cadena.
+
+Cada sucursal tiene su propia base (proyecto.db y su proyecto_archivo.db).
+Las sucursales se registran en sucursales.json (o en PROYECTO_SUCURSALES).
+Cada consulta se envía en paralelo a todas las sucursales, en hilos o en
+procesos. Cada sucursal calcula su agregado parcial con las mismas
+funciones de GraficosEstadisticos y luego se suman los parciales. El tiempo
+total es el de la sucursal más lenta, no la suma de todas.
+
+Los menús y los ingredientes se combinan por nombre, porque los IDs no
+coinciden entre sucursales. Las bases de las sucursales se abren en solo
+lectura.
+
+Uso:
+    python federacion.py --agregar Centro /datos/centro/proyecto.db
+    python federacion.py --listar
+    python federacion.py --consulta ventas --periodo mensual
+"""
+import argparse
+import io
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import matplotlib.pyplot as plt
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateTable
+
+from crud.version_crud import VersionCRUD
+from graficos import GraficosEstadisticos
+from models import ItemPedidoArchivado, PedidoArchivado
+
+REGISTRO = os.environ.get("PROYECTO_SUCURSALES", "sucursales.json")
+
+# Consultas que se pueden federar (ver consultar_sucursal)
+CONSULTAS = ("ventas", "menus", "ingredientes", "version")
+
+# Gráfico de la pestaña Gráficos -> consulta federada que usa
+TIPOS_FEDERADOS = {
+    "Ventas por Fecha": "ventas",
+    "Ventas por Sucursal": "ventas",
+    "Menús Más Vendidos": "menus",
+    "Uso de Ingredientes": "ingredientes",
+}
+
+# Engines de las sucursales abiertos en este proceso: (ruta, archivo) -> engine
+_motores = {}
+_lock_motores = threading.Lock()
+
+
+def ruta_archivo_sucursal(ruta: str) -> str:
+    """Archivo de pedidos de una sucursal: centro/proyecto.db -> centro/proyecto_archivo.db"""
+    base, extension = os.path.splitext(ruta)
+    return f"{base}_archivo{extension or '.db'}"
+
+
+def _motor_sucursal(ruta: str, archivo: str):
+    """Engine de solo lectura sobre la base de una sucursal, con su archivo adjunto"""
+    with _lock_motores:
+        motor = _motores.get((ruta, archivo))
+        if motor is not None:
+            return motor
+        uri = Path(ruta).resolve().as_uri() + "?mode=ro"
+        motor = create_engine(
+            "sqlite://", creator=lambda: sqlite3.connect(uri, uri=True, check_same_thread=False)
+        )
+        existe_archivo = os.path.exists(archivo)
+
+        @event.listens_for(motor, "connect")
+        def _preparar(conexion, _):
+            if existe_archivo:
+                conexion.execute("ATTACH DATABASE ? AS archivo", (Path(archivo).resolve().as_uri() + "?mode=ro",))
+            else:
+                # Sucursal que nunca archivó pedidos: archivo vacío en memoria
+                conexion.execute("ATTACH DATABASE ':memory:' AS archivo")
+                for tabla in (PedidoArchivado.__table__, ItemPedidoArchivado.__table__):
+                    conexion.execute(str(CreateTable(tabla).compile(dialect=motor.dialect)))
+            conexion.execute("PRAGMA query_only=ON")
+
+        _motores[(ruta, archivo)] = motor
+        return motor
+
+
+def consultar_sucursal(sucursal: Dict, consulta: str, periodo: str = "diario") -> Dict:
+    """
+    Calcula el agregado parcial de una sucursal. Retorna un diccionario con
+    el nombre de la sucursal, los datos, el tiempo empleado y el error, si
+    hubo. Se ejecuta en un hilo o en un proceso del pool.
+    """
+    inicio = time.perf_counter()
+    resultado = {"sucursal": sucursal["nombre"], "datos": None, "error": None}
+    db = None
+    try:
+        db = Session(bind=_motor_sucursal(sucursal["ruta"], sucursal["archivo"]))
+        if consulta == "ventas":
+            resultado["datos"] = GraficosEstadisticos.obtener_ventas_por_fecha(db, periodo)
+        elif consulta == "menus":
+            resultado["datos"] = GraficosEstadisticos.obtener_distribucion_menus(db)
+        elif consulta == "ingredientes":
+            resultado["datos"] = GraficosEstadisticos.obtener_uso_ingredientes(db)
+        elif consulta == "version":
+            try:
+                resultado["datos"] = VersionCRUD.obtener(db)
+            except Exception:
+                # Base anterior a las versiones de datos: se usa la fecha de modificación
+                resultado["datos"] = "mtime=" + ";".join(
+                    str(os.path.getmtime(r)) for r in (sucursal["ruta"], sucursal["archivo"]) if os.path.exists(r)
+                )
+        else:
+            raise ValueError(f"Consulta desconocida: {consulta}")
+    except Exception as e:
+        resultado["error"] = str(e)
+    finally:
+        if db is not None:
+            db.close()
+    resultado["segundos"] = round(time.perf_counter() - inicio, 4)
+    return resultado
+
+
+def combinar(consulta: str, parciales: List[Dict]) -> Dict:
+    """Suma los agregados parciales por clave, con el orden de GraficosEstadisticos"""
+    total = {}
+    for parcial in parciales:
+        for clave, valor in parcial.items():
+            total[clave] = total.get(clave, 0) + (valor or 0)
+    if consulta == "ventas":
+        return dict(sorted(total.items()))
+    return dict(sorted(total.items(), key=lambda x: x[1], reverse=True))
+
+
+class Federacion:
+    def __init__(self, registro: str = REGISTRO):
+        self.registro = registro
+        self.sucursales: List[Dict] = []
+        if os.path.exists(registro):
+            with open(registro, "r", encoding="utf-8") as archivo:
+                self.sucursales = json.load(archivo)
+
+    def guardar(self) -> None:
+        with open(self.registro, "w", encoding="utf-8") as archivo:
+            json.dump(self.sucursales, archivo, ensure_ascii=False, indent=2)
+
+    def agregar(self, nombre: str, ruta: str, archivo: str = None) -> Dict:
+        """Registra la base de una sucursal"""
+        if not nombre or not nombre.strip():
+            raise ValueError("El nombre de la sucursal no puede estar vacío")
+        if any(s["nombre"] == nombre.strip() for s in self.sucursales):
+            raise ValueError(f"La sucursal '{nombre}' ya está registrada")
+        if not os.path.isfile(ruta):
+            raise ValueError(f"No existe la base de datos '{ruta}'")
+        ruta = os.path.abspath(ruta)
+        sucursal = {"nombre": nombre.strip(), "ruta": ruta,
+                    "archivo": os.path.abspath(archivo) if archivo else ruta_archivo_sucursal(ruta)}
+        self.sucursales.append(sucursal)
+        self.guardar()
+        return sucursal
+
+    def quitar(self, nombre: str) -> bool:
+        cantidad = len(self.sucursales)
+        self.sucursales = [s for s in self.sucursales if s["nombre"] != nombre]
+        if len(self.sucursales) == cantidad:
+            return False
+        self.guardar()
+        return True
+
+    def consultar(self, consulta: str, periodo: str = "diario", procesos: bool = False) -> Dict:
+        """
+        Ejecuta la consulta en todas las sucursales a la vez y combina los
+        resultados. Retorna {"total", "por_sucursal", "tiempos", "errores",
+        "segundos"}. Las sucursales con error quedan fuera del total.
+        """
+        if consulta not in CONSULTAS:
+            raise ValueError(f"Consulta desconocida: {consulta}")
+        if not self.sucursales:
+            raise ValueError("No hay sucursales registradas")
+
+        inicio = time.perf_counter()
+        # SQLite libera el GIL mientras ejecuta la consulta: con hilos las sucursales ya corren en paralelo
+        ejecutor = ProcessPoolExecutor if procesos else ThreadPoolExecutor
+        with ejecutor(max_workers=len(self.sucursales)) as pool:
+            resultados = list(pool.map(
+                consultar_sucursal, self.sucursales,
+                [consulta] * len(self.sucursales), [periodo] * len(self.sucursales)
+            ))
+
+        correctos = [r for r in resultados if r["error"] is None]
+        return {
+            "total": combinar(consulta, [r["datos"] for r in correctos]) if consulta != "version" else None,
+            "por_sucursal": {r["sucursal"]: r["datos"] for r in correctos},
+            "tiempos": {r["sucursal"]: r["segundos"] for r in resultados},
+            "errores": {r["sucursal"]: r["error"] for r in resultados if r["error"]},
+            "segundos": round(time.perf_counter() - inicio, 4),
+        }
+
+    def version(self) -> str:
+        """Sello de la versión de datos de toda la cadena (para la caché de gráficos)"""
+        resultado = self.consultar("version")
+        return "|".join(f"{nombre}:{resultado['por_sucursal'].get(nombre, '?')}"
+                        for nombre in sorted(s["nombre"] for s in self.sucursales))
+
+    # Gráficos
+
+    def generar_figura(self, tipo: str, periodo: str = "diario"):
+        """Gráfico de la cadena, con cada barra dividida por sucursal. Retorna (figura, error)"""
+        if tipo not in TIPOS_FEDERADOS:
+            return None, f"El gráfico '{tipo}' no está disponible para la cadena"
+        try:
+            resultado = self.consultar(TIPOS_FEDERADOS[tipo], periodo)
+        except Exception as e:
+            return None, f"Error al consultar las sucursales: {str(e)}"
+        por_sucursal = resultado["por_sucursal"]
+        if not resultado["total"]:
+            errores = "; ".join(f"{n}: {e}" for n, e in resultado["errores"].items())
+            return None, "No hay datos disponibles en las sucursales" + (f" ({errores})" if errores else "")
+
+        try:
+            fig, ax = plt.subplots(figsize=(10, 6))
+            if tipo == "Ventas por Sucursal":
+                totales = {nombre: sum(datos.values()) for nombre, datos in por_sucursal.items()}
+                ax.bar(list(totales.keys()), list(totales.values()), color="steelblue")
+                ax.set_xlabel("Sucursal")
+                ax.set_ylabel("Ventas ($)")
+                ax.set_title("Ventas por Sucursal")
+            else:
+                claves = list(resultado["total"].keys())
+                if tipo != "Ventas por Fecha":
+                    claves = claves[:10]
+                horizontal = tipo != "Ventas por Fecha"
+                base = [0.0] * len(claves)
+                for nombre, datos in por_sucursal.items():
+                    valores = [datos.get(clave, 0) for clave in claves]
+                    if horizontal:
+                        ax.barh(claves, valores, left=base, label=nombre)
+                    else:
+                        ax.bar(claves, valores, bottom=base, label=nombre)
+                    base = [b + v for b, v in zip(base, valores)]
+                if tipo == "Ventas por Fecha":
+                    ax.set_xlabel("Fecha")
+                    ax.set_ylabel("Ventas ($)")
+                    ax.set_title(f"Ventas de la Cadena por {periodo.capitalize()}")
+                    plt.xticks(rotation=45, ha="right")
+                elif tipo == "Menús Más Vendidos":
+                    ax.invert_yaxis()
+                    ax.set_xlabel("Cantidad Vendida")
+                    ax.set_title("Top 10 Menús Más Vendidos en la Cadena")
+                else:
+                    ax.invert_yaxis()
+                    ax.set_xlabel("Cantidad Usada")
+                    ax.set_title("Top 10 Ingredientes Más Usados en la Cadena")
+                ax.legend()
+            if resultado["errores"]:
+                ax.text(0.01, 0.99, "Sin datos de: " + ", ".join(resultado["errores"]),
+                        transform=ax.transAxes, va="top", color="red", fontsize=8)
+            plt.tight_layout()
+            return fig, None
+        except Exception as e:
+            return None, f"Error al generar gráfico: {str(e)}"
+
+    def renderizar_grafico(self, tipo: str, periodo: str = "diario", formato: str = "png") -> Tuple[bytes, str]:
+        """Genera el gráfico de la cadena y lo renderiza a una imagen. Retorna (datos, error)"""
+        fig, error = self.generar_figura(tipo, periodo)
+        if error or fig is None:
+            return None, error or "No se pudo generar el gráfico"
+        try:
+            buffer = io.BytesIO()
+            fig.savefig(buffer, format=formato)
+            return buffer.getvalue(), None
+        except Exception as e:
+            return None, f"Error al renderizar gráfico: {str(e)}"
+        finally:
+            plt.close(fig)
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Registra sucursales y consulta estadísticas de toda la cadena")
+    parser.add_argument("--registro", default=REGISTRO, help=f"Archivo de sucursales (default: {REGISTRO})")
+    parser.add_argument("--agregar", nargs=2, metavar=("NOMBRE", "RUTA"), help="Registra la base de una sucursal")
+    parser.add_argument("--quitar", metavar="NOMBRE", help="Quita una sucursal del registro")
+    parser.add_argument("--listar", action="store_true", help="Lista las sucursales registradas")
+    parser.add_argument("--consulta", choices=[c for c in CONSULTAS if c != "version"],
+                        help="Consulta a ejecutar en todas las sucursales")
+    parser.add_argument("--periodo", default="diario", choices=["diario", "semanal", "mensual", "anual"])
+    parser.add_argument("--procesos", action="store_true", help="Usa procesos en vez de hilos")
+    parser.add_argument("--limite", type=int, default=20, help="Filas del total a mostrar")
+    args = parser.parse_args(argv)
+
+    federacion = Federacion(args.registro)
+    try:
+        if args.agregar:
+            federacion.agregar(*args.agregar)
+        if args.quitar and not federacion.quitar(args.quitar):
+            print(f"No existe la sucursal '{args.quitar}'")
+            return 1
+    except ValueError as e:
+        print(e)
+        return 1
+    if args.listar or args.agregar or args.quitar:
+        for sucursal in federacion.sucursales:
+            print(f"{sucursal['nombre']:<20} {sucursal['ruta']}")
+
+    if args.consulta:
+        resultado = federacion.consultar(args.consulta, args.periodo, args.procesos)
+        for clave, valor in list(resultado["total"].items())[:args.limite]:
+            print(f"{clave:<30} {valor:>14.2f}")
+        print()
+        for nombre, segundos in resultado["tiempos"].items():
+            estado = "ERROR " + resultado["errores"][nombre] if nombre in resultado["errores"] else "ok"
+            print(f"{nombre:<20} {segundos:>8.3f}s  {estado}")
+        print(f"{'total':<20} {resultado['segundos']:>8.3f}s (suma de sucursales: "
+              f"{sum(resultado['tiempos'].values()):.3f}s)")
+        return 1 if resultado["errores"] else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
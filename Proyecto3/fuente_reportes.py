@@ -0,0 +1,226 @@
+"""
+Fuente de datos para estadísticas, gráficos y reportes.
+
+Las consultas de estadísticas recorren todos los pedidos; si leen la base
+principal compiten con la toma de pedidos (en SQLite sin WAL un lector
+largo bloquea los commits). Esta fuente las separa según
+PROYECTO_REPORTES_MODO:
+
+- "instantanea" (por defecto): una copia de la base y del archivo hecha
+  con la API de respaldo en línea de SQLite, leída en una sola transacción
+  para que ambas sean consistentes. Se renueva cuando tiene más de
+  PROYECTO_REPORTES_ANTIGUEDAD segundos (60 por defecto). Se alternan dos
+  copias: la nueva se escribe mientras los reportes leen la anterior. En
+  modo WAL la copia no bloquea a los escritores; sin WAL los bloquea sólo
+  mientras se copia, no mientras duran las consultas.
+- "solo_lectura": conexiones de solo lectura (mode=ro, query_only) sobre
+  la base principal en modo WAL, donde cada lector ve una instantánea sin
+  bloquear a los escritores. Los datos siempre están al día.
+- "directo": la misma base y engine que la toma de pedidos.
+
+Con bases en memoria siempre se usa "directo".
+
+Con iniciar_refresco_periodico() las copias las hace un hilo propio,
+también la primera: las consultas no copian la base en el hilo que las
+pide (la interfaz) y sólo esperan si todavía no hay ninguna copia. Los
+errores al refrescar se registran en el log y quedan en ultimo_error
+(pestaña Diagnóstico); mientras tanto se sigue leyendo la copia anterior.
+
+Uso:
+    db = next(get_session_reportes())
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Optional, Tuple
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from database import DATABASE_URL, SessionLocal, adjuntar_archivo, ruta_archivo
+
+logger = logging.getLogger(__name__)
+
+MODOS = ("instantanea", "solo_lectura", "directo")
+# Páginas copiadas por paso del respaldo
+PAGINAS_POR_PASO = 4096
+# Segundos que una consulta espera la primera copia del hilo de refresco antes de copiar ella misma
+ESPERA_PRIMERA_COPIA = 30.0
+
+
+def _ruta_base(database_url: str) -> str:
+    ruta = database_url.split("///", 1)[1] if "///" in database_url else ""
+    return "" if ruta == ":memory:" else ruta
+
+
+def _solo_lectura(motor) -> None:
+    """Cualquier escritura por este engine falla en vez de modificar la base"""
+    @event.listens_for(motor, "connect")
+    def _activar(conexion, _):
+        conexion.execute("PRAGMA query_only=ON")
+
+
+class FuenteReportes:
+    def __init__(self, database_url: str = DATABASE_URL, modo: str = None,
+                 max_antiguedad: float = None, archivo: str = None):
+        modo = modo or os.environ.get("PROYECTO_REPORTES_MODO", "instantanea")
+        if modo not in MODOS:
+            raise ValueError(f"Modo de reportes inválido: {modo}")
+        self.ruta = _ruta_base(database_url)
+        self.modo = modo if self.ruta else "directo"
+        self.archivo = archivo or ruta_archivo(database_url)
+        if max_antiguedad is None:
+            max_antiguedad = float(os.environ.get("PROYECTO_REPORTES_ANTIGUEDAD", "60"))
+        self.max_antiguedad = max_antiguedad
+        self.fecha_datos: Optional[datetime] = None  # Momento de la copia en uso
+        self.refrescos = 0
+        self.errores_refresco = 0
+        self.ultimo_error: Optional[Tuple[datetime, str]] = None  # None = el último refresco funcionó
+        self._primera_copia = threading.Event()
+        self._lock = threading.Lock()
+        self._copia = 0            # Índice de la copia en uso (0 o 1)
+        self._instante = None      # time.monotonic() de la copia en uso
+        self._sesiones = None
+        self._motores = []
+        self._detener = None
+        if self.modo == "solo_lectura":
+            self._preparar_solo_lectura()
+
+    # Copias
+
+    def rutas_copia(self, indice: int) -> Tuple[str, str]:
+        """Rutas de la copia `indice` de la base y del archivo: proyecto_reportes_a.db y proyecto_reportes_a_archivo.db"""
+        base, extension = os.path.splitext(self.ruta)
+        extension = extension or ".db"
+        nombre = f"{base}_reportes_{'ab'[indice]}"
+        return f"{nombre}{extension}", f"{nombre}_archivo{extension}"
+
+    def vencida(self) -> bool:
+        return self._instante is None or time.monotonic() - self._instante > self.max_antiguedad
+
+    def refrescar(self) -> None:
+        """
+        Copia la base y el archivo en la copia que no está en uso y pasa a
+        usarla. Ambas se leen dentro de una misma transacción de lectura, así
+        que un pedido archivado entre medio no queda en las dos ni en ninguna.
+        """
+        if self.modo != "instantanea":
+            return
+        with self._lock:
+            indice = 1 - self._copia if self._instante is not None else 0
+            ruta_copia, ruta_copia_archivo = self.rutas_copia(indice)
+            origen = sqlite3.connect(self.ruta, isolation_level=None, check_same_thread=False)
+            try:
+                origen.execute("ATTACH DATABASE ? AS archivo", (self.archivo,))
+                origen.execute("BEGIN")
+                # La transacción toma su instantánea en la primera lectura de cada base
+                origen.execute("SELECT count(*) FROM main.sqlite_master").fetchone()
+                origen.execute("SELECT count(*) FROM archivo.sqlite_master").fetchone()
+                for esquema, destino in (("main", ruta_copia), ("archivo", ruta_copia_archivo)):
+                    copia = sqlite3.connect(destino)
+                    try:
+                        origen.backup(copia, pages=PAGINAS_POR_PASO, name=esquema)
+                    finally:
+                        copia.close()
+                origen.execute("COMMIT")
+            finally:
+                origen.close()
+
+            motor = create_engine(f"sqlite:///{ruta_copia}", connect_args={"check_same_thread": False})
+            adjuntar_archivo(motor, ruta_copia_archivo)
+            _solo_lectura(motor)
+            # Las sesiones abiertas terminan sobre la copia anterior; se reutiliza en el próximo refresco
+            self._motores.append(motor)
+            if len(self._motores) > 2:
+                self._motores.pop(0).dispose()
+            self._sesiones = sessionmaker(autocommit=False, autoflush=False, bind=motor)
+            self._copia = indice
+            self._instante = time.monotonic()
+            self.fecha_datos = datetime.now()
+            self.refrescos += 1
+            self._primera_copia.set()
+
+    def _preparar_solo_lectura(self) -> None:
+        # WAL es persistente en el archivo: basta con activarlo una vez
+        conexion = sqlite3.connect(self.ruta)
+        try:
+            conexion.execute("PRAGMA journal_mode=WAL")
+        finally:
+            conexion.close()
+        motor = create_engine(
+            f"sqlite:///file:{self.ruta}?mode=ro&uri=true", connect_args={"check_same_thread": False}
+        )
+        adjuntar_archivo(motor, self.archivo)
+        _solo_lectura(motor)
+        self._motores.append(motor)
+        self._sesiones = sessionmaker(autocommit=False, autoflush=False, bind=motor)
+
+    # Sesiones
+
+    def sesion(self):
+        """Sesión de lectura para reportes; renueva antes la copia si está vencida"""
+        if self.modo == "directo":
+            return SessionLocal()
+        if self.modo == "instantanea":
+            if self._detener is not None:
+                # El hilo de refresco mantiene la copia: sólo se espera la primera
+                if not self._primera_copia.wait(ESPERA_PRIMERA_COPIA):
+                    self.refrescar()
+            elif self.vencida():
+                self.refrescar()
+        return self._sesiones()
+
+    def url(self) -> Tuple[str, str]:
+        """URL de la base y ruta del archivo que leen los reportes (para otros procesos)"""
+        if self.modo == "instantanea":
+            if self.vencida():
+                self.refrescar()
+            ruta, archivo = self.rutas_copia(self._copia)
+            return f"sqlite:///{ruta}", archivo
+        if self.modo == "solo_lectura":
+            return f"sqlite:///file:{self.ruta}?mode=ro&uri=true", self.archivo
+        return f"sqlite:///{self.ruta}" if self.ruta else DATABASE_URL, self.archivo
+
+    def iniciar_refresco_periodico(self) -> None:
+        """
+        Hace la primera copia y la renueva antes de que venza en segundo
+        plano, así ninguna consulta espera a que se copie la base
+        """
+        if self.modo != "instantanea" or self._detener is not None:
+            return
+        detener = self._detener = threading.Event()
+
+        def ciclo():
+            espera = 0.0 if self._instante is None else self.max_antiguedad / 2
+            while not detener.wait(espera):
+                espera = self.max_antiguedad / 2
+                try:
+                    self.refrescar()
+                    self.ultimo_error = None
+                except Exception as e:
+                    # Se reintenta en el próximo ciclo; las consultas siguen con la copia anterior
+                    self.errores_refresco += 1
+                    self.ultimo_error = (datetime.now(), str(e))
+                    logger.exception("Error al refrescar la copia de reportes")
+
+        threading.Thread(target=ciclo, name="refresco-reportes", daemon=True).start()
+
+    def detener(self) -> None:
+        if self._detener is not None:
+            self._detener.set()
+            self._detener = None
+
+
+# Instancia compartida por la aplicación (la primera copia se hace en la primera consulta)
+fuente_reportes = FuenteReportes()
+
+
+def get_session_reportes():
+    db = fuente_reportes.sesion()
+    try:
+        yield db
+    finally:
+        db.close()
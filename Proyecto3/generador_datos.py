@@ -0,0 +1,263 @@
+"""
+Generador de datos sintéticos reproducibles (con semilla).
+
+Crea clientes, ingredientes, menús con recetas y pedidos con fechas, items e
+historial de estados a distintas escalas, de 1.000 a 10.000.000 de filas.
+Las filas se insertan por lotes con sentencias INSERT masivas, sin construir
+objetos del ORM.
+
+Uso:
+    python generador_datos.py --db datos_prueba.db --pedidos 100000 --semilla 42
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from sqlalchemy import func, insert
+from sqlalchemy.orm import Session
+
+NOMBRES = ["Carlos", "María", "José", "Ana", "Luis", "Camila", "Jorge", "Valentina", "Pedro",
+           "Francisca", "Diego", "Javiera", "Andrés", "Catalina", "Felipe", "Constanza", "Matías",
+           "Daniela", "Sebastián", "Fernanda"]
+APELLIDOS = ["González", "Muñoz", "Rojas", "Díaz", "Pérez", "Soto", "Contreras", "Silva",
+             "Martínez", "Sepúlveda", "Morales", "Rodríguez", "López", "Fuentes", "Hernández",
+             "Torres", "Araya", "Flores", "Espinoza", "Valenzuela"]
+DOMINIOS = ["gmail.com", "hotmail.com", "outlook.com", "yahoo.com", "empresa.cl"]
+INGREDIENTES_BASE = [
+    ("Harina", "kg"), ("Tomate", "kg"), ("Queso", "kg"), ("Jamón", "kg"), ("Pepperoni", "kg"),
+    ("Champiñón", "kg"), ("Aceituna", "kg"), ("Cebolla", "kg"), ("Pimentón", "kg"), ("Carne", "kg"),
+    ("Pollo", "kg"), ("Lechuga", "kg"), ("Palta", "kg"), ("Pan", "unidades"), ("Papa", "kg"),
+    ("Aceite", "litros"), ("Leche", "litros"), ("Huevo", "unidades"), ("Azúcar", "kg"),
+    ("Chocolate", "kg"), ("Crema", "litros"), ("Bebida", "litros"), ("Jugo", "litros"), ("Café", "kg"),
+]
+CATEGORIAS = {
+    "Pizzas": (8000, 16000), "Sándwiches": (4000, 9000), "Ensaladas": (4500, 8000),
+    "Acompañamientos": (2000, 4500), "Postres": (2500, 5500), "Bebidas": (1200, 3000),
+}
+# Peso relativo de pedidos por hora del día (almuerzo y cena más concurridos)
+PESO_HORAS = [0, 0, 0, 0, 0, 0, 0, 0, 1, 2, 3, 6, 10, 12, 8, 4, 3, 4, 6, 9, 11, 9, 5, 2]
+# Peso relativo por día de la semana (lunes=0): fines de semana más concurridos
+PESO_DIAS = [0.8, 0.8, 0.9, 1.0, 1.3, 1.5, 1.2]
+
+
+def digito_verificador(numero: int) -> str:
+    """Calcula el dígito verificador de un RUT chileno"""
+    suma, multiplicador = 0, 2
+    while numero:
+        suma += (numero % 10) * multiplicador
+        numero //= 10
+        multiplicador = 2 if multiplicador == 7 else multiplicador + 1
+    resto = 11 - suma % 11
+    return {11: "0", 10: "K"}.get(resto, str(resto))
+
+
+class GeneradorDatos:
+    def __init__(self, semilla: int = 42, lote: int = 50000):
+        self.random = random.Random(semilla)
+        # Los tiempos de preparación usan su propia secuencia: no alteran el resto de los datos
+        self.random_tiempos = random.Random(semilla + 1)
+        self.lote = lote
+
+    @staticmethod
+    def _siguiente_id(db: Session, modelo) -> int:
+        return (db.query(func.max(modelo.id)).scalar() or 0) + 1
+
+    def _insertar(self, db: Session, modelo, filas: List[Dict]) -> None:
+        if filas:
+            db.execute(insert(modelo), filas)
+
+    def generar_clientes(self, db: Session, cantidad: int) -> List[int]:
+        from models import Cliente
+        inicio = self._siguiente_id(db, Cliente)
+        ruts_usados = {r for (r,) in db.query(Cliente.rut).all()}
+        filas = []
+        for cliente_id in range(inicio, inicio + cantidad):
+            numero = 5000000 + cliente_id * 7 + self.random.randint(0, 6)
+            rut = f"{numero}-{digito_verificador(numero)}"
+            while rut in ruts_usados:
+                numero += 1
+                rut = f"{numero}-{digito_verificador(numero)}"
+            ruts_usados.add(rut)
+            nombre = self.random.choice(NOMBRES)
+            apellido = self.random.choice(APELLIDOS)
+            correo = None
+            if self.random.random() < 0.7:
+                correo = f"{nombre.lower()}.{apellido.lower()}{cliente_id}@{self.random.choice(DOMINIOS)}"
+                correo = correo.encode("ascii", "ignore").decode("ascii")
+            filas.append({"id": cliente_id, "rut": rut, "nombre": f"{nombre} {apellido}", "correo": correo})
+            if len(filas) >= self.lote:
+                self._insertar(db, Cliente, filas)
+                filas = []
+        self._insertar(db, Cliente, filas)
+        db.commit()
+        return list(range(inicio, inicio + cantidad))
+
+    def generar_ingredientes(self, db: Session, cantidad: int) -> List[str]:
+        from models import Ingrediente
+        inicio = self._siguiente_id(db, Ingrediente)
+        existentes = {n for (n,) in db.query(Ingrediente.nombre).all()}
+        filas, nombres = [], []
+        for i in range(cantidad):
+            base, unidad = INGREDIENTES_BASE[i % len(INGREDIENTES_BASE)]
+            nombre = base if i < len(INGREDIENTES_BASE) else f"{base} {i // len(INGREDIENTES_BASE) + 1}"
+            if nombre in existentes:
+                nombre = f"{nombre} ({inicio + i})"
+            nombres.append(nombre)
+            filas.append({"id": inicio + i, "nombre": nombre, "unidad": unidad,
+                          "stock": round(self.random.uniform(500, 50000), 2)})
+        self._insertar(db, Ingrediente, filas)
+        db.commit()
+        return nombres
+
+    def generar_menus(self, db: Session, cantidad: int, ingredientes: List[str]) -> Dict[int, float]:
+        """Crea menús con recetas de 2 a 6 ingredientes. Retorna {menu_id: precio}"""
+        from models import Menu
+        inicio = self._siguiente_id(db, Menu)
+        categorias = list(CATEGORIAS)
+        filas, precios = [], {}
+        for i in range(cantidad):
+            categoria = categorias[i % len(categorias)]
+            minimo, maximo = CATEGORIAS[categoria]
+            precio = float(self.random.randrange(minimo, maximo, 100))
+            receta = None
+            if ingredientes and categoria != "Bebidas":
+                elegidos = self.random.sample(ingredientes, min(len(ingredientes), self.random.randint(2, 6)))
+                receta = {nombre: round(self.random.uniform(0.02, 0.4), 3) for nombre in elegidos}
+            filas.append({
+                "id": inicio + i, "nombre": f"{categoria} {i + 1}", "descripcion": f"{categoria} de la casa",
+                "precio": precio, "categoria": categoria, "disponible": 1 if self.random.random() < 0.95 else 0,
+                "receta": receta,
+            })
+            precios[inicio + i] = precio
+        self._insertar(db, Menu, filas)
+        db.commit()
+        return precios
+
+    def _transiciones(self, pedido_id: int, fecha: datetime, estado: str, factor: float) -> List[Dict]:
+        """Historial de estados del pedido; la espera y la preparación crecen en las horas concurridas"""
+        filas = [{"pedido_id": pedido_id, "estado_anterior": None, "estado": "Pendiente", "fecha": fecha}]
+        carga = 1 + 0.8 * PESO_HORAS[fecha.hour] / max(PESO_HORAS)
+        if estado != "Pendiente":
+            inicio = fecha + timedelta(minutes=self.random_tiempos.lognormvariate(1.1, 0.5) * carga)
+            filas.append({"pedido_id": pedido_id, "estado_anterior": "Pendiente",
+                          "estado": "En preparación", "fecha": inicio})
+            if estado == "Completado":
+                minutos = self.random_tiempos.lognormvariate(2.5, 0.35) * carga * factor
+                filas.append({"pedido_id": pedido_id, "estado_anterior": "En preparación",
+                              "estado": "Completado", "fecha": inicio + timedelta(minutes=minutos)})
+        return filas
+
+    def generar_pedidos(self, db: Session, cantidad: int, cliente_ids: List[int],
+                        menu_ids: List[int], dias: int = 730, fin: datetime = None) -> int:
+        """Crea `cantidad` pedidos de 1 a 4 items repartidos en los últimos `dias` días. Retorna la cantidad de items"""
+        from models import Pedido, ItemPedido, HistorialEstadoPedido
+        fin = fin or datetime.now()
+        primer_dia = (fin - timedelta(days=dias)).replace(hour=0, minute=0, second=0, microsecond=0)
+        pesos_dia = [PESO_DIAS[(primer_dia + timedelta(days=d)).weekday()] for d in range(dias)]
+        horas = list(range(24))
+        # Unos pocos menús concentran la mayoría de las ventas (pesos de Zipf)
+        pesos_menu = [1.0 / (rango + 1) for rango in range(len(menu_ids))]
+        estados = ["Completado"] * 90 + ["En preparación"] * 5 + ["Pendiente"] * 5
+        # Cada menú tarda más o menos que el promedio; un pedido, lo que su menú más lento
+        factor_menu = {menu_id: self.random_tiempos.uniform(0.6, 1.8) for menu_id in menu_ids}
+
+        # Pedidos por día proporcionales al peso del día, en orden cronológico
+        suma_pesos = sum(pesos_dia)
+        por_dia = [int(cantidad * p / suma_pesos) for p in pesos_dia]
+        for d in self.random.sample(range(dias), min(dias, cantidad - sum(por_dia))):
+            por_dia[d] += 1
+
+        pedido_id = self._siguiente_id(db, Pedido)
+        item_id = self._siguiente_id(db, ItemPedido)
+        total_items = 0
+        pedidos, items, historial = [], [], []
+        for d, n in enumerate(por_dia):
+            horas_dia = sorted(self.random.choices(horas, weights=PESO_HORAS, k=n))
+            for h in horas_dia:
+                fecha = primer_dia + timedelta(days=d, hours=h, minutes=self.random.randrange(60),
+                                               seconds=self.random.randrange(60))
+                pedido = {
+                    "id": pedido_id, "fecha": fecha, "cliente_id": self.random.choice(cliente_ids),
+                    "estado": self.random.choice(estados) if d >= dias - 1 else "Completado",
+                }
+                pedidos.append(pedido)
+                menus_pedido = set(self.random.choices(menu_ids, weights=pesos_menu, k=self.random.randint(1, 4)))
+                for menu_id in menus_pedido:
+                    items.append({"id": item_id, "pedido_id": pedido_id, "menu_id": menu_id,
+                                  "cantidad": self.random.choices([1, 2, 3, 4], weights=[70, 20, 7, 3])[0]})
+                    item_id += 1
+                historial.extend(self._transiciones(pedido_id, fecha, pedido["estado"],
+                                                    max(factor_menu[m] for m in menus_pedido)))
+                pedido_id += 1
+            if len(pedidos) >= self.lote or d == dias - 1:
+                self._insertar(db, Pedido, pedidos)
+                self._insertar(db, ItemPedido, items)
+                self._insertar(db, HistorialEstadoPedido, historial)
+                total_items += len(items)
+                pedidos, items, historial = [], [], []
+                db.commit()
+        return total_items
+
+    def poblar(self, db: Session, pedidos: int, clientes: int = None, ingredientes: int = None,
+               menus: int = None, dias: int = 730) -> Dict[str, int]:
+        """
+        Puebla la base con un conjunto de datos coherente para la escala indicada.
+        Si no se indican, la cantidad de clientes, ingredientes y menús se
+        deriva de la cantidad de pedidos.
+        """
+        from crud.cliente_crud import ClienteCRUD
+        from crud.version_crud import VersionCRUD
+        from tiempos_preparacion import TiemposPreparacion
+        clientes = clientes or max(50, pedidos // 20)
+        ingredientes = ingredientes or min(500, max(len(INGREDIENTES_BASE), pedidos // 2000))
+        menus = menus or min(300, max(30, pedidos // 5000))
+
+        cliente_ids = self.generar_clientes(db, clientes)
+        nombres_ingredientes = self.generar_ingredientes(db, ingredientes)
+        precios = self.generar_menus(db, menus, nombres_ingredientes)
+        total_items = self.generar_pedidos(db, pedidos, cliente_ids, list(precios), dias)
+
+        # Los pedidos se insertan en bloque, sin pasar por PedidoCRUD
+        ClienteCRUD.recalcular_estadisticas(db)
+        TiemposPreparacion.reconstruir(db)
+        VersionCRUD.incrementar(db, "pedidos", "menus")
+        db.commit()
+        return {"clientes": clientes, "ingredientes": ingredientes, "menus": menus,
+                "pedidos": pedidos, "items": total_items}
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Genera datos sintéticos reproducibles")
+    parser.add_argument("--db", required=True, help="Archivo SQLite a poblar (se crea si no existe)")
+    parser.add_argument("--pedidos", type=int, default=1000, help="Cantidad de pedidos (1000 a 10000000)")
+    parser.add_argument("--clientes", type=int, default=None)
+    parser.add_argument("--ingredientes", type=int, default=None)
+    parser.add_argument("--menus", type=int, default=None)
+    parser.add_argument("--dias", type=int, default=730, help="Días de historial hacia atrás")
+    parser.add_argument("--semilla", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    os.environ["PROYECTO_DATABASE_URL"] = f"sqlite:///{os.path.abspath(args.db)}"
+    from database import SessionLocal, actualizar_esquema
+    import models  # noqa: F401  (registra los modelos en Base)
+    actualizar_esquema()
+
+    db = SessionLocal()
+    try:
+        inicio = time.perf_counter()
+        conteo = GeneradorDatos(args.semilla).poblar(
+            db, args.pedidos, args.clientes, args.ingredientes, args.menus, args.dias
+        )
+        print(f"Generado en {time.perf_counter() - inicio:.2f}s: " +
+              ", ".join(f"{k}={v}" for k, v in conteo.items()))
+    finally:
+        db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,13 @@
 import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from sqlalchemy import func
 from sqlalchemy.orm import Session
-from models import Pedido, ItemPedido, Menu, Ingrediente
-from datetime import datetime, timedelta
+from models import Menu, Ingrediente
+from archivo import fuente_ventas
+from tiempos_preparacion import TiemposPreparacion
+from datetime import date, datetime, timedelta
 from typing import List, Dict, Tuple
 from functools import reduce
+import io
 
 class GraficosEstadisticos:
     
@@ -20,22 +23,24 @@ class GraficosEstadisticos:
         """
         Obtiene las ventas agrupadas por fecha según el periodo especificado.
         Periodos: 'diario', 'semanal', 'mensual', 'anual'
+        Incluye los pedidos archivados. Las ventas se suman por día en SQL y
+        los días se agrupan por periodo en Python.
         """
         try:
-            pedidos = db.query(Pedido).all()
+            ventas_items = fuente_ventas()
+            dia = func.date(ventas_items.c.fecha)
+            filas = db.query(dia, func.sum(ventas_items.c.subtotal)).filter(
+                ventas_items.c.fecha.isnot(None)
+            ).group_by(dia).all()
             
-            if not GraficosEstadisticos.validar_datos_disponibles(pedidos):
+            if not GraficosEstadisticos.validar_datos_disponibles(filas):
                 return {}
             
             ventas = {}
             
-            for pedido in pedidos:
-                if not pedido.fecha:
-                    continue
-                    
+            for dia_venta, total in filas:
                 try:
-                    fecha = pedido.fecha
-                    total = pedido.total
+                    fecha = datetime.strptime(dia_venta, "%Y-%m-%d")
                     
                     if periodo == "diario":
                         clave = fecha.strftime("%Y-%m-%d")
@@ -49,9 +54,9 @@ class GraficosEstadisticos:
                     else:
                         clave = fecha.strftime("%Y-%m-%d")
                     
-                    ventas[clave] = ventas.get(clave, 0.0) + total
+                    ventas[clave] = ventas.get(clave, 0.0) + (total or 0.0)
                     
-                except (ValueError, AttributeError) as e:
+                except (ValueError, TypeError) as e:
                     # Manejar errores de formato en fechas
                     continue
             
@@ -62,19 +67,17 @@ class GraficosEstadisticos:
     
     @staticmethod
     def obtener_distribucion_menus(db: Session) -> Dict[str, int]:
-        """Obtiene la cantidad de veces que cada menú ha sido comprado"""
+        """Obtiene la cantidad de veces que cada menú ha sido comprado (incluye pedidos archivados)"""
         try:
-            items = db.query(ItemPedido).all()
+            ventas_items = fuente_ventas()
+            filas = db.query(Menu.nombre, func.sum(ventas_items.c.cantidad)).join(
+                ventas_items, ventas_items.c.menu_id == Menu.id
+            ).filter(Menu.nombre.isnot(None)).group_by(Menu.nombre).all()
             
-            if not GraficosEstadisticos.validar_datos_disponibles(items):
+            if not GraficosEstadisticos.validar_datos_disponibles(filas):
                 return {}
             
-            # Usar reduce para sumar las cantidades
-            distribucion = {}
-            for item in items:
-                if item.menu and item.menu.nombre:
-                    nombre = item.menu.nombre
-                    distribucion[nombre] = distribucion.get(nombre, 0) + item.cantidad
+            distribucion = {nombre: cantidad for nombre, cantidad in filas if nombre}
             
             # Ordenar por cantidad (mayor a menor)
             return dict(sorted(distribucion.items(), key=lambda x: x[1], reverse=True))
@@ -84,29 +87,28 @@ class GraficosEstadisticos:
     
     @staticmethod
     def obtener_uso_ingredientes(db: Session) -> Dict[str, float]:
-        """Calcula el uso total de cada ingrediente en todos los pedidos"""
+        """Calcula el uso total de cada ingrediente en todos los pedidos (incluye pedidos archivados)"""
         try:
-            pedidos = db.query(Pedido).all()
+            ventas_items = fuente_ventas()
+            vendidos = db.query(Menu.receta, func.sum(ventas_items.c.cantidad)).join(
+                ventas_items, ventas_items.c.menu_id == Menu.id
+            ).group_by(Menu.id).all()
             
-            if not GraficosEstadisticos.validar_datos_disponibles(pedidos):
+            if not GraficosEstadisticos.validar_datos_disponibles(vendidos):
                 return {}
             
             uso_ingredientes = {}
             
-            for pedido in pedidos:
-                for item in pedido.items:
-                    menu = item.menu
-                    cantidad_menu = item.cantidad
-                    
-                    # Si el menú tiene receta, calcular ingredientes
-                    if menu and menu.receta:
-                        for ingrediente, cantidad_por_menu in menu.receta.items():
-                            try:
-                                cantidad_total = cantidad_por_menu * cantidad_menu
-                                uso_ingredientes[ingrediente] = uso_ingredientes.get(ingrediente, 0.0) + cantidad_total
-                            except (ValueError, TypeError):
-                                # Manejar errores de formato en cantidades
-                                continue
+            for receta, cantidad_menu in vendidos:
+                # Si el menú tiene receta, calcular ingredientes
+                if receta:
+                    for ingrediente, cantidad_por_menu in receta.items():
+                        try:
+                            cantidad_total = cantidad_por_menu * cantidad_menu
+                            uso_ingredientes[ingrediente] = uso_ingredientes.get(ingrediente, 0.0) + cantidad_total
+                        except (ValueError, TypeError):
+                            # Manejar errores de formato en cantidades
+                            continue
             
             return dict(sorted(uso_ingredientes.items(), key=lambda x: x[1], reverse=True))
             
@@ -167,6 +169,32 @@ class GraficosEstadisticos:
         except Exception as e:
             return None, f"Error al generar gráfico: {str(e)}"
     
+    @staticmethod
+    def graficar_top_clientes(db: Session):
+        """Genera gráfico de barras horizontales de los clientes con mayor gasto acumulado"""
+        try:
+            from analisis_clientes import AnalisisClientes
+            clientes = AnalisisClientes.obtener_top_clientes(db, 10)
+            
+            if not clientes:
+                return None, "No hay datos disponibles para mostrar top clientes"
+            
+            fig, ax = plt.subplots(figsize=(10, 6))
+            
+            nombres = [f"{c.nombre} ({c.total_pedidos} ped.)" for c in reversed(clientes)]
+            gastos = [c.total_gastado for c in reversed(clientes)]
+            
+            ax.barh(nombres, gastos, color='mediumseagreen')
+            ax.set_xlabel('Gasto Acumulado ($)')
+            ax.set_ylabel('Cliente')
+            ax.set_title('Top 10 Clientes')
+            plt.tight_layout()
+            
+            return fig, None
+            
+        except Exception as e:
+            return None, f"Error al generar gráfico: {str(e)}"
+    
     @staticmethod
     def graficar_uso_ingredientes(db: Session):
         """Genera gráfico circular del uso de ingredientes"""
@@ -201,3 +229,204 @@ class GraficosEstadisticos:
             
         except Exception as e:
             return None, f"Error al generar gráfico: {str(e)}"
+    
+    DIAS_SEMANA = ["Lunes", "Martes", "Miércoles", "Jueves", "Viernes", "Sábado", "Domingo"]
+    
+    @staticmethod
+    def obtener_mapa_calor_horario(db: Session, fecha_inicio: date = None, fecha_fin: date = None,
+                                   categoria: str = None) -> Dict[str, List[List[float]]]:
+        """
+        Cantidad de pedidos e ingresos por día de la semana y hora (7 x 24).
+        Se calcula con una sola agregación en SQL sobre el índice de Pedido.fecha
+        (en la base principal y en el archivo), sin cargar objetos del ORM. Filas: lunes a domingo; columnas: horas 0 a 23.
+        Con categoría, sólo se consideran los items de menús de esa categoría.
+        """
+        try:
+            ventas_items = fuente_ventas()
+            dia = func.strftime("%w", ventas_items.c.fecha)  # 0=domingo
+            hora = func.strftime("%H", ventas_items.c.fecha)
+            consulta = db.query(
+                dia, hora,
+                func.count(func.distinct(ventas_items.c.pedido_id)),
+                func.sum(ventas_items.c.subtotal)
+            )
+            
+            if fecha_inicio:
+                consulta = consulta.filter(ventas_items.c.fecha >= datetime.combine(fecha_inicio, datetime.min.time()))
+            if fecha_fin:
+                # La fecha final es inclusiva
+                consulta = consulta.filter(ventas_items.c.fecha < datetime.combine(fecha_fin + timedelta(days=1), datetime.min.time()))
+            if categoria:
+                consulta = consulta.join(Menu, Menu.id == ventas_items.c.menu_id).filter(Menu.categoria == categoria)
+            
+            pedidos = [[0] * 24 for _ in range(7)]
+            ingresos = [[0.0] * 24 for _ in range(7)]
+            for dia_semana, hora_dia, cantidad, total in consulta.group_by(dia, hora).all():
+                if dia_semana is None or hora_dia is None:
+                    continue
+                fila = (int(dia_semana) + 6) % 7  # lunes=0
+                pedidos[fila][int(hora_dia)] = cantidad
+                ingresos[fila][int(hora_dia)] = total or 0.0
+            
+            return {"pedidos": pedidos, "ingresos": ingresos}
+            
+        except Exception as e:
+            raise Exception(f"Error al obtener mapa de calor: {str(e)}")
+    
+    @staticmethod
+    def graficar_mapa_calor(db: Session, fecha_inicio: date = None, fecha_fin: date = None, categoria: str = None):
+        """Genera los mapas de calor de pedidos e ingresos por día de la semana y hora"""
+        try:
+            datos = GraficosEstadisticos.obtener_mapa_calor_horario(db, fecha_inicio, fecha_fin, categoria)
+            
+            if not any(any(fila) for fila in datos["pedidos"]):
+                return None, "No hay datos disponibles para mostrar el mapa de calor"
+            
+            fig, (ax_pedidos, ax_ingresos) = plt.subplots(2, 1, figsize=(10, 8))
+            
+            for ax, clave, titulo, mapa_color in (
+                (ax_pedidos, "pedidos", "Pedidos", "YlOrRd"),
+                (ax_ingresos, "ingresos", "Ingresos ($)", "YlGnBu"),
+            ):
+                imagen = ax.imshow(datos[clave], aspect="auto", cmap=mapa_color)
+                ax.set_yticks(range(7))
+                ax.set_yticklabels(GraficosEstadisticos.DIAS_SEMANA)
+                ax.set_xticks(range(24))
+                ax.set_xticklabels([f"{h:02d}" for h in range(24)], fontsize=8)
+                ax.set_title(titulo)
+                fig.colorbar(imagen, ax=ax)
+            
+            ax_ingresos.set_xlabel("Hora del día")
+            filtros = []
+            if fecha_inicio or fecha_fin:
+                filtros.append(f"{fecha_inicio or '...'} a {fecha_fin or '...'}")
+            if categoria:
+                filtros.append(categoria)
+            fig.suptitle("Pedidos por Día y Hora" + (f" ({', '.join(filtros)})" if filtros else ""))
+            plt.tight_layout()
+            
+            return fig, None
+            
+        except Exception as e:
+            return None, f"Error al generar gráfico: {str(e)}"
+    
+    @staticmethod
+    def graficar_tiempos_por_menu(db: Session):
+        """Genera barras horizontales con p50, p90 y p99 del tiempo de preparación de los 15 menús más preparados"""
+        try:
+            filas = TiemposPreparacion.por_menu(db, 15)
+            
+            if not filas:
+                return None, "No hay pedidos completados para mostrar tiempos de preparación"
+            
+            fig, ax = plt.subplots(figsize=(10, 7))
+            
+            filas = list(reversed(filas))
+            posiciones = range(len(filas))
+            alto = 0.27
+            for desplazamiento, campo, etiqueta, color in (
+                (-alto, "p50", "p50", "mediumseagreen"), (0, "p90", "p90", "orange"), (alto, "p99", "p99", "indianred"),
+            ):
+                ax.barh([p + desplazamiento for p in posiciones], [getattr(f, campo) / 60 for f in filas],
+                        height=alto, label=etiqueta, color=color)
+            ax.set_yticks(list(posiciones))
+            ax.set_yticklabels([f"{f.clave} ({f.cantidad})" for f in filas])
+            ax.set_xlabel('Minutos')
+            ax.set_title('Tiempo de Preparación por Menú')
+            ax.legend()
+            plt.tight_layout()
+            
+            return fig, None
+            
+        except Exception as e:
+            return None, f"Error al generar gráfico: {str(e)}"
+    
+    @staticmethod
+    def graficar_tiempos_por_hora(db: Session):
+        """Genera líneas de p50, p90 y p99 del tiempo de preparación según la hora en que empezó"""
+        try:
+            filas = TiemposPreparacion.por_hora(db)
+            
+            if not any(f.cantidad for f in filas):
+                return None, "No hay pedidos completados para mostrar tiempos de preparación"
+            
+            fig, ax = plt.subplots(figsize=(10, 6))
+            
+            horas = [f.clave for f in filas]
+            for campo, color in (("p50", "mediumseagreen"), ("p90", "orange"), ("p99", "indianred")):
+                # Las horas sin pedidos quedan como huecos en la línea
+                minutos = [getattr(f, campo) / 60 if f.cantidad else float("nan") for f in filas]
+                ax.plot(horas, minutos, marker='o', label=campo, color=color)
+            
+            ax.set_xticks(horas)
+            ax.set_xticklabels([f"{h:02d}" for h in horas], fontsize=8)
+            ax.set_xlabel('Hora de inicio de la preparación')
+            ax.set_ylabel('Minutos')
+            ax.set_title('Tiempo de Preparación por Hora')
+            ax.legend()
+            ax.grid(True, alpha=0.3)
+            plt.tight_layout()
+            
+            return fig, None
+            
+        except Exception as e:
+            return None, f"Error al generar gráfico: {str(e)}"
+    
+    # Tipos de gráfico disponibles en la pestaña Gráficos
+    TIPOS_GRAFICO = ["Ventas por Fecha", "Menús Más Vendidos", "Uso de Ingredientes", "Mapa de Calor Horario",
+                     "Top Clientes", "Tiempos de Preparación por Menú", "Tiempos de Preparación por Hora"]
+    PERIODOS = ["diario", "semanal", "mensual", "anual"]
+    
+    @staticmethod
+    def generar_figura(db: Session, tipo: str, periodo: str = "diario", filtros: Dict = None):
+        """
+        Genera la figura del tipo indicado. Retorna (figura, error).
+        filtros: {"fecha_inicio", "fecha_fin", "categoria"} para los gráficos que los usan
+        """
+        filtros = filtros or {}
+        if tipo == "Ventas por Fecha":
+            return GraficosEstadisticos.graficar_ventas_por_fecha(db, periodo)
+        elif tipo == "Menús Más Vendidos":
+            return GraficosEstadisticos.graficar_distribucion_menus(db)
+        elif tipo == "Uso de Ingredientes":
+            return GraficosEstadisticos.graficar_uso_ingredientes(db)
+        elif tipo == "Top Clientes":
+            return GraficosEstadisticos.graficar_top_clientes(db)
+        elif tipo == "Tiempos de Preparación por Menú":
+            return GraficosEstadisticos.graficar_tiempos_por_menu(db)
+        elif tipo == "Tiempos de Preparación por Hora":
+            return GraficosEstadisticos.graficar_tiempos_por_hora(db)
+        elif tipo == "Mapa de Calor Horario":
+            return GraficosEstadisticos.graficar_mapa_calor(
+                db, filtros.get("fecha_inicio"), filtros.get("fecha_fin"), filtros.get("categoria")
+            )
+        return None, f"Tipo de gráfico desconocido: {tipo}"
+    
+    @staticmethod
+    def usa_periodo(tipo: str) -> bool:
+        """Indica si el gráfico depende del periodo seleccionado"""
+        return tipo == "Ventas por Fecha"
+    
+    @staticmethod
+    def usa_filtros(tipo: str) -> bool:
+        """Indica si el gráfico acepta filtros de rango de fechas y categoría"""
+        return tipo == "Mapa de Calor Horario"
+    
+    @staticmethod
+    def renderizar_grafico(db: Session, tipo: str, periodo: str = "diario", formato: str = "png",
+                           filtros: Dict = None) -> Tuple[bytes, str]:
+        """
+        Genera el gráfico y lo renderiza a una imagen (png o svg).
+        Retorna (datos, error). La figura se cierra después de renderizar.
+        """
+        fig, error = GraficosEstadisticos.generar_figura(db, tipo, periodo, filtros)
+        if error or fig is None:
+            return None, error or "No se pudo generar el gráfico"
+        try:
+            buffer = io.BytesIO()
+            fig.savefig(buffer, format=formato)
+            return buffer.getvalue(), None
+        except Exception as e:
+            return None, f"Error al renderizar gráfico: {str(e)}"
+        finally:
+            plt.close(fig)
@@ -0,0 +1,188 @@
+"""
+Instrumentación de consultas SQL basada en eventos del engine.
+
+Cuenta y mide las sentencias ejecutadas dentro de cada operación (método
+CRUD o acción de la interfaz), marca como posible N+1 las sentencias
+idénticas repetidas dentro de una misma llamada y, en modo estricto, hace
+que las cargas perezosas (lazy loads) lancen una excepción.
+
+Uso:
+    instrumentacion.instalar(engine)
+    instrumentacion.instrumentar_clase(ClienteCRUD)
+    with instrumentacion.operacion("cargar_pedidos"):
+        ...
+    instrumentacion.exportar_json("diagnostico.json")
+"""
+import functools
+import json
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+
+class CargaPerezosaError(Exception):
+    """Se lanza en modo estricto cuando una relación se carga de forma perezosa"""
+
+
+class _Llamada:
+    """Sentencias ejecutadas durante una llamada a una operación"""
+    __slots__ = ("nombre", "sentencias", "tiempo_sql", "inicio")
+
+    def __init__(self, nombre: str):
+        self.nombre = nombre
+        self.sentencias = Counter()
+        self.tiempo_sql = 0.0
+        self.inicio = time.perf_counter()
+
+
+class Instrumentacion:
+    def __init__(self, umbral_n_mas_1: int = 5):
+        # Una sentencia repetida esta cantidad de veces en una llamada se marca como N+1
+        self.umbral_n_mas_1 = umbral_n_mas_1
+        self.estricto = False
+        self._pila: ContextVar[tuple] = ContextVar("pila_operaciones", default=())
+        self._estadisticas: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._engines = set()
+        self._sesiones_instaladas = False
+
+    # Eventos del engine
+
+    def instalar(self, engine) -> None:
+        """Registra los eventos en el engine (una sola vez por engine)"""
+        if id(engine) in self._engines:
+            return
+        self._engines.add(id(engine))
+        event.listen(engine, "before_cursor_execute", self._antes_de_ejecutar)
+        event.listen(engine, "after_cursor_execute", self._despues_de_ejecutar)
+        if not self._sesiones_instaladas:
+            event.listen(Session, "do_orm_execute", self._al_ejecutar_orm)
+            self._sesiones_instaladas = True
+
+    def _antes_de_ejecutar(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("instrumentacion_inicio", []).append(time.perf_counter())
+
+    def _despues_de_ejecutar(self, conn, cursor, statement, parameters, context, executemany):
+        inicio = conn.info["instrumentacion_inicio"].pop()
+        duracion = time.perf_counter() - inicio
+        pila = self._pila.get() or (_Llamada("(sin operación)"),)
+        # La sentencia cuenta para la operación actual y para las que la contienen
+        for llamada in pila:
+            llamada.sentencias[statement] += 1
+            llamada.tiempo_sql += duracion
+        if pila[0].nombre == "(sin operación)":
+            self._registrar(pila[0])
+
+    def _al_ejecutar_orm(self, estado):
+        if self.estricto and estado.lazy_loaded_from is not None:
+            clase = estado.lazy_loaded_from.class_.__name__
+            raise CargaPerezosaError(f"Carga perezosa de una relación de {clase} en modo estricto")
+
+    # Operaciones
+
+    def operacion(self, nombre: str):
+        """Context manager que agrupa las sentencias ejecutadas bajo un nombre"""
+        return _ContextoOperacion(self, nombre)
+
+    def _entrar(self, nombre: str):
+        llamada = _Llamada(nombre)
+        token = self._pila.set(self._pila.get() + (llamada,))
+        return llamada, token
+
+    def _salir(self, llamada: _Llamada, token) -> None:
+        self._pila.reset(token)
+        self._registrar(llamada, time.perf_counter() - llamada.inicio)
+
+    def _registrar(self, llamada: _Llamada, tiempo_total: float = 0.0) -> None:
+        cantidad = sum(llamada.sentencias.values())
+        repetidas = {s: n for s, n in llamada.sentencias.items() if n >= self.umbral_n_mas_1}
+        with self._lock:
+            estadistica = self._estadisticas.setdefault(llamada.nombre, {
+                "operacion": llamada.nombre, "llamadas": 0, "sentencias": 0, "max_sentencias": 0,
+                "tiempo_sql": 0.0, "tiempo_total": 0.0, "llamadas_n_mas_1": 0, "n_mas_1": {},
+            })
+            estadistica["llamadas"] += 1
+            estadistica["sentencias"] += cantidad
+            estadistica["max_sentencias"] = max(estadistica["max_sentencias"], cantidad)
+            estadistica["tiempo_sql"] += llamada.tiempo_sql
+            estadistica["tiempo_total"] += tiempo_total
+            if repetidas:
+                estadistica["llamadas_n_mas_1"] += 1
+                for sentencia, veces in repetidas.items():
+                    estadistica["n_mas_1"][sentencia] = max(estadistica["n_mas_1"].get(sentencia, 0), veces)
+
+    def instrumentar(self, nombre: str) -> Callable:
+        """Decorador que registra cada llamada a la función como una operación"""
+        def decorador(funcion):
+            @functools.wraps(funcion)
+            def envoltura(*args, **kwargs):
+                with self.operacion(nombre):
+                    return funcion(*args, **kwargs)
+            envoltura.__instrumentada__ = True
+            return envoltura
+        return decorador
+
+    def instrumentar_clase(self, clase, metodos: Iterable[str] = None) -> None:
+        """
+        Instrumenta los métodos estáticos públicos de una clase CRUD, o los
+        métodos indicados en `metodos` (por ejemplo los manejadores de App).
+        """
+        nombres = metodos if metodos is not None else [
+            n for n, v in vars(clase).items() if isinstance(v, staticmethod) and not n.startswith("_")
+        ]
+        for nombre in nombres:
+            valor = vars(clase)[nombre]
+            es_estatico = isinstance(valor, staticmethod)
+            funcion = valor.__func__ if es_estatico else valor
+            if getattr(funcion, "__instrumentada__", False):
+                continue
+            envoltura = self.instrumentar(f"{clase.__name__}.{nombre}")(funcion)
+            setattr(clase, nombre, staticmethod(envoltura) if es_estatico else envoltura)
+
+    # Resultados
+
+    def resumen(self) -> List[Dict]:
+        """Estadísticas por operación, ordenadas por tiempo total"""
+        with self._lock:
+            filas = []
+            for e in self._estadisticas.values():
+                fila = dict(e)
+                fila["n_mas_1"] = [{"sentencia": s, "repeticiones": n}
+                                   for s, n in sorted(e["n_mas_1"].items(), key=lambda x: -x[1])]
+                fila["promedio_sentencias"] = e["sentencias"] / e["llamadas"] if e["llamadas"] else 0
+                fila["tiempo_sql"] = round(e["tiempo_sql"], 6)
+                fila["tiempo_total"] = round(e["tiempo_total"], 6)
+                filas.append(fila)
+        return sorted(filas, key=lambda f: (f["tiempo_total"], f["tiempo_sql"]), reverse=True)
+
+    def exportar_json(self, ruta: str) -> None:
+        with open(ruta, "w", encoding="utf-8") as archivo:
+            json.dump({"umbral_n_mas_1": self.umbral_n_mas_1, "operaciones": self.resumen()},
+                      archivo, ensure_ascii=False, indent=2)
+
+    def reiniciar(self) -> None:
+        with self._lock:
+            self._estadisticas.clear()
+
+
+class _ContextoOperacion:
+    def __init__(self, instrumentacion: Instrumentacion, nombre: str):
+        self.instrumentacion = instrumentacion
+        self.nombre = nombre
+
+    def __enter__(self) -> _Llamada:
+        self.llamada, self.token = self.instrumentacion._entrar(self.nombre)
+        return self.llamada
+
+    def __exit__(self, *exc) -> bool:
+        self.instrumentacion._salir(self.llamada, self.token)
+        return False
+
+
+# Instancia compartida por la aplicación
+instrumentacion = Instrumentacion()
@@ -1,11 +1,11 @@
-from database import get_session, engine, Base
+from database import get_session, actualizar_esquema
 from crud.cliente_crud import ClienteCRUD
 from crud.ingrediente_crud import IngredienteCRUD
 from crud.menu_crud import MenuCRUD
 from crud.pedido_crud import PedidoCRUD
 
 # Crear las tablas en la base de datos
-Base.metadata.create_all(bind=engine)
+actualizar_esquema()
 
 # Función principal para el uso del CRUD
 def main():
@@ -72,7 +72,7 @@ def main():
         
         # 5. Listar todos los clientes
         print("\n=== TODOS LOS CLIENTES ===")
-        clientes = ClienteCRUD.obtener_todos_clientes(db)
+        clientes = ClienteCRUD.listar_clientes(db)
         for c in clientes:
             print(f"- {c.nombre} (RUT: {c.rut})")
         
@@ -0,0 +1,277 @@
+"""
+Métricas de operación en vivo: pedidos por minuto, ingresos de la última
+hora y ticket promedio.
+
+Se mantienen en memoria con ventanas deslizantes sobre buffers circulares
+de tamaño fijo (una cubeta por segundo para el último minuto y una por
+minuto para la última hora) con sus sumas acumuladas, así registrar un
+pedido y leer las métricas cuesta O(1) sin importar el volumen.
+
+Las alimenta el bus de eventos sin agregar trabajo al commit del
+escritor: el suscriptor sólo anota los IDs de los pedidos creados o
+modificados, y un hilo propio lee sus montos en una consulta por lote
+(juntando los IDs que llegan mientras trabaja) y los suma o ajusta en la
+cubeta de su fecha. Los eliminados se descuentan de memoria, sin
+consultar, en el mismo orden que los eventos. Al iniciar se reconstruyen
+con una sola consulta acotada a la última hora (índice de Pedidos.fecha);
+un evento con IDs desconocidos también las reconstruye.
+
+Uso:
+    metricas_en_vivo.instalar()
+    metricas_en_vivo.instantanea()   # {"pedidos_por_minuto": ..., ...}
+"""
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, en_lotes
+from eventos import EventoCambio, bus_eventos
+from models import ItemPedido, Menu, Pedido
+
+logger = logging.getLogger(__name__)
+
+# (segundos por cubeta, cubetas) de cada ventana
+VENTANA_MINUTO = (1, 60)
+VENTANA_HORA = (60, 60)
+
+
+class VentanaDeslizante:
+    """Cantidad y monto de los últimos ancho * cubetas segundos en un buffer circular"""
+
+    def __init__(self, ancho: int, cubetas: int):
+        self.ancho = ancho
+        self.cubetas = cubetas
+        self._cantidades = [0] * cubetas
+        self._montos = [0.0] * cubetas
+        self._ultima: Optional[int] = None  # Número de la cubeta más reciente
+        self.cantidad = 0
+        self.monto = 0.0
+
+    def _avanzar(self, cubeta: int) -> None:
+        """Vacía las cubetas que salen de la ventana (a lo sumo todas: O(1) amortizado)"""
+        if self._ultima is None:
+            self._ultima = cubeta
+            return
+        for numero in range(self._ultima + 1, min(cubeta, self._ultima + self.cubetas) + 1):
+            posicion = numero % self.cubetas
+            self.cantidad -= self._cantidades[posicion]
+            self.monto -= self._montos[posicion]
+            self._cantidades[posicion] = 0
+            self._montos[posicion] = 0.0
+        if not self.cantidad:
+            self.monto = 0.0  # Sin acumular error de redondeo entre ventanas
+        self._ultima = max(self._ultima, cubeta)
+
+    def agregar(self, instante: float, cantidad: int, monto: float) -> bool:
+        """Suma a la cubeta del instante (segundos epoch); False si ya salió de la ventana"""
+        cubeta = int(instante // self.ancho)
+        self._avanzar(cubeta)
+        if cubeta <= self._ultima - self.cubetas:
+            return False
+        posicion = cubeta % self.cubetas
+        self._cantidades[posicion] += cantidad
+        self._montos[posicion] += monto
+        self.cantidad += cantidad
+        self.monto += monto
+        return True
+
+    def totales(self, instante: float) -> Tuple[int, float]:
+        self._avanzar(int(instante // self.ancho))
+        return self.cantidad, self.monto
+
+    def serie(self, instante: float) -> List[int]:
+        """Cantidad por cubeta, de la más antigua a la actual"""
+        self._avanzar(int(instante // self.ancho))
+        inicio = self._ultima - self.cubetas + 1
+        return [self._cantidades[numero % self.cubetas] for numero in range(inicio, self._ultima + 1)]
+
+    def vaciar(self) -> None:
+        self._cantidades = [0] * self.cubetas
+        self._montos = [0.0] * self.cubetas
+        self._ultima = None
+        self.cantidad = 0
+        self.monto = 0.0
+
+
+class MetricasEnVivo:
+    def __init__(self, sesiones=SessionLocal):
+        self.sesiones = sesiones
+        self.minuto = VentanaDeslizante(*VENTANA_MINUTO)
+        self.hora = VentanaDeslizante(*VENTANA_HORA)
+        self.duracion = VENTANA_HORA[0] * VENTANA_HORA[1]
+        self.rehidrataciones = 0
+        # Pedidos dentro de la ventana: ID -> (instante, monto sumado), y su orden de llegada
+        self._pedidos: Dict[int, Tuple[float, float]] = {}
+        self._orden: deque = deque()
+        self._lock = threading.Lock()
+        self._instalado = False
+        # Pedidos por leer (None = reconstruir todo) y tareas del hilo de métricas
+        self._pendientes: Optional[Set[int]] = set()
+        self._lectura_encolada = False
+        self._cola: Optional[queue.Queue] = None
+
+    @staticmethod
+    def _consulta_totales():
+        return (
+            select(Pedido.id, Pedido.fecha, func.coalesce(func.sum(ItemPedido.cantidad * Menu.precio), 0.0))
+            .outerjoin(ItemPedido, ItemPedido.pedido_id == Pedido.id)
+            .outerjoin(Menu, Menu.id == ItemPedido.menu_id)
+            .group_by(Pedido.id)
+        )
+
+    def _registrar(self, pedido_id: int, fecha: datetime, monto: float) -> None:
+        """Suma el pedido nuevo o la diferencia de su monto; requiere el lock"""
+        anterior = self._pedidos.get(pedido_id)
+        if anterior is not None:
+            instante, monto_anterior = anterior
+            self._sumar(instante, 0, monto - monto_anterior)
+            self._pedidos[pedido_id] = (instante, monto)
+            return
+        instante = fecha.timestamp()
+        if self._sumar(instante, 1, monto):
+            self._pedidos[pedido_id] = (instante, monto)
+            self._orden.append((instante, pedido_id))
+
+    def _quitar(self, pedido_id: int) -> None:
+        anterior = self._pedidos.pop(pedido_id, None)
+        if anterior is not None:
+            self._sumar(anterior[0], -1, -anterior[1])
+
+    def _sumar(self, instante: float, cantidad: int, monto: float) -> bool:
+        en_hora = self.hora.agregar(instante, cantidad, monto)
+        self.minuto.agregar(instante, cantidad, monto)
+        return en_hora
+
+    def _olvidar_antiguos(self, ahora: float) -> None:
+        """Deja de seguir los pedidos que salieron de la ventana de una hora"""
+        while self._orden and self._orden[0][0] <= ahora - self.duracion:
+            _, pedido_id = self._orden.popleft()
+            self._pedidos.pop(pedido_id, None)
+
+    def rehidratar(self, db: Session = None) -> int:
+        """Reconstruye las ventanas con los pedidos de la última hora (una consulta). Retorna cuántos"""
+        propia = db is None
+        db = db or self.sesiones()
+        try:
+            desde = datetime.fromtimestamp(time.time() - self.duracion)
+            filas = db.execute(self._consulta_totales().where(Pedido.fecha >= desde).order_by(Pedido.fecha)).all()
+        finally:
+            if propia:
+                db.close()
+        with self._lock:
+            self.minuto.vaciar()
+            self.hora.vaciar()
+            self._pedidos.clear()
+            self._orden.clear()
+            for pedido_id, fecha, monto in filas:
+                if fecha is not None:
+                    self._registrar(pedido_id, fecha, monto)
+            self.rehidrataciones += 1
+        return len(filas)
+
+    def aplicar(self, evento: EventoCambio) -> None:
+        """
+        Suscriptor del bus (dentro del commit del escritor): sólo anota el
+        cambio para el hilo de métricas, sin consultar la base.
+        """
+        if evento.operacion == "eliminar" and evento.ids is not None:
+            with self._lock:
+                if self._pendientes is not None:
+                    self._pendientes.difference_update(evento.ids)
+            self._poner(("eliminar", evento.ids))
+            return
+        with self._lock:
+            if evento.ids is None or self._pendientes is None:
+                self._pendientes = None
+            else:
+                self._pendientes.update(evento.ids)
+            if self._lectura_encolada:
+                return
+            self._lectura_encolada = True
+        self._poner(("leer", None))
+
+    def leer(self, pedido_ids: List[int]) -> None:
+        """Suma los pedidos nuevos o ajusta el monto de los conocidos (una consulta por lote)"""
+        desde = datetime.fromtimestamp(time.time() - self.duracion)
+        db = self.sesiones()
+        try:
+            filas = [fila for lote in en_lotes(sorted(pedido_ids))
+                     for fila in db.execute(self._consulta_totales()
+                                            .where(Pedido.id.in_(lote), Pedido.fecha >= desde))]
+        finally:
+            db.close()
+        with self._lock:
+            self._olvidar_antiguos(time.time())
+            for pedido_id, fecha, monto in filas:
+                self._registrar(pedido_id, fecha, monto)
+
+    def esperar(self) -> None:
+        """Bloquea hasta que el hilo de métricas aplique los eventos pendientes"""
+        if self._cola is not None:
+            self._cola.join()
+
+    # Hilo de métricas: las tareas se aplican en el orden de los eventos
+
+    def _poner(self, tarea: Tuple[str, Optional[frozenset]]) -> None:
+        with self._lock:
+            if self._cola is None:
+                self._cola = queue.Queue()
+                threading.Thread(target=self._trabajar, name="metricas-en-vivo", daemon=True).start()
+        self._cola.put(tarea)
+
+    def _trabajar(self) -> None:
+        while True:
+            tarea, ids = self._cola.get()
+            try:
+                if tarea == "eliminar":
+                    with self._lock:
+                        for pedido_id in ids:
+                            self._quitar(pedido_id)
+                else:
+                    with self._lock:
+                        pendientes, self._pendientes = self._pendientes, set()
+                        self._lectura_encolada = False
+                    if pendientes is None:
+                        self.rehidratar()
+                    elif pendientes:
+                        self.leer(pendientes)
+            except Exception:
+                logger.exception("Error al actualizar las métricas en vivo (%s)", tarea)
+            finally:
+                self._cola.task_done()
+
+    def instantanea(self, ahora: float = None) -> Dict:
+        """Métricas actuales; O(1) salvo la serie por minuto (60 valores)"""
+        ahora = time.time() if ahora is None else ahora
+        with self._lock:
+            self._olvidar_antiguos(ahora)
+            pedidos_minuto, ingresos_minuto = self.minuto.totales(ahora)
+            pedidos_hora, ingresos_hora = self.hora.totales(ahora)
+            serie = self.hora.serie(ahora)
+        return {
+            "pedidos_por_minuto": pedidos_minuto,
+            "ingresos_ultimo_minuto": round(ingresos_minuto, 2),
+            "pedidos_ultima_hora": pedidos_hora,
+            "ingresos_ultima_hora": round(ingresos_hora, 2),
+            "ticket_promedio": round(ingresos_hora / pedidos_hora, 2) if pedidos_hora else 0.0,
+            "pedidos_por_minuto_hora": serie,
+        }
+
+    def instalar(self) -> None:
+        """Reconstruye las ventanas y luego las mantiene con los eventos de pedidos"""
+        if self._instalado:
+            return
+        self._instalado = True
+        bus_eventos.suscribir(self.aplicar, "pedidos")
+        self.rehidratar()
+
+
+# Instancia compartida por la aplicación (se activa con instalar())
+metricas_en_vivo = MetricasEnVivo()
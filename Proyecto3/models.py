@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Float, Integer, ForeignKey, JSON, DateTime
+from sqlalchemy import Column, String, Float, Integer, ForeignKey, JSON, DateTime, Index, text
 from sqlalchemy.orm import relationship
 from database import Base
 from datetime import datetime
@@ -10,9 +10,16 @@ class Cliente(Base):
     rut = Column(String, unique=True, index=True, nullable=False)
     nombre = Column(String, nullable=False)
     correo = Column(String, nullable=True)
+
+    # Contadores desnormalizados, mantenidos por las escrituras de pedidos
+    total_pedidos = Column(Integer, nullable=False, default=0, server_default="0")
+    total_gastado = Column(Float, nullable=False, default=0.0, server_default="0")
+    primer_pedido = Column(DateTime, nullable=True)
+    ultimo_pedido = Column(DateTime, nullable=True)
     
     # Relaciones
-    pedidos = relationship("Pedido", back_populates="cliente", cascade="all, delete-orphan")
+    # La base elimina los pedidos (ON DELETE CASCADE); el ORM no los carga para borrarlos
+    pedidos = relationship("Pedido", back_populates="cliente", cascade="all, delete-orphan", passive_deletes=True)
 
 
 class Ingrediente(Base):
@@ -22,6 +29,12 @@ class Ingrediente(Base):
     nombre = Column(String, nullable=False, unique=True)
     stock = Column(Float, default=0.0)
     unidad = Column(String, nullable=False)  # Ej: "kg", "litros", "unidades"
+    # Umbrales de reposición (None = sin alerta); ver alertas.py
+    stock_minimo = Column(Float, nullable=True)
+    stock_critico = Column(Float, nullable=True)
+    # Control de concurrencia optimista (ver crud/concurrencia.py)
+    version = Column(Integer, nullable=False, server_default="0")
+    __mapper_args__ = {"version_id_col": version}
 
 
 class Menu(Base):
@@ -34,24 +47,32 @@ class Menu(Base):
     categoria = Column(String, nullable=True)  # Ej: "Pizzas", "Bebidas", "Postres"
     disponible = Column(Integer, default=1)  # 1=disponible, 0=no disponible
     receta = Column(JSON, nullable=True)  # Ej: {"harina": 0.5, "tomate": 0.2}
+    # Control de concurrencia optimista (ver crud/concurrencia.py)
+    version = Column(Integer, nullable=False, server_default="0")
+    __mapper_args__ = {"version_id_col": version}
     
     # Relaciones
-    items = relationship("ItemPedido", back_populates="menu", cascade="all, delete-orphan")
+    items = relationship("ItemPedido", back_populates="menu", cascade="all, delete-orphan", passive_deletes=True)
 
 
 class Pedido(Base):
     __tablename__ = "Pedidos"
+    # AUTOINCREMENT: un ID nunca se reutiliza, ni el de un pedido ya archivado
+    __table_args__ = {"sqlite_autoincrement": True}
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    fecha = Column(DateTime, default=datetime.now)
+    fecha = Column(DateTime, default=datetime.now, index=True)
     estado = Column(String, default="Pendiente")  # Pendiente, En preparación, Completado
+    # Control de concurrencia optimista (ver crud/concurrencia.py)
+    version = Column(Integer, nullable=False, server_default="0")
+    __mapper_args__ = {"version_id_col": version}
     
     # Claves foráneas
-    cliente_id = Column(Integer, ForeignKey("Clientes.id"), nullable=False)
+    cliente_id = Column(Integer, ForeignKey("Clientes.id", ondelete="CASCADE"), nullable=False, index=True)
     
     # Relaciones
     cliente = relationship("Cliente", back_populates="pedidos")
-    items = relationship("ItemPedido", back_populates="pedido", cascade="all, delete-orphan")
+    items = relationship("ItemPedido", back_populates="pedido", cascade="all, delete-orphan", passive_deletes=True)
     
     @property
     def total(self) -> float:
@@ -60,13 +81,14 @@ class Pedido(Base):
 
 class ItemPedido(Base):
     __tablename__ = "ItemPedidos"
+    __table_args__ = {"sqlite_autoincrement": True}
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     cantidad = Column(Integer, nullable=False)
 
     # Claves foráneas
-    pedido_id = Column(Integer, ForeignKey("Pedidos.id"), nullable=False)
-    menu_id = Column(Integer, ForeignKey("Menus.id"), nullable=False)
+    pedido_id = Column(Integer, ForeignKey("Pedidos.id", ondelete="CASCADE"), nullable=False, index=True)
+    menu_id = Column(Integer, ForeignKey("Menus.id", ondelete="CASCADE"), nullable=False, index=True)
     
     # Relaciones
     pedido = relationship("Pedido", back_populates="items")
@@ -77,3 +99,93 @@ class ItemPedido(Base):
         if self.menu:
             return self.menu.precio * self.cantidad
         return 0.0
+
+
+class VersionDatos(Base):
+    __tablename__ = "VersionesDatos"
+
+    ambito = Column(String, primary_key=True)  # Ej: "pedidos", "menus"
+    version = Column(Integer, nullable=False, default=0)
+
+
+class AlertaStock(Base):
+    __tablename__ = "AlertasStock"
+    # A lo sumo una alerta activa por ingrediente
+    __table_args__ = (
+        Index("ux_alertas_activas", "ingrediente_id", unique=True, sqlite_where=text("resuelta IS NULL")),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    nivel = Column(String, nullable=False)  # "bajo" o "critico"
+    stock = Column(Float, nullable=False)  # Stock al momento de la alerta
+    umbral = Column(Float, nullable=False)
+    fecha = Column(DateTime, default=datetime.now, index=True)
+    resuelta = Column(DateTime, nullable=True)  # None = alerta activa
+
+    # Claves foráneas
+    ingrediente_id = Column(Integer, ForeignKey("Ingredientes.id", ondelete="CASCADE"), nullable=False, index=True)
+
+
+class HistorialEstadoPedido(Base):
+    __tablename__ = "HistorialEstadosPedido"
+    # Transiciones de un pedido en orden, y las de un estado en un rango de fechas
+    __table_args__ = (
+        Index("ix_historial_pedido_fecha", "pedido_id", "fecha"),
+        Index("ix_historial_estado_fecha", "estado", "fecha"),
+        {"sqlite_autoincrement": True},
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    estado_anterior = Column(String, nullable=True)  # None = creación del pedido
+    estado = Column(String, nullable=False)
+    fecha = Column(DateTime, default=datetime.now, nullable=False)
+
+    # Claves foráneas
+    pedido_id = Column(Integer, ForeignKey("Pedidos.id", ondelete="CASCADE"), nullable=False)
+
+
+class LatenciaPreparacion(Base):
+    __tablename__ = "LatenciasPreparacion"
+
+    # Un resumen de cuantiles por menú y hora del día en que empezó la preparación
+    menu_id = Column(Integer, ForeignKey("Menus.id", ondelete="CASCADE"), primary_key=True)
+    hora = Column(Integer, primary_key=True)  # 0 a 23
+    cantidad = Column(Integer, nullable=False, default=0)
+    resumen = Column(JSON, nullable=False)  # ResumenCuantiles.a_dict() (ver cuantiles.py)
+    # Control de concurrencia optimista (ver crud/concurrencia.py)
+    version = Column(Integer, nullable=False, server_default="0")
+    __mapper_args__ = {"version_id_col": version}
+
+
+# Pedidos antiguos movidos al archivo (base SQLite adjunta como esquema "archivo")
+class PedidoArchivado(Base):
+    __tablename__ = "Pedidos"
+    __table_args__ = {"schema": "archivo"}
+
+    id = Column(Integer, primary_key=True)  # Mismo ID que tenía en Pedidos
+    fecha = Column(DateTime, index=True)
+    estado = Column(String)
+    cliente_id = Column(Integer, nullable=False, index=True)
+    archivado = Column(DateTime, default=datetime.now)
+
+
+class ItemPedidoArchivado(Base):
+    __tablename__ = "ItemPedidos"
+    __table_args__ = {"schema": "archivo"}
+
+    id = Column(Integer, primary_key=True)
+    cantidad = Column(Integer, nullable=False)
+    pedido_id = Column(Integer, nullable=False, index=True)
+    menu_id = Column(Integer, nullable=False, index=True)
+    precio_unitario = Column(Float, nullable=False)  # Precio del menú al momento de archivar
+
+
+class HistorialEstadoPedidoArchivado(Base):
+    __tablename__ = "HistorialEstadosPedido"
+    __table_args__ = {"schema": "archivo"}
+
+    id = Column(Integer, primary_key=True)  # Mismo ID que tenía en HistorialEstadosPedido
+    estado_anterior = Column(String, nullable=True)
+    estado = Column(String, nullable=False)
+    fecha = Column(DateTime, nullable=False)
+    pedido_id = Column(Integer, nullable=False, index=True)
@@ -0,0 +1,160 @@
+"""
+Perfilado bajo demanda de las acciones de la interfaz y de los métodos CRUD.
+
+Se activa con la variable de entorno PROYECTO_PERFIL=1 o con el atajo
+oculto Ctrl+Shift+P de la aplicación. Mientras está desactivado, cada
+llamada envuelta sólo paga la lectura de un atributo.
+
+Con el perfilado activo, la acción más externa (por ejemplo el botón
+presionado) se ejecuta bajo cProfile y un hilo muestrea su pila cada pocos
+milisegundos (tiempo de reloj, incluye esperas de E/S). Por cada acción se
+escribe un volcado .prof y se actualiza un resumen con las acciones más
+lentas.
+"""
+import cProfile
+import functools
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, defaultdict, deque
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List
+
+
+class _Muestreador(threading.Thread):
+    """Toma muestras periódicas de la pila de un hilo"""
+
+    def __init__(self, hilo_id: int, intervalo: float):
+        super().__init__(daemon=True)
+        self.hilo_id = hilo_id
+        self.intervalo = intervalo
+        self.muestras = Counter()
+        self._detener = threading.Event()
+
+    def run(self):
+        while not self._detener.wait(self.intervalo):
+            marco = sys._current_frames().get(self.hilo_id)
+            if marco is None:
+                continue
+            pila = traceback.extract_stack(marco, limit=12)
+            self.muestras[" <- ".join(f"{f.name} ({os.path.basename(f.filename)}:{f.lineno})"
+                                       for f in reversed(pila[-4:]))] += 1
+
+    def detener(self) -> Counter:
+        self._detener.set()
+        self.join()
+        return self.muestras
+
+
+class Perfilador:
+    def __init__(self, directorio: str = "perfiles", top: int = 15,
+                 historial: int = 50, intervalo_muestreo: float = 0.005):
+        self.activo = os.environ.get("PROYECTO_PERFIL") == "1"
+        self.directorio = directorio
+        self.top = top
+        self.intervalo_muestreo = intervalo_muestreo
+        # Últimas duraciones de cada acción (ventana móvil)
+        self._duraciones: Dict[str, deque] = defaultdict(lambda: deque(maxlen=historial))
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def alternar(self) -> bool:
+        """Activa o desactiva el perfilado. Retorna el nuevo estado"""
+        self.activo = not self.activo
+        return self.activo
+
+    def envolver(self, nombre: str, funcion: Callable) -> Callable:
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            if not self.activo:
+                return funcion(*args, **kwargs)
+            return self._perfilar(nombre, funcion, args, kwargs)
+        envoltura.__perfilada__ = True
+        return envoltura
+
+    def perfilar_clase(self, clase, metodos: Iterable[str] = None) -> None:
+        """Envuelve los métodos estáticos públicos de la clase, o los indicados en `metodos`"""
+        nombres = metodos if metodos is not None else [
+            n for n, v in vars(clase).items() if isinstance(v, staticmethod) and not n.startswith("_")
+        ]
+        for nombre in nombres:
+            valor = vars(clase)[nombre]
+            es_estatico = isinstance(valor, staticmethod)
+            funcion = valor.__func__ if es_estatico else valor
+            if getattr(funcion, "__perfilada__", False):
+                continue
+            envoltura = self.envolver(f"{clase.__name__}.{nombre}", funcion)
+            setattr(clase, nombre, staticmethod(envoltura) if es_estatico else envoltura)
+
+    def _perfilar(self, nombre: str, funcion: Callable, args, kwargs):
+        # Sólo la llamada más externa se perfila con cProfile; las internas
+        # (por ejemplo el CRUD llamado por un botón) registran su duración
+        externa = not getattr(self._local, "en_curso", False)
+        perfil = muestreador = None
+        if externa:
+            self._local.en_curso = True
+            perfil = cProfile.Profile()
+            muestreador = _Muestreador(threading.get_ident(), self.intervalo_muestreo)
+            muestreador.start()
+            try:
+                perfil.enable()
+            except ValueError:
+                # Otro perfilador ya está activo (por ejemplo en otro hilo)
+                perfil = None
+
+        inicio = time.perf_counter()
+        try:
+            return funcion(*args, **kwargs)
+        finally:
+            duracion = time.perf_counter() - inicio
+            with self._lock:
+                self._duraciones[nombre].append(duracion)
+            if externa:
+                if perfil:
+                    perfil.disable()
+                muestras = muestreador.detener()
+                self._local.en_curso = False
+                self._guardar(nombre, perfil, muestras, duracion)
+
+    def _guardar(self, nombre: str, perfil: cProfile.Profile, muestras: Counter, duracion: float) -> None:
+        try:
+            os.makedirs(self.directorio, exist_ok=True)
+            sello = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+            base = os.path.join(self.directorio, f"{sello}_{nombre}")
+            if perfil:
+                perfil.dump_stats(f"{base}.prof")
+            with open(f"{base}_muestras.txt", "w", encoding="utf-8") as archivo:
+                archivo.write(f"{nombre}: {duracion * 1000:.1f} ms, {sum(muestras.values())} muestras "
+                              f"cada {self.intervalo_muestreo * 1000:.0f} ms\n\n")
+                for pila, veces in muestras.most_common(30):
+                    archivo.write(f"{veces:>6}  {pila}\n")
+            self.escribir_resumen()
+        except OSError:
+            # El perfilado nunca debe interrumpir la acción del usuario
+            pass
+
+    def resumen(self) -> List[Dict]:
+        """Las `top` acciones más lentas según su duración máxima reciente"""
+        with self._lock:
+            filas = [{
+                "accion": nombre,
+                "llamadas": len(duraciones),
+                "media_ms": round(sum(duraciones) / len(duraciones) * 1000, 2),
+                "max_ms": round(max(duraciones) * 1000, 2),
+                "ultima_ms": round(duraciones[-1] * 1000, 2),
+            } for nombre, duraciones in self._duraciones.items() if duraciones]
+        return sorted(filas, key=lambda f: f["max_ms"], reverse=True)[:self.top]
+
+    def escribir_resumen(self) -> None:
+        with open(os.path.join(self.directorio, "resumen.txt"), "w", encoding="utf-8") as archivo:
+            archivo.write(f"Acciones más lentas (actualizado {datetime.now():%Y-%m-%d %H:%M:%S})\n\n")
+            archivo.write(f"{'acción':<45} {'llamadas':>8} {'media ms':>10} {'máx ms':>10} {'última ms':>10}\n")
+            for fila in self.resumen():
+                archivo.write(f"{fila['accion']:<45} {fila['llamadas']:>8} {fila['media_ms']:>10} "
+                              f"{fila['max_ms']:>10} {fila['ultima_ms']:>10}\n")
+
+
+# Instancia compartida por la aplicación
+perfilador = Perfilador()
@@ -0,0 +1,206 @@
+import argparse
+import sys
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from models import Menu, Ingrediente
+from archivo import fuente_ventas
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Tuple
+
+class PronosticoIngredientes:
+    """
+    Pronóstico de consumo de ingredientes a partir del historial de pedidos.
+    Trabaja sobre series diarias agregadas en SQL (día x menú), nunca sobre
+    los pedidos individuales, por lo que el costo depende de la cantidad de
+    días y no de la cantidad de pedidos.
+    """
+
+    @staticmethod
+    def _dia_semana(dias: np.ndarray) -> np.ndarray:
+        """Día de la semana (0=lunes) de un arreglo datetime64[D]"""
+        # El 1970-01-01 fue jueves
+        return (dias.astype(np.int64) + 3) % 7
+
+    @staticmethod
+    def obtener_consumo_diario(db: Session, desde: date = None,
+                               hasta: date = None) -> Tuple[np.ndarray, List[str], np.ndarray]:
+        """
+        Construye la serie diaria de consumo por ingrediente.
+        Retorna (dias, ingredientes, consumo) donde consumo es una matriz
+        de dimensiones len(dias) x len(ingredientes); los días sin pedidos
+        quedan en cero.
+        """
+        try:
+            # Incluye los pedidos archivados; con `desde` SQLite filtra por fecha en cada base
+            ventas = fuente_ventas()
+            dia = func.date(ventas.c.fecha)
+            consulta = db.query(
+                dia.label("dia"),
+                ventas.c.menu_id,
+                func.sum(ventas.c.cantidad)
+            ).filter(ventas.c.fecha.isnot(None))
+            if desde:
+                consulta = consulta.filter(ventas.c.fecha >= datetime.combine(desde, datetime.min.time()))
+            if hasta:
+                consulta = consulta.filter(ventas.c.fecha < datetime.combine(hasta + timedelta(days=1), datetime.min.time()))
+            filas = consulta.group_by(dia, ventas.c.menu_id).all()
+
+            # Matriz de recetas (menú x ingrediente)
+            recetas = {}
+            ingredientes = {ing.nombre: None for ing in db.query(Ingrediente.nombre).all()}
+            for menu_id, receta in db.query(Menu.id, Menu.receta).filter(Menu.receta.isnot(None)).all():
+                limpia = {}
+                for nombre, cantidad in (receta or {}).items():
+                    try:
+                        limpia[nombre] = float(cantidad)
+                    except (ValueError, TypeError):
+                        # Cantidades con formato inválido se ignoran
+                        continue
+                    ingredientes.setdefault(nombre, None)
+                recetas[menu_id] = limpia
+            nombres = sorted(ingredientes)
+
+            if not filas or not nombres:
+                return np.array([], dtype="datetime64[D]"), nombres, np.zeros((0, len(nombres)))
+
+            dias_filas = np.array([f[0] for f in filas], dtype="datetime64[D]")
+            inicio = np.datetime64(desde, "D") if desde else dias_filas.min()
+            fin = np.datetime64(hasta, "D") if hasta else max(dias_filas.max(), np.datetime64(date.today(), "D"))
+            dias = np.arange(inicio, fin + 1, dtype="datetime64[D]")
+
+            menu_ids = sorted({f[1] for f in filas})
+            indice_menu = {menu_id: i for i, menu_id in enumerate(menu_ids)}
+            indice_ing = {nombre: j for j, nombre in enumerate(nombres)}
+
+            # Unidades vendidas (día x menú)
+            vendidos = np.zeros((len(dias), len(menu_ids)))
+            filas_idx = (dias_filas - inicio).astype(np.int64)
+            cols_idx = np.array([indice_menu[f[1]] for f in filas], dtype=np.int64)
+            np.add.at(vendidos, (filas_idx, cols_idx), np.array([f[2] or 0 for f in filas], dtype=float))
+
+            matriz_recetas = np.zeros((len(menu_ids), len(nombres)))
+            for menu_id, i in indice_menu.items():
+                for nombre, cantidad in recetas.get(menu_id, {}).items():
+                    matriz_recetas[i, indice_ing[nombre]] = cantidad
+
+            return dias, nombres, vendidos @ matriz_recetas
+
+        except Exception as e:
+            raise Exception(f"Error al construir consumo diario: {str(e)}")
+
+    @staticmethod
+    def media_movil(serie: np.ndarray, ventana: int = 7) -> np.ndarray:
+        """
+        Media móvil por columnas usando sumas acumuladas.
+        Los primeros días promedian sólo los valores disponibles.
+        """
+        if ventana <= 0:
+            raise ValueError("La ventana debe ser mayor que cero")
+        if len(serie) == 0:
+            return serie.astype(float)
+        acumulado = np.cumsum(serie, axis=0, dtype=float)
+        resultado = acumulado.copy()
+        resultado[ventana:] = acumulado[ventana:] - acumulado[:-ventana]
+        divisor = np.minimum(np.arange(1, len(serie) + 1), ventana).astype(float)
+        return resultado / divisor.reshape((-1,) + (1,) * (serie.ndim - 1))
+
+    @staticmethod
+    def estacionalidad_semanal(dias: np.ndarray, serie: np.ndarray) -> np.ndarray:
+        """
+        Factores por día de la semana (7 x ingredientes): consumo promedio
+        de cada día dividido por el promedio general. Sin datos el factor es 1.
+        """
+        factores = np.ones((7, serie.shape[1]))
+        if len(dias) == 0:
+            return factores
+        dia_semana = PronosticoIngredientes._dia_semana(dias)
+        sumas = np.zeros((7, serie.shape[1]))
+        np.add.at(sumas, dia_semana, serie)
+        conteo = np.bincount(dia_semana, minlength=7).astype(float)
+        promedios = np.divide(sumas, conteo[:, None], out=np.zeros_like(sumas), where=conteo[:, None] > 0)
+        general = serie.mean(axis=0)
+        np.divide(promedios, general, out=factores, where=(general > 0) & (conteo[:, None] > 0))
+        return factores
+
+    @staticmethod
+    def proyectar_agotamiento(db: Session, ventana: int = 14, semanas_historial: int = 12,
+                              horizonte_dias: int = 365) -> List[Dict]:
+        """
+        Proyecta la fecha de agotamiento de cada ingrediente según su stock actual.
+        El consumo esperado de cada día es la media móvil de los últimos
+        `ventana` días ajustada por la estacionalidad semanal calculada
+        sobre las últimas `semanas_historial` semanas.
+        """
+        try:
+            if horizonte_dias <= 0:
+                raise ValueError("El horizonte debe ser mayor que cero")
+
+            dias, nombres, consumo = PronosticoIngredientes.obtener_consumo_diario(db)
+            stock = {ing.nombre: (ing.stock or 0.0, ing.unidad)
+                     for ing in db.query(Ingrediente.nombre, Ingrediente.stock, Ingrediente.unidad).all()}
+
+            if len(dias) == 0:
+                return [
+                    {"ingrediente": nombre, "unidad": unidad, "stock": cantidad,
+                     "consumo_diario": 0.0, "dias_restantes": None, "fecha_agotamiento": None}
+                    for nombre, (cantidad, unidad) in sorted(stock.items())
+                ]
+
+            base = PronosticoIngredientes.media_movil(consumo, ventana)[-1]
+            reciente = slice(max(0, len(dias) - semanas_historial * 7), None)
+            factores = PronosticoIngredientes.estacionalidad_semanal(dias[reciente], consumo[reciente])
+
+            # Consumo esperado para cada día del horizonte (días x ingredientes)
+            futuros = dias[-1] + np.arange(1, horizonte_dias + 1)
+            esperado = base[None, :] * factores[PronosticoIngredientes._dia_semana(futuros)]
+            acumulado = np.cumsum(esperado, axis=0)
+
+            existencias = np.array([stock.get(nombre, (0.0, None))[0] for nombre in nombres])
+            agotado = acumulado >= existencias[None, :]
+            llega = agotado.any(axis=0) & (base > 0)
+            indice = agotado.argmax(axis=0)
+
+            resultados = []
+            for j, nombre in enumerate(nombres):
+                cantidad, unidad = stock.get(nombre, (0.0, None))
+                fecha = futuros[indice[j]].astype(date) if llega[j] else None
+                resultados.append({
+                    "ingrediente": nombre,
+                    "unidad": unidad,
+                    "stock": cantidad,
+                    "consumo_diario": float(base[j]),
+                    "dias_restantes": int(indice[j]) + 1 if llega[j] else None,
+                    "fecha_agotamiento": fecha,
+                })
+
+            # Primero los que se agotan antes
+            return sorted(resultados, key=lambda r: (r["dias_restantes"] is None, r["dias_restantes"] or 0, r["ingrediente"]))
+
+        except Exception as e:
+            raise Exception(f"Error al proyectar agotamiento: {str(e)}")
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Proyección de agotamiento de ingredientes")
+    parser.add_argument("--ventana", type=int, default=14, help="Días de la media móvil (default: 14)")
+    parser.add_argument("--semanas", type=int, default=12, help="Semanas para la estacionalidad (default: 12)")
+    parser.add_argument("--horizonte", type=int, default=365, help="Días proyectados (default: 365)")
+    args = parser.parse_args(argv)
+
+    from database import SessionLocal, actualizar_esquema
+    actualizar_esquema()
+    db = SessionLocal()
+    try:
+        proyeccion = PronosticoIngredientes.proyectar_agotamiento(db, args.ventana, args.semanas, args.horizonte)
+    finally:
+        db.close()
+    for fila in proyeccion:
+        agotamiento = f"{fila['fecha_agotamiento']} ({fila['dias_restantes']} días)" if fila["fecha_agotamiento"] else "-"
+        print(f"{fila['ingrediente']:<30} {fila['stock']:>10.2f} {fila['unidad'] or '':<10} "
+              f"{fila['consumo_diario']:>8.2f}/día  agota: {agotamiento}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
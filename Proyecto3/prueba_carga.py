@@ -0,0 +1,270 @@
+"""
+Prueba de carga concurrente de la toma de pedidos sobre SQLite.
+
+Lanza N hilos o procesos que ejecutan una mezcla de operaciones (crear
+pedidos, editar items, ajustar stock, leer el catálogo y consultar
+estadísticas) contra un archivo de base de datos, y reporta por operación el
+throughput, la latencia p50/p95/p99, los reintentos por bloqueo ("database is
+locked") y la tasa de errores, además de los conflictos de versión resueltos
+por el control de concurrencia optimista.
+
+Uso:
+    python prueba_carga.py --db carga.db --trabajadores 8 --duracion 30 --journal wal
+    python prueba_carga.py --db carga.db --modo procesos --busy-timeout 0 --salida delete.json
+    python prueba_carga.py --db carga.db --mezcla "ajustar_stock=50,editar_items=50"
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+MEZCLA_DEFECTO = "crear_pedido=40,editar_items=20,leer_catalogo=30,consultar_grafico=10"
+
+
+def crear_engine(config: Dict):
+    """Engine con la configuración de SQLite a evaluar"""
+    from database import adjuntar_archivo, ruta_archivo
+    engine = create_engine(
+        f"sqlite:///{config['db']}",
+        connect_args={"check_same_thread": False, "timeout": config["busy_timeout"] / 1000.0},
+    )
+
+    # Las estadísticas leen también el archivo de pedidos
+    adjuntar_archivo(engine, ruta_archivo(f"sqlite:///{config['db']}"))
+
+    @event.listens_for(engine, "connect")
+    def configurar(conexion, _):
+        cursor = conexion.cursor()
+        cursor.execute(f"PRAGMA journal_mode={config['journal']}")
+        cursor.execute(f"PRAGMA synchronous={config['synchronous']}")
+        cursor.close()
+
+    return engine
+
+
+def _bloqueada(error: Exception) -> bool:
+    texto = str(error).lower()
+    return "database is locked" in texto or "database is busy" in texto
+
+
+def _datos_base(Session) -> Dict:
+    from models import Cliente, Menu, Ingrediente
+    db = Session()
+    try:
+        return {
+            "clientes": [i for (i,) in db.query(Cliente.id).limit(5000).all()],
+            "menus": [i for (i,) in db.query(Menu.id).filter(Menu.disponible == 1).all()],
+            # Pocos ingredientes para que los ajustes de stock compitan entre sí
+            "ingredientes": [i for (i,) in db.query(Ingrediente.id).order_by(Ingrediente.id).limit(5).all()],
+        }
+    finally:
+        db.close()
+
+
+def _operacion(nombre: str, db, datos: Dict, rng: random.Random, propios: List[int]) -> None:
+    from crud.menu_crud import MenuCRUD
+    from crud.ingrediente_crud import IngredienteCRUD
+    from crud.pedido_crud import PedidoCRUD
+    from graficos import GraficosEstadisticos
+
+    if nombre == "crear_pedido":
+        items = [{"menu_id": m, "cantidad": rng.randint(1, 3)}
+                 for m in set(rng.choices(datos["menus"], k=rng.randint(1, 4)))]
+        pedido = PedidoCRUD.crear_pedido(db, rng.choice(datos["clientes"]), items)
+        propios.append(pedido.id)
+
+    elif nombre == "editar_items":
+        if not propios:
+            return _operacion("crear_pedido", db, datos, rng, propios)
+        pedido_id = rng.choice(propios[-50:])
+        accion = rng.random()
+        if accion < 0.5:
+            PedidoCRUD.agregar_item(db, pedido_id, rng.choice(datos["menus"]), 1)
+        else:
+            pedido = PedidoCRUD.obtener_pedido_por_id(db, pedido_id)
+            if pedido and pedido.items:
+                item = rng.choice(pedido.items)
+                if accion < 0.8 or len(pedido.items) == 1:
+                    PedidoCRUD.actualizar_cantidad_item(db, item.id, rng.randint(1, 5))
+                else:
+                    PedidoCRUD.eliminar_item(db, item.id)
+
+    elif nombre == "ajustar_stock":
+        IngredienteCRUD.actualizar_stock(db, rng.choice(datos["ingredientes"]), rng.choice((-1.0, 1.0)))
+
+    elif nombre == "leer_catalogo":
+        MenuCRUD.obtener_menus_disponibles(db)
+        IngredienteCRUD.obtener_todos_ingredientes(db)
+
+    elif nombre == "consultar_grafico":
+        GraficosEstadisticos.obtener_distribucion_menus(db)
+
+
+def trabajador(config: Dict, indice: int) -> Dict:
+    """Ejecuta operaciones durante `duracion` segundos y retorna sus mediciones y conflictos de versión"""
+    from crud.concurrencia import metricas_conflictos
+    engine = crear_engine(config)
+    Session = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+    datos = _datos_base(Session)
+    rng = random.Random(config["semilla"] + indice)
+    nombres = list(config["mezcla"])
+    pesos = [config["mezcla"][n] for n in nombres]
+    mediciones = {n: {"latencias": [], "errores": 0, "reintentos": 0, "mensajes": []} for n in nombres}
+    propios: List[int] = []
+
+    fin = time.perf_counter() + config["duracion"]
+    while time.perf_counter() < fin:
+        nombre = rng.choices(nombres, weights=pesos)[0]
+        medicion = mediciones[nombre]
+        inicio = time.perf_counter()
+        for intento in range(config["reintentos"] + 1):
+            db = Session()
+            try:
+                _operacion(nombre, db, datos, rng, propios)
+                medicion["latencias"].append(time.perf_counter() - inicio)
+                break
+            except Exception as e:
+                if _bloqueada(e) and intento < config["reintentos"]:
+                    medicion["reintentos"] += 1
+                    # Espera exponencial con variación aleatoria antes de reintentar
+                    time.sleep(min(0.5, 0.005 * 2 ** intento) * rng.uniform(0.5, 1.5))
+                    continue
+                medicion["errores"] += 1
+                if len(medicion["mensajes"]) < 5:
+                    medicion["mensajes"].append(str(e)[:200])
+                break
+            finally:
+                db.close()
+
+    engine.dispose()
+    return {"mediciones": mediciones, "conflictos": metricas_conflictos.resumen()}
+
+
+def percentil(valores: List[float], p: float) -> float:
+    """Percentil por rango más cercano sobre una lista ordenada"""
+    if not valores:
+        return 0.0
+    indice = max(0, min(len(valores) - 1, math.ceil(p / 100.0 * len(valores)) - 1))
+    return valores[indice]
+
+
+def resumir(parciales: List[Dict], duracion: float) -> Dict:
+    resumen = {}
+    for nombre in parciales[0]:
+        latencias = sorted(l for p in parciales for l in p[nombre]["latencias"])
+        errores = sum(p[nombre]["errores"] for p in parciales)
+        total = len(latencias) + errores
+        resumen[nombre] = {
+            "operaciones": total,
+            "exitosas": len(latencias),
+            "errores": errores,
+            "tasa_error": round(errores / total, 4) if total else 0.0,
+            "reintentos_bloqueo": sum(p[nombre]["reintentos"] for p in parciales),
+            "throughput_ops_s": round(len(latencias) / duracion, 2),
+            "p50_ms": round(percentil(latencias, 50) * 1000, 3),
+            "p95_ms": round(percentil(latencias, 95) * 1000, 3),
+            "p99_ms": round(percentil(latencias, 99) * 1000, 3),
+            "max_ms": round(latencias[-1] * 1000, 3) if latencias else 0.0,
+            "mensajes_error": sorted({m for p in parciales for m in p[nombre]["mensajes"]})[:5],
+        }
+    return resumen
+
+
+def sumar_conflictos(parciales: List[Dict]) -> List[Dict]:
+    """Une los conflictos de versión contados en cada proceso"""
+    total: Dict[str, Dict] = {}
+    for parcial in parciales:
+        for fila in parcial["conflictos"]:
+            suma = total.setdefault(fila["operacion"], dict.fromkeys(fila, 0))
+            for clave, valor in fila.items():
+                suma[clave] = valor if clave == "operacion" else suma[clave] + valor
+    return sorted(total.values(), key=lambda f: f["conflictos"], reverse=True)
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Prueba de carga concurrente sobre SQLite")
+    parser.add_argument("--db", required=True, help="Archivo SQLite (se genera con datos sintéticos si no existe)")
+    parser.add_argument("--pedidos", type=int, default=10000, help="Escala de la base generada")
+    parser.add_argument("--modo", choices=["hilos", "procesos"], default="hilos")
+    parser.add_argument("--trabajadores", type=int, default=4)
+    parser.add_argument("--duracion", type=float, default=10.0, help="Segundos de carga")
+    parser.add_argument("--mezcla", default=MEZCLA_DEFECTO, help=f"Pesos por operación (default: {MEZCLA_DEFECTO})")
+    parser.add_argument("--journal", default="delete", choices=["delete", "wal", "truncate", "persist", "memory"])
+    parser.add_argument("--synchronous", default="full", choices=["off", "normal", "full", "extra"])
+    parser.add_argument("--busy-timeout", type=int, default=5000, help="Espera por bloqueo de SQLite, en ms")
+    parser.add_argument("--reintentos", type=int, default=5, help="Reintentos ante 'database is locked'")
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--etiqueta", default=None, help="Nombre de la configuración en el reporte")
+    parser.add_argument("--salida", default=None, help="Archivo JSON de resultados")
+    args = parser.parse_args(argv)
+
+    ruta = os.path.abspath(args.db)
+    os.environ["PROYECTO_DATABASE_URL"] = f"sqlite:///{ruta}"
+    if not os.path.exists(ruta):
+        from database import SessionLocal, actualizar_esquema
+        import models  # noqa: F401
+        from generador_datos import GeneradorDatos
+        actualizar_esquema()
+        db = SessionLocal()
+        try:
+            print(f"Generando base de prueba: {GeneradorDatos(args.semilla).poblar(db, args.pedidos)}")
+        finally:
+            db.close()
+
+    mezcla = {}
+    for parte in args.mezcla.split(","):
+        nombre, peso = parte.split("=")
+        mezcla[nombre.strip()] = float(peso)
+    config = {
+        "db": ruta, "modo": args.modo, "trabajadores": args.trabajadores, "duracion": args.duracion,
+        "mezcla": mezcla, "journal": args.journal, "synchronous": args.synchronous,
+        "busy_timeout": args.busy_timeout, "reintentos": args.reintentos, "semilla": args.semilla,
+    }
+
+    Executor = ThreadPoolExecutor if args.modo == "hilos" else ProcessPoolExecutor
+    inicio = time.perf_counter()
+    with Executor(max_workers=args.trabajadores) as pool:
+        parciales = list(pool.map(trabajador, [config] * args.trabajadores, range(args.trabajadores)))
+    transcurrido = time.perf_counter() - inicio
+
+    resumen = resumir([p["mediciones"] for p in parciales], transcurrido)
+    if args.modo == "hilos":
+        # Los hilos comparten el contador del proceso
+        from crud.concurrencia import metricas_conflictos
+        conflictos = metricas_conflictos.resumen()
+    else:
+        conflictos = sumar_conflictos(parciales)
+    print(f"\n{args.trabajadores} {args.modo}, journal={args.journal}, synchronous={args.synchronous}, "
+          f"busy_timeout={args.busy_timeout}ms, {transcurrido:.1f}s")
+    print(f"{'operación':<20} {'ops/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'reintentos':>10} {'errores':>8}")
+    for nombre, r in resumen.items():
+        print(f"{nombre:<20} {r['throughput_ops_s']:>8} {r['p50_ms']:>9} {r['p95_ms']:>9} {r['p99_ms']:>9} "
+              f"{r['reintentos_bloqueo']:>10} {r['errores']:>8}")
+    for fila in conflictos:
+        print(f"conflictos de versión en {fila['operacion']}: {fila['conflictos']} "
+              f"({fila['resueltas']} resueltas al reintentar, {fila['agotadas']} fallidas)")
+
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as archivo:
+            json.dump({
+                "etiqueta": args.etiqueta or f"{args.journal}-{args.synchronous}-{args.busy_timeout}ms",
+                "fecha": datetime.now().isoformat(timespec="seconds"),
+                "configuracion": config,
+                "segundos": round(transcurrido, 3),
+                "operaciones": resumen,
+                "conflictos_version": conflictos,
+            }, archivo, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
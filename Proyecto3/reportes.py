@@ -0,0 +1,246 @@
+"""
+Generación de reportes sin interfaz gráfica.
+
+Renderiza todos los gráficos de GraficosEstadisticos para todos los periodos,
+además de tablas resumen en CSV y JSON, en un directorio de salida. Cada
+reporte se genera en paralelo en un pool de procesos.
+
+Uso (por ejemplo desde cron):
+    python reportes.py --salida reportes/ --db proyecto.db --procesos 4
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+import matplotlib
+matplotlib.use("Agg")  # Sin display: se debe fijar antes de importar pyplot
+
+# Sesiones de cada proceso del pool sobre la base que leen los reportes (ver _inicializar_proceso)
+_sesiones_reportes = None
+
+
+def _nombre_archivo(*partes: str) -> str:
+    """Convierte 'Menús Más Vendidos' en 'menus_mas_vendidos'"""
+    texto = "_".join(p for p in partes if p)
+    texto = unicodedata.normalize("NFKD", texto).encode("ascii", "ignore").decode("ascii")
+    return "".join(c if c.isalnum() else "_" for c in texto.lower()).strip("_")
+
+
+def _inicializar_proceso(database_url: str, archivo: str) -> None:
+    """
+    Prepara cada proceso del pool con su propia conexión a la base de datos
+    que leen los reportes (la copia de fuente_reportes, compartida por todos).
+    Con fork el módulo database ya viene importado del proceso padre y su
+    engine apunta a la base principal: se crea un engine propio.
+    """
+    global _sesiones_reportes
+    os.environ["PROYECTO_DATABASE_URL"] = database_url
+    os.environ["PROYECTO_ARCHIVO"] = archivo
+    os.environ["PROYECTO_REPORTES_MODO"] = "directo"
+    matplotlib.use("Agg")
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from database import adjuntar_archivo, engine
+    # Las conexiones heredadas del proceso padre no se deben reutilizar
+    engine.dispose(close=False)
+    motor = create_engine(database_url, connect_args={"check_same_thread": False})
+    adjuntar_archivo(motor, archivo)
+    _sesiones_reportes = sessionmaker(autocommit=False, autoflush=False, bind=motor)
+
+
+def _escribir_tabla(directorio: str, nombre: str, columnas: List[str], filas: List[Tuple]) -> List[str]:
+    """Escribe una tabla resumen en CSV y JSON. Retorna las rutas escritas"""
+    ruta_csv = os.path.join(directorio, f"{nombre}.csv")
+    with open(ruta_csv, "w", newline="", encoding="utf-8") as archivo:
+        escritor = csv.writer(archivo)
+        escritor.writerow(columnas)
+        escritor.writerows(filas)
+
+    ruta_json = os.path.join(directorio, f"{nombre}.json")
+    with open(ruta_json, "w", encoding="utf-8") as archivo:
+        json.dump([dict(zip(columnas, fila)) for fila in filas], archivo, ensure_ascii=False, indent=2)
+
+    return [ruta_csv, ruta_json]
+
+
+def generar_reporte(tarea: Dict) -> Dict:
+    """
+    Genera un reporte (un gráfico o una tabla) y retorna un diccionario con
+    el nombre, los archivos escritos, el tiempo empleado y el error, si hubo.
+    Se ejecuta dentro de un proceso del pool.
+    """
+    from database import SessionLocal
+    from graficos import GraficosEstadisticos
+
+    inicio = time.perf_counter()
+    resultado = {"nombre": tarea["nombre"], "archivos": [], "error": None}
+    db = (_sesiones_reportes or SessionLocal)()
+    try:
+        if tarea["clase"] == "grafico":
+            for formato in tarea["formatos"]:
+                datos, error = GraficosEstadisticos.renderizar_grafico(
+                    db, tarea["tipo"], tarea["periodo"] or "diario", formato
+                )
+                if error:
+                    resultado["error"] = error
+                    break
+                ruta = os.path.join(tarea["salida"], f"{tarea['nombre']}.{formato}")
+                with open(ruta, "wb") as archivo:
+                    archivo.write(datos)
+                resultado["archivos"].append(ruta)
+
+        elif tarea["clase"] == "ventas":
+            ventas = GraficosEstadisticos.obtener_ventas_por_fecha(db, tarea["periodo"])
+            resultado["archivos"] = _escribir_tabla(
+                tarea["salida"], tarea["nombre"], ["periodo", "ventas"], list(ventas.items())
+            )
+
+        elif tarea["clase"] == "menus":
+            distribucion = GraficosEstadisticos.obtener_distribucion_menus(db)
+            resultado["archivos"] = _escribir_tabla(
+                tarea["salida"], tarea["nombre"], ["menu", "cantidad"], list(distribucion.items())
+            )
+
+        elif tarea["clase"] == "mapa_calor":
+            mapa = GraficosEstadisticos.obtener_mapa_calor_horario(db)
+            filas = [
+                (dia, hora, mapa["pedidos"][i][hora], mapa["ingresos"][i][hora])
+                for i, dia in enumerate(GraficosEstadisticos.DIAS_SEMANA) for hora in range(24)
+            ]
+            resultado["archivos"] = _escribir_tabla(
+                tarea["salida"], tarea["nombre"], ["dia", "hora", "pedidos", "ingresos"], filas
+            )
+
+        elif tarea["clase"] == "rfm":
+            from analisis_clientes import AnalisisClientes
+            rfm = AnalisisClientes.calcular_rfm(db)
+            columnas = ["cliente_id", "rut", "nombre", "recencia_dias", "frecuencia", "monto", "r", "f", "m", "segmento"]
+            resultado["archivos"] = _escribir_tabla(
+                tarea["salida"], tarea["nombre"], columnas, [tuple(f[c] for c in columnas) for f in rfm]
+            )
+            segmentos = AnalisisClientes.resumen_segmentos(rfm)
+            resultado["archivos"] += _escribir_tabla(
+                tarea["salida"], "resumen_segmentos_rfm", ["segmento", "clientes", "monto"],
+                [(nombre, s["clientes"], round(s["monto"], 2)) for nombre, s in segmentos.items()]
+            )
+
+        elif tarea["clase"] == "top_clientes":
+            from analisis_clientes import AnalisisClientes
+            clientes = AnalisisClientes.obtener_top_clientes(db, tarea["limite"])
+            resultado["archivos"] = _escribir_tabla(
+                tarea["salida"], tarea["nombre"],
+                ["cliente_id", "rut", "nombre", "pedidos", "gastado", "primer_pedido", "ultimo_pedido"],
+                [(c.id, c.rut, c.nombre, c.total_pedidos, round(c.total_gastado, 2),
+                  c.primer_pedido.isoformat() if c.primer_pedido else None,
+                  c.ultimo_pedido.isoformat() if c.ultimo_pedido else None) for c in clientes]
+            )
+
+        elif tarea["clase"] == "ingredientes":
+            uso = GraficosEstadisticos.obtener_uso_ingredientes(db)
+            resultado["archivos"] = _escribir_tabla(
+                tarea["salida"], tarea["nombre"], ["ingrediente", "cantidad"], list(uso.items())
+            )
+
+        elif tarea["clase"] == "pronostico":
+            from pronostico import PronosticoIngredientes
+            proyeccion = PronosticoIngredientes.proyectar_agotamiento(db)
+            columnas = ["ingrediente", "unidad", "stock", "consumo_diario", "dias_restantes", "fecha_agotamiento"]
+            resultado["archivos"] = _escribir_tabla(
+                tarea["salida"], tarea["nombre"], columnas,
+                [tuple(f[c].isoformat() if c == "fecha_agotamiento" and f[c] else f[c] for c in columnas)
+                 for f in proyeccion]
+            )
+
+    except Exception as e:
+        resultado["error"] = str(e)
+    finally:
+        db.close()
+
+    resultado["segundos"] = round(time.perf_counter() - inicio, 4)
+    return resultado
+
+
+def crear_tareas(salida: str, formatos: List[str]) -> List[Dict]:
+    """Arma la lista de reportes independientes: cada gráfico en cada periodo y las tablas resumen"""
+    from graficos import GraficosEstadisticos
+
+    tareas = []
+    for tipo in GraficosEstadisticos.TIPOS_GRAFICO:
+        periodos = GraficosEstadisticos.PERIODOS if GraficosEstadisticos.usa_periodo(tipo) else [None]
+        for periodo in periodos:
+            tareas.append({
+                "clase": "grafico", "tipo": tipo, "periodo": periodo, "formatos": formatos,
+                "nombre": _nombre_archivo(tipo, periodo), "salida": salida,
+            })
+
+    for periodo in GraficosEstadisticos.PERIODOS:
+        tareas.append({"clase": "ventas", "periodo": periodo,
+                       "nombre": _nombre_archivo("resumen_ventas", periodo), "salida": salida})
+    tareas.append({"clase": "menus", "nombre": "resumen_menus", "salida": salida})
+    tareas.append({"clase": "ingredientes", "nombre": "resumen_ingredientes", "salida": salida})
+    tareas.append({"clase": "pronostico", "nombre": "pronostico_ingredientes", "salida": salida})
+    tareas.append({"clase": "mapa_calor", "nombre": "resumen_mapa_calor", "salida": salida})
+    tareas.append({"clase": "rfm", "nombre": "clientes_rfm", "salida": salida})
+    tareas.append({"clase": "top_clientes", "nombre": "resumen_top_clientes", "limite": 50, "salida": salida})
+    return tareas
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Genera todos los reportes estadísticos sin interfaz gráfica")
+    parser.add_argument("--salida", default="reportes", help="Directorio de salida (default: reportes)")
+    parser.add_argument("--db", default=None, help="Ruta del archivo SQLite (default: PROYECTO_DATABASE_URL o ./proyecto.db)")
+    parser.add_argument("--formatos", nargs="+", default=["png"], choices=["png", "svg"],
+                        help="Formatos de imagen de los gráficos")
+    parser.add_argument("--procesos", type=int, default=os.cpu_count() or 1,
+                        help="Cantidad de procesos en paralelo")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        os.environ["PROYECTO_DATABASE_URL"] = f"sqlite:///{os.path.abspath(args.db)}"
+    from database import DATABASE_URL
+    from fuente_reportes import fuente_reportes
+    # Todos los procesos leen la misma copia: los reportes son consistentes entre sí
+    url_reportes, archivo_reportes = fuente_reportes.url()
+
+    os.makedirs(args.salida, exist_ok=True)
+    tareas = crear_tareas(args.salida, args.formatos)
+
+    inicio = time.perf_counter()
+    resultados = []
+    with ProcessPoolExecutor(max_workers=max(1, args.procesos),
+                             initializer=_inicializar_proceso,
+                             initargs=(url_reportes, archivo_reportes)) as pool:
+        futuros = [pool.submit(generar_reporte, tarea) for tarea in tareas]
+        for futuro in as_completed(futuros):
+            resultado = futuro.result()
+            resultados.append(resultado)
+            estado = "ERROR " + resultado["error"] if resultado["error"] else "ok"
+            print(f"{resultado['nombre']:<45} {resultado['segundos']:>8.3f}s  {estado}")
+    total = time.perf_counter() - inicio
+
+    errores = [r for r in resultados if r["error"]]
+    indice = {
+        "generado": datetime.now().isoformat(timespec="seconds"),
+        "base_de_datos": DATABASE_URL,
+        "modo_datos": fuente_reportes.modo,
+        "datos_al": (fuente_reportes.fecha_datos or datetime.now()).isoformat(timespec="seconds"),
+        "procesos": args.procesos,
+        "segundos_total": round(total, 4),
+        "reportes": sorted(resultados, key=lambda r: r["nombre"]),
+    }
+    with open(os.path.join(args.salida, "indice.json"), "w", encoding="utf-8") as archivo:
+        json.dump(indice, archivo, ensure_ascii=False, indent=2)
+
+    print(f"\n{len(resultados) - len(errores)} reportes generados, {len(errores)} con error, en {total:.3f}s")
+    return 1 if errores else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,365 @@
+"""
+Respaldos en línea de la base de datos.
+
+Copia la base principal y el archivo de pedidos con la API de respaldo en
+línea de SQLite, de a PAGINAS_POR_PASO páginas con una pausa entre pasos:
+los escritores sólo esperan lo que dura un paso, nunca la copia completa.
+Si otra conexión escribe durante la copia, SQLite la reinicia. Tras
+MAX_REINICIOS reinicios se copia en un solo paso, que bloquea a los
+escritores sólo mientras dura.
+
+Cada respaldo es un conjunto de archivos con el mismo sello de tiempo:
+    respaldo_20260101_120000.db[.gz]           base principal
+    respaldo_20260101_120000_archivo.db[.gz]   pedidos archivados
+    respaldo_20260101_120000.json              manifiesto (tamaños, sha256, conteos, verificación)
+
+Cada copia se verifica (integrity_check y claves foráneas) antes de
+comprimirla y de rotar los respaldos anteriores. Si el archivo cambió
+mientras se copiaba la base (un archivado entre medio), se repite el par
+para que ningún pedido quede en las dos copias ni en ninguna.
+
+Uso:
+    python respaldo.py respaldar --destino respaldos --comprimir --conservar 14 --espejo /mnt/espejo
+    python respaldo.py respaldar --cada 60          # cada 60 minutos
+    python respaldo.py listar --destino respaldos
+    python respaldo.py verificar respaldos/respaldo_20260101_120000.json
+    python respaldo.py restaurar respaldos/respaldo_20260101_120000.json
+"""
+import argparse
+import glob
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List
+
+# Páginas copiadas por paso y pausa entre pasos (segundos)
+PAGINAS_POR_PASO = 256
+PAUSA = 0.005
+# Reinicios de la copia por escrituras concurrentes antes de copiar en un solo paso
+MAX_REINICIOS = 5
+# Intentos de copiar base y archivo sin que el archivo cambie entre medio
+MAX_INTENTOS_PAR = 3
+# Tablas cuyas filas se cuentan en el manifiesto
+TABLAS_CONTEO = ("Clientes", "Ingredientes", "Menus", "Pedidos", "ItemPedidos")
+
+
+class CopiaReiniciada(Exception):
+    """La copia escalonada se reinició demasiadas veces por escrituras concurrentes"""
+
+
+def _sha256(ruta: str) -> str:
+    resumen = hashlib.sha256()
+    with open(ruta, "rb") as archivo:
+        for bloque in iter(lambda: archivo.read(1 << 20), b""):
+            resumen.update(bloque)
+    return resumen.hexdigest()
+
+
+def _copiar(origen: sqlite3.Connection, esquema: str, destino: str) -> Dict:
+    """
+    Copia un esquema de la conexión de origen a `destino` por pasos. Retorna
+    las páginas copiadas, los reinicios y si hubo que copiar en un solo paso.
+    """
+    estado = {"paginas": 0, "reinicios": 0, "un_paso": False}
+    anterior = [None]
+
+    def progreso(_, restantes, total):
+        # Si quedan más páginas que en el paso anterior, la copia se reinició
+        if anterior[0] is not None and restantes > anterior[0]:
+            estado["reinicios"] += 1
+            if estado["reinicios"] >= MAX_REINICIOS:
+                raise CopiaReiniciada()
+        anterior[0] = restantes
+        estado["paginas"] = total
+
+    copia = sqlite3.connect(destino)
+    try:
+        try:
+            origen.backup(copia, pages=PAGINAS_POR_PASO, progress=progreso, name=esquema, sleep=PAUSA)
+        except CopiaReiniciada:
+            estado["un_paso"] = True
+            origen.backup(copia, pages=-1, name=esquema)
+            estado["paginas"] = copia.execute("PRAGMA page_count").fetchone()[0]
+    finally:
+        copia.close()
+    return estado
+
+
+def verificar_base(ruta: str) -> Dict:
+    """integrity_check, foreign_key_check y conteo de filas de una copia sin comprimir"""
+    conexion = sqlite3.connect(f"file:{ruta}?mode=ro", uri=True)
+    try:
+        integridad = [fila[0] for fila in conexion.execute("PRAGMA integrity_check")]
+        claves = conexion.execute("PRAGMA foreign_key_check").fetchall()
+        tablas = {fila[0] for fila in conexion.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        conteos = {tabla: conexion.execute(f'SELECT count(*) FROM "{tabla}"').fetchone()[0]
+                   for tabla in TABLAS_CONTEO if tabla in tablas}
+    finally:
+        conexion.close()
+    return {"correcta": integridad == ["ok"] and not claves, "integridad": integridad[:5],
+            "claves_foraneas_invalidas": len(claves), "conteos": conteos}
+
+
+def _comprimir(ruta: str) -> str:
+    with open(ruta, "rb") as entrada, gzip.open(ruta + ".gz", "wb", compresslevel=6) as salida:
+        shutil.copyfileobj(entrada, salida, 1 << 20)
+    os.remove(ruta)
+    return ruta + ".gz"
+
+
+def _descomprimir(ruta: str, destino: str) -> str:
+    if not ruta.endswith(".gz"):
+        shutil.copyfile(ruta, destino)
+        return destino
+    with gzip.open(ruta, "rb") as entrada, open(destino, "wb") as salida:
+        shutil.copyfileobj(entrada, salida, 1 << 20)
+    return destino
+
+
+class Respaldo:
+    def __init__(self, ruta_base: str, ruta_archivo: str, directorio: str = "respaldos"):
+        self.ruta_base = ruta_base
+        self.ruta_archivo = ruta_archivo
+        self.directorio = directorio
+
+    @classmethod
+    def desde_configuracion(cls, directorio: str = "respaldos") -> "Respaldo":
+        """Respaldo de la base configurada (PROYECTO_DATABASE_URL y PROYECTO_ARCHIVO)"""
+        from database import DATABASE_URL, ruta_archivo
+        if "///" not in DATABASE_URL or DATABASE_URL.endswith(":memory:"):
+            raise ValueError("Sólo se pueden respaldar bases SQLite en archivo")
+        return cls(DATABASE_URL.split("///", 1)[1], ruta_archivo(DATABASE_URL), directorio)
+
+    # Respaldo
+
+    def respaldar(self, comprimir: bool = False, conservar: int = None, espejo: str = None) -> Dict:
+        """
+        Copia la base y el archivo, verifica la copia, la comprime si se pide
+        y escribe el manifiesto. Luego actualiza el espejo y rota los
+        respaldos (conserva los `conservar` más recientes). Retorna el manifiesto.
+        """
+        inicio = time.perf_counter()
+        os.makedirs(self.directorio, exist_ok=True)
+        sello = datetime.now().strftime("%Y%m%d_%H%M%S")
+        nombre = os.path.join(self.directorio, f"respaldo_{sello}")
+        temporal = tempfile.mkdtemp(prefix=".temporal_", dir=self.directorio)
+        try:
+            copias = {"base": os.path.join(temporal, "base.db"), "archivo": os.path.join(temporal, "archivo.db")}
+            origen = sqlite3.connect(self.ruta_base, isolation_level=None)
+            try:
+                origen.execute("ATTACH DATABASE ? AS archivo", (self.ruta_archivo,))
+                for intento in range(1, MAX_INTENTOS_PAR + 1):
+                    version_archivo = origen.execute("PRAGMA archivo.data_version").fetchone()[0]
+                    pasos = {"base": _copiar(origen, "main", copias["base"]),
+                             "archivo": _copiar(origen, "archivo", copias["archivo"])}
+                    if origen.execute("PRAGMA archivo.data_version").fetchone()[0] == version_archivo:
+                        break
+                else:
+                    raise RuntimeError("El archivo de pedidos cambió durante cada intento de respaldo")
+            finally:
+                origen.close()
+
+            verificacion = {clave: verificar_base(ruta) for clave, ruta in copias.items()}
+            if not all(v["correcta"] for v in verificacion.values()):
+                raise RuntimeError(f"La copia no pasó la verificación: {verificacion}")
+
+            if espejo:
+                self._actualizar_espejo(copias, espejo)
+
+            archivos = {}
+            for clave, ruta in copias.items():
+                if comprimir:
+                    ruta = _comprimir(ruta)
+                final = nombre + ("" if clave == "base" else "_archivo") + ".db" + (".gz" if comprimir else "")
+                os.replace(ruta, final)
+                archivos[clave] = {"ruta": os.path.basename(final), "bytes": os.path.getsize(final),
+                                   "sha256": _sha256(final), **pasos[clave]}
+        finally:
+            shutil.rmtree(temporal, ignore_errors=True)
+
+        manifiesto = {
+            "fecha": datetime.now().isoformat(timespec="seconds"),
+            "origen": os.path.abspath(self.ruta_base),
+            "comprimido": comprimir,
+            "intentos": intento,
+            "archivos": archivos,
+            "verificacion": verificacion,
+            "espejo": os.path.abspath(espejo) if espejo else None,
+            "segundos": round(time.perf_counter() - inicio, 3),
+        }
+        with open(nombre + ".json", "w", encoding="utf-8") as archivo:
+            json.dump(manifiesto, archivo, ensure_ascii=False, indent=2)
+        manifiesto["manifiesto"] = nombre + ".json"
+
+        if conservar:
+            self.rotar(conservar)
+        return manifiesto
+
+    def _actualizar_espejo(self, copias: Dict[str, str], espejo: str) -> None:
+        """
+        Deja en `espejo` la copia más reciente lista para usar (proyecto.db y
+        proyecto_archivo.db). Se reemplazan de forma atómica.
+        """
+        os.makedirs(espejo, exist_ok=True)
+        destinos = {"base": os.path.join(espejo, os.path.basename(self.ruta_base)),
+                    "archivo": os.path.join(espejo, os.path.basename(self.ruta_archivo))}
+        for clave, ruta in copias.items():
+            shutil.copyfile(ruta, destinos[clave] + ".tmp")
+            os.replace(destinos[clave] + ".tmp", destinos[clave])
+
+    # Administración
+
+    def listar(self) -> List[Dict]:
+        """Manifiestos de los respaldos del directorio, del más reciente al más antiguo"""
+        manifiestos = []
+        for ruta in sorted(glob.glob(os.path.join(self.directorio, "respaldo_*.json")), reverse=True):
+            with open(ruta, "r", encoding="utf-8") as archivo:
+                manifiesto = json.load(archivo)
+            manifiesto["manifiesto"] = ruta
+            manifiestos.append(manifiesto)
+        return manifiestos
+
+    def rotar(self, conservar: int) -> List[str]:
+        """Elimina los respaldos más antiguos y conserva los `conservar` más recientes"""
+        eliminados = []
+        for manifiesto in self.listar()[max(1, conservar):]:
+            for datos in manifiesto["archivos"].values():
+                ruta = os.path.join(os.path.dirname(manifiesto["manifiesto"]), datos["ruta"])
+                if os.path.exists(ruta):
+                    os.remove(ruta)
+            os.remove(manifiesto["manifiesto"])
+            eliminados.append(manifiesto["manifiesto"])
+        return eliminados
+
+    @staticmethod
+    def verificar(ruta_manifiesto: str) -> Dict:
+        """Comprueba el sha256 de cada archivo y la integridad de las copias descomprimidas"""
+        with open(ruta_manifiesto, "r", encoding="utf-8") as archivo:
+            manifiesto = json.load(archivo)
+        directorio = os.path.dirname(ruta_manifiesto)
+        resultado = {}
+        temporal = tempfile.mkdtemp(prefix="verificacion_")
+        try:
+            for clave, datos in manifiesto["archivos"].items():
+                ruta = os.path.join(directorio, datos["ruta"])
+                if not os.path.exists(ruta):
+                    resultado[clave] = {"correcta": False, "error": "No existe el archivo"}
+                    continue
+                if _sha256(ruta) != datos["sha256"]:
+                    resultado[clave] = {"correcta": False, "error": "El sha256 no coincide"}
+                    continue
+                resultado[clave] = verificar_base(_descomprimir(ruta, os.path.join(temporal, f"{clave}.db")))
+                if resultado[clave]["conteos"] != manifiesto["verificacion"][clave]["conteos"]:
+                    resultado[clave]["correcta"] = False
+        finally:
+            shutil.rmtree(temporal, ignore_errors=True)
+        return resultado
+
+    def restaurar(self, ruta_manifiesto: str) -> Dict:
+        """
+        Verifica el respaldo y copia su contenido sobre la base y el archivo
+        con la API de respaldo, en un solo paso por archivo: las conexiones
+        abiertas (otras terminales) ven los datos restaurados en su próxima
+        transacción. Retorna la verificación.
+        """
+        verificacion = self.verificar(ruta_manifiesto)
+        if not all(v["correcta"] for v in verificacion.values()):
+            raise RuntimeError(f"El respaldo no pasó la verificación: {verificacion}")
+        with open(ruta_manifiesto, "r", encoding="utf-8") as archivo:
+            manifiesto = json.load(archivo)
+        directorio = os.path.dirname(ruta_manifiesto)
+        temporal = tempfile.mkdtemp(prefix="restauracion_")
+        try:
+            for clave, destino in (("base", self.ruta_base), ("archivo", self.ruta_archivo)):
+                copia = _descomprimir(os.path.join(directorio, manifiesto["archivos"][clave]["ruta"]),
+                                      os.path.join(temporal, f"{clave}.db"))
+                origen = sqlite3.connect(copia)
+                conexion = sqlite3.connect(destino, timeout=30)
+                try:
+                    origen.backup(conexion, pages=-1)
+                finally:
+                    conexion.close()
+                    origen.close()
+        finally:
+            shutil.rmtree(temporal, ignore_errors=True)
+        return verificacion
+
+
+def iniciar_respaldo_periodico(respaldo: Respaldo, minutos: float, **opciones) -> threading.Event:
+    """Respalda en segundo plano cada `minutos`. Retorna el evento que lo detiene"""
+    detener = threading.Event()
+
+    def ciclo():
+        while not detener.wait(minutos * 60):
+            try:
+                respaldo.respaldar(**opciones)
+            except Exception as e:
+                print(f"Error en el respaldo periódico: {e}", file=sys.stderr)
+
+    threading.Thread(target=ciclo, name="respaldo-periodico", daemon=True).start()
+    return detener
+
+
+def _imprimir(manifiesto: Dict) -> None:
+    archivos = ", ".join(f"{d['ruta']} ({d['bytes'] / 2 ** 20:.1f} MB)" for d in manifiesto["archivos"].values())
+    print(f"{manifiesto['fecha']}  {archivos}  {manifiesto['segundos']}s")
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Respaldos en línea de la base de datos")
+    parser.add_argument("--db", default=None, help="Ruta del archivo SQLite (default: PROYECTO_DATABASE_URL o ./proyecto.db)")
+    parser.add_argument("--destino", default="respaldos", help="Directorio de los respaldos (default: respaldos)")
+    subcomandos = parser.add_subparsers(dest="comando", required=True)
+
+    respaldar = subcomandos.add_parser("respaldar", help="Hace un respaldo")
+    respaldar.add_argument("--comprimir", action="store_true", help="Comprime las copias con gzip")
+    respaldar.add_argument("--conservar", type=int, default=None, help="Cantidad de respaldos a conservar")
+    respaldar.add_argument("--espejo", default=None, help="Directorio donde dejar la última copia lista para usar")
+    respaldar.add_argument("--cada", type=float, default=None, help="Repetir cada N minutos (hasta Ctrl+C)")
+    subcomandos.add_parser("listar", help="Lista los respaldos")
+    verificar = subcomandos.add_parser("verificar", help="Verifica un respaldo")
+    verificar.add_argument("manifiesto")
+    restaurar = subcomandos.add_parser("restaurar", help="Restaura un respaldo sobre la base")
+    restaurar.add_argument("manifiesto")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        os.environ["PROYECTO_DATABASE_URL"] = f"sqlite:///{os.path.abspath(args.db)}"
+    respaldo = Respaldo.desde_configuracion(args.destino)
+
+    if args.comando == "respaldar":
+        while True:
+            manifiesto = respaldo.respaldar(args.comprimir, args.conservar, args.espejo)
+            _imprimir(manifiesto)
+            if not args.cada:
+                return 0
+            try:
+                time.sleep(args.cada * 60)
+            except KeyboardInterrupt:
+                return 0
+    if args.comando == "listar":
+        for manifiesto in respaldo.listar():
+            _imprimir(manifiesto)
+        return 0
+    if args.comando == "verificar":
+        resultado = Respaldo.verificar(args.manifiesto)
+        for clave, datos in resultado.items():
+            print(f"{clave:<10} {'ok' if datos['correcta'] else 'ERROR'}  {datos.get('error') or datos.get('conteos')}")
+        return 0 if all(d["correcta"] for d in resultado.values()) else 1
+    if args.comando == "restaurar":
+        respaldo.restaurar(args.manifiesto)
+        print(f"Restaurado {args.manifiesto} sobre {respaldo.ruta_base}")
+        return 0
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,54 @@
+"""
+Configuración común de las pruebas.
+
+database.py crea el engine al importarse: la base (y su archivo de pedidos)
+se fija en un directorio temporal antes de importar cualquier módulo del
+proyecto. Cada prueba parte de las tablas vacías.
+"""
+import os
+import sys
+import tempfile
+
+_DIRECTORIO = tempfile.mkdtemp(prefix="proyecto3_pruebas_")
+os.environ["PROYECTO_DATABASE_URL"] = f"sqlite:///{os.path.join(_DIRECTORIO, 'pruebas.db')}"
+os.environ["PROYECTO_ARCHIVO"] = os.path.join(_DIRECTORIO, "pruebas_archivo.db")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+
+from database import Base, SessionLocal, actualizar_esquema, engine  # noqa: E402
+import models  # noqa: E402,F401  (registra los modelos en Base)
+
+
+@pytest.fixture(scope="session")
+def esquema():
+    actualizar_esquema()
+    return engine
+
+
+@pytest.fixture
+def db(esquema):
+    sesion = SessionLocal()
+    try:
+        yield sesion
+    finally:
+        sesion.rollback()
+        sesion.close()
+        with esquema.begin() as conexion:
+            for tabla in reversed(Base.metadata.sorted_tables):
+                conexion.execute(tabla.delete())
+            conexion.exec_driver_sql("DELETE FROM sqlite_sequence")
+
+
+@pytest.fixture
+def datos(db):
+    """Un cliente y dos menús disponibles con receta sobre un ingrediente"""
+    from crud.cliente_crud import ClienteCRUD
+    from crud.ingrediente_crud import IngredienteCRUD
+    from crud.menu_crud import MenuCRUD
+
+    harina = IngredienteCRUD.crear_ingrediente(db, "harina", 100.0, "kg")
+    cliente = ClienteCRUD.crear_cliente(db, "11111111-1", "Cliente de prueba", "cliente@prueba.cl")
+    pizza = MenuCRUD.crear_menu(db, "Pizza", "Pizza de prueba", 8000.0, "Pizzas", receta={"harina": 0.5})
+    pan = MenuCRUD.crear_menu(db, "Pan", "Pan de prueba", 1500.0, "Panadería", receta={"harina": 0.25})
+    return {"cliente": cliente, "harina": harina, "pizza": pizza, "pan": pan}
@@ -0,0 +1,27 @@
+from datetime import datetime, timedelta
+
+from analisis_clientes import AnalisisClientes
+from models import Cliente
+
+
+def test_puntajes_iguales_para_valores_iguales():
+    assert AnalisisClientes._puntajes([1, 1, 1, 1, 1, 1, 1, 1, 5, 9]) == [1, 1, 1, 1, 1, 1, 1, 1, 5, 5]
+    assert AnalisisClientes._puntajes([10, 20, 30, 40, 50]) == [1, 2, 3, 4, 5]
+    # Recencia: menos días es mejor
+    assert AnalisisClientes._puntajes([3, 3, 40, 40, 90], invertir=True) == [4, 4, 2, 2, 1]
+
+
+def test_clientes_identicos_quedan_en_el_mismo_segmento(db):
+    ahora = datetime(2026, 1, 31, 12, 0)
+    for i in range(20):
+        # Diez clientes con un pedido ayer y diez con varios pedidos hace meses
+        reciente = i < 10
+        db.add(Cliente(rut=f"{i}-K", nombre=f"Cliente {i}", total_pedidos=1 if reciente else 5 + i,
+                       total_gastado=5000.0 if reciente else 1000.0 * i,
+                       ultimo_pedido=ahora - timedelta(days=1 if reciente else 120)))
+    db.commit()
+
+    rfm = AnalisisClientes.calcular_rfm(db, ahora)
+    identicos = [fila for fila in rfm if fila["frecuencia"] == 1]
+    assert len(identicos) == 10
+    assert len({(fila["r"], fila["f"], fila["m"], fila["segmento"]) for fila in identicos}) == 1
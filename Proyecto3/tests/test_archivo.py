@@ -0,0 +1,109 @@
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import delete, func, select
+
+from archivo import archivar_pedidos, fuente_ventas
+from crud.menu_crud import MenuCRUD
+from crud.pedido_crud import PedidoCRUD
+from models import Cliente, HistorialEstadoPedido, HistorialEstadoPedidoArchivado, Pedido, PedidoArchivado
+from tiempos_preparacion import TiemposPreparacion
+
+
+def _completar(db, datos, cantidad: int) -> None:
+    """Pedidos con pizza y pan, preparados y completados ahora"""
+    for _ in range(cantidad):
+        pedido = PedidoCRUD.crear_pedido(db, datos["cliente"].id, [
+            {"menu_id": datos["pizza"].id, "cantidad": 1}, {"menu_id": datos["pan"].id, "cantidad": 2},
+        ])
+        PedidoCRUD.cambiar_estado(db, pedido.id, "En preparación")
+        PedidoCRUD.cambiar_estado(db, pedido.id, "Completado")
+
+
+def _pedidos_completados(db, datos, cantidad: int, recientes: int = 0, dias: int = 200):
+    """`cantidad` pedidos completados hace `dias` días (archivables) y `recientes` completados hoy"""
+    _completar(db, datos, cantidad)
+    for fila in db.scalars(select(Pedido)).all() + db.scalars(select(HistorialEstadoPedido)).all():
+        fila.fecha -= timedelta(days=dias)
+    db.commit()
+    _completar(db, datos, recientes)
+
+
+def _ventas(db, incluir_archivo: bool = True):
+    ventas = fuente_ventas(incluir_archivo)
+    return db.execute(select(func.count(), func.sum(ventas.c.cantidad), func.sum(ventas.c.subtotal))).one()
+
+
+def test_fuente_ventas_une_pedidos_activos_y_archivados(db, datos):
+    _pedidos_completados(db, datos, 3, recientes=1)
+    # Pizza 8000 + 2 panes de 1500 por pedido
+    assert tuple(_ventas(db)) == (8, 12, 4 * 11000.0)
+
+    assert archivar_pedidos(db, dias=180)["pedidos"] == 3
+    assert tuple(_ventas(db)) == (8, 12, 4 * 11000.0)
+    assert tuple(_ventas(db, incluir_archivo=False)) == (2, 3, 11000.0)
+
+
+def test_archivo_fija_el_precio_al_archivar(db, datos):
+    _pedidos_completados(db, datos, 2, recientes=1)
+    archivar_pedidos(db, dias=180)
+    MenuCRUD.ajustar_precios(db, monto=1000.0, menu_ids=[datos["pizza"].id])
+
+    # Sólo el pedido activo usa el precio nuevo
+    assert _ventas(db)[2] == 2 * 11000.0 + 12000.0
+    cliente = db.get(Cliente, datos["cliente"].id)
+    db.refresh(cliente)
+    assert (cliente.total_pedidos, cliente.total_gastado) == (3, 2 * 11000.0 + 12000.0)
+
+
+def _muestras(db):
+    return {fila.clave: fila.cantidad for fila in TiemposPreparacion.por_menu(db)}
+
+
+def test_archivar_conserva_los_tiempos_de_preparacion(db, datos):
+    _pedidos_completados(db, datos, 4, recientes=1)
+    antes = TiemposPreparacion.reconstruir(db)
+    db.commit()
+    muestras = _muestras(db)
+    assert antes == 10
+    assert muestras == {"Pizza": 5, "Pan": 5}
+
+    assert archivar_pedidos(db, dias=180)["pedidos"] == 4
+    archivados = db.scalars(select(PedidoArchivado.id)).all()
+    assert db.scalar(select(func.count()).where(HistorialEstadoPedido.pedido_id.in_(archivados))) == 0
+    assert db.scalar(select(func.count(HistorialEstadoPedidoArchivado.id))) == 4 * 3
+
+    assert TiemposPreparacion.reconstruir(db) == antes
+    db.commit()
+    assert _muestras(db) == muestras
+    assert [t.estado for t in TiemposPreparacion.historial(db, archivados[0])] == \
+        ["Pendiente", "En preparación", "Completado"]
+
+
+def test_reconstruir_rechaza_archivados_sin_historial(db, datos):
+    _pedidos_completados(db, datos, 2, recientes=1)
+    archivar_pedidos(db, dias=180)
+    # Como en los archivos anteriores a guardar el historial
+    db.execute(delete(HistorialEstadoPedidoArchivado))
+    db.commit()
+
+    with pytest.raises(ValueError):
+        TiemposPreparacion.reconstruir(db)
+    assert TiemposPreparacion.reconstruir(db, forzar=True) == 2
+
+
+def test_no_reutiliza_ids_archivados(db, datos):
+    _pedidos_completados(db, datos, 2, recientes=1)
+    assert archivar_pedidos(db, dias=180)["pedidos"] == 2
+    # Sin AUTOINCREMENT, eliminar el pedido más nuevo hacía que el siguiente reutilizara el ID 1
+    PedidoCRUD.eliminar_pedido(db, 3)
+    nuevo = PedidoCRUD.crear_pedido(db, datos["cliente"].id, [{"menu_id": datos["pizza"].id, "cantidad": 1}])
+    assert nuevo.id == 4
+    PedidoCRUD.cambiar_estado(db, nuevo.id, "Completado")
+    db.get(Pedido, nuevo.id).fecha -= timedelta(days=200)
+    db.commit()
+
+    assert archivar_pedidos(db, dias=180)["pedidos"] == 1
+    ventas = fuente_ventas()
+    assert db.execute(select(ventas.c.pedido_id, func.count()).group_by(ventas.c.pedido_id)).all() == \
+        [(1, 2), (2, 2), (4, 1)]
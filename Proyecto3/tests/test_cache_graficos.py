@@ -0,0 +1,21 @@
+import os
+
+from cache_graficos import CacheGraficos
+
+
+def test_limpiar_y_recortar_solo_borran_archivos_de_la_cache(tmp_path):
+    ajeno = tmp_path / "informe.png"
+    ajeno.write_bytes(b"x" * 500)
+    (tmp_path / "notas.txt").write_text("no borrar")
+
+    cache = CacheGraficos(str(tmp_path), max_bytes_disco=250)
+    # Los archivos ajenos no cuentan para el presupuesto ni se recortan
+    assert cache._bytes_disco == 0
+    for i in range(3):
+        cache.guardar(CacheGraficos.crear_clave("ventas", "diario", "png", str(i)), b"g" * 100)
+    propios = [n for n in os.listdir(tmp_path) if n.endswith(".png") and n != "informe.png"]
+    assert len(propios) == 2
+
+    cache.limpiar()
+    assert sorted(os.listdir(tmp_path)) == ["informe.png", "notas.txt"]
+    assert cache.obtener(CacheGraficos.crear_clave("ventas", "diario", "png", "2")) is None
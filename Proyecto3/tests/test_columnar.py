@@ -0,0 +1,32 @@
+from columnar import AlmacenColumnar, AnalisisColumnar
+from crud.menu_crud import MenuCRUD
+from crud.pedido_crud import EdicionPedido, PedidoCRUD
+from graficos import GraficosEstadisticos
+
+
+def test_actualizar_detecta_cantidad_movida_entre_lineas_de_igual_precio(db, datos, tmp_path):
+    cola = MenuCRUD.crear_menu(db, "Cola", "Bebida", 1000.0, "Bebidas").id
+    jugo = MenuCRUD.crear_menu(db, "Jugo", "Bebida", 1000.0, "Bebidas").id
+    pedido = PedidoCRUD.crear_pedido(db, datos["cliente"].id, [
+        {"menu_id": cola, "cantidad": 2}, {"menu_id": jugo, "cantidad": 1},
+    ])
+    analisis = AnalisisColumnar(AlmacenColumnar(str(tmp_path / "columnar")))
+    assert analisis.obtener_distribucion_menus(db) == {"Cola": 2, "Jugo": 1}
+
+    # Mismas filas, cantidad total, monto, menús, clientes y fechas: sólo cambia qué línea tiene qué cantidad
+    EdicionPedido(db, pedido.id).cambiar_cantidad(cola, 1).cambiar_cantidad(jugo, 2).aplicar()
+    assert analisis.obtener_distribucion_menus(db) == {"Jugo": 2, "Cola": 1}
+    assert analisis.obtener_distribucion_menus(db) == GraficosEstadisticos.obtener_distribucion_menus(db)
+
+
+def test_actualizar_agrega_solo_los_pedidos_nuevos(db, datos, tmp_path):
+    pizza = datos["pizza"].id
+    PedidoCRUD.crear_pedido(db, datos["cliente"].id, [{"menu_id": pizza, "cantidad": 1}])
+    almacen = AlmacenColumnar(str(tmp_path / "columnar"))
+    assert almacen.actualizar(db) == 1
+    assert almacen.actualizar(db) == 0
+
+    PedidoCRUD.crear_pedido(db, datos["cliente"].id, [{"menu_id": pizza, "cantidad": 3}])
+    assert almacen.actualizar(db) == 1
+    assert almacen.filas == 2
+    assert list(almacen.columnas()["cantidad"]) == [1, 3]
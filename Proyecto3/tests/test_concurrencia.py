@@ -0,0 +1,58 @@
+import pytest
+from sqlalchemy.orm.exc import StaleDataError
+
+from crud import concurrencia
+from crud.concurrencia import con_reintentos, metricas_conflictos
+from crud.ingrediente_crud import IngredienteCRUD
+from database import SessionLocal
+from models import Ingrediente
+
+
+@pytest.fixture(autouse=True)
+def sin_espera(monkeypatch):
+    monkeypatch.setattr(concurrencia, "ESPERA_BASE", 0.0)
+    metricas_conflictos.reiniciar()
+    yield
+    metricas_conflictos.reiniciar()
+
+
+def _resumen():
+    return {f["operacion"]: (f["conflictos"], f["resueltas"], f["agotadas"]) for f in metricas_conflictos.resumen()}
+
+
+def test_reintenta_sobre_los_datos_nuevos(db, datos):
+    harina = datos["harina"]
+    version = harina.version
+    assert harina.stock == 100.0  # La sesión queda con la versión leída
+
+    # Otra terminal modifica el ingrediente después de la lectura
+    otra = SessionLocal()
+    try:
+        otra.get(Ingrediente, harina.id).stock += 10.0
+        otra.commit()
+    finally:
+        otra.close()
+
+    # El primer UPDATE no coincide con la versión; el reintento relee y suma sobre 110
+    assert IngredienteCRUD.actualizar_stock(db, harina.id, 5.0).stock == 115.0
+    assert harina.version == version + 2
+    assert _resumen() == {"IngredienteCRUD.actualizar_stock": (1, 1, 0)}
+
+
+def test_sin_conflictos_no_reintenta(db, datos):
+    IngredienteCRUD.actualizar_stock(db, datos["harina"].id, -5.0)
+    assert db.get(Ingrediente, datos["harina"].id).stock == 95.0
+    assert _resumen() == {}
+
+
+def test_agota_los_intentos(db):
+    llamadas = []
+
+    def siempre_en_conflicto():
+        llamadas.append(1)
+        raise StaleDataError("conflicto")
+
+    with pytest.raises(StaleDataError, match="3 intentos"):
+        con_reintentos(db, "prueba", siempre_en_conflicto, intentos=3)
+    assert len(llamadas) == 3
+    assert _resumen() == {"prueba": (3, 0, 1)}
@@ -0,0 +1,93 @@
+import pytest
+from sqlalchemy import event, select
+
+from crud.pedido_crud import EdicionPedido, PedidoCRUD
+from database import SessionLocal, engine
+from models import Ingrediente, ItemPedido
+
+
+def _lineas(db, pedido_id):
+    return sorted((i.menu_id, i.cantidad) for i in
+                  db.scalars(select(ItemPedido).where(ItemPedido.pedido_id == pedido_id)))
+
+
+def _stock(nombre):
+    otra = SessionLocal()
+    try:
+        return otra.scalar(select(Ingrediente.stock).where(Ingrediente.nombre == nombre))
+    finally:
+        otra.close()
+
+
+@pytest.fixture
+def pedido(db, datos):
+    return PedidoCRUD.crear_pedido(db, datos["cliente"].id, [{"menu_id": datos["pizza"].id, "cantidad": 1}])
+
+
+def test_aplicar_fusiona_lineas_repetidas(db, datos, pedido):
+    pizza, pan = datos["pizza"].id, datos["pan"].id
+    # Línea repetida de una versión anterior que no fusionaba
+    db.add(ItemPedido(pedido_id=pedido.id, menu_id=pizza, cantidad=2))
+    db.commit()
+
+    EdicionPedido(db, pedido.id).agregar(pizza, 1).agregar(pan, 2).cambiar_cantidad(pan, 3).aplicar()
+    assert _lineas(db, pedido.id) == [(pizza, 4), (pan, 3)]
+
+    EdicionPedido(db, pedido.id).quitar(pan).aplicar()
+    assert _lineas(db, pedido.id) == [(pizza, 4)]
+
+
+def test_aplicar_valida_todo_antes_de_escribir(db, datos, pedido):
+    pizza = datos["pizza"].id
+    with pytest.raises(Exception, match="no tiene el menú"):
+        EdicionPedido(db, pedido.id).agregar(pizza, 1).cambiar_cantidad(datos["pan"].id, 2).aplicar()
+    with pytest.raises(Exception, match="al menos un producto"):
+        EdicionPedido(db, pedido.id).quitar(pizza).aplicar()
+    assert _lineas(db, pedido.id) == [(pizza, 1)]
+
+
+def test_aplicar_descuenta_y_devuelve_stock(db, datos, pedido):
+    pizza, pan = datos["pizza"].id, datos["pan"].id
+    # Pizza 0.5 kg de harina, pan 0.25 kg
+    EdicionPedido(db, pedido.id).agregar(pizza, 2).agregar(pan, 4).aplicar(descontar_stock=True)
+    assert _stock("harina") == pytest.approx(100.0 - 1.0 - 1.0)
+
+    EdicionPedido(db, pedido.id).cambiar_cantidad(pizza, 1).quitar(pan).aplicar(descontar_stock=True)
+    assert _stock("harina") == pytest.approx(100.0 - 1.0 - 1.0 + 1.0 + 1.0)
+    assert db.get(Ingrediente, datos["harina"].id).stock == pytest.approx(100.0)
+
+
+def test_aplicar_no_vende_stock_consumido_por_otra_terminal(db, datos, pedido, monkeypatch):
+    pizza = datos["pizza"].id
+    datos["harina"].stock = 1.0
+    db.commit()
+
+    intentos = []
+    cantidades_finales = EdicionPedido._cantidades_finales
+    monkeypatch.setattr(EdicionPedido, "_cantidades_finales",
+                        lambda self, actuales: intentos.append(1) or cantidades_finales(self, actuales))
+    consumido = []
+
+    # Otra terminal consume harina entre la validación del stock y el UPDATE
+    @event.listens_for(engine, "before_cursor_execute")
+    def _consumir(conexion, cursor, sentencia, parametros, contexto, multiples):
+        if consumido or not sentencia.startswith('UPDATE "Ingredientes"'):
+            return
+        consumido.append(True)
+        otra = SessionLocal()
+        try:
+            otra.get(Ingrediente, datos["harina"].id).stock = 0.5
+            otra.commit()
+        finally:
+            otra.close()
+
+    try:
+        with pytest.raises(Exception, match="Stock insuficiente"):
+            EdicionPedido(db, pedido.id).agregar(pizza, 2).aplicar(descontar_stock=True)
+    finally:
+        event.remove(engine, "before_cursor_execute", _consumir)
+
+    # El compare-and-swap detecta el cambio, reintenta y la validación rechaza la edición
+    assert _stock("harina") == 0.5
+    assert _lineas(db, pedido.id) == [(pizza, 1)]
+    assert len(intentos) == 2
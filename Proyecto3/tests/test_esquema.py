@@ -0,0 +1,77 @@
+from sqlalchemy import create_engine, inspect, text
+
+from database import activar_claves_foraneas, actualizar_esquema, adjuntar_archivo
+
+# Esquema de una base creada antes de ON DELETE CASCADE y de los contadores por cliente
+ESQUEMA_ANTERIOR = [
+    'CREATE TABLE "Clientes" (id INTEGER PRIMARY KEY, rut VARCHAR NOT NULL UNIQUE, nombre VARCHAR NOT NULL, '
+    'correo VARCHAR)',
+    'CREATE TABLE "Menus" (id INTEGER PRIMARY KEY, nombre VARCHAR NOT NULL, descripcion VARCHAR, '
+    'precio FLOAT NOT NULL, categoria VARCHAR, disponible INTEGER, receta JSON)',
+    'CREATE TABLE "Pedidos" (id INTEGER PRIMARY KEY, fecha DATETIME, estado VARCHAR, '
+    'cliente_id INTEGER NOT NULL REFERENCES "Clientes" (id))',
+    'CREATE TABLE "ItemPedidos" (id INTEGER PRIMARY KEY, cantidad INTEGER NOT NULL, '
+    'pedido_id INTEGER NOT NULL REFERENCES "Pedidos" (id), menu_id INTEGER NOT NULL REFERENCES "Menus" (id))',
+    "INSERT INTO \"Clientes\" VALUES (1, '11111111-1', 'Ana', NULL), (2, '22222222-2', 'Beto', NULL)",
+    "INSERT INTO \"Menus\" VALUES (1, 'Pizza', NULL, 8000, 'Pizzas', 1, NULL)",
+    "INSERT INTO \"Pedidos\" VALUES (1, '2024-01-01 12:00:00', 'Completado', 1), "
+    "(2, '2024-01-02 12:00:00', 'Completado', 1), (3, '2024-01-03 12:00:00', 'Pendiente', 2)",
+    'INSERT INTO "ItemPedidos" VALUES (1, 1, 1, 1), (2, 2, 2, 1), (3, 1, 3, 1)',
+]
+
+
+def _motor(tmp_path):
+    motor = create_engine(f"sqlite:///{tmp_path / 'anterior.db'}")
+    activar_claves_foraneas(motor)
+    adjuntar_archivo(motor, str(tmp_path / "anterior_archivo.db"))
+    with motor.begin() as conexion:
+        for sentencia in ESQUEMA_ANTERIOR:
+            conexion.exec_driver_sql(sentencia)
+    return motor
+
+
+def test_actualizar_esquema_reconstruye_las_claves_foraneas(tmp_path):
+    motor = _motor(tmp_path)
+    try:
+        agregadas = actualizar_esquema(motor)
+        assert "Clientes.total_pedidos" in agregadas
+
+        inspector = inspect(motor)
+        for tabla in ("Pedidos", "ItemPedidos"):
+            assert {fk["options"].get("ondelete") for fk in inspector.get_foreign_keys(tabla)} == {"CASCADE"}
+
+        with motor.begin() as conexion:
+            # Las filas se copian a la tabla nueva y los contadores se calculan una vez
+            assert conexion.execute(text('SELECT count(*) FROM "ItemPedidos"')).scalar() == 3
+            assert conexion.execute(text(
+                'SELECT total_pedidos, total_gastado, ultimo_pedido FROM "Clientes" WHERE id = 1'
+            )).one() == (2, 24000.0, "2024-01-02 12:00:00")
+
+            conexion.execute(text('DELETE FROM "Clientes" WHERE id = 1'))
+            assert conexion.execute(text('SELECT id FROM "Pedidos"')).scalars().all() == [3]
+            assert conexion.execute(text('SELECT id FROM "ItemPedidos"')).scalars().all() == [3]
+
+        # Una segunda vez no hay nada que agregar ni reconstruir
+        assert actualizar_esquema(motor) == []
+    finally:
+        motor.dispose()
+
+
+def test_actualizar_esquema_continua_las_secuencias_despues_del_archivo(tmp_path):
+    motor = _motor(tmp_path)
+    try:
+        actualizar_esquema(motor)
+        with motor.begin() as conexion:
+            sql = conexion.execute(text("SELECT sql FROM sqlite_master WHERE name = 'Pedidos'")).scalar()
+            assert "AUTOINCREMENT" in sql
+            # Pedidos archivados antes de usar AUTOINCREMENT, con IDs mayores a los de la base principal
+            conexion.execute(text(
+                "INSERT INTO archivo.\"Pedidos\" (id, fecha, estado, cliente_id) VALUES (10, '2023-01-01', 'Completado', 2)"
+            ))
+
+        actualizar_esquema(motor)
+        with motor.begin() as conexion:
+            conexion.execute(text("INSERT INTO \"Pedidos\" (estado, cliente_id, version) VALUES ('Pendiente', 2, 0)"))
+            assert conexion.execute(text('SELECT max(id) FROM "Pedidos"')).scalar() == 11
+    finally:
+        motor.dispose()
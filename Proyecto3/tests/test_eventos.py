@@ -0,0 +1,70 @@
+import pytest
+
+from crud.cliente_crud import ClienteCRUD
+from crud.pedido_crud import PedidoCRUD
+from eventos import _fusionar, bus_eventos, registrar_cambio
+from models import Cliente
+
+
+@pytest.fixture
+def eventos():
+    recibidos = []
+    funcion = bus_eventos.suscribir(lambda evento: recibidos.append((evento.entidad, evento.operacion, evento.ids)))
+    yield recibidos
+    bus_eventos.cancelar(funcion)
+
+
+def _por_clave(eventos):
+    return {(e.entidad, e.operacion): e.ids for e in eventos}
+
+
+def test_fusionar_un_evento_por_entidad_y_operacion():
+    eventos = _fusionar({
+        ("pedidos", "crear"): {1, 2},
+        ("pedidos", "actualizar"): {1, 3, 4},
+        ("pedidos", "eliminar"): {2, 4},
+        ("menus", "actualizar"): None,
+    })
+    assert _por_clave(eventos) == {
+        # Creado y eliminado en la misma transacción: sólo cuenta como eliminado
+        ("pedidos", "crear"): frozenset({1}),
+        # Lo creado en la transacción no se informa además como actualizado
+        ("pedidos", "actualizar"): frozenset({3}),
+        ("pedidos", "eliminar"): frozenset({2, 4}),
+        ("menus", "actualizar"): None,
+    }
+
+
+def test_fusionar_omite_operaciones_sin_ids():
+    eventos = _fusionar({("clientes", "crear"): {5}, ("clientes", "eliminar"): {5}})
+    assert _por_clave(eventos) == {("clientes", "eliminar"): frozenset({5})}
+
+
+def test_registrar_cambio_agrega_las_cascadas(db):
+    registrar_cambio(db, "clientes", "eliminar", [1, 2])
+    registrar_cambio(db, "clientes", "eliminar", [3])
+    assert db.info["eventos_pendientes"] == {("clientes", "eliminar"): {1, 2, 3}, ("pedidos", "eliminar"): None}
+    with pytest.raises(ValueError):
+        registrar_cambio(db, "clientes", "borrar", [1])
+    db.rollback()
+
+
+def test_publica_al_confirmar_y_descarta_al_deshacer(db, datos, eventos):
+    eventos.clear()
+    pedido = PedidoCRUD.crear_pedido(db, datos["cliente"].id, [
+        {"menu_id": datos["pizza"].id, "cantidad": 1}, {"menu_id": datos["pan"].id, "cantidad": 2},
+    ])
+    # Los items nuevos no generan una actualización aparte del pedido creado
+    assert ("pedidos", "crear", frozenset({pedido.id})) in eventos
+    assert not [e for e in eventos if e[0] == "pedidos" and e[1] != "crear"]
+    assert ("clientes", "actualizar", frozenset({datos["cliente"].id})) in eventos
+
+    eventos.clear()
+    db.get(Cliente, datos["cliente"].id).nombre = "Otro nombre"
+    db.flush()
+    db.rollback()
+    assert eventos == []
+
+    ClienteCRUD.eliminar_cliente(db, datos["cliente"].id)
+    assert ("clientes", "eliminar", frozenset({datos["cliente"].id})) in eventos
+    assert ("pedidos", "eliminar", None) in eventos
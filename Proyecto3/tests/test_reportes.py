@@ -0,0 +1,101 @@
+import csv
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+import reportes
+from crud.pedido_crud import PedidoCRUD
+from database import DATABASE_URL
+from fuente_reportes import FuenteReportes
+
+
+def _base_del_proceso() -> str:
+    """Archivo de la base que leen las sesiones de un proceso del pool"""
+    db = reportes._sesiones_reportes()
+    try:
+        return db.get_bind().url.database
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def fuente(db):
+    fuente = FuenteReportes(DATABASE_URL, modo="instantanea", max_antiguedad=3600)
+    yield fuente
+    fuente.detener()
+    for motor in fuente._motores:
+        motor.dispose()
+    for indice in (0, 1):
+        for ruta in fuente.rutas_copia(indice):
+            if os.path.exists(ruta):
+                os.remove(ruta)
+
+
+@pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="Requiere fork")
+def test_los_procesos_leen_la_copia_y_no_la_base_principal(db, datos, fuente, tmp_path):
+    PedidoCRUD.crear_pedido(db, datos["cliente"].id, [{"menu_id": datos["pizza"].id, "cantidad": 1}])
+    url, archivo = fuente.url()
+    # Pedido posterior a la copia: los reportes no lo ven
+    PedidoCRUD.crear_pedido(db, datos["cliente"].id, [{"menu_id": datos["pan"].id, "cantidad": 3}])
+
+    # Con fork el proceso hereda el módulo database ya importado (el caso que fallaba)
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("fork"),
+                             initializer=reportes._inicializar_proceso, initargs=(url, archivo)) as pool:
+        assert pool.submit(_base_del_proceso).result() == fuente.rutas_copia(0)[0]
+        resultado = pool.submit(reportes.generar_reporte, {
+            "clase": "menus", "nombre": "resumen_menus", "salida": str(tmp_path),
+        }).result()
+
+    assert resultado["error"] is None
+    with open(tmp_path / "resumen_menus.csv", encoding="utf-8") as archivo_csv:
+        assert list(csv.DictReader(archivo_csv)) == [{"menu": "Pizza", "cantidad": "1"}]
+
+
+def _esperar(condicion, limite: float = 5.0) -> None:
+    fin = time.monotonic() + limite
+    while not condicion():
+        assert time.monotonic() < fin, "Tiempo de espera agotado"
+        time.sleep(0.01)
+
+
+def test_la_primera_copia_se_hace_en_el_hilo_de_refresco(db, fuente, monkeypatch):
+    hilos = []
+    refrescar = fuente.refrescar
+
+    def refrescar_registrando():
+        hilos.append(threading.current_thread().name)
+        refrescar()
+
+    monkeypatch.setattr(fuente, "refrescar", refrescar_registrando)
+    fuente.iniciar_refresco_periodico()
+    sesion = fuente.sesion()
+    sesion.close()
+    assert hilos == ["refresco-reportes"]
+    assert fuente.refrescos == 1
+
+
+def test_los_errores_al_refrescar_se_registran(db, fuente, monkeypatch, caplog):
+    fuente.refrescar()
+    fecha_datos = fuente.fecha_datos
+
+    def fallar():
+        raise OSError("disco lleno")
+
+    monkeypatch.setattr(fuente, "refrescar", fallar)
+    fuente.max_antiguedad = 0.02
+    with caplog.at_level(logging.ERROR, logger="fuente_reportes"):
+        fuente.iniciar_refresco_periodico()
+        _esperar(lambda: fuente.errores_refresco > 0)
+        # Mientras el hilo reintenta, las consultas siguen leyendo la copia anterior
+        sesion = fuente.sesion()
+        sesion.close()
+        fuente.detener()
+
+    assert fuente.fecha_datos == fecha_datos
+    assert fuente.ultimo_error[1] == "disco lleno"
+    assert "Error al refrescar la copia de reportes" in caplog.text
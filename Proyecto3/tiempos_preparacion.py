@@ -0,0 +1,250 @@
+"""
+Historial de estados de los pedidos y tiempos de preparación.
+
+Cada cambio de estado de un pedido queda en HistorialEstadosPedido con su
+fecha (crear_pedido registra el "Pendiente" inicial y cambiar_estado cada
+transición). El tiempo de preparación de un pedido va desde que entra "En
+preparación" (o desde que se crea, si pasa directo a "Completado") hasta
+que se completa por primera vez.
+
+Los percentiles (p50, p90, p99) por menú y por hora del día no se calculan
+ordenando el historial: cada (menú, hora de inicio) tiene en
+LatenciasPreparacion un ResumenCuantiles (ver cuantiles.py) al que se
+suma el pedido en la misma transacción que lo completa. Los de un menú
+salen de fusionar sus 24 horas y los de una hora de fusionar todos los
+menús, sin leer el historial.
+
+Al archivar un pedido su historial se mueve al archivo junto con sus items
+(ver archivo.py), y reconstruir lee ambas bases: los tiempos de los pedidos
+archivados no se pierden. Eliminar un pedido borra su historial; su tiempo
+queda en los resúmenes hasta la próxima reconstrucción.
+
+Uso:
+    python tiempos_preparacion.py [--reconstruir [--forzar]] [--pedido ID]
+"""
+import argparse
+import sys
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import case, delete, func, insert, select, union_all
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from crud.version_crud import VersionCRUD
+from cuantiles import ResumenCuantiles
+from models import (HistorialEstadoPedido, HistorialEstadoPedidoArchivado, ItemPedido, ItemPedidoArchivado,
+                    LatenciaPreparacion, Menu, Pedido, PedidoArchivado)
+
+ESTADO_INICIO = "En preparación"
+ESTADO_FIN = "Completado"
+CUANTILES = (0.5, 0.9, 0.99)
+# Filas del historial leídas por lote al reconstruir
+LOTE_RECONSTRUCCION = 10000
+
+
+class FilaLatencia(NamedTuple):
+    clave: object  # Nombre del menú u hora del día
+    cantidad: int
+    p50: Optional[float]  # Segundos
+    p90: Optional[float]
+    p99: Optional[float]
+    promedio: Optional[float]
+
+
+def _fila(clave, resumen: ResumenCuantiles) -> FilaLatencia:
+    return FilaLatencia(clave, resumen.cantidad, *resumen.cuantiles(CUANTILES), resumen.promedio)
+
+
+class TiemposPreparacion:
+    @staticmethod
+    def registrar_estado(db: Session, pedido: Pedido, anterior: Optional[str], fecha: datetime = None) -> None:
+        """
+        Anota la transición del pedido a su estado actual y, si se completa
+        por primera vez, suma su tiempo de preparación a los resúmenes de
+        sus menús. No hace commit.
+        """
+        fecha = fecha or datetime.now()
+        if pedido.estado == ESTADO_FIN and anterior != ESTADO_FIN:
+            # Antes de agregar la transición: con autoflush=False la consulta no la ve
+            TiemposPreparacion._acumular_pedido(db, pedido, fecha)
+        db.add(HistorialEstadoPedido(pedido_id=pedido.id, estado_anterior=anterior,
+                                     estado=pedido.estado, fecha=fecha))
+
+    @staticmethod
+    def _acumular_pedido(db: Session, pedido: Pedido, fin: datetime) -> None:
+        fechas = dict(db.execute(
+            select(HistorialEstadoPedido.estado, func.min(HistorialEstadoPedido.fecha))
+            .where(HistorialEstadoPedido.pedido_id == pedido.id)
+            .group_by(HistorialEstadoPedido.estado)
+        ).all())
+        if ESTADO_FIN in fechas:
+            return  # Ya se había completado: sólo cuenta la primera vez
+        inicio = fechas.get(ESTADO_INICIO) or pedido.fecha or fin
+        menu_ids = db.scalars(select(ItemPedido.menu_id).where(ItemPedido.pedido_id == pedido.id).distinct()).all()
+        if menu_ids:
+            segundos = max(0.0, (fin - inicio).total_seconds())
+            TiemposPreparacion.acumular(db, inicio.hour, {menu_id: segundos for menu_id in menu_ids})
+
+    @staticmethod
+    def acumular(db: Session, hora: int, segundos: Dict[int, float]) -> None:
+        """Suma un tiempo (menu_id -> segundos) al resumen de cada menú en esa hora. No hace commit"""
+        db.execute(sqlite_insert(LatenciaPreparacion).values([
+            {"menu_id": menu_id, "hora": hora, "cantidad": 0, "resumen": ResumenCuantiles().a_dict()}
+            for menu_id in segundos
+        ]).on_conflict_do_nothing())
+        filas = db.scalars(
+            select(LatenciaPreparacion)
+            .where(LatenciaPreparacion.hora == hora, LatenciaPreparacion.menu_id.in_(list(segundos)))
+            .execution_options(populate_existing=True)
+        ).all()
+        for fila in filas:
+            # Se asigna un resumen nuevo: la columna JSON no detecta cambios internos
+            resumen = ResumenCuantiles.desde_dict(fila.resumen)
+            resumen.agregar(segundos[fila.menu_id])
+            fila.resumen = resumen.a_dict()
+            fila.cantidad = resumen.cantidad
+        VersionCRUD.incrementar(db, "tiempos")
+
+    @staticmethod
+    def historial(db: Session, pedido_id: int) -> List[HistorialEstadoPedido]:
+        """Transiciones del pedido en orden cronológico (del archivo si el pedido está archivado)"""
+        for modelo in (HistorialEstadoPedido, HistorialEstadoPedidoArchivado):
+            transiciones = db.scalars(
+                select(modelo).where(modelo.pedido_id == pedido_id).order_by(modelo.fecha, modelo.id)
+            ).all()
+            if transiciones:
+                return transiciones
+        return []
+
+    @staticmethod
+    def _consulta_tiempos(historial, items):
+        """(pedido_id, menu_id, hora de inicio, segundos) de cada menú de los pedidos completados de una base"""
+        inicio = func.coalesce(
+            func.min(case((historial.estado == ESTADO_INICIO, historial.fecha))),
+            func.min(case((historial.estado_anterior.is_(None), historial.fecha))),
+        )
+        fin = func.min(case((historial.estado == ESTADO_FIN, historial.fecha)))
+        tiempos = (
+            select(historial.pedido_id, inicio.label("inicio"), fin.label("fin"))
+            .group_by(historial.pedido_id).having(fin.isnot(None)).subquery()
+        )
+        return (
+            # Con el pedido: distinct sólo junta las líneas repetidas de un menú, no pedidos con igual tiempo
+            select(tiempos.c.pedido_id, items.menu_id, func.strftime("%H", tiempos.c.inicio),
+                   (func.julianday(tiempos.c.fin) - func.julianday(tiempos.c.inicio)) * 86400.0)
+            .join(tiempos, tiempos.c.pedido_id == items.pedido_id)
+            .where(tiempos.c.inicio.isnot(None))
+            .distinct()
+        )
+
+    @staticmethod
+    def archivados_sin_historial(db: Session) -> int:
+        """Pedidos archivados antes de que el archivo guardara el historial (sus tiempos no se pueden recalcular)"""
+        return db.scalar(
+            select(func.count(PedidoArchivado.id))
+            .where(~select(HistorialEstadoPedidoArchivado.id)
+                   .where(HistorialEstadoPedidoArchivado.pedido_id == PedidoArchivado.id).exists())
+        )
+
+    @staticmethod
+    def reconstruir(db: Session, forzar: bool = False) -> int:
+        """
+        Rehace todos los resúmenes desde el historial de los pedidos activos y
+        archivados (bases existentes o datos cargados en bloque). Recorre el
+        historial una vez, sin ordenar los tiempos. Si hay pedidos archivados
+        sin historial no reconstruye (perdería sus tiempos), salvo con forzar.
+        No hace commit. Retorna los tiempos sumados.
+        """
+        if not forzar:
+            sin_historial = TiemposPreparacion.archivados_sin_historial(db)
+            if sin_historial:
+                raise ValueError(f"Hay {sin_historial} pedidos archivados sin historial de estados: "
+                                 "reconstruir descartaría sus tiempos")
+        # Un pedido está en una sola de las bases: cada rama agrupa sólo su historial
+        consulta = union_all(
+            TiemposPreparacion._consulta_tiempos(HistorialEstadoPedido, ItemPedido),
+            TiemposPreparacion._consulta_tiempos(HistorialEstadoPedidoArchivado, ItemPedidoArchivado),
+        )
+
+        resumenes: Dict[Tuple[int, int], ResumenCuantiles] = {}
+        total = 0
+        resultado = db.execute(consulta, execution_options={"yield_per": LOTE_RECONSTRUCCION})
+        for _, menu_id, hora, segundos in resultado:
+            clave = (menu_id, int(hora))
+            if clave not in resumenes:
+                resumenes[clave] = ResumenCuantiles()
+            resumenes[clave].agregar(max(0.0, segundos))
+            total += 1
+
+        db.execute(delete(LatenciaPreparacion))
+        if resumenes:
+            db.execute(insert(LatenciaPreparacion.__table__), [
+                {"menu_id": menu_id, "hora": hora, "cantidad": resumen.cantidad, "resumen": resumen.a_dict()}
+                for (menu_id, hora), resumen in resumenes.items()
+            ])
+        VersionCRUD.incrementar(db, "tiempos")
+        return total
+
+    # Percentiles
+
+    @staticmethod
+    def por_menu(db: Session, limite: int = None) -> List[FilaLatencia]:
+        """Percentiles de cada menú (fusionando sus horas), los más preparados primero"""
+        resumenes: Dict[str, ResumenCuantiles] = {}
+        for nombre, datos in db.execute(
+            select(Menu.nombre, LatenciaPreparacion.resumen)
+            .join(Menu, Menu.id == LatenciaPreparacion.menu_id)
+            .where(LatenciaPreparacion.cantidad > 0)
+        ):
+            resumen = ResumenCuantiles.desde_dict(datos)
+            if nombre in resumenes:
+                resumenes[nombre].fusionar(resumen)
+            else:
+                resumenes[nombre] = resumen
+        filas = sorted((_fila(nombre, resumen) for nombre, resumen in resumenes.items()),
+                       key=lambda f: f.cantidad, reverse=True)
+        return filas[:limite] if limite else filas
+
+    @staticmethod
+    def por_hora(db: Session) -> List[FilaLatencia]:
+        """Percentiles de cada hora del día (fusionando todos los menús), de 0 a 23"""
+        resumenes = [ResumenCuantiles() for _ in range(24)]
+        for hora, datos in db.execute(
+            select(LatenciaPreparacion.hora, LatenciaPreparacion.resumen).where(LatenciaPreparacion.cantidad > 0)
+        ):
+            resumenes[hora].fusionar(ResumenCuantiles.desde_dict(datos))
+        return [_fila(hora, resumen) for hora, resumen in enumerate(resumenes)]
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Tiempos de preparación de los pedidos")
+    parser.add_argument("--reconstruir", action="store_true", help="Rehace los resúmenes desde el historial")
+    parser.add_argument("--forzar", action="store_true",
+                        help="Reconstruye aunque haya pedidos archivados sin historial")
+    parser.add_argument("--pedido", type=int, default=None, help="Muestra el historial de estados de un pedido")
+    args = parser.parse_args(argv)
+
+    from database import SessionLocal, actualizar_esquema
+    actualizar_esquema()
+    db = SessionLocal()
+    try:
+        if args.reconstruir:
+            print(f"Tiempos sumados: {TiemposPreparacion.reconstruir(db, args.forzar)}")
+            db.commit()
+        if args.pedido is not None:
+            for transicion in TiemposPreparacion.historial(db, args.pedido):
+                print(f"{transicion.fecha:%Y-%m-%d %H:%M:%S}  {transicion.estado_anterior or '-':<15} -> "
+                      f"{transicion.estado}")
+            return 0
+        print(f"{'Menú':<30} {'Pedidos':>8} {'p50':>8} {'p90':>8} {'p99':>8}  (minutos)")
+        for fila in TiemposPreparacion.por_menu(db):
+            print(f"{fila.clave:<30} {fila.cantidad:>8} " +
+                  " ".join(f"{valor / 60:>8.1f}" for valor in (fila.p50, fila.p90, fila.p99)))
+    finally:
+        db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())